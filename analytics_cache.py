@@ -0,0 +1,215 @@
+# analytics_cache.py
+"""
+Stale-while-revalidate-Cache für aufwendige Auswertungen (KPI-Dashboard,
+Verbrauchsprognosen, Projektstatistiken).
+
+Ein Eintrag wird beim ersten Aufruf synchron berechnet. Danach wird immer
+sofort das zuletzt berechnete Ergebnis ausgeliefert; ist es älter als die
+TTL oder wurde es invalidiert, startet im Hintergrund eine Neuberechnung
+(höchstens eine pro Schlüssel). Seiten blockieren dadurch nur beim
+allerersten Aufruf auf eine volle Berechnung.
+
+Jeder Eintrag trägt Tags (Tabellennamen). Änderungen an diesen Tabellen
+markieren ihn nach dem Commit als veraltet; zusätzlich kann mit
+invalidate_analytics() explizit invalidiert werden.
+
+Die berechneten Werte werden zwischen Requests und Threads geteilt und
+dürfen daher keine ORM-Objekte enthalten, nur einfache Daten.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+
+import change_tracking
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ANALYTICS_TTL_SECONDS = 300
+# Obergrenze der Einträge (z.B. Statistiken pro Projekt), älteste fliegen raus
+DEFAULT_MAX_ENTRIES = 256
+
+
+class _Entry:
+    __slots__ = ('value', 'computed_at', 'ttl', 'tags', 'stale', 'generation', 'refreshing')
+
+    def __init__(self, value, ttl, tags):
+        self.value = value
+        self.computed_at = time.monotonic()
+        self.ttl = ttl
+        self.tags = frozenset(tags)
+        self.stale = False
+        self.generation = 0
+        self.refreshing = False
+
+    def is_fresh(self):
+        return not self.stale and time.monotonic() - self.computed_at <= self.ttl
+
+
+class AnalyticsCache:
+    """
+    Thread-sicherer Stale-while-revalidate-Cache.
+
+    Args:
+        app: Flask-App (für den App-Kontext der Hintergrund-Berechnung)
+        ttl_seconds: Standard-TTL der Einträge
+        background: Veraltete Einträge im Hintergrund statt synchron neu berechnen
+        max_entries: Maximale Anzahl an Einträgen
+    """
+
+    def __init__(self, app, ttl_seconds=DEFAULT_ANALYTICS_TTL_SECONDS, background=True,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.app = app
+        self.ttl_seconds = ttl_seconds
+        self.background = background
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._metrics = dict.fromkeys(('hits', 'stale_hits', 'misses', 'refreshes', 'errors'), 0)
+
+    def get(self, key, compute, tags=(), ttl=None):
+        """
+        Liefert den Wert für key; berechnet ihn über compute() bei Bedarf.
+
+        Args:
+            key: Hashbarer Schlüssel (z.B. ('project_stats', 5))
+            compute: Funktion ohne Argumente, liefert den Wert
+            tags: Tabellennamen, deren Änderung den Eintrag invalidiert
+            ttl: Abweichende TTL in Sekunden
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.is_fresh():
+                    self._metrics['hits'] += 1
+                    return entry.value
+                if self.background:
+                    self._metrics['stale_hits'] += 1
+                    if not entry.refreshing:
+                        entry.refreshing = True
+                        self._start_refresh(key, compute, entry.generation)
+                    return entry.value
+            self._metrics['misses'] += 1
+
+        value = compute()
+        self._store(key, value, ttl if ttl is not None else self.ttl_seconds, tags)
+        return value
+
+    def _store(self, key, value, ttl, tags):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = _Entry(value, ttl, tags)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                entry.value = value
+                entry.computed_at = time.monotonic()
+                entry.stale = False
+
+    def _start_refresh(self, key, compute, generation):
+        thread = threading.Thread(
+            target=self._refresh, args=(key, compute, generation),
+            name=f'analytics-refresh-{key}', daemon=True
+        )
+        thread.start()
+
+    def _refresh(self, key, compute, generation):
+        value = None
+        failed = False
+        with self.app.app_context():
+            try:
+                value = compute()
+            except Exception:
+                failed = True
+                logger.exception("Hintergrund-Berechnung für %s fehlgeschlagen", key)
+            finally:
+                db.session.remove()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refreshing = False
+            if failed:
+                self._metrics['errors'] += 1
+                return
+            self._metrics['refreshes'] += 1
+            entry.value = value
+            entry.computed_at = time.monotonic()
+            # Während der Berechnung invalidiert: Ergebnis ausliefern, aber veraltet lassen
+            entry.stale = entry.generation != generation
+
+    def invalidate(self, tags=None, key=None, drop=False):
+        """
+        Markiert Einträge als veraltet (nächster Zugriff stößt die Neuberechnung an).
+
+        Args:
+            tags: Nur Einträge mit mindestens einem dieser Tags (None = alle)
+            key: Nur genau diesen Eintrag
+            drop: Einträge entfernen statt nur als veraltet zu markieren
+        """
+        tags = set(tags) if tags is not None else None
+        with self._lock:
+            for entry_key, entry in list(self._entries.items()):
+                if key is not None and entry_key != key:
+                    continue
+                if tags is not None and not (entry.tags & tags):
+                    continue
+                if drop:
+                    del self._entries[entry_key]
+                else:
+                    entry.stale = True
+                    entry.generation += 1
+
+    def stats(self):
+        """Trefferquote und Zustand des Caches."""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['entries'] = len(self._entries)
+            metrics['stale_entries'] = sum(1 for entry in self._entries.values() if not entry.is_fresh())
+            metrics['refreshing'] = sum(1 for entry in self._entries.values() if entry.refreshing)
+        served = metrics['hits'] + metrics['stale_hits'] + metrics['misses']
+        metrics['hit_ratio'] = round((metrics['hits'] + metrics['stale_hits']) / served, 3) if served else None
+        metrics['ttl_seconds'] = self.ttl_seconds
+        return metrics
+
+
+def get_analytics_cache(app=None):
+    """Gibt den Analytics-Cache der (aktuellen) App zurück und legt ihn bei Bedarf an."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('analytics_cache')
+    if cache is None:
+        cache = AnalyticsCache(
+            app,
+            ttl_seconds=app.config.get('ANALYTICS_CACHE_TTL_SECONDS', DEFAULT_ANALYTICS_TTL_SECONDS),
+            # Im Testmodus synchron, damit Tests deterministisch bleiben
+            background=app.config.get('ANALYTICS_CACHE_BACKGROUND', not app.testing),
+            max_entries=app.config.get('ANALYTICS_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        )
+        app.extensions['analytics_cache'] = cache
+    return cache
+
+
+def cached_analytics(key, compute, tags=(), ttl=None):
+    """Kurzform für get_analytics_cache().get(...)."""
+    return get_analytics_cache().get(key, compute, tags=tags, ttl=ttl)
+
+
+def invalidate_analytics(*tags):
+    """Explizite Invalidierung, z.B. nach Änderungen an der Datenbank vorbei."""
+    if has_app_context():
+        get_analytics_cache().invalidate(tags or None)
+
+
+# --- Automatische Invalidierung nach dem Commit ---
+
+@change_tracking.on_commit
+def _invalidate_after_commit(changes):
+    cache = current_app.extensions.get('analytics_cache')
+    if cache is not None and changes.tables:
+        cache.invalidate(changes.tables)
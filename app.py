@@ -14,6 +14,9 @@ from scheduler import init_scheduler
 from manage_db import export_data_command, import_data_command
 from tests import test_suite_command
 from routes import register_blueprints
+from stock_alerts import get_low_stock_materials
+from search_index import init_search_index, search_reindex_command
+from kpi_rollup import kpi_backfill_command, printer_counters_command
 
 def check_and_repair_database(app):
     """
@@ -23,8 +26,14 @@ def check_and_repair_database(app):
     pass
 
 
-def create_app():
-    """Erstellt und konfiguriert die Flask-Anwendung."""
+def create_app(config_class=None):
+    """
+    Erstellt und konfiguriert die Flask-Anwendung.
+
+    Args:
+        config_class: Optionale Konfigurationsklasse (z.B. config_test.TestConfig),
+                      die die Standardkonfiguration überschreibt.
+    """
     
     load_dotenv()
     base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -42,8 +51,12 @@ def create_app():
         STL_FOLDER=os.path.join(base_dir, 'static', 'uploads', 'stl_files'),
         GCODE_FOLDER=os.path.join(base_dir, 'static', 'uploads', 'gcode'),
         SLICER_PROFILES_FOLDER=os.path.join(base_dir, 'slicer_profiles'),
-        SNAPSHOT_FOLDER=os.path.join(base_dir, 'static', 'uploads', 'snapshots')
+        SNAPSHOT_FOLDER=os.path.join(base_dir, 'static', 'uploads', 'snapshots'),
+        # Gemeinsame Socket.IO-Queue bei mehreren Web-Workern (z.B. redis://localhost:6379/0)
+        SOCKETIO_MESSAGE_QUEUE=os.environ.get('SOCKETIO_MESSAGE_QUEUE')
     )
+    if config_class is not None:
+        app.config.from_object(config_class)
     
     for folder in ['UPLOAD_FOLDER', 'PRINTER_IMAGES_FOLDER', 'STL_FOLDER', 'GCODE_FOLDER', 'SLICER_PROFILES_FOLDER', 'SNAPSHOT_FOLDER']:
         os.makedirs(app.config[folder], exist_ok=True)
@@ -58,7 +71,7 @@ def create_app():
     login_manager.init_app(app)
     login_manager.login_view = 'auth_bp.login'
     csrf.init_app(app)
-    socketio.init_app(app, cors_allowed_origins="*")
+    socketio.init_app(app, cors_allowed_origins="*", message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'))
 
     # --- Blueprints registrieren ---
     register_blueprints(app)
@@ -67,6 +80,9 @@ def create_app():
     app.cli.add_command(export_data_command)
     app.cli.add_command(import_data_command)
     app.cli.add_command(test_suite_command)
+    app.cli.add_command(search_reindex_command)
+    app.cli.add_command(kpi_backfill_command)
+    app.cli.add_command(printer_counters_command)
 
     @login_manager.user_loader
     def load_user(user_id):
@@ -78,15 +94,8 @@ def create_app():
         if not current_user.is_authenticated:
             return {}
             
-        low_stock_filaments = FilamentType.query.filter(
-            FilamentType.reorder_level_g != None,
-            FilamentType.reorder_level_g > 0
-        ).all()
-        
-        triggered_alerts = [
-            ftype for ftype in low_stock_filaments 
-            if ftype and ftype.total_remaining_weight <= ftype.reorder_level_g
-        ]
+        # Zwischengespeichert, eine gruppierte Abfrage statt einer pro Material
+        triggered_alerts = get_low_stock_materials()
         
         return dict(
             models=models,
@@ -118,7 +127,11 @@ def create_app():
                 db.session.commit()
                 print("--- Admin-Benutzer wurde mit Standard-Passwort 'admin' erstellt. ---")
 
-    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    # FTS5-Suchindizes anlegen (idempotent, bei bestehenden Datenbanken)
+    init_search_index(app)
+
+    # Im Testmodus keinen Hintergrund-Scheduler starten
+    if not app.testing and (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
         init_scheduler(app, socketio)
     
     return app
@@ -0,0 +1,312 @@
+# assignment_engine.py
+"""
+Zuweisung wartender Aufträge zu freien Druckern als Min-Cost-Bipartite-Matching.
+
+Statt Auftrag für Auftrag den ersten passenden Drucker zu nehmen, werden alle
+Kandidaten einmal geladen (feste Anzahl Abfragen, unabhängig von der Anzahl
+der Paare) und daraus eine Machbarkeits- und eine Kostenmatrix aufgebaut:
+
+- Machbarkeit: Zeitfenster des Druckers, Materialkompatibilität, geladene
+  Spule bzw. Lagerbestand mit genug Restgewicht, Bauraum, Abhängigkeiten
+- Kosten: Rang des Auftrags in der Prioritätsreihenfolge, Deadline-Nähe,
+  Spulenwechsel bzw. Einlegen einer Spule
+
+Das Matching (Ungarische Methode) maximiert zuerst die Anzahl der
+zugewiesenen Aufträge (unzulässige Paare kosten mehr als jede zulässige
+Lösung) und minimiert danach die Kosten.
+
+Jede freie Spule im Lager kann nur einmal eingelegt werden. Braucht das
+Matching mehr Spulen eines Typs als vorhanden sind, behalten die
+wichtigsten Aufträge (best fit nach Restgewicht) ihre Spule; die übrigen
+dürfen für diesen Lauf nur noch auf Drucker mit passender geladener Spule,
+und das Matching wird neu gelöst.
+"""
+import bisect
+import datetime
+from collections import namedtuple
+
+import numpy as np
+from extensions import db
+from models import Job, JobStatus, GCodeFile, FilamentType, FilamentSpool, TimeWindow, JobDependency, DependencyType
+
+# Kostengewichte: Priorität vor Spulenwechsel vor Einlegen einer Spule
+PRIORITY_WEIGHT = 10.0
+DEADLINE_WEIGHT = 5.0
+SWAP_PENALTY = 3.0
+LOAD_PENALTY = 1.5
+# Deadlines innerhalb dieses Horizonts erhöhen die Dringlichkeit
+DEADLINE_HORIZON_H = 24.0
+
+Assignment = namedtuple('Assignment', ['job', 'printer', 'spool_change', 'cost'])
+
+
+class AssignmentPlan:
+    """
+    Ergebnis einer Zuweisungsrunde.
+
+    Attributes:
+        assignments: Liste von Assignment(job, printer, spool_change, cost)
+        skipped: Anzahl nicht zuweisbarer Aufträge je Grund
+            ('dependencies', 'time_window', 'material', 'size')
+    """
+
+    def __init__(self, assignments, skipped):
+        self.assignments = assignments
+        self.skipped = skipped
+
+    @property
+    def spool_changes(self):
+        return sum(1 for a in self.assignments if a.spool_change)
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def __iter__(self):
+        return iter(self.assignments)
+
+
+def solve_assignment(cost):
+    """
+    Ungarische Methode (kürzeste augmentierende Wege, O(n²·m)) für eine
+    rechteckige Kostenmatrix. Jede Zeile bzw. Spalte der kleineren Seite wird
+    genau einmal zugeordnet.
+
+    Args:
+        cost: 2D-Array (Zeilen × Spalten), nur endliche Werte
+
+    Returns:
+        list: (zeile, spalte)-Paare, sortiert nach Zeile
+    """
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return []
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # Potentiale u (Zeilen), v (Spalten); p[j] = Zeile an Spalte j (1-basiert, 0 = frei)
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        p[0] = row
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            used_columns = np.nonzero(used)[0]
+            u[p[used_columns]] += delta
+            v[used_columns] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Augmentieren entlang des gefundenen Weges
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
+
+
+def _parse_materials(printer):
+    materials = {m.strip().upper() for m in (printer.compatible_material_types or '').split(',')}
+    materials.discard('')
+    return materials
+
+
+def _fits_build_volume(dims, printer):
+    """Prüft Bauteilmaße gegen den Bauraum (Drehung um 90° in XY erlaubt)."""
+    x, y, z = dims
+    length, width, height = printer.build_volume_l, printer.build_volume_w, printer.build_volume_h
+    if x and y and length and width:
+        if not ((x <= length and y <= width) or (y <= length and x <= width)):
+            return False
+    if z and height and z > height:
+        return False
+    return True
+
+
+def blocked_job_ids(job_ids):
+    """
+    Aufträge, deren Abhängigkeiten noch nicht erfüllt sind (eine Abfrage).
+    Entspricht Job.can_start für alle übergebenen Aufträge.
+    """
+    if not job_ids:
+        return set()
+    predecessor = db.aliased(Job)
+    rows = db.session.query(JobDependency.job_id, JobDependency.dependency_type, predecessor.status)\
+        .join(predecessor, JobDependency.depends_on_job_id == predecessor.id)\
+        .filter(JobDependency.job_id.in_(job_ids)).all()
+    blocked = set()
+    for job_id, dependency_type, status in rows:
+        if dependency_type == DependencyType.FINISH_TO_START and status != JobStatus.COMPLETED:
+            blocked.add(job_id)
+        elif dependency_type == DependencyType.START_TO_START and status == JobStatus.PENDING:
+            blocked.add(job_id)
+    return blocked
+
+
+def _unstocked_loads(matched, spool_cost, type_ids, needed, job_cost, stock):
+    """
+    Verteilt die freien Spulen auf die Paare mit Einlegen/Wechsel.
+
+    Wichtigere Aufträge zuerst, jeweils die kleinste Spule mit genug
+    Restgewicht (best fit).
+
+    Returns:
+        list: Zeilen der Aufträge, für die keine Spule mehr übrig ist
+    """
+    loads = sorted((job_cost[j], j) for j, k in matched if spool_cost[j, k])
+    remaining = {type_id: list(weights) for type_id, weights in stock.items()}
+    unstocked = []
+    for _, j in loads:
+        weights = remaining.get(type_ids[j], [])
+        index = bisect.bisect_left(weights, needed[j])
+        if index < len(weights):
+            weights.pop(index)
+        else:
+            unstocked.append(j)
+    return unstocked
+
+
+def plan_assignments(jobs, printers, now=None, check_dependencies=True):
+    """
+    Berechnet die optimale Zuweisung von Aufträgen zu freien Druckern.
+
+    Args:
+        jobs: Wartende Aufträge in Prioritätsreihenfolge (wichtigster zuerst)
+        printers: Freie Drucker
+        now: Bezugszeit für Zeitfenster und Deadlines
+        check_dependencies: Aufträge mit offenen Abhängigkeiten überspringen
+
+    Returns:
+        AssignmentPlan
+    """
+    now = now or datetime.datetime.utcnow()
+    skipped = dict.fromkeys(('dependencies', 'time_window', 'material', 'size'), 0)
+    if not jobs or not printers:
+        return AssignmentPlan([], skipped)
+
+    if check_dependencies:
+        blocked = blocked_job_ids([job.id for job in jobs])
+        skipped['dependencies'] = sum(1 for job in jobs if job.id in blocked)
+        ranks = {job.id: rank for rank, job in enumerate(jobs)}
+        jobs = [job for job in jobs if job.id not in blocked]
+    else:
+        ranks = {job.id: rank for rank, job in enumerate(jobs)}
+    if not jobs:
+        return AssignmentPlan([], skipped)
+    job_count, printer_count = len(jobs), len(printers)
+    rank_scale = max(len(ranks) - 1, 1)
+
+    # --- Kandidaten einmal laden ---
+    job_rows = {row.id: row for row in db.session.query(
+        Job.id, Job.required_filament_type_id, Job.estimated_material_g, Job.deadline,
+        FilamentType.material_type, GCodeFile.material_needed_g,
+        GCodeFile.dimensions_x_mm, GCodeFile.dimensions_y_mm, GCodeFile.dimensions_z_mm
+    ).outerjoin(FilamentType, Job.required_filament_type_id == FilamentType.id)
+     .outerjoin(GCodeFile, Job.gcode_file_id == GCodeFile.id)
+     .filter(Job.id.in_([job.id for job in jobs]))}
+
+    printer_ids = [printer.id for printer in printers]
+    windows = {}
+    for window in TimeWindow.query.filter(TimeWindow.printer_id.in_(printer_ids)):
+        windows.setdefault(window.printer_id, []).append(window)
+    loaded = {}
+    for spool in FilamentSpool.query.filter(
+        FilamentSpool.assigned_to_printer_id.in_(printer_ids), FilamentSpool.is_in_use == True
+    ):
+        loaded.setdefault(spool.assigned_to_printer_id, spool)
+    # Restgewichte der freien Spulen je Filamenttyp, aufsteigend (für Einlegen/Wechsel)
+    stock = {}
+    for type_id, weight in db.session.query(FilamentSpool.filament_type_id, FilamentSpool.current_weight_g)\
+            .filter(FilamentSpool.is_in_use == False, FilamentSpool.current_weight_g > 0)\
+            .order_by(FilamentSpool.current_weight_g):
+        stock.setdefault(type_id, []).append(weight)
+
+    # --- Matrizen aufbauen ---
+    in_window = np.array([
+        not windows.get(printer.id) or any(w.is_within_window(now) for w in windows[printer.id])
+        for printer in printers
+    ])
+    material_ok = np.ones((job_count, printer_count), dtype=bool)
+    size_ok = np.ones((job_count, printer_count), dtype=bool)
+    spool_cost = np.zeros((job_count, printer_count))
+    printer_materials = [_parse_materials(printer) for printer in printers]
+    job_cost = np.zeros(job_count)
+    needed = np.zeros(job_count)
+
+    for j, job in enumerate(jobs):
+        row = job_rows[job.id]
+        job_cost[j] = PRIORITY_WEIGHT * ranks[job.id] / rank_scale
+        if row.deadline:
+            hours_left = (row.deadline - now).total_seconds() / 3600
+            job_cost[j] -= DEADLINE_WEIGHT * min(max(1 - hours_left / DEADLINE_HORIZON_H, 0), 1)
+        dims = (row.dimensions_x_mm, row.dimensions_y_mm, row.dimensions_z_mm)
+        needed_g = needed[j] = row.material_needed_g or row.estimated_material_g or 0
+        type_id = row.required_filament_type_id
+        for k, printer in enumerate(printers):
+            size_ok[j, k] = _fits_build_volume(dims, printer)
+            if not type_id:
+                continue
+            required = (row.material_type or '').upper()
+            if printer_materials[k] and required not in printer_materials[k]:
+                material_ok[j, k] = False
+                continue
+            spool = loaded.get(printer.id)
+            if spool is not None and spool.filament_type_id == type_id and spool.current_weight_g >= needed_g \
+                    and spool.current_weight_g > 0:
+                continue
+            # Spule einlegen bzw. wechseln, nur wenn eine passende im Lager liegt
+            if not stock.get(type_id) or stock[type_id][-1] < needed_g:
+                material_ok[j, k] = False
+            else:
+                spool_cost[j, k] = SWAP_PENALTY if spool is not None else LOAD_PENALTY
+
+    base_cost = job_cost[:, np.newaxis] + spool_cost
+    base_cost -= base_cost.min()
+    # Unzulässige Paare teurer als jede zulässige Gesamtlösung
+    infeasible_cost = (base_cost.max() + 1) * (min(job_count, printer_count) + 1)
+    type_ids = [job_rows[job.id].required_filament_type_id for job in jobs]
+
+    while True:
+        feasible = in_window[np.newaxis, :] & material_ok & size_ok
+        cost = np.where(feasible, base_cost, infeasible_cost)
+        matched = [(j, k) for j, k in solve_assignment(cost) if feasible[j, k]]
+        over_capacity = _unstocked_loads(matched, spool_cost, type_ids, needed, job_cost, stock)
+        if not over_capacity:
+            break
+        # Ohne Spule aus dem Lager bleiben nur Drucker mit passender geladener Spule
+        for j in over_capacity:
+            material_ok[j, spool_cost[j] > 0] = False
+
+    assignments = [Assignment(jobs[j], printers[k], bool(spool_cost[j, k]), float(cost[j, k])) for j, k in matched]
+
+    assigned = {a.job.id for a in assignments}
+    for j, job in enumerate(jobs):
+        if job.id in assigned or feasible[j].any():
+            continue
+        if not in_window.any():
+            skipped['time_window'] += 1
+        elif not (material_ok[j] & in_window).any():
+            skipped['material'] += 1
+        else:
+            skipped['size'] += 1
+    return AssignmentPlan(assignments, skipped)
@@ -0,0 +1,34 @@
+# bulk_updates.py
+"""
+Gesammelte Updates auf Aufträge.
+
+Planer und Score-Berechnungen schreiben viele Aufträge auf einmal. Ein
+Bulk-UPDATE per Primärschlüssel (executemany) umgeht die Identity-Map;
+bereits geladene Aufträge müssen die geänderten Spalten daher neu lesen.
+"""
+from sqlalchemy import update
+
+from extensions import db
+from models import Job
+
+
+def bulk_update_jobs(rows, attrs):
+    """
+    Schreibt Zeilen der Form {'id': ..., <attr>: ...} in einem Bulk-UPDATE
+    (ohne Commit) und lässt geladene Aufträge die Spalten neu lesen.
+
+    Args:
+        rows: Liste von Dicts mit 'id' und den geänderten Werten
+        attrs: Namen der geschriebenen Spalten
+
+    Returns:
+        int: Anzahl geschriebener Zeilen
+    """
+    if not rows:
+        return 0
+    db.session.execute(update(Job), rows)
+    changed = {row['id'] for row in rows}
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Job) and obj.id in changed:
+            db.session.expire(obj, list(attrs))
+    return len(rows)
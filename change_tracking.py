@@ -0,0 +1,157 @@
+# change_tracking.py
+"""
+Gemeinsame Erfassung der Datenbankänderungen einer Transaktion.
+
+Caches und Ereignisse (HTTP-ETags, Auswertungs-Cache, Farm-Zustand,
+Low-Stock-Liste, Scheduler-Ereignisse, Projekt-Graphen) dürfen erst nach
+dem Commit reagieren und müssen Änderungen bei einem Rollback verwerfen.
+Dieses Modul registriert die Session-Listener dafür einmal:
+
+    after_flush     geänderte Tabellen sammeln, on_flush-Abonnenten aufrufen
+    do_orm_execute  Massen-Inserts/-Updates/-Deletes (ohne Flush) sammeln
+    after_commit    on_commit-Abonnenten mit den gesammelten Änderungen aufrufen
+    rollback        gesammelte Änderungen verwerfen, on_rollback aufrufen
+
+Für Savepoints (begin_nested) gilt einheitlich: ihr Commit veröffentlicht
+noch nichts, ihr Rollback verwirft nichts – erst die äußere Transaktion
+entscheidet. Ein zurückgerollter Savepoint kann so höchstens eine
+überflüssige Invalidierung auslösen, nie eine verlorene.
+
+Beispiel:
+    @change_tracking.on_commit
+    def _invalidate(changes):
+        if 'job' in changes.tables:
+            ...
+"""
+import logging
+from collections import namedtuple
+
+from flask import has_app_context
+from sqlalchemy import event
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Objekte eines Flushes; dirty enthält nur tatsächlich geänderte Objekte
+Flushed = namedtuple('Flushed', ['new', 'dirty', 'deleted'])
+
+# Massenanweisung: Modellklasse, 'insert'/'update'/'delete', gesetzte Spalten (None, wenn unbekannt)
+BulkChange = namedtuple('BulkChange', ['model', 'kind', 'columns'])
+
+_flush_callbacks = []
+_commit_callbacks = []
+_rollback_callbacks = []
+
+
+class ChangeSet:
+    """Gesammelte Änderungen einer (äußeren) Transaktion."""
+
+    def __init__(self):
+        self.tables = set()
+        self.bulk = []
+        # Ablage der Abonnenten, z.B. betroffene IDs (Schlüssel: Modulname)
+        self.data = {}
+
+    @property
+    def touched(self):
+        return bool(self.tables or self.bulk or self.data)
+
+    def bulk_changes(self, *models, kinds=('insert', 'update', 'delete')):
+        """Massenanweisungen auf die angegebenen Modelle."""
+        return [change for change in self.bulk if change.model in models and change.kind in kinds]
+
+
+def on_flush(callback):
+    """Registriert callback(session, flushed, changes) für jeden Flush (Decorator)."""
+    _flush_callbacks.append(callback)
+    return callback
+
+
+def on_commit(callback):
+    """Registriert callback(changes) nach dem Commit der äußeren Transaktion (Decorator)."""
+    _commit_callbacks.append(callback)
+    return callback
+
+
+def on_rollback(callback):
+    """Registriert callback(changes) nach dem Rollback der äußeren Transaktion (Decorator)."""
+    _rollback_callbacks.append(callback)
+    return callback
+
+
+def pending_changes(session=None):
+    """ChangeSet der laufenden Transaktion, z.B. für eigene Markierungen außerhalb eines Flushes."""
+    session = session or db.session
+    return session.info.setdefault('change_tracking', ChangeSet())
+
+
+def _run(callbacks, *args):
+    for callback in callbacks:
+        try:
+            callback(*args)
+        except Exception:
+            logger.exception("Fehler in %s.%s", callback.__module__, callback.__name__)
+
+
+def _updated_columns(orm_execute_state):
+    """Spaltennamen eines Bulk-UPDATE (None, wenn nicht bestimmbar)."""
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, list) and parameters:
+        return frozenset(parameters[0])
+    values = getattr(orm_execute_state.statement, '_values', None)
+    if not values:
+        return None
+    return frozenset(getattr(key, 'key', key) for key in values)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_flush(session, flush_context):
+    flushed = Flushed(
+        list(session.new),
+        [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)],
+        list(session.deleted),
+    )
+    changes = pending_changes(session)
+    changes.tables.update(
+        obj.__table__.name for objects in flushed for obj in objects if hasattr(obj, '__table__')
+    )
+    for callback in _flush_callbacks:
+        callback(session, flushed, changes)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _collect_bulk(orm_execute_state):
+    if orm_execute_state.is_insert:
+        kind = 'insert'
+    elif orm_execute_state.is_update:
+        kind = 'update'
+    elif orm_execute_state.is_delete:
+        kind = 'delete'
+    else:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    changes = pending_changes(orm_execute_state.session)
+    changes.tables.add(mapper.local_table.name)
+    columns = _updated_columns(orm_execute_state) if kind == 'update' else None
+    changes.bulk.append(BulkChange(mapper.class_, kind, columns))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_changes(session):
+    if session.in_nested_transaction():
+        return
+    changes = session.info.pop('change_tracking', None)
+    if changes is not None and changes.touched and has_app_context():
+        _run(_commit_callbacks, changes)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_changes(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    changes = session.info.pop('change_tracking', None)
+    if changes is not None and changes.touched and has_app_context():
+        _run(_rollback_callbacks, changes)
@@ -0,0 +1,194 @@
+# changeover_sequencer.py
+"""
+Reihenfolgeoptimierung der Drucker-Warteschlangen (reihenfolgeabhängige Rüstzeiten).
+
+Jeder Filamentwechsel kostet Bedienzeit und Stillstand (CHANGEOVER). Die
+Aufträge einer Warteschlange werden deshalb nach Filamenttyp (Material und
+Farbe) gebündelt, beginnend mit der eingelegten Spule:
+
+- Solange es die Deadlines erlauben, wird beim aktuellen Filament geblieben.
+- Muss gewechselt werden, geht es zum Filament des dringendsten Auftrags.
+- Vor jeder Wahl wird geprüft, ob die restlichen Aufträge in
+  Deadline-Reihenfolge (EDD) noch rechtzeitig fertig werden. Als Grenze gilt
+  die Deadline bzw. das Ende in reiner EDD-Reihenfolge, falls die Deadline
+  ohnehin nicht zu halten ist; kein Auftrag wird also später fertig, als es
+  ohne Bündelung der Fall wäre.
+- Abhängigkeiten innerhalb der Warteschlange bleiben erhalten.
+
+Das Ergebnis wird als Job.queue_position gespeichert; danach richten sich
+Printer.get_active_or_next_job(), das Dashboard und die Farmplanung.
+"""
+import datetime
+from collections import namedtuple
+
+from bulk_updates import bulk_update_jobs
+from extensions import db
+from models import Job, JobStatus, GCodeFile, FilamentSpool, JobDependency
+from horizon_scheduler import estimated_duration
+
+CHANGEOVER = datetime.timedelta(minutes=10)  # erfahrungsgemäß 5-15 Minuten
+
+# family: Filamenttyp (None = druckt mit jeder Spule), after: IDs der Vorgänger
+QueueItem = namedtuple('QueueItem', ['job_id', 'family', 'duration', 'deadline', 'priority_score', 'after'])
+
+
+def count_changeovers(items, family=None):
+    """Anzahl Filamentwechsel für eine Reihenfolge, ausgehend von der eingelegten Spule."""
+    changes = 0
+    for item in items:
+        if item.family is None:
+            continue
+        if item.family != family:
+            if family is not None:
+                changes += 1
+            family = item.family
+    return changes
+
+
+def _edd_key(item, index):
+    return (item.deadline or datetime.datetime.max, -(item.priority_score or 0), index)
+
+
+def _simulate(prefix_end, family, remaining, order, done):
+    """
+    Ende je Auftrag, wenn die restlichen Aufträge in EDD-Reihenfolge
+    (unter Beachtung der Abhängigkeiten) gedruckt werden.
+    """
+    finish = {}
+    done = set(done)
+    end = prefix_end
+    pending = [item for item in order if item.job_id in remaining]
+    while pending:
+        for position, item in enumerate(pending):
+            if all(pred in done for pred in item.after):
+                break
+        else:
+            position, item = 0, pending[0]  # Zyklus: Reihenfolge beibehalten
+        pending.pop(position)
+        if item.family is not None and item.family != family:
+            if family is not None:
+                end += CHANGEOVER
+            family = item.family
+        end += item.duration
+        finish[item.job_id] = end
+        done.add(item.job_id)
+    return finish
+
+
+def sequence_queue(items, start, family=None):
+    """
+    Berechnet die Reihenfolge einer Drucker-Warteschlange.
+
+    Args:
+        items: Liste von QueueItem
+        start: Zeitpunkt, ab dem der Drucker frei ist
+        family: Filamenttyp der eingelegten Spule
+
+    Returns:
+        list: QueueItems in optimierter Reihenfolge
+    """
+    index = {item.job_id: i for i, item in enumerate(items)}
+    queue_ids = set(index)
+    items = [item._replace(after=tuple(p for p in item.after if p in queue_ids)) for item in items]
+    edd = sorted(items, key=lambda item: _edd_key(item, index[item.job_id]))
+
+    # Obergrenze je Auftrag: Deadline, außer EDD verfehlt sie ohnehin
+    baseline = _simulate(start, family, queue_ids, edd, ())
+    limit = {item.job_id: max(item.deadline, baseline[item.job_id])
+             for item in items if item.deadline}
+
+    def feasible(candidate, end, current):
+        if candidate.family is not None and candidate.family != current:
+            if current is not None:
+                end += CHANGEOVER
+            current = candidate.family
+        end += candidate.duration
+        if candidate.job_id in limit and end > limit[candidate.job_id]:
+            return False
+        rest = _simulate(end, current, remaining - {candidate.job_id}, edd, done | {candidate.job_id})
+        return all(finish <= limit[job_id] for job_id, finish in rest.items() if job_id in limit)
+
+    result, done, remaining = [], set(), set(queue_ids)
+    end, current = start, family
+    while remaining:
+        eligible = [item for item in edd if item.job_id in remaining and all(p in done for p in item.after)]
+        if not eligible:
+            eligible = [item for item in edd if item.job_id in remaining]
+        # Gleiches Filament (oder beliebiges) zuerst, sonst nach Dringlichkeit
+        candidates = sorted(eligible, key=lambda item: (
+            item.family is not None and item.family != current and current is not None,
+            _edd_key(item, index[item.job_id])))
+        chosen = next((item for item in candidates if feasible(item, end, current)), eligible[0])
+
+        if chosen.family is not None and chosen.family != current:
+            if current is not None:
+                end += CHANGEOVER
+            current = chosen.family
+        end += chosen.duration
+        result.append(chosen)
+        done.add(chosen.job_id)
+        remaining.discard(chosen.job_id)
+    return result
+
+
+def optimize_printer_queues(now=None):
+    """
+    Optimiert die Warteschlangen (zugewiesene und eingereihte Aufträge) aller
+    Drucker und speichert die Reihenfolge gesammelt als Job.queue_position.
+
+    Returns:
+        dict: printers, reordered (geänderte Aufträge), changeovers_before, changeovers_after
+    """
+    now = now or datetime.datetime.utcnow()
+    rows = db.session.query(
+        Job.id, Job.printer_id, Job.status, Job.required_filament_type_id, Job.deadline, Job.priority,
+        Job.priority_score, Job.created_at, Job.start_time, Job.queue_position,
+        Job.estimated_print_duration_s, GCodeFile.estimated_print_time_min
+    ).outerjoin(GCodeFile, Job.gcode_file_id == GCodeFile.id).filter(
+        Job.printer_id.isnot(None),
+        Job.status.in_([JobStatus.PRINTING, JobStatus.ASSIGNED, JobStatus.QUEUED])
+    ).all()
+    summary = {'printers': 0, 'reordered': 0, 'changeovers_before': 0, 'changeovers_after': 0}
+    queued = [row for row in rows if row.status != JobStatus.PRINTING]
+    if not queued:
+        return summary
+
+    # Drucker frei ab Ende des laufenden Auftrags, Filament der Spule bzw. des laufenden Auftrags
+    free_at, family = {}, {}
+    for spool in FilamentSpool.query.filter(FilamentSpool.assigned_to_printer_id.isnot(None),
+                                            FilamentSpool.is_in_use == True).order_by(FilamentSpool.id):
+        family.setdefault(spool.assigned_to_printer_id, spool.filament_type_id)
+    for row in rows:
+        if row.status == JobStatus.PRINTING:
+            free_at[row.printer_id] = max((row.start_time or now) + estimated_duration(row), now)
+            if row.required_filament_type_id:
+                family[row.printer_id] = row.required_filament_type_id
+
+    predecessors = {}
+    for job_id, depends_on_id in db.session.query(JobDependency.job_id, JobDependency.depends_on_job_id)\
+            .filter(JobDependency.job_id.in_([row.id for row in queued])):
+        predecessors.setdefault(job_id, []).append(depends_on_id)
+
+    queues = {}
+    for row in queued:
+        queues.setdefault(row.printer_id, []).append(row)
+
+    updates = []
+    for printer_id, queue in queues.items():
+        # Bisherige Reihenfolge wie Job.queue_order()
+        queue.sort(key=lambda row: (row.queue_position is None, row.queue_position or 0, -(row.priority or 0),
+                                    row.created_at or datetime.datetime.max, row.id))
+        items = [QueueItem(row.id, row.required_filament_type_id, estimated_duration(row), row.deadline,
+                           row.priority_score, tuple(predecessors.get(row.id, ()))) for row in queue]
+        loaded = family.get(printer_id)
+        ordered = sequence_queue(items, free_at.get(printer_id, now), loaded)
+        summary['printers'] += 1
+        summary['changeovers_before'] += count_changeovers(items, loaded)
+        summary['changeovers_after'] += count_changeovers(ordered, loaded)
+        positions = {row.id: row.queue_position for row in queue}
+        for position, item in enumerate(ordered):
+            if positions[item.job_id] != position:
+                updates.append({'id': item.job_id, 'queue_position': position})
+
+    summary['reordered'] = bulk_update_jobs(updates, ['queue_position'])
+    return summary
@@ -0,0 +1,108 @@
+# conftest.py
+"""
+Gemeinsame Fixtures der Tests: App mit In-Memory-Datenbank, angemeldeter
+Test-Client und Zählung der SQL-Statements.
+
+Tests mit eigenen Ausgangsdaten überschreiben 'app' im Modul und fordern
+dabei die App von hier an:
+
+    @pytest.fixture
+    def app(app):
+        db.session.add(Printer(name='P1'))
+        db.session.commit()
+        return app
+
+Dazu kommen Hilfsfunktionen zum Anlegen und Nachschlagen von Druckern und
+Aufträgen (from conftest import create_printer, create_job, ...).
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from config_test import TestConfig
+from extensions import db
+from models import User, UserRole, Printer, PrinterStatus, Job, JobStatus, FilamentType, FilamentSpool, GCodeFile
+
+TEST_USERNAME = 'test_user'
+
+
+def filament_type(material):
+    """Der (einzige) Filament-Typ mit diesem Material."""
+    return FilamentType.query.filter_by(material_type=material).one()
+
+
+def printer_by_name(name):
+    return Printer.query.filter_by(name=name).one()
+
+
+def create_printer(name, materials='PLA,PETG', status=PrinterStatus.IDLE, spool=None, spool_g=1000, **kwargs):
+    """Legt einen Drucker an, optional mit eingelegter Spule des Materials 'spool'."""
+    printer = Printer(name=name, status=status, compatible_material_types=materials, **kwargs)
+    db.session.add(printer)
+    db.session.flush()
+    if spool:
+        db.session.add(FilamentSpool(filament_type_id=filament_type(spool).id, current_weight_g=spool_g,
+                                     is_in_use=True, assigned_to_printer_id=printer.id))
+    return printer
+
+
+def create_job(name, material=None, grams=None, minutes=None, dims=None, status=JobStatus.PENDING, printer=None,
+               **kwargs):
+    """Legt einen Auftrag samt G-Code-Datei (Materialbedarf, Druckzeit, Abmessungen) an."""
+    gcode = GCodeFile(filename=f'{name}.gcode', material_needed_g=grams, estimated_print_time_min=minutes)
+    if dims:
+        gcode.dimensions_x_mm, gcode.dimensions_y_mm, gcode.dimensions_z_mm = dims
+    db.session.add(gcode)
+    db.session.flush()
+    job = Job(name=name, status=status, gcode_file_id=gcode.id, printer_id=printer.id if printer else None,
+              required_filament_type_id=filament_type(material).id if material else None, **kwargs)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def logged_in_client(app):
+    """Test-Client mit angemeldetem Administrator (create_app legt 'admin' bereits an)."""
+    user = User(username=TEST_USERNAME, role=UserRole.ADMIN)
+    user.set_password('test')
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+        sess['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def count_queries(app):
+    """
+    Sammelt die SQL-Statements, die innerhalb eines with-Blocks über die Engine laufen:
+
+        with count_queries() as statements:
+            ...
+        assert len(statements) <= 5
+    """
+    @contextmanager
+    def counter():
+        statements = []
+        listener = lambda conn, cursor, statement, params, context, executemany: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    return counter
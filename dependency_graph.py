@@ -0,0 +1,121 @@
+# dependency_graph.py
+"""
+Transitive Abhängigkeiten von Aufträgen über rekursive CTEs.
+
+Statt Knoten für Knoten nachzuladen (eine Abfrage bzw. ein Lazy-Load pro
+besuchtem Auftrag) liefert eine rekursive CTE die komplette transitive Hülle
+in einer Abfrage. UNION (statt UNION ALL) entfernt Duplikate und sorgt dafür,
+dass die Rekursion auch bei fehlerhaften, bereits zyklischen Daten endet.
+
+Unterstützt die Datenbank keine rekursiven CTEs (SQLite < 3.8.3,
+MySQL < 8.0), wird die Hülle in Python ebenenweise geladen: eine Abfrage pro
+Tiefe, nicht pro Auftrag.
+"""
+import sqlite3
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Job, JobDependency
+
+
+def _supports_recursive_cte(session):
+    dialect = session.get_bind().dialect
+    if dialect.name == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 8, 3)
+    if dialect.name in ('mysql', 'mariadb'):
+        version = dialect.server_version_info or (0,)
+        return version >= ((10, 2) if dialect.is_mariadb else (8, 0))
+    return True
+
+
+def _closure_cte(start_ids, upstream=True):
+    """CTE mit allen von start_ids aus erreichbaren Kanten (job_id, depends_on_job_id, dependency_type)."""
+    # upstream: weiter über depends_on_job_id (Vorgänger), sonst über job_id (Nachfolger)
+    near = JobDependency.job_id if upstream else JobDependency.depends_on_job_id
+    columns = (JobDependency.job_id, JobDependency.depends_on_job_id, JobDependency.dependency_type)
+    closure = select(*columns).where(near.in_(start_ids)).cte('dependency_closure', recursive=True)
+    step = db.aliased(JobDependency)
+    step_near = step.job_id if upstream else step.depends_on_job_id
+    closure_far = closure.c.depends_on_job_id if upstream else closure.c.job_id
+    return closure.union(
+        select(step.job_id, step.depends_on_job_id, step.dependency_type)
+        .join(closure, step_near == closure_far)
+    )
+
+
+def _closure_python(session, start_ids, upstream=True):
+    near = JobDependency.job_id if upstream else JobDependency.depends_on_job_id
+    edges, seen, frontier = set(), set(start_ids), set(start_ids)
+    while frontier:
+        rows = session.query(JobDependency.job_id, JobDependency.depends_on_job_id, JobDependency.dependency_type)\
+            .filter(near.in_(frontier)).all()
+        edges.update(rows)
+        reached = {row.depends_on_job_id if upstream else row.job_id for row in rows}
+        frontier = reached - seen
+        seen |= reached
+    return [tuple(edge) for edge in edges]
+
+
+def dependency_edges(job_ids, upstream=True, session=None):
+    """
+    Alle Kanten der transitiven Hülle ab job_ids (eine Abfrage).
+
+    Args:
+        job_ids: Start-Aufträge
+        upstream: True = Vorgänger (wovon hängen die Aufträge ab), False = Nachfolger
+        session: SQLAlchemy Session (Standard: db.session)
+
+    Returns:
+        list: (job_id, depends_on_job_id, dependency_type)-Tupel
+    """
+    session = session or db.session
+    job_ids = list(job_ids)
+    if not job_ids:
+        return []
+    if not _supports_recursive_cte(session):
+        return _closure_python(session, job_ids, upstream)
+    closure = _closure_cte(job_ids, upstream)
+    return [tuple(row) for row in session.execute(select(closure))]
+
+
+def reachable_ids(job_id, upstream=True, session=None):
+    """IDs aller transitiven Vorgänger (upstream) bzw. Nachfolger eines Auftrags, ohne ihn selbst."""
+    index = 1 if upstream else 0
+    reached = {edge[index] for edge in dependency_edges([job_id], upstream, session)}
+    reached.discard(job_id)
+    return reached
+
+
+def would_create_cycle(job_id, depends_on_id, session=None):
+    """
+    Prüft, ob die Kante job_id -> depends_on_id einen Zyklus schließt, d.h. ob
+    job_id bereits (transitiv) von depends_on_id abhängig ist (eine Abfrage).
+    """
+    if job_id == depends_on_id:
+        return True
+    session = session or db.session
+    if not _supports_recursive_cte(session):
+        return job_id in reachable_ids(depends_on_id, True, session)
+    closure = _closure_cte([depends_on_id], upstream=True)
+    hit = session.execute(
+        select(closure.c.depends_on_job_id).where(closure.c.depends_on_job_id == job_id).limit(1)
+    ).first()
+    return hit is not None
+
+
+def dependency_subgraph(job_id, session=None):
+    """
+    Auftrag mit allen transitiven Vorgängern und den Kanten dazwischen.
+
+    Returns:
+        tuple: (jobs, edges) – Job-Objekte (Startauftrag zuerst) und
+            (job_id, depends_on_job_id, dependency_type)-Tupel
+    """
+    session = session or db.session
+    edges = dependency_edges([job_id], True, session)
+    ids = {job_id} | {edge[1] for edge in edges}
+    jobs = {job.id: job for job in session.query(Job).filter(Job.id.in_(ids))}
+    ordered = [jobs[job_id]] if job_id in jobs else []
+    ordered += [jobs[i] for i in sorted(ids - {job_id}) if i in jobs]
+    return ordered, sorted(edges)
@@ -0,0 +1,241 @@
+# farm_state.py
+"""
+Ereignisgesteuertes In-Memory-Abbild des Farm-Zustands.
+
+Hält pro Drucker Status, aktuellen und nächsten Job, die Eingangsgrößen für
+den Fortschritt sowie die aktive Spule im Speicher. Änderungen an Jobs,
+Druckern und Spulen markieren die betroffenen Drucker nach dem Commit als
+veraltet; beim nächsten Lesen werden nur diese Drucker nachgeladen.
+Zusätzlich wird der Zustand periodisch vollständig mit der Datenbank
+abgeglichen.
+
+Nachgeladen wird außerhalb der Sperre in einer eigenen Session: Leser
+warten nicht auf die Abfrage eines anderen Lesers, und noch nicht
+committete Änderungen des Aufrufers gelangen nicht in den geteilten Zustand.
+"""
+import datetime
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import change_tracking
+from extensions import db
+from models import Job, JobStatus, Printer, FilamentSpool, PrinterStatus
+
+# Standard-Intervall für den vollständigen Abgleich mit der Datenbank
+DEFAULT_RECONCILE_SECONDS = 300
+# Live-Daten aus der Druckerabfrage gelten nur so lange als aktuell
+POLL_RESULT_MAX_AGE_SECONDS = 120
+
+
+class FarmState:
+    """Thread-sicherer Zustandsspeicher für alle Drucker einer App-Instanz."""
+
+    def __init__(self, reconcile_seconds=DEFAULT_RECONCILE_SECONDS):
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.Lock()
+        # Nur ein Nachladen gleichzeitig; Leser nutzen währenddessen den bisherigen Stand
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._entries = {}
+        self._live = {}
+        self._dirty = set()
+        self._all_dirty = True
+        self._last_reconcile = 0.0
+        self._seen_versions = None
+        self.version = 0
+        self.live_version = 0
+
+    # --- Änderungen ---
+
+    def mark_dirty(self, printer_ids=None):
+        """
+        Markiert Drucker als veraltet.
+
+        Args:
+            printer_ids: Iterable von Drucker-IDs oder None für alle Drucker
+        """
+        with self._lock:
+            if printer_ids is None:
+                self._all_dirty = True
+            else:
+                self._dirty.update(pid for pid in printer_ids if pid is not None)
+
+    def update_from_poll(self, printer_id, status_dict):
+        """Übernimmt Live-Daten (Temperaturen, Fortschritt) aus einer Druckerabfrage."""
+        if not status_dict or status_dict.get('db_status', True):
+            return
+        live = {key: status_dict[key] for key in ('state', 'progress', 'time_info', 'temps') if key in status_dict}
+        with self._lock:
+            self._live[printer_id] = (time.monotonic(), live)
+            self.version += 1
+            self.live_version += 1
+
+    # --- Lesen ---
+
+    def get_all_statuses(self):
+        """Gibt den Status aller Drucker im Format von /api/dashboard/status zurück."""
+        from routes.services import finalize_printer_status
+        self._refresh()
+        with self._lock:
+            now = datetime.datetime.utcnow()
+            return {pid: self._with_live(pid, finalize_printer_status(entry, now))
+                    for pid, entry in self._entries.items()}
+
+    def get_status(self, printer_id, include_live=True):
+        """Gibt den Status eines einzelnen Druckers zurück (oder None)."""
+        from routes.services import finalize_printer_status
+        self._refresh()
+        with self._lock:
+            entry = self._entries.get(printer_id)
+            if entry is None:
+                return None
+            data = finalize_printer_status(entry)
+            return self._with_live(printer_id, data) if include_live else data
+
+    def sync_versions(self, versions):
+        """
+        Gleicht mit den Tabellen-Versionen aus der Datenbank ab (siehe
+        http_cache). Haben sich diese geändert – etwa durch einen anderen
+        Prozess –, wird der gesamte Zustand beim nächsten Lesen neu geladen.
+
+        Returns:
+            bool: True, wenn gerade ein Drucker druckt (Fortschritt ändert sich laufend)
+        """
+        with self._lock:
+            if self._seen_versions is not None and versions != self._seen_versions:
+                self._all_dirty = True
+            self._seen_versions = dict(versions)
+        self._refresh()
+        with self._lock:
+            return any(entry['job_status'] == JobStatus.PRINTING.name for entry in self._entries.values())
+
+    def reconcile(self):
+        """Erzwingt einen vollständigen Abgleich mit der Datenbank."""
+        with self._lock:
+            self._all_dirty = True
+        self._refresh()
+
+    # --- Intern ---
+
+    def _with_live(self, printer_id, data):
+        live_entry = self._live.get(printer_id)
+        if not live_entry:
+            return data
+        received, live = live_entry
+        if time.monotonic() - received > POLL_RESULT_MAX_AGE_SECONDS:
+            self._live.pop(printer_id, None)
+            return data
+        if 'temps' in live:
+            data['temps'] = live['temps']
+        # Wie in get_printer_status(): meldet die API 'Idle', während die DB
+        # noch druckt, bleibt der DB-basierte Fortschritt maßgeblich.
+        api_idle_while_printing = (data['state_key'] == PrinterStatus.PRINTING.name and
+                                   live.get('state') == PrinterStatus.IDLE.value)
+        if 'progress' in live and not api_idle_while_printing:
+            data['progress'] = live['progress']
+            data['time_info'] = live.get('time_info', data['time_info'])
+        return data
+
+    def _refresh(self):
+        # Läuft bereits ein Nachladen, genügt der bisherige Stand (außer beim ersten Lesen)
+        if not self._load_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            with self._lock:
+                if time.monotonic() - self._last_reconcile > self.reconcile_seconds:
+                    self._all_dirty = True
+                full = self._all_dirty
+                printer_ids = None if full else list(self._dirty)
+                if not full and not printer_ids:
+                    return
+                self._all_dirty = False
+                self._dirty.clear()
+            try:
+                fresh = _load_entries(printer_ids)
+            except Exception:
+                # Markierungen für den nächsten Versuch erhalten
+                self.mark_dirty(printer_ids)
+                raise
+            with self._lock:
+                if full:
+                    self._entries = fresh
+                    self._live = {pid: v for pid, v in self._live.items() if pid in fresh}
+                    self._last_reconcile = time.monotonic()
+                    self._loaded = True
+                else:
+                    for pid in printer_ids:
+                        if pid in fresh:
+                            self._entries[pid] = fresh[pid]
+                        else:
+                            self._entries.pop(pid, None)
+                            self._live.pop(pid, None)
+                self.version += 1
+        finally:
+            self._load_lock.release()
+
+
+def _load_entries(printer_ids):
+    """Lädt Statuseinträge in einer eigenen Session, unabhängig von der Transaktion des Aufrufers."""
+    from routes.services import load_printer_status_entries
+    # In-Memory-SQLite (Tests): nur eine gemeinsame Verbindung, eine eigene Session sähe dasselbe
+    if isinstance(db.engine.pool, StaticPool):
+        return load_printer_status_entries(printer_ids)
+    with Session(db.engine) as session:
+        return load_printer_status_entries(printer_ids, session=session)
+
+
+def get_farm_state(app=None):
+    """Gibt den FarmState der (aktuellen) App zurück und legt ihn bei Bedarf an."""
+    app = app or current_app._get_current_object()
+    state = app.extensions.get('farm_state')
+    if state is None:
+        state = FarmState(app.config.get('FARM_STATE_RECONCILE_SECONDS', DEFAULT_RECONCILE_SECONDS))
+        app.extensions['farm_state'] = state
+    return state
+
+
+# --- Automatische Markierung nach dem Commit ---
+
+def _history_values(obj, attr):
+    """Liefert aktuellen und vorherigen Wert eines Attributs."""
+    history = inspect(obj).attrs[attr].history
+    return list(history.added) + list(history.unchanged) + list(history.deleted)
+
+
+def _affected_printer_ids(flushed):
+    printer_ids = set()
+    all_printers = False
+    for obj in flushed.new + flushed.dirty + flushed.deleted:
+        if isinstance(obj, Job):
+            printer_ids.update(_history_values(obj, 'printer_id'))
+        elif isinstance(obj, FilamentSpool):
+            printer_ids.update(_history_values(obj, 'assigned_to_printer_id'))
+        elif isinstance(obj, Printer):
+            if obj in flushed.new or obj in flushed.deleted:
+                all_printers = True
+            printer_ids.add(obj.id)
+    printer_ids.discard(None)
+    return None if all_printers else printer_ids
+
+
+@change_tracking.on_flush
+def _collect_farm_changes(session, flushed, changes):
+    affected = _affected_printer_ids(flushed)
+    pending = changes.data.setdefault('farm_state', set())
+    if affected is None:
+        changes.data['farm_state_all'] = True
+    else:
+        pending.update(affected)
+
+
+@change_tracking.on_commit
+def _apply_farm_changes(changes):
+    pending = changes.data.get('farm_state')
+    all_dirty = changes.data.get('farm_state_all', False)
+    if pending or all_dirty:
+        get_farm_state().mark_dirty(None if all_dirty else pending)
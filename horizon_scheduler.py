@@ -0,0 +1,285 @@
+# horizon_scheduler.py
+"""
+Farmweite Zeitplanung (List Scheduling) über einen mehrtägigen Horizont.
+
+Alle laufenden, zugewiesenen, eingereihten und wartenden Aufträge werden auf
+die Drucker verteilt und bekommen eine kapazitätsbewusste geschätzte Start-
+und Endzeit:
+
+- Laufende Aufträge belegen ihren Drucker bis zum erwarteten Ende.
+- Aufträge werden in Prioritätsreihenfolge (zugewiesene vor wartenden)
+  eingeplant, sobald alle Vorgänger (JobDependency) eingeplant sind;
+  Finish-to-Start wartet auf das Ende, Start-to-Start auf den Start des
+  Vorgängers.
+- Zugewiesene Aufträge bleiben auf ihrem Drucker; wartende gehen auf den
+  kompatiblen Drucker mit dem frühesten Ende. Die Drucker liegen dazu in
+  einem Heap nach dem Zeitpunkt, ab dem sie frei sind.
+- Ein Auftrag startet nur innerhalb eines aktiven TimeWindow des Druckers
+  (gleiche Regel wie Printer.is_available_at, der Druck darf darüber
+  hinauslaufen).
+
+compute_farm_schedule() rechnet nur im Speicher (Gantt-Ansichten),
+persist_schedule() schreibt die Zeiten gesammelt in die Auftragstabelle
+(Kalender, Projektansichten).
+"""
+import datetime
+import heapq
+from collections import namedtuple
+
+from bulk_updates import bulk_update_jobs
+from extensions import db
+from models import (Printer, PrinterStatus, Job, JobStatus, GCodeFile, FilamentType, TimeWindow,
+                    JobDependency, DependencyType)
+
+DEFAULT_HORIZON_H = 7 * 24
+# Annahme für Aufträge ohne Zeitschätzung
+DEFAULT_DURATION = datetime.timedelta(hours=1)
+# Drucker in diesen Status bekommen keine neuen Aufträge eingeplant
+UNAVAILABLE_STATES = (PrinterStatus.OFFLINE, PrinterStatus.ERROR, PrinterStatus.MAINTENANCE)
+PLANNED_STATES = (JobStatus.PRINTING, JobStatus.ASSIGNED, JobStatus.QUEUED, JobStatus.PENDING)
+
+ScheduledJob = namedtuple('ScheduledJob', ['job_id', 'name', 'printer_id', 'status', 'start', 'end', 'deadline'])
+
+
+class FarmSchedule:
+    """
+    Ergebnis der Zeitplanung.
+
+    Attributes:
+        entries: {job_id: ScheduledJob}
+        unscheduled: IDs der Aufträge ohne Platz im Horizont, mit blockierten
+            Abhängigkeiten oder ohne kompatiblen Drucker
+        generated_at: Bezugszeitpunkt
+        stored: {job_id: (estimated_start_time, estimated_end_time)} beim Laden
+    """
+
+    def __init__(self, entries, unscheduled, generated_at, horizon_end, stored):
+        self.entries = entries
+        self.unscheduled = unscheduled
+        self.generated_at = generated_at
+        self.horizon_end = horizon_end
+        self.stored = stored
+
+    def for_printer(self, printer_id):
+        """Eingeplante Aufträge eines Druckers in zeitlicher Reihenfolge."""
+        return sorted((e for e in self.entries.values() if e.printer_id == printer_id),
+                      key=lambda e: (e.start, e.end, e.job_id))
+
+    @property
+    def late_jobs(self):
+        """Aufträge, deren geplantes Ende nach ihrer Deadline liegt."""
+        return [e for e in self.entries.values() if e.deadline and e.end > e.deadline]
+
+    @property
+    def makespan_end(self):
+        return max((e.end for e in self.entries.values()), default=None)
+
+
+def next_window_start(windows, earliest):
+    """
+    Frühester Zeitpunkt >= earliest innerhalb eines aktiven Zeitfensters.
+
+    Args:
+        windows: TimeWindows des Druckers (leer = immer verfügbar)
+
+    Returns:
+        datetime oder None, wenn kein aktives Fenster existiert
+    """
+    if not windows:
+        return earliest
+    active = [w for w in windows if w.is_active]
+    best = None
+    for days_ahead in range(8):
+        day = earliest.date() + datetime.timedelta(days=days_ahead)
+        for window in active:
+            if window.day_of_week != day.weekday():
+                continue
+            window_start = datetime.datetime.combine(day, window.start_time)
+            window_end = datetime.datetime.combine(day, window.end_time)
+            if window_start <= earliest <= window_end:
+                return earliest
+            if window_start >= earliest and (best is None or window_start < best):
+                best = window_start
+        if best is not None:
+            return best
+    return None
+
+
+def estimated_duration(row):
+    """Druckdauer laut G-Code, sonst Auftragsschätzung, sonst DEFAULT_DURATION."""
+    if row.estimated_print_time_min:
+        return datetime.timedelta(minutes=row.estimated_print_time_min)
+    if row.estimated_print_duration_s:
+        return datetime.timedelta(seconds=row.estimated_print_duration_s)
+    return DEFAULT_DURATION
+
+
+def _priority_key(row):
+    # Bereits zugewiesene Aufträge stehen physisch in der Warteschlange ihres
+    # Druckers und gehen wartenden vor, in der optimierten Reihenfolge
+    queue_position = row.queue_position if row.queue_position is not None else float('inf')
+    return (row.printer_id is None, queue_position, -(row.priority_score or 0), row.deadline or datetime.datetime.max, -(row.priority or 0),
+            row.created_at or datetime.datetime.max, row.id)
+
+
+def _load(now):
+    printers = {p.id: p for p in db.session.query(
+        Printer.id, Printer.status, Printer.compatible_material_types).order_by(Printer.id)}
+    windows = {}
+    for window in TimeWindow.query.all():
+        windows.setdefault(window.printer_id, []).append(window)
+    jobs = {row.id: row for row in db.session.query(
+        Job.id, Job.name, Job.status, Job.printer_id, Job.priority, Job.priority_score, Job.deadline,
+        Job.created_at, Job.start_time, Job.estimated_print_duration_s,
+        Job.estimated_start_time, Job.estimated_end_time, Job.queue_position,
+        GCodeFile.estimated_print_time_min, FilamentType.material_type
+    ).outerjoin(GCodeFile, Job.gcode_file_id == GCodeFile.id)
+     .outerjoin(FilamentType, Job.required_filament_type_id == FilamentType.id)
+     .filter(Job.status.in_(PLANNED_STATES), Job.is_archived == False)}
+    predecessor = db.aliased(Job)
+    dependencies = db.session.query(
+        JobDependency.job_id, JobDependency.depends_on_job_id, JobDependency.dependency_type, predecessor.status
+    ).join(predecessor, JobDependency.depends_on_job_id == predecessor.id)\
+     .filter(JobDependency.job_id.in_(list(jobs))).all() if jobs else []
+    return printers, windows, jobs, dependencies
+
+
+def compute_farm_schedule(now=None, horizon_hours=DEFAULT_HORIZON_H):
+    """
+    Plant alle offenen Aufträge auf allen Druckern ein (ohne zu speichern).
+
+    Args:
+        now: Planungsbeginn (Standard: jetzt, UTC)
+        horizon_hours: Aufträge mit späterem Start bleiben uneingeplant
+
+    Returns:
+        FarmSchedule
+    """
+    now = now or datetime.datetime.utcnow()
+    horizon_end = now + datetime.timedelta(hours=horizon_hours)
+    printers, windows, jobs, dependencies = _load(now)
+    entries = {}
+    free_at = {printer_id: now for printer_id in printers}
+
+    def record(row, printer_id, start, end):
+        entries[row.id] = ScheduledJob(row.id, row.name, printer_id, row.status, start, end, row.deadline)
+
+    # Laufende Aufträge belegen ihren Drucker bis zum erwarteten Ende
+    for row in jobs.values():
+        if row.status == JobStatus.PRINTING and row.printer_id in printers:
+            start = row.start_time or now
+            end = max(start + estimated_duration(row), now)
+            record(row, row.printer_id, start, end)
+            free_at[row.printer_id] = max(free_at[row.printer_id], end)
+
+    # Abhängigkeitsgraph innerhalb der Planung
+    predecessors = {job_id: [] for job_id in jobs}
+    successors = {job_id: [] for job_id in jobs}
+    blocked = set()
+    for job_id, depends_on_id, dependency_type, status in dependencies:
+        if depends_on_id in jobs:
+            predecessors[job_id].append((depends_on_id, dependency_type))
+            successors[depends_on_id].append(job_id)
+        elif dependency_type == DependencyType.FINISH_TO_START and status != JobStatus.COMPLETED:
+            blocked.add(job_id)  # Vorgänger fehlgeschlagen/abgebrochen
+        elif dependency_type == DependencyType.START_TO_START and status == JobStatus.PENDING:
+            blocked.add(job_id)
+
+    waiting_for = {job_id: sum(1 for pred, _ in preds if pred not in entries)
+                   for job_id, preds in predecessors.items()}
+    ready = [(_priority_key(row), job_id) for job_id, row in jobs.items()
+             if job_id not in entries and job_id not in blocked and waiting_for[job_id] == 0]
+    heapq.heapify(ready)
+    printer_heap = [(free_at[printer_id], printer_id) for printer_id in printers]
+    heapq.heapify(printer_heap)
+    compatible_cache = {}
+
+    def compatible(printer_id, material):
+        key = (printer_id, material)
+        if key not in compatible_cache:
+            printer = printers[printer_id]
+            materials = {m.strip().upper() for m in (printer.compatible_material_types or '').split(',')}
+            materials.discard('')
+            compatible_cache[key] = printer.status not in UNAVAILABLE_STATES and (
+                not material or not materials or material.upper() in materials)
+        return compatible_cache[key]
+
+    def place(printer_id, earliest, duration):
+        start = next_window_start(windows.get(printer_id), max(free_at[printer_id], earliest))
+        return None if start is None else (start, start + duration)
+
+    def release(job_id):
+        for successor in successors[job_id]:
+            waiting_for[successor] -= 1
+            if waiting_for[successor] == 0 and successor not in blocked:
+                heapq.heappush(ready, (_priority_key(jobs[successor]), successor))
+
+    # Laufende Aufträge geben ihre Nachfolger frei
+    for job_id in list(entries):
+        release(job_id)
+
+    while ready:
+        _, job_id = heapq.heappop(ready)
+        if job_id in entries:
+            continue
+        row = jobs[job_id]
+        duration = estimated_duration(row)
+        earliest = now
+        for pred, dependency_type in predecessors[job_id]:
+            pred_entry = entries[pred]
+            earliest = max(earliest, pred_entry.start if dependency_type == DependencyType.START_TO_START
+                           else pred_entry.end)
+
+        best = None
+        if row.printer_id in printers:
+            # Zugewiesen: Drucker steht fest
+            slot = place(row.printer_id, earliest, duration)
+            if slot:
+                best = (slot[1], slot[0], row.printer_id)
+        elif row.printer_id is None:
+            # Drucker in Reihenfolge ihrer Verfügbarkeit prüfen, abbrechen sobald
+            # kein früheres Ende mehr möglich ist
+            popped = []
+            while printer_heap:
+                free, printer_id = heapq.heappop(printer_heap)
+                if free != free_at[printer_id]:
+                    continue  # veralteter Eintrag
+                popped.append(printer_id)
+                if best and max(free, earliest) + duration >= best[0]:
+                    break
+                if not compatible(printer_id, row.material_type):
+                    continue
+                slot = place(printer_id, earliest, duration)
+                if slot and (best is None or slot[1] < best[0]):
+                    best = (slot[1], slot[0], printer_id)
+            for printer_id in popped:
+                heapq.heappush(printer_heap, (free_at[printer_id], printer_id))
+
+        if best is None or best[1] > horizon_end:
+            continue  # Nachfolger bleiben dadurch ebenfalls uneingeplant
+        end, start, printer_id = best
+        record(row, printer_id, start, end)
+        free_at[printer_id] = end
+        heapq.heappush(printer_heap, (end, printer_id))
+        release(job_id)
+
+    unscheduled = sorted(job_id for job_id in jobs if job_id not in entries)
+    stored = {job_id: (row.estimated_start_time, row.estimated_end_time) for job_id, row in jobs.items()}
+    return FarmSchedule(entries, unscheduled, now, horizon_end, stored)
+
+
+def persist_schedule(schedule):
+    """
+    Schreibt die geplanten Zeiten gesammelt (ein Bulk-UPDATE) in die Aufträge.
+    Uneingeplante Aufträge verlieren ihre veraltete Schätzung.
+
+    Returns:
+        int: Anzahl geänderter Aufträge
+    """
+    rows = []
+    for job_id, (old_start, old_end) in schedule.stored.items():
+        entry = schedule.entries.get(job_id)
+        start, end = (entry.start, entry.end) if entry else (None, None)
+        if (start, end) != (old_start, old_end):
+            rows.append({'id': job_id, 'estimated_start_time': start, 'estimated_end_time': end})
+    return bulk_update_jobs(rows, ['estimated_start_time', 'estimated_end_time'])
@@ -0,0 +1,115 @@
+# http_cache.py
+"""
+Conditional GET (ETag / 304) für häufig gepollte JSON-Endpunkte.
+
+Jede Tabelle besitzt einen Versionszähler (EntityVersion), der nach jedem
+Commit mit Änderungen an dieser Tabelle erhöht wird – auch über mehrere
+Prozesse hinweg, da er in der Datenbank liegt. Die geänderten Tabellen
+werden während der Transaktion nur gesammelt und nach dem Commit einmal in
+einer eigenen, kurzen Transaktion hochgezählt; so hält keine schreibende
+Transaktion die Sperre auf entity_version bis zu ihrem Ende. Das ETag einer Antwort ergibt
+sich aus den Versionen der beteiligten Tabellen, der Request-URL und einer
+optionalen Zusatzkomponente (z.B. einem Zeitfenster für zeitabhängige Daten).
+Stimmt es mit If-None-Match überein, wird 304 ohne Body zurückgegeben.
+"""
+import hashlib
+import json
+import logging
+import time
+from functools import wraps
+
+from flask import request, make_response
+from sqlalchemy import select, update, insert
+
+import change_tracking
+from extensions import db
+from models import EntityVersion
+
+_VERSION_TABLE = EntityVersion.__table__
+
+logger = logging.getLogger(__name__)
+
+
+# --- Versionszähler ---
+
+def _bump_versions(connection, entities):
+    for entity in sorted(entities):
+        result = connection.execute(
+            update(_VERSION_TABLE)
+            .where(_VERSION_TABLE.c.entity == entity)
+            .values(version=_VERSION_TABLE.c.version + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(_VERSION_TABLE).values(entity=entity, version=1))
+
+
+@change_tracking.on_commit
+def _bump_versions_after_commit(changes):
+    entities = changes.tables - {_VERSION_TABLE.name}
+    if not entities:
+        return
+    try:
+        with db.engine.begin() as connection:
+            _bump_versions(connection, entities)
+    except Exception:
+        # Die Daten sind bereits committet; bis zur nächsten Änderung bleiben ETags veraltet
+        logger.exception("Versionszähler für %s nicht erhöht", ', '.join(sorted(entities)))
+
+
+def get_entity_versions(entities):
+    """
+    Liest die aktuellen Versionen der angegebenen Tabellen in einer Abfrage.
+
+    Returns:
+        dict: {tabellenname: version} (fehlende Tabellen mit Version 0)
+    """
+    rows = db.session.execute(
+        select(_VERSION_TABLE.c.entity, _VERSION_TABLE.c.version)
+        .where(_VERSION_TABLE.c.entity.in_(entities))
+    ).all()
+    versions = {entity: 0 for entity in entities}
+    versions.update({entity: version for entity, version in rows})
+    return versions
+
+
+def time_bucket(seconds):
+    """Zeitfenster-Komponente für Antworten, die von der aktuellen Zeit abhängen."""
+    return int(time.time() // seconds)
+
+
+# --- Decorator ---
+
+def conditional_json(*models, extra=None):
+    """
+    Versieht eine JSON-Route mit ETag und beantwortet passende
+    If-None-Match-Anfragen mit 304.
+
+    Args:
+        *models: Modelle, deren Änderungen die Antwort beeinflussen
+        extra: Optionale Funktion extra(versions) mit zusätzlicher ETag-Komponente
+
+    Beispiel:
+        @conditional_json(LayoutItem)
+        def get_layout(): ...
+    """
+    entities = sorted(model.__table__.name for model in models)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = get_entity_versions(entities)
+            parts = [request.full_path, versions, extra(versions) if extra else None]
+            etag = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
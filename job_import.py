@@ -0,0 +1,241 @@
+# job_import.py
+"""
+Massenimport von Aufträgen aus CSV-Dateien (z.B. ERP-Exporten).
+
+Die Datei wird zeilenweise gelesen und blockweise verarbeitet: Jede Zeile
+wird validiert, gültige Zeilen werden pro Block mit einem einzigen
+Bulk-INSERT geschrieben und der Block wird sofort committet. Fehlerhafte
+Zeilen brechen den Import nicht ab, sondern landen im Fehlerbericht.
+
+Da jeder Block für sich committet wird, lässt sich ein abgebrochener
+Import fortsetzen: Der Fortschritt (letzte committete Zeile) wird pro
+Datei-Prüfsumme in den SystemSettings abgelegt.
+"""
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import Job, JobStatus, FilamentType, GCodeFile, SystemSetting
+
+DEFAULT_CHUNK_SIZE = 1000
+# Obergrenze der gespeicherten Fehlerzeilen, damit der Bericht klein bleibt
+MAX_REPORTED_ERRORS = 500
+
+REQUIRED_HEADERS = ['name']
+DATE_FORMATS = ('%d.%m.%Y', '%Y-%m-%d')
+
+RowError = namedtuple('RowError', ['row', 'message'])
+
+
+class ImportReport:
+    """Ergebnis eines Importlaufs."""
+
+    def __init__(self, dry_run=False, start_row=0):
+        self.dry_run = dry_run
+        self.start_row = start_row
+        self.processed = 0
+        self.imported = 0
+        self.skipped = 0
+        self.error_count = 0
+        self.errors = []
+        self.last_committed_row = start_row
+        self.completed = False
+
+    def add_error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(row, message))
+
+    def to_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'start_row': self.start_row,
+            'processed': self.processed,
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'error_count': self.error_count,
+            'errors': [error._asdict() for error in self.errors],
+            'last_committed_row': self.last_committed_row,
+            'completed': self.completed,
+        }
+
+
+def file_checksum(stream, block_size=1 << 16):
+    """SHA1 eines Datei-Streams; der Stream wird danach zurückgespult."""
+    digest = hashlib.sha1()
+    for block in iter(lambda: stream.read(block_size), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _progress_key(checksum):
+    return f'job_import:{checksum[:32]}'
+
+
+def get_import_progress(checksum):
+    """Letzte committete Zeile eines früheren Imports dieser Datei (0 = keiner)."""
+    setting = SystemSetting.query.filter_by(key=_progress_key(checksum)).first()
+    return int(setting.value) if setting else 0
+
+
+def _store_import_progress(checksum, row):
+    key = _progress_key(checksum)
+    setting = SystemSetting.query.filter_by(key=key).first()
+    if setting is None:
+        db.session.add(SystemSetting(key=key, value=str(row)))
+    else:
+        setting.value = str(row)
+
+
+def _clear_import_progress(checksum):
+    SystemSetting.query.filter_by(key=_progress_key(checksum)).delete()
+
+
+def _parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Ungültiges Datum '{value}' (erwartet TT.MM.JJJJ)")
+
+
+def _parse_positive_int(value, field):
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"'{field}' muss eine ganze Zahl sein, nicht '{value}'")
+    if number < 0:
+        raise ValueError(f"'{field}' darf nicht negativ sein")
+    return number
+
+
+def _parse_status(value):
+    for member in JobStatus:
+        if value.lower() in (member.name.lower(), member.value.lower()):
+            return member
+    raise ValueError(f"Unbekannter Status '{value}'")
+
+
+class JobImporter:
+    """
+    Validiert und importiert Auftragszeilen blockweise.
+
+    Args:
+        chunk_size: Zeilen pro Block (und pro Commit)
+        dry_run: Nur validieren, nichts schreiben
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        # Nachschlagetabellen einmal pro Import laden statt pro Zeile
+        self.material_ids = {
+            f"{manufacturer.lower()} {name.lower()}": id_
+            for id_, manufacturer, name in db.session.query(FilamentType.id, FilamentType.manufacturer, FilamentType.name)
+        }
+        self.gcode_ids = dict(db.session.query(GCodeFile.filename, GCodeFile.id))
+
+    def validate_row(self, row):
+        """
+        Wandelt eine CSV-Zeile in Spaltenwerte für Job um.
+
+        Raises:
+            ValueError: mit lesbarer Fehlermeldung
+        """
+        def value(field):
+            return (row.get(field) or '').strip()
+
+        name = value('name')
+        if not name:
+            raise ValueError("'name' fehlt")
+        if len(name) > Job.name.type.length:
+            raise ValueError(f"'name' ist länger als {Job.name.type.length} Zeichen")
+
+        values = {
+            'name': name,
+            'status': _parse_status(value('status')) if value('status') else JobStatus.PENDING,
+            'priority': _parse_positive_int(value('priority'), 'priority') if value('priority') else 1,
+            'is_archived': False,
+            'material_number': value('material_number') or None,
+            'source_stl_filename': value('source_stl_filename') or None,
+            'target_quantity_parts': None,
+            'deadline': None,
+            # Unbekannte Materialien/G-Codes bleiben wie bisher leer
+            'required_filament_type_id': self.material_ids.get(value('material_short_text').lower()),
+            'gcode_file_id': self.gcode_ids.get(value('gcode_filename')),
+        }
+        # Alle Zeilen haben dieselben Schlüssel, damit der Bulk-INSERT als ein executemany läuft
+        if value('target_quantity_parts'):
+            values['target_quantity_parts'] = _parse_positive_int(value('target_quantity_parts'), 'target_quantity_parts')
+        end_date = value('estimated_end_date') or value('deadline')
+        if end_date:
+            values['deadline'] = _parse_date(end_date)
+        return values
+
+    def run(self, reader, start_row=0, checksum=None):
+        """
+        Führt den Import aus.
+
+        Args:
+            reader: csv.DictReader
+            start_row: Zeilennummer (inkl. Kopfzeile), bis zu der bereits importiert wurde
+            checksum: Datei-Prüfsumme für die Fortschrittsspeicherung (optional)
+
+        Returns:
+            ImportReport
+
+        Raises:
+            ValueError: wenn Pflichtspalten fehlen
+        """
+        missing = [h for h in REQUIRED_HEADERS if h not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"Fehlende Spalten in der CSV-Datei: {', '.join(missing)}")
+
+        report = ImportReport(dry_run=self.dry_run, start_row=start_row)
+        chunk = []
+        last_row = start_row
+        # Zeile 1 ist die Kopfzeile
+        for row_number, row in enumerate(reader, start=2):
+            if row_number <= start_row:
+                report.skipped += 1
+                continue
+            last_row = row_number
+            if not any((v or '').strip() for v in row.values() if isinstance(v, str)):
+                continue
+            report.processed += 1
+            try:
+                chunk.append(self.validate_row(row))
+            except ValueError as e:
+                report.add_error(row_number, str(e))
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk, report, last_row, checksum)
+                chunk = []
+
+        self._flush(chunk, report, last_row, checksum)
+        if checksum and not self.dry_run:
+            _clear_import_progress(checksum)
+            db.session.commit()
+        report.completed = True
+        return report
+
+    def _flush(self, rows, report, last_row, checksum):
+        if self.dry_run:
+            report.imported += len(rows)
+            report.last_committed_row = last_row
+            return
+        try:
+            if rows:
+                db.session.execute(insert(Job), rows)
+            if checksum:
+                _store_import_progress(checksum, last_row)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        report.imported += len(rows)
+        report.last_committed_row = last_row
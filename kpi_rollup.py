@@ -0,0 +1,338 @@
+# kpi_rollup.py
+"""
+Tägliche KPI-Rollups pro Drucker (Tabelle printer_daily_stats).
+
+Jeder abgeschlossene Auftrag liefert einen Beitrag zu genau einer Zeile
+(Drucker × Tag des Abschlusses): Druckzeit, Anzahl, Erfolge, Fehlschläge,
+Materialverbrauch und Kosten. Bei jedem Flush wird für geänderte Aufträge
+der alte Beitrag (aus der Datenbank) mit dem neuen verglichen und nur die
+Differenz auf die Rollups gebucht – in derselben Transaktion wie die
+Änderung selbst. Das KPI-Dashboard liest dadurch nur noch eine Zeile pro
+Drucker und Tag statt der gesamten Auftragshistorie.
+
+Im selben Schritt werden die Lebenszeit-Zähler am Drucker
+(lifetime_print_seconds, lifetime_filament_g, lifetime_jobs_count) gepflegt,
+damit Printer.total_print_hours & Co. ohne Aggregat-Abfrage auskommen.
+
+Massen-Updates an der Datenbank vorbei (Query.update, SQL) werden nicht
+erfasst; dafür gibt es die Befehle `flask kpi-backfill` und
+`flask printer-counters --rebuild`.
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select, update, insert, delete, func, case, cast, and_, Integer
+from sqlalchemy.orm.util import identity_key
+
+from extensions import db
+from models import Job, JobStatus, JobQuality, GCodeFile, Printer, PrinterDailyStats
+
+# Job-Attribute, von denen der Beitrag eines Auftrags abhängt
+TRACKED_ATTRS = ('printer_id', 'status', 'quality_assessment', 'completed_at', 'end_time',
+                 'actual_print_duration_s', 'actual_cost', 'gcode_file_id')
+COUNTERS = ('print_seconds', 'jobs_count', 'successful_count', 'failed_count', 'material_g', 'cost')
+
+# Lebenszeit-Zähler am Drucker (Spalten der Tabelle printer)
+PRINTER_COUNTERS = ('lifetime_print_seconds', 'lifetime_filament_g', 'lifetime_jobs_count')
+
+_STATS = PrinterDailyStats.__table__
+_JOB = Job.__table__
+_PRINTER = Printer.__table__
+
+
+def job_contribution(state, material_by_gcode):
+    """
+    Beitrag eines Auftrags zu den Rollups.
+
+    Args:
+        state: dict mit den Werten aus TRACKED_ATTRS
+        material_by_gcode: {gcode_file_id: material_needed_g}
+
+    Returns:
+        ((printer_id, tag), {zähler: wert}) oder None, wenn der Auftrag nicht zählt
+    """
+    if state['status'] != JobStatus.COMPLETED or not state['printer_id']:
+        return None
+    finished = state['completed_at'] or state['end_time']
+    if finished is None:
+        return None
+    quality = state['quality_assessment']
+    return (state['printer_id'], finished.date()), {
+        'print_seconds': int(state['actual_print_duration_s'] or 0),
+        'jobs_count': 1,
+        'successful_count': int(quality == JobQuality.SUCCESSFUL),
+        'failed_count': int(quality == JobQuality.FAILED),
+        'material_g': material_by_gcode.get(state['gcode_file_id']) or 0.0,
+        'cost': state['actual_cost'] or 0.0,
+    }
+
+
+def printer_contribution(state, material_by_gcode):
+    """
+    Beitrag eines Auftrags zu den Lebenszeit-Zählern seines Druckers.
+    Anders als bei den Rollups zählt auch ein Auftrag ohne Abschlusszeitpunkt.
+
+    Returns:
+        (printer_id, {zähler: wert}) oder None, wenn der Auftrag nicht zählt
+    """
+    if state['status'] != JobStatus.COMPLETED or not state['printer_id']:
+        return None
+    return state['printer_id'], {
+        'lifetime_print_seconds': int(state['actual_print_duration_s'] or 0),
+        'lifetime_filament_g': material_by_gcode.get(state['gcode_file_id']) or 0.0,
+        'lifetime_jobs_count': 1,
+    }
+
+
+def _add(deltas, contribution, sign, counters=COUNTERS):
+    if contribution is None:
+        return
+    key, values = contribution
+    bucket = deltas.setdefault(key, dict.fromkeys(counters, 0))
+    for counter, value in values.items():
+        bucket[counter] += sign * value
+
+
+def _apply_deltas(connection, deltas):
+    for (printer_id, day), values in sorted(deltas.items()):
+        if not any(values.values()):
+            continue
+        result = connection.execute(
+            update(_STATS)
+            .where(_STATS.c.printer_id == printer_id, _STATS.c.day == day)
+            .values({counter: _STATS.c[counter] + value for counter, value in values.items()})
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(_STATS).values(printer_id=printer_id, day=day, **values))
+
+
+def _apply_printer_deltas(session, connection, deltas):
+    for printer_id, values in sorted(deltas.items()):
+        values = {counter: value for counter, value in values.items() if value}
+        if not values:
+            continue
+        connection.execute(
+            update(_PRINTER)
+            .where(_PRINTER.c.id == printer_id)
+            .values({counter: _PRINTER.c[counter] + value for counter, value in values.items()})
+        )
+        # Geladene Drucker sehen den neuen Stand beim nächsten Zugriff
+        printer = session.identity_map.get(identity_key(Printer, printer_id))
+        if printer is not None:
+            session.expire(printer, list(values))
+
+
+def _changed_attrs(obj):
+    attrs = inspect(obj).attrs
+    return {attr: attrs[attr].history for attr in TRACKED_ATTRS if attrs[attr].history.has_changes()}
+
+
+@event.listens_for(db.session, 'before_flush')
+def _update_rollups_before_flush(session, flush_context, instances):
+    """Bucht die Beitragsänderungen aller betroffenen Aufträge auf Rollups und Druckerzähler."""
+    new_jobs = [obj for obj in session.new if isinstance(obj, Job)]
+    changed = {}
+    for obj in session.dirty:
+        if isinstance(obj, Job) and inspect(obj).identity:
+            history = _changed_attrs(obj)
+            if history:
+                changed[inspect(obj).identity[0]] = history
+    deleted_ids = [inspect(obj).identity[0] for obj in session.deleted
+                   if isinstance(obj, Job) and inspect(obj).identity]
+    if not (new_jobs or changed or deleted_ids):
+        return
+
+    connection = session.connection()
+    # Bisherige Beiträge stehen in der Datenbank (Stand des letzten Flushs)
+    old_states = {}
+    if changed or deleted_ids:
+        rows = connection.execute(
+            select(_JOB.c.id, *[_JOB.c[attr] for attr in TRACKED_ATTRS])
+            .where(_JOB.c.id.in_(list(changed) + deleted_ids))
+        ).mappings()
+        old_states = {row['id']: dict(row) for row in rows}
+
+    new_states = []
+    for obj in new_jobs:
+        new_states.append({attr: getattr(obj, attr) for attr in TRACKED_ATTRS})
+    for job_id, history in changed.items():
+        if job_id not in old_states:
+            continue
+        state = dict(old_states[job_id])
+        for attr, attr_history in history.items():
+            state[attr] = attr_history.added[0] if attr_history.added else None
+        new_states.append(state)
+
+    gcode_ids = {s['gcode_file_id'] for s in new_states} | {s['gcode_file_id'] for s in old_states.values()}
+    gcode_ids.discard(None)
+    material_by_gcode = {}
+    if gcode_ids:
+        material_by_gcode = dict(connection.execute(
+            select(GCodeFile.__table__.c.id, GCodeFile.__table__.c.material_needed_g)
+            .where(GCodeFile.__table__.c.id.in_(gcode_ids))
+        ).all())
+
+    deltas = {}
+    printer_deltas = {}
+    for states, sign in ((old_states.values(), -1), (new_states, 1)):
+        for state in states:
+            _add(deltas, job_contribution(state, material_by_gcode), sign)
+            _add(printer_deltas, printer_contribution(state, material_by_gcode), sign, PRINTER_COUNTERS)
+    _apply_deltas(connection, deltas)
+    _apply_printer_deltas(session, connection, printer_deltas)
+
+
+# --- Backfill ---
+
+def _rollup_source_query():
+    """Aggregiert die Rollups direkt aus der Auftragstabelle."""
+    gcode = GCodeFile.__table__
+    day = func.date(func.coalesce(_JOB.c.completed_at, _JOB.c.end_time))
+    return select(
+        _JOB.c.printer_id,
+        day.label('day'),
+        func.coalesce(func.sum(cast(_JOB.c.actual_print_duration_s, Integer)), 0),
+        func.count(_JOB.c.id),
+        func.sum(case((_JOB.c.quality_assessment == JobQuality.SUCCESSFUL, 1), else_=0)),
+        func.sum(case((_JOB.c.quality_assessment == JobQuality.FAILED, 1), else_=0)),
+        func.coalesce(func.sum(gcode.c.material_needed_g), 0.0),
+        func.coalesce(func.sum(_JOB.c.actual_cost), 0.0),
+    ).select_from(
+        _JOB.outerjoin(gcode, _JOB.c.gcode_file_id == gcode.c.id)
+    ).where(
+        _JOB.c.status == JobStatus.COMPLETED,
+        _JOB.c.printer_id.isnot(None),
+        func.coalesce(_JOB.c.completed_at, _JOB.c.end_time).isnot(None)
+    ).group_by(_JOB.c.printer_id, day)
+
+
+def rebuild_printer_daily_stats(connection):
+    """
+    Baut alle Rollups aus der Auftragshistorie neu auf.
+
+    Returns:
+        int: Anzahl der erzeugten Zeilen
+    """
+    connection.execute(delete(_STATS))
+    connection.execute(insert(_STATS).from_select(
+        ['printer_id', 'day', *COUNTERS], _rollup_source_query()
+    ))
+    return connection.execute(select(func.count()).select_from(_STATS)).scalar()
+
+
+@click.command('kpi-backfill')
+@with_appcontext
+def kpi_backfill_command():
+    """Berechnet die täglichen KPI-Rollups aus allen Aufträgen neu."""
+    with db.engine.begin() as connection:
+        rows = rebuild_printer_daily_stats(connection)
+    click.echo(f"KPI-Rollups neu aufgebaut: {rows} Drucker-Tage.")
+
+
+# --- Lebenszeit-Zähler am Drucker ---
+
+def _printer_counter_sources():
+    """Soll-Werte der Lebenszeit-Zähler als korrelierte Unterabfragen pro Drucker."""
+    gcode = GCodeFile.__table__
+    completed = and_(_JOB.c.printer_id == _PRINTER.c.id, _JOB.c.status == JobStatus.COMPLETED)
+    return {
+        'lifetime_print_seconds': select(
+            func.coalesce(func.sum(cast(_JOB.c.actual_print_duration_s, Integer)), 0)
+        ).where(completed).scalar_subquery(),
+        'lifetime_filament_g': select(
+            func.coalesce(func.sum(gcode.c.material_needed_g), 0.0)
+        ).select_from(_JOB.join(gcode, _JOB.c.gcode_file_id == gcode.c.id)).where(completed).scalar_subquery(),
+        'lifetime_jobs_count': select(func.count(_JOB.c.id)).where(completed).scalar_subquery(),
+    }
+
+
+def check_printer_counters(connection):
+    """
+    Vergleicht die gespeicherten Zähler mit der Auftragshistorie.
+
+    Returns:
+        list: (printer_id, name, zähler, gespeichert, soll) pro Abweichung
+    """
+    sources = _printer_counter_sources()
+    rows = connection.execute(select(
+        _PRINTER.c.id, _PRINTER.c.name,
+        *[_PRINTER.c[counter] for counter in PRINTER_COUNTERS],
+        *[source.label(f'expected_{counter}') for counter, source in sources.items()]
+    ).order_by(_PRINTER.c.id)).mappings()
+    mismatches = []
+    for row in rows:
+        for counter in PRINTER_COUNTERS:
+            stored, expected = row[counter] or 0, row[f'expected_{counter}'] or 0
+            if abs(stored - expected) > 1e-6:
+                mismatches.append((row['id'], row['name'], counter, stored, expected))
+    return mismatches
+
+
+def rebuild_printer_counters(connection):
+    """
+    Setzt die Lebenszeit-Zähler aller Drucker aus der Auftragshistorie neu.
+
+    Returns:
+        int: Anzahl der aktualisierten Drucker
+    """
+    return connection.execute(update(_PRINTER).values(_printer_counter_sources())).rowcount
+
+
+@click.command('printer-counters')
+@click.option('--rebuild', is_flag=True, help='Abweichende Zähler aus der Auftragshistorie neu berechnen.')
+@with_appcontext
+def printer_counters_command(rebuild):
+    """Prüft die Lebenszeit-Zähler der Drucker (Druckstunden, Filament, Aufträge)."""
+    with db.engine.begin() as connection:
+        mismatches = check_printer_counters(connection)
+        for printer_id, name, counter, stored, expected in mismatches:
+            click.echo(f"Drucker {printer_id} ({name}): {counter} = {stored}, erwartet {expected}")
+        if not mismatches:
+            click.echo("Alle Drucker-Zähler sind konsistent.")
+        elif rebuild:
+            rows = rebuild_printer_counters(connection)
+            click.echo(f"Drucker-Zähler neu aufgebaut: {rows} Drucker.")
+        else:
+            click.echo(f"{len(mismatches)} Abweichungen gefunden. Mit --rebuild korrigieren.")
+
+
+# --- Abfragen für das Dashboard ---
+
+def printer_totals(recent_since):
+    """
+    Summen pro Drucker über alle Tage sowie die Druckzeit ab recent_since.
+
+    Returns:
+        dict: {printer_id: Row(jobs, successful, failed, print_seconds, material_g, cost, recent_print_seconds)}
+    """
+    stats = PrinterDailyStats
+    rows = db.session.query(
+        stats.printer_id,
+        func.sum(stats.jobs_count).label('jobs'),
+        func.sum(stats.successful_count).label('successful'),
+        func.sum(stats.failed_count).label('failed'),
+        func.sum(stats.print_seconds).label('print_seconds'),
+        func.sum(stats.material_g).label('material_g'),
+        func.sum(stats.cost).label('cost'),
+        func.sum(case((stats.day >= recent_since, stats.print_seconds), else_=0)).label('recent_print_seconds')
+    ).group_by(stats.printer_id).all()
+    return {row.printer_id: row for row in rows}
+
+
+def daily_totals(since):
+    """
+    Summen über alle Drucker pro Tag ab since (nur Tage mit Einträgen).
+
+    Returns:
+        dict: {datetime.date: Row(jobs, successful, failed, print_seconds, material_g, cost)}
+    """
+    stats = PrinterDailyStats
+    rows = db.session.query(
+        stats.day,
+        func.sum(stats.jobs_count).label('jobs'),
+        func.sum(stats.successful_count).label('successful'),
+        func.sum(stats.failed_count).label('failed'),
+        func.sum(stats.print_seconds).label('print_seconds'),
+        func.sum(stats.material_g).label('material_g'),
+        func.sum(stats.cost).label('cost')
+    ).filter(stats.day >= since).group_by(stats.day).order_by(stats.day).all()
+    return {row.day: row for row in rows}
@@ -277,6 +277,12 @@ class Printer(db.Model):
     historical_print_hours = db.Column(db.Float, default=0.0)
     historical_filament_used_g = db.Column(db.Float, default=0.0)
     historical_jobs_count = db.Column(db.Integer, default=0)
+
+    # Laufende Summen der abgeschlossenen Aufträge, gepflegt in kpi_rollup
+    # (Prüfung/Neuaufbau: `flask printer-counters`)
+    lifetime_print_seconds = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    lifetime_filament_g = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    lifetime_jobs_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     location = db.Column(db.String(100), nullable=True)
     last_maintenance_date = db.Column(db.Date, nullable=True)
@@ -307,19 +313,27 @@ class Printer(db.Model):
 
     @property
     def total_print_hours(self):
-        new_seconds = db.session.query(func.sum(Job.actual_print_duration_s)).filter(Job.printer_id == self.id, Job.status == JobStatus.COMPLETED).scalar() or 0
-        new_hours = new_seconds / 3600
+        new_hours = (self.lifetime_print_seconds or 0) / 3600
         return round((self.historical_print_hours or 0) + new_hours, 1)
 
     @property
     def total_filament_used_g(self):
-        new_grams = db.session.query(func.sum(GCodeFile.material_needed_g)).join(Job).filter(Job.printer_id == self.id, Job.status == JobStatus.COMPLETED).scalar() or 0
-        return round((self.historical_filament_used_g or 0) + (new_grams or 0), 2)
+        return round((self.historical_filament_used_g or 0) + (self.lifetime_filament_g or 0), 2)
     
     @property
     def total_jobs_count(self):
-        new_jobs_count = self.jobs.filter(Job.status == JobStatus.COMPLETED).count()
-        return (self.historical_jobs_count or 0) + new_jobs_count
+        return (self.historical_jobs_count or 0) + (self.lifetime_jobs_count or 0)
+
+    @classmethod
+    def overdue_maintenance_count(cls):
+        """Anzahl der Drucker mit überfälliger Wartung (aus den gespeicherten Zählern)."""
+        total_hours = func.round(
+            func.coalesce(cls.historical_print_hours, 0) + cls.lifetime_print_seconds / 3600.0, 1
+        )
+        return db.session.query(func.count(cls.id)).filter(
+            cls.maintenance_interval_h > 0,
+            total_hours - func.coalesce(cls.last_maintenance_h, 0) >= cls.maintenance_interval_h
+        ).scalar()
 
     @property
     def calculated_cost_per_hour(self):
@@ -346,7 +360,7 @@ class Printer(db.Model):
             return printing_job
         next_job = self.jobs.filter(
             Job.status.in_([JobStatus.QUEUED, JobStatus.ASSIGNED])
-        ).order_by(Job.priority.desc(), Job.created_at.asc()).first()
+        ).order_by(*Job.queue_order()).first()
         return next_job
 
     def is_available_at(self, check_time=None):
@@ -439,8 +453,25 @@ class Job(db.Model):
     estimated_end_time = db.Column(db.DateTime, nullable=True)
     estimated_print_duration_s = db.Column(db.Integer, nullable=True)
     estimated_material_g = db.Column(db.Float, nullable=True) 
+    # Position in der Drucker-Warteschlange (Rüstoptimierung), NULL = nach Priorität
+    queue_position = db.Column(db.Integer, nullable=True)
     complexity_score = db.Column(db.Integer, nullable=True)  # 1-10
     
+    # Auftragsdaten aus dem ERP-Import
+    target_quantity_parts = db.Column(db.Integer, nullable=True)
+    material_number = db.Column(db.String(50), nullable=True)
+    
+    # Indizes für die Keyset-Paginierung der Auftragslisten
+    __table_args__ = (
+        db.Index('ix_job_is_archived_created_at', 'is_archived', 'created_at', 'id'),
+        db.Index('ix_job_is_archived_end_time', 'is_archived', 'end_time', 'id'),
+    )
+    
+    @staticmethod
+    def queue_order():
+        """Sortierung der Drucker-Warteschlange: optimierte Position, dann Priorität."""
+        return (Job.queue_position.asc().nulls_last(), Job.priority.desc(), Job.created_at.asc())
+    
     # Relationships (KORRIGIERT!)
     assigned_printer = db.relationship('Printer', foreign_keys=[printer_id], back_populates='jobs')
     required_filament_type = db.relationship('FilamentType', foreign_keys=[required_filament_type_id])
@@ -503,21 +534,11 @@ class Job(db.Model):
                     blocking.append(dep)
         return blocking
     
-    def get_all_dependencies(self, visited=None):
-        """Gibt alle transitiven Abhängigkeiten zurück"""
-        if visited is None:
-            visited = set()
-        
-        if self.id in visited:
-            return []
-        
-        visited.add(self.id)
-        deps = [self]
-        
-        for dep in self.dependencies:
-            deps.extend(dep.depends_on.get_all_dependencies(visited))
-        
-        return deps
+    def get_all_dependencies(self):
+        """Gibt den Job und alle transitiven Abhängigkeiten zurück (eine rekursive Abfrage)"""
+        from dependency_graph import dependency_subgraph
+        jobs, _ = dependency_subgraph(self.id)
+        return jobs or [self]
     
     def get_elapsed_and_total_time_seconds(self):
         total_seconds = 0
@@ -690,6 +711,8 @@ class FilamentSpool(db.Model):
     weight_measurements = db.Column(JSON, nullable=True)
     usage_history = db.Column(JSON, nullable=True)
     
+    __table_args__ = (db.Index('ix_filament_spool_filament_type_id', 'filament_type_id'),)
+    
     def __init__(self, *args, **kwargs):
         super(FilamentSpool, self).__init__(*args, **kwargs)
         if not self.short_id:
@@ -793,6 +816,16 @@ class SystemSetting(db.Model):
     key = db.Column(db.String(50), unique=True, nullable=False)
     value = db.Column(db.String(255), nullable=False)
 
+class SchedulerLease(db.Model):
+    """Lease für die Leader-Wahl des Hintergrund-Schedulers (eine Zeile pro Lease)."""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(120), nullable=True)
+    acquired_at = db.Column(db.DateTime, nullable=True)
+    renewed_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    # Von Standby-Prozessen angeforderte Job-IDs (kommagetrennt), der Leader führt sie aus
+    requested_jobs = db.Column(db.Text, nullable=True)
+
 class Consumable(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     
@@ -843,6 +876,9 @@ class Consumable(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
+    # Index für die Keyset-Paginierung der Materialliste
+    __table_args__ = (db.Index('ix_consumable_category_name', 'category', 'name', 'id'),)
+    
     # Beziehungen
     compatible_printers = db.relationship('Printer', secondary=consumable_printers, backref=db.backref('consumables', lazy='dynamic'))
     
@@ -922,6 +958,50 @@ class PrinterStatusLog(db.Model):
     status = db.Column(RobustEnum(PrinterStatus), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
+class PrinterStatusInterval(db.Model):
+    """
+    Zeitraum, in dem ein Drucker einen Status hatte (end_time None = aktuell).
+    Wird zusammen mit PrinterStatusLog in _log_printer_status gepflegt und
+    dient als Grundlage der Auslastungsauswertung (utilization.py).
+    """
+    __tablename__ = 'printer_status_interval'
+
+    id = db.Column(db.Integer, primary_key=True)
+    printer_id = db.Column(db.Integer, db.ForeignKey('printer.id', ondelete='CASCADE'), nullable=False)
+    status = db.Column(RobustEnum(PrinterStatus), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_printer_status_interval_printer_end', 'printer_id', 'end_time'),
+        db.Index('ix_printer_status_interval_start', 'start_time'),
+    )
+
+class PrinterDailyStats(db.Model):
+    """
+    Tägliche Kennzahlen pro Drucker (Rollup der abgeschlossenen Aufträge).
+    Wird beim Abschließen/Bewerten von Aufträgen inkrementell gepflegt,
+    siehe kpi_rollup.py.
+    """
+    __tablename__ = 'printer_daily_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    printer_id = db.Column(db.Integer, db.ForeignKey('printer.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    print_seconds = db.Column(db.Integer, default=0, nullable=False)
+    jobs_count = db.Column(db.Integer, default=0, nullable=False)
+    successful_count = db.Column(db.Integer, default=0, nullable=False)
+    failed_count = db.Column(db.Integer, default=0, nullable=False)
+    material_g = db.Column(db.Float, default=0.0, nullable=False)
+    cost = db.Column(db.Float, default=0.0, nullable=False)
+
+    printer = db.relationship('Printer')
+
+    __table_args__ = (
+        db.UniqueConstraint('printer_id', 'day', name='uq_printer_daily_stats_printer_day'),
+        db.Index('ix_printer_daily_stats_day', 'day'),
+    )
+
 class CostCalculation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
@@ -1283,3 +1363,13 @@ class MaintenancePhotoNew(db.Model):
     @property
     def url(self):
         return f'uploads/maintenance_photos/{self.filename}'
+
+class EntityVersion(db.Model):
+    """
+    Versionszähler pro Tabelle. Wird bei jeder Änderung erhöht und dient
+    als Grundlage für ETags (Conditional GET) der Polling-Endpunkte.
+    """
+    __tablename__ = 'entity_version'
+
+    entity = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
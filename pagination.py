@@ -0,0 +1,181 @@
+# pagination.py
+"""
+Keyset-(Cursor-)Paginierung.
+
+Statt OFFSET merkt sich der Cursor die Sortierwerte des letzten bzw. ersten
+Eintrags der aktuellen Seite. Die nächste Seite wird über eine WHERE-Bedingung
+auf diese Werte geladen, sodass die Datenbank direkt über den Index springt –
+tiefe Seiten sind damit genauso schnell wie die erste.
+
+Die Sortierung muss eindeutig sein; als letzter Schlüssel wird daher immer
+die ID angehängt. NULL-Werte werden stets ans Ende sortiert.
+"""
+import base64
+import datetime
+import enum
+import json
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 15
+MAX_PER_PAGE = 200
+
+
+class InvalidCursor(ValueError):
+    """Der übergebene Cursor ist ungültig oder passt nicht zur Sortierung."""
+
+
+class SortKey:
+    """
+    Ein Sortierschlüssel der Paginierung.
+
+    Args:
+        column: Spalte bzw. SQL-Ausdruck
+        descending: Absteigend sortieren
+        getter: Funktion item -> Wert; Standard ist getattr(item, column.key)
+    """
+
+    def __init__(self, column, descending=False, getter=None):
+        self.column = column
+        self.descending = descending
+        self.getter = getter or (lambda item, key=column.key: getattr(item, key))
+
+    def order_clause(self, reverse=False):
+        descending = self.descending != reverse
+        clause = self.column.desc() if descending else self.column.asc()
+        # NULLs in Leserichtung immer zuletzt (bzw. beim Zurückblättern zuerst)
+        return clause.nulls_first() if reverse else clause.nulls_last()
+
+    def after(self, value, reverse=False):
+        """Bedingung: Spaltenwert liegt in Leserichtung hinter value."""
+        descending = self.descending != reverse
+        if value is None:
+            # Hinter NULL kommt (vorwärts) nichts mehr, rückwärts alle Nicht-NULL-Werte
+            return self.column.isnot(None) if reverse else None
+        comparison = self.column < value if descending else self.column > value
+        return comparison if reverse else or_(comparison, self.column.is_(None))
+
+    def equals(self, value):
+        return self.column.is_(None) if value is None else self.column == value
+
+
+class KeysetPage:
+    """Ergebnis einer Keyset-Abfrage mit Cursorn für die Nachbarseiten."""
+
+    def __init__(self, items, per_page, next_cursor, prev_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def to_dict(self, serializer):
+        return {
+            'items': [serializer(item) for item in self.items],
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+        }
+
+
+# --- Cursor-Kodierung ---
+
+def _encode_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime.datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return datetime.date.fromisoformat(value['d'])
+        raise InvalidCursor('Unbekannter Cursor-Wert')
+    return value
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': [_encode_value(v) for v in values], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return [_decode_value(v) for v in data['v']], data['d']
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f'Ungültiger Cursor: {e}')
+
+
+# --- Paginierung ---
+
+def _seek_condition(sort_keys, values, reverse):
+    branches = []
+    for i, key in enumerate(sort_keys):
+        after = key.after(values[i], reverse)
+        if after is None:
+            continue
+        equal_prefix = [sort_keys[j].equals(values[j]) for j in range(i)]
+        branches.append(and_(*equal_prefix, after))
+    return or_(*branches) if branches else None
+
+
+def keyset_paginate(query, sort_keys, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """
+    Liefert eine Seite der Abfrage per Keyset-Paginierung.
+
+    Args:
+        query: SQLAlchemy-Query (ohne order_by)
+        sort_keys: Liste von SortKey; der letzte Schlüssel muss eindeutig sein (ID)
+        cursor: Cursor aus KeysetPage.next_cursor / prev_cursor oder None
+        per_page: Einträge pro Seite
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        InvalidCursor: bei ungültigem Cursor
+    """
+    per_page = max(1, min(per_page or DEFAULT_PER_PAGE, MAX_PER_PAGE))
+    values, direction = decode_cursor(cursor) if cursor else (None, 'next')
+    if values is not None and len(values) != len(sort_keys):
+        raise InvalidCursor('Cursor passt nicht zur Sortierung')
+    reverse = direction == 'prev'
+
+    if values is not None:
+        condition = _seek_condition(sort_keys, values, reverse)
+        if condition is not None:
+            query = query.filter(condition)
+        else:
+            query = query.filter(False)
+
+    rows = query.order_by(*[key.order_clause(reverse) for key in sort_keys]).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    if reverse:
+        items.reverse()
+
+    def cursor_for(item, cursor_direction):
+        return encode_cursor([key.getter(item) for key in sort_keys], cursor_direction)
+
+    next_cursor = prev_cursor = None
+    if items:
+        if has_more or reverse:
+            next_cursor = cursor_for(items[-1], 'next')
+        if values is not None and (has_more or not reverse):
+            prev_cursor = cursor_for(items[0], 'prev')
+    return KeysetPage(items, per_page, next_cursor, prev_cursor)
@@ -2,6 +2,10 @@
 import requests
 import os
 from models import APIType, PrinterStatus, JobQuality # JobQuality importiert
+from farm_state import get_farm_state
+
+# Druckzustand laut Drucker-API ('print_state'): Druck regulär beendet
+PRINT_STATE_COMPLETE = 'complete'
 
 def test_printer_connection(printer):
     """
@@ -28,8 +32,17 @@ def get_printer_status(printer):
     """
     Ruft den Status eines Druckers ab, inklusive Zuverlässigkeitsdaten.
     """
-    active_job = printer.get_active_or_next_job()
-    time_info = active_job.get_elapsed_and_total_time_seconds() if active_job else {'elapsed': 0, 'total': 0}
+    # Job- und Fortschrittsdaten kommen aus dem In-Memory-Abbild der Farm
+    snapshot = get_farm_state().get_status(printer.id, include_live=False)
+    if snapshot is None:
+        active_job = printer.get_active_or_next_job()
+        snapshot = {
+            'progress': active_job.get_manual_progress() if active_job else 0,
+            'job_name': active_job.name if active_job else None,
+            'job_id': active_job.id if active_job else None,
+            'preview_image_url': active_job.gcode_file.preview_image_url if active_job and active_job.gcode_file else None,
+            'time_info': active_job.get_elapsed_and_total_time_seconds() if active_job else {'elapsed': 0, 'total': 0},
+        }
 
     # --- ZWEITE, FINALE KORREKTUR ---
     # Die Zählung der Jobs wird nun korrekt über die Datenbank-Relation durchgeführt.
@@ -39,11 +52,11 @@ def get_printer_status(printer):
     status_dict = {
         'state': printer.status.value,
         'db_status': True,
-        'progress': active_job.get_manual_progress() if active_job else 0,
-        'job_name': active_job.name if active_job else None,
-        'job_id': active_job.id if active_job else None,
-        'preview_image_url': active_job.gcode_file.preview_image_url if active_job and active_job.gcode_file else None,
-        'time_info': time_info,
+        'progress': snapshot['progress'],
+        'job_name': snapshot['job_name'],
+        'job_id': snapshot['job_id'],
+        'preview_image_url': snapshot['preview_image_url'],
+        'time_info': snapshot['time_info'],
         'temps': { 'nozzle_actual': 0, 'nozzle_target': 0, 'bed_actual': 0, 'bed_target': 0 },
         'reliability': { 'successful': successful_jobs_count, 'failed': failed_jobs_count }
     }
@@ -61,17 +74,21 @@ def get_printer_status(printer):
         if api_data:
             api_state = PrinterStatus(api_data.get('state', 'Offline'))
             db_state = printer.status
-            if db_state == PrinterStatus.PRINTING and api_state == PrinterStatus.IDLE:
+            # Frei, aber kein regulär beendeter Druck (Standby, abgebrochen): der
+            # laufende Auftrag der DB bleibt maßgeblich. Meldet der Drucker das
+            # Druckende, wird 'Idle' durchgereicht (siehe update_printer_statuses).
+            if db_state == PrinterStatus.PRINTING and api_state == PrinterStatus.IDLE \
+                    and api_data.get('print_state') != PRINT_STATE_COMPLETE:
                 api_data['progress'] = status_dict['progress']
                 api_data['time_info'] = status_dict['time_info']
                 api_data['state'] = PrinterStatus.PRINTING.value
             status_dict.update(api_data)
             status_dict['db_status'] = False
         
-        if not status_dict.get('job_name') and active_job:
-            status_dict['job_name'] = active_job.name
-            status_dict['job_id'] = active_job.id
-            status_dict['preview_image_url'] = active_job.gcode_file.preview_image_url if active_job.gcode_file else None
+        if not status_dict.get('job_name') and snapshot['job_id']:
+            status_dict['job_name'] = snapshot['job_name']
+            status_dict['job_id'] = snapshot['job_id']
+            status_dict['preview_image_url'] = snapshot['preview_image_url']
         
         return status_dict
     except requests.RequestException:
@@ -155,6 +172,7 @@ def _get_klipper_status(printer):
 
     return {
         'state': status_map.get(state_str, PrinterStatus.OFFLINE.value),
+        'print_state': state_str.lower(),
         'progress': round(print_stats.get('progress', 0) * 100, 1),
         'time_info': time_info,
         'job_name': print_stats.get('filename'),
@@ -184,12 +202,19 @@ def _get_octoprint_status(printer):
     else: state = PrinterStatus.OFFLINE.value
     
     progress_data = job_data.get('progress', {})
+    # OctoPrint meldet nach dem Druckende 'Operational' mit 100 % Fortschritt
+    if state == PrinterStatus.IDLE.value and job_data.get('job', {}).get('file', {}).get('name') \
+            and (progress_data.get('completion') or 0) >= 100:
+        print_state = PRINT_STATE_COMPLETE
+    else:
+        print_state = (job_data.get('state') or state).lower()
     elapsed = progress_data.get('printTime', 0)
     total = elapsed + progress_data.get('printTimeLeft', 0) if progress_data.get('printTimeLeft') is not None else 0
     time_info = {'elapsed': elapsed, 'total': total}
 
     return {
         'state': state,
+        'print_state': print_state,
         'progress': round(progress_data.get('completion', 0) or 0, 1),
         'time_info': time_info,
         'job_name': job_data.get('job', {}).get('file', {}).get('name'),
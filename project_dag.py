@@ -0,0 +1,410 @@
+# project_dag.py
+"""
+Inkrementeller kritischer Pfad (CPM) mit zwischengespeichertem Projekt-DAG.
+
+Pro Projekt wird der Abhängigkeitsgraph der offenen Aufträge einmal geladen
+(zwei Abfragen) und mit Vorwärts- und Rückwärtsrechnung im Speicher gehalten.
+Änderungen an Aufträgen (Status, Projekt, G-Code), Abhängigkeiten und
+G-Code-Druckzeiten markieren nach dem Commit die betroffenen Aufträge. Beim
+nächsten Zugriff werden nur diese nachgeladen und nur die davon abhängige
+Region neu gerechnet:
+
+- Vorwärtsrechnung (frühester Start/Ende) ab den geänderten Knoten nach
+  unten, Abbruch sobald sich ein Wert nicht mehr ändert
+- Rückwärtsrechnung (spätester Start/Ende) ab den geänderten Knoten nach
+  oben; nur wenn sich das Projektende verschiebt, über alle Knoten
+- Topologische Reihenfolge wird beim Einfügen einer Kante lokal repariert
+  (Pearce-Kelly), neue Zyklen werden dabei erkannt
+
+Finish-to-Start: Nachfolger startet nach dem Ende, Start-to-Start: nicht vor
+dem Start des Vorgängers. Zeiten in Minuten ab Projektbeginn, Dauer laut
+G-Code (ohne Angabe 0, wie bisher).
+
+Die Markierung is_on_critical_path wird gesammelt (ein Bulk-UPDATE) und nur
+für geänderte Aufträge geschrieben.
+"""
+import heapq
+import threading
+from collections import deque
+
+from flask import current_app
+from sqlalchemy import inspect, or_
+
+import change_tracking
+from bulk_updates import bulk_update_jobs
+from extensions import db
+from models import Job, JobStatus, JobDependency, DependencyType, GCodeFile
+
+ACTIVE_STATES = (JobStatus.PENDING, JobStatus.ASSIGNED, JobStatus.QUEUED, JobStatus.PRINTING)
+# Float-Vergleich mit Toleranz (Minuten)
+SLACK_TOLERANCE = 0.1
+# Job-Attribute, deren Änderung den Graphen betrifft
+JOB_GRAPH_ATTRIBUTES = ('status', 'project_id', 'gcode_file_id', 'is_on_critical_path')
+# Spalten, deren Bulk-Update den Graphen verändern kann
+GRAPH_COLUMNS = {'status', 'project_id', 'gcode_file_id', 'estimated_print_time_min'}
+
+
+class ProjectDag:
+    """CPM-Zustand eines Projekts (nur IDs und Zahlen, keine ORM-Objekte)."""
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.duration = {}
+        self.gcode = {}
+        self.flag = {}
+        self.preds = {}
+        self.succs = {}
+        self.order = {}
+        self.next_index = 0
+        self.es, self.ef, self.ls, self.lf = {}, {}, {}, {}
+        self.project_end = 0
+        self.cyclic = False
+
+    # --- Laden ---
+
+    @classmethod
+    def load(cls, project_id):
+        dag = cls(project_id)
+        rows = _job_rows(Job.project_id == project_id)
+        for row in rows:
+            dag._add_node(row)
+        edges = _edge_rows(JobDependency.job_id.in_(list(dag.duration))) if dag.duration else []
+        for job_id, depends_on_id, dependency_type in edges:
+            if depends_on_id in dag.duration:
+                dag.preds[job_id][depends_on_id] = dependency_type
+                dag.succs[depends_on_id][job_id] = dependency_type
+        dag.cyclic = not dag._sort_all()
+        if not dag.cyclic:
+            dag._forward(dag.duration)
+            dag._backward(dag.duration, full=True)
+        return dag
+
+    def _add_node(self, row):
+        self.duration[row.id] = row.estimated_print_time_min or 0
+        self.gcode[row.id] = row.gcode_file_id
+        self.flag[row.id] = row.is_on_critical_path
+        self.preds[row.id] = {}
+        self.succs[row.id] = {}
+        self.order[row.id] = self.next_index
+        self.next_index += 1
+
+    def _sort_all(self):
+        """Kahn-Algorithmus über den ganzen Graphen; False bei Zyklus."""
+        in_degree = {node: len(preds) for node, preds in self.preds.items()}
+        queue = deque(sorted((node for node, degree in in_degree.items() if degree == 0), key=self.order.get))
+        index = 0
+        while queue:
+            node = queue.popleft()
+            self.order[node] = index
+            index += 1
+            for successor in self.succs[node]:
+                in_degree[successor] -= 1
+                if in_degree[successor] == 0:
+                    queue.append(successor)
+        self.next_index = index
+        return index == len(self.duration)
+
+    # --- CPM ---
+
+    def _forward(self, seeds):
+        heap = [(self.order[node], node) for node in seeds if node in self.duration]
+        heapq.heapify(heap)
+        queued = {node for _, node in heap}
+        while heap:
+            _, node = heapq.heappop(heap)
+            queued.discard(node)
+            es = 0
+            for pred, dependency_type in self.preds[node].items():
+                es = max(es, self.es[pred] if dependency_type == DependencyType.START_TO_START else self.ef[pred])
+            ef = es + self.duration[node]
+            if self.es.get(node) == es and self.ef.get(node) == ef:
+                continue
+            self.es[node], self.ef[node] = es, ef
+            for successor in self.succs[node]:
+                if successor not in queued:
+                    queued.add(successor)
+                    heapq.heappush(heap, (self.order[successor], successor))
+
+    def _backward(self, seeds, full=False):
+        self.project_end = max(self.ef.values(), default=0)
+        heap = [(-self.order[node], node) for node in seeds if node in self.duration]
+        heapq.heapify(heap)
+        queued = {node for _, node in heap}
+        while heap:
+            _, node = heapq.heappop(heap)
+            queued.discard(node)
+            duration = self.duration[node]
+            lf = self.project_end
+            for successor, dependency_type in self.succs[node].items():
+                if dependency_type == DependencyType.START_TO_START:
+                    lf = min(lf, self.ls[successor] + duration)
+                else:
+                    lf = min(lf, self.ls[successor])
+            ls = lf - duration
+            if not full and self.lf.get(node) == lf and self.ls.get(node) == ls:
+                continue
+            self.lf[node], self.ls[node] = lf, ls
+            for pred in self.preds[node]:
+                if pred not in queued:
+                    queued.add(pred)
+                    heapq.heappush(heap, (-self.order[pred], pred))
+
+    def critical_ids(self):
+        """Aufträge ohne Puffer in topologischer Reihenfolge."""
+        if self.cyclic:
+            return []
+        return sorted((node for node in self.duration if abs(self.ls[node] - self.es[node]) < SLACK_TOLERANCE),
+                      key=self.order.get)
+
+    def slack(self, job_id):
+        """Puffer eines Auftrags in Minuten (None, wenn nicht im Graphen)."""
+        if self.cyclic or job_id not in self.duration:
+            return None
+        return self.ls[job_id] - self.es[job_id]
+
+    # --- Inkrementelle Aktualisierung ---
+
+    def _insert_edge(self, job_id, depends_on_id, dependency_type):
+        """Fügt depends_on -> job ein und repariert die Reihenfolge; False bei Zyklus."""
+        self.preds[job_id][depends_on_id] = dependency_type
+        self.succs[depends_on_id][job_id] = dependency_type
+        lower, upper = self.order[job_id], self.order[depends_on_id]
+        if lower > upper:
+            return True
+        # Pearce-Kelly: betroffene Region zwischen den beiden Positionen umordnen
+        forward, stack = set(), [job_id]
+        while stack:
+            node = stack.pop()
+            if node == depends_on_id:
+                return False
+            if node in forward:
+                continue
+            forward.add(node)
+            stack.extend(s for s in self.succs[node] if self.order[s] <= upper)
+        backward, stack = set(), [depends_on_id]
+        while stack:
+            node = stack.pop()
+            if node in backward:
+                continue
+            backward.add(node)
+            stack.extend(p for p in self.preds[node] if self.order[p] >= lower)
+        moved = sorted(backward, key=self.order.get) + sorted(forward, key=self.order.get)
+        for node, index in zip(moved, sorted(self.order[node] for node in moved)):
+            self.order[node] = index
+        return True
+
+    def refresh(self, dirty):
+        """
+        Lädt die geänderten Aufträge nach und rechnet nur die betroffene Region neu.
+
+        Returns:
+            bool: False, wenn der Graph neu geladen werden muss (Zyklus)
+        """
+        if self.cyclic:
+            return False
+        rows = {row.id: row for row in _job_rows(Job.id.in_(list(dirty)))
+                if row.project_id == self.project_id}
+        forward_seeds, backward_seeds = set(), set()
+
+        for node in dirty:
+            row = rows.get(node)
+            if node in self.duration and row is None:
+                # Abgeschlossen, gelöscht oder in ein anderes Projekt verschoben
+                for pred in self.preds.pop(node):
+                    del self.succs[pred][node]
+                    backward_seeds.add(pred)
+                for successor in self.succs.pop(node):
+                    del self.preds[successor][node]
+                    forward_seeds.add(successor)
+                for mapping in (self.duration, self.gcode, self.flag, self.order,
+                                self.es, self.ef, self.ls, self.lf):
+                    mapping.pop(node, None)
+            elif row is not None:
+                if node not in self.duration:
+                    self._add_node(row)
+                elif self.duration[node] != (row.estimated_print_time_min or 0):
+                    self.duration[node] = row.estimated_print_time_min or 0
+                else:
+                    self.gcode[node], self.flag[node] = row.gcode_file_id, row.is_on_critical_path
+                    continue
+                self.gcode[node], self.flag[node] = row.gcode_file_id, row.is_on_critical_path
+                forward_seeds.add(node)
+                backward_seeds.add(node)
+
+        touched = [node for node in dirty if node in self.duration]
+        if touched:
+            current = {(job_id, depends_on_id): dependency_type for job_id, depends_on_id, dependency_type in
+                       _edge_rows(or_(JobDependency.job_id.in_(touched), JobDependency.depends_on_job_id.in_(touched)))
+                       if job_id in self.duration and depends_on_id in self.duration}
+            known = {}
+            for node in touched:
+                known.update(((node, pred), t) for pred, t in self.preds[node].items())
+                known.update(((successor, node), t) for successor, t in self.succs[node].items())
+            for (job_id, depends_on_id), dependency_type in known.items():
+                if current.get((job_id, depends_on_id)) != dependency_type:
+                    del self.preds[job_id][depends_on_id]
+                    del self.succs[depends_on_id][job_id]
+                    forward_seeds.add(job_id)
+                    backward_seeds.add(depends_on_id)
+            for (job_id, depends_on_id), dependency_type in current.items():
+                if known.get((job_id, depends_on_id)) != dependency_type:
+                    if not self._insert_edge(job_id, depends_on_id, dependency_type):
+                        return False
+                    forward_seeds.add(job_id)
+                    backward_seeds.add(depends_on_id)
+
+        old_end = self.project_end
+        self._forward(forward_seeds)
+        if max(self.ef.values(), default=0) != old_end:
+            self._backward(self.duration, full=True)
+        else:
+            self._backward(backward_seeds)
+        return True
+
+
+def _job_rows(condition):
+    return db.session.query(
+        Job.id, Job.project_id, Job.gcode_file_id, Job.is_on_critical_path, GCodeFile.estimated_print_time_min
+    ).outerjoin(GCodeFile, Job.gcode_file_id == GCodeFile.id)\
+     .filter(condition, Job.status.in_(ACTIVE_STATES)).all()
+
+
+def _edge_rows(condition):
+    return db.session.query(JobDependency.job_id, JobDependency.depends_on_job_id, JobDependency.dependency_type)\
+        .filter(condition).all()
+
+
+class ProjectDagCache:
+    """Thread-sicherer Cache der Projekt-Graphen einer App."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dags = {}
+        self._dirty = {}
+        self._metrics = dict.fromkeys(('loads', 'refreshes', 'hits'), 0)
+
+    def _get(self, project_id):
+        dag = self._dags.get(project_id)
+        dirty = self._dirty.pop(project_id, None)
+        if dag is not None and not dirty:
+            self._metrics['hits'] += 1
+            return dag
+        if dag is not None and dag.refresh(dirty):
+            self._metrics['refreshes'] += 1
+            return dag
+        self._metrics['loads'] += 1
+        dag = self._dags[project_id] = ProjectDag.load(project_id)
+        return dag
+
+    def update_critical_path(self, project_id):
+        """
+        Aktualisiert den Graphen und schreibt geänderte is_on_critical_path-Werte
+        gesammelt in die Datenbank (ohne Commit).
+
+        Returns:
+            list: IDs der Aufträge auf dem kritischen Pfad
+        """
+        with self._lock:
+            dag = self._get(project_id)
+            critical = dag.critical_ids()
+            critical_set = set(critical)
+            rows = [{'id': node, 'is_on_critical_path': node in critical_set}
+                    for node, flag in dag.flag.items() if flag != (node in critical_set)]
+            for row in rows:
+                dag.flag[row['id']] = row['is_on_critical_path']
+        if bulk_update_jobs(rows, ['is_on_critical_path']):
+            # Bei Rollback stimmt der gespeicherte Stand nicht mehr
+            change_tracking.pending_changes().data.setdefault('project_dag_written', set()).add(project_id)
+        return critical
+
+    def slack(self, project_id, job_id):
+        with self._lock:
+            return self._get(project_id).slack(job_id)
+
+    def mark_dirty(self, job_ids=(), project_ids=(), gcode_ids=()):
+        with self._lock:
+            for project_id, dag in self._dags.items():
+                affected = {node for node in job_ids if node in dag.duration}
+                if project_id in project_ids:
+                    affected.update(node for node in job_ids)
+                if gcode_ids:
+                    affected.update(node for node, gcode_id in dag.gcode.items() if gcode_id in gcode_ids)
+                if affected:
+                    self._dirty.setdefault(project_id, set()).update(affected)
+
+    def drop(self, project_ids=None):
+        with self._lock:
+            for project_id in list(self._dags if project_ids is None else project_ids):
+                self._dags.pop(project_id, None)
+                self._dirty.pop(project_id, None)
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['projects'] = len(self._dags)
+            metrics['jobs'] = sum(len(dag.duration) for dag in self._dags.values())
+        return metrics
+
+
+def get_project_dag_cache(app=None):
+    """Gibt den DAG-Cache der (aktuellen) App zurück und legt ihn bei Bedarf an."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('project_dag')
+    if cache is None:
+        cache = app.extensions['project_dag'] = ProjectDagCache()
+    return cache
+
+
+# --- Invalidierung nach dem Commit ---
+
+def _changes(changes):
+    return changes.data.setdefault('project_dag', {'jobs': set(), 'projects': set(), 'gcodes': set()})
+
+
+@change_tracking.on_flush
+def _collect_graph_changes(session, flushed, changes):
+    for obj in flushed.new + flushed.dirty + flushed.deleted:
+        if isinstance(obj, Job):
+            state = inspect(obj)
+            if obj in session.dirty and not any(state.attrs[name].history.has_changes()
+                                                for name in JOB_GRAPH_ATTRIBUTES):
+                continue
+            graph = _changes(changes)
+            graph['jobs'].add(obj.id)
+            history = state.attrs.project_id.history
+            graph['projects'].update(p for p in (obj.project_id, *history.deleted) if p is not None)
+        elif isinstance(obj, JobDependency):
+            _changes(changes)['jobs'].update((obj.job_id, obj.depends_on_job_id))
+        elif isinstance(obj, GCodeFile) and inspect(obj).attrs.estimated_print_time_min.history.has_changes():
+            _changes(changes)['gcodes'].add(obj.id)
+
+
+def _graph_reset(changes):
+    """True, wenn eine Massenanweisung den Graphen verändert haben kann."""
+    for change in changes.bulk_changes(Job, JobDependency, GCodeFile):
+        # z.B. geschätzte Zeiten, Prioritäten oder eigene Markierungen ändern nichts
+        if change.kind != 'update' or change.columns is None or GRAPH_COLUMNS & change.columns:
+            return True
+    return False
+
+
+@change_tracking.on_commit
+def _invalidate_graphs_after_commit(changes):
+    graph = changes.data.get('project_dag')
+    reset = _graph_reset(changes)
+    cache = current_app.extensions.get('project_dag')
+    if cache is None or not (graph or reset):
+        return
+    if reset:
+        cache.drop()
+    else:
+        cache.mark_dirty(graph['jobs'], graph['projects'], graph['gcodes'])
+
+
+@change_tracking.on_rollback
+def _discard_graph_changes(changes):
+    # Bei Rollback stimmt der gespeicherte Stand der Markierungen nicht mehr
+    written = changes.data.get('project_dag_written')
+    cache = current_app.extensions.get('project_dag')
+    if written and cache is not None:
+        cache.drop(written)
@@ -0,0 +1,330 @@
+# realtime.py
+"""
+Echtzeit-Kommunikation über Socket.IO.
+
+Clients abonnieren mit 'subscribe' nur die Räume, die sie anzeigen:
+    printer:<id>   - Ereignisse eines einzelnen Druckers
+    project:<id>   - Ereignisse eines Projekts
+    page:<name>    - Seitenweite Ereignisse (siehe PAGE_ROOMS)
+
+Status-Updates werden delta-kodiert verschickt: Der Server merkt sich den
+zuletzt gesendeten Zustand und sendet nur geänderte Druckerfelder mit einer
+fortlaufenden Sequenznummer ('status_delta'). Erkennt ein Client eine Lücke
+in der Sequenz, fordert er mit 'request_resync' den vollständigen Zustand
+an ('status_full').
+
+Bei mehreren Web-Workern (SOCKETIO_MESSAGE_QUEUE) vergibt nur der Prozess,
+der die Scheduler-Lease hält, Sequenznummern. Standby-Prozesse senden keine
+eigenen Deltas, sondern ziehen den Broadcast des Leaders vor bzw. leiten
+'request_resync' an ihn weiter; der Leader sendet dann 'status_full' an den
+Flotten-Raum. Jeder Encoder hat eine eigene Epoche, nach einem Leaderwechsel
+fordern Clients den Vollzustand neu an.
+
+'reload_dashboard' wird über einen EmitCoalescer gebündelt: Alle Meldungen
+innerhalb eines kurzen Zeitfensters ergeben eine einzige Benachrichtigung
+mit der Vereinigung der geänderten IDs.
+"""
+import copy
+import re
+import threading
+import uuid
+
+from flask import current_app
+from flask_login import current_user
+from flask_socketio import emit, join_room, leave_room
+
+from extensions import socketio
+from farm_state import get_farm_state
+from scheduler_events import get_scheduler_events
+from scheduler_lease import get_leader_election
+
+STATUS_DELTA_EVENT = 'status_delta'
+STATUS_FULL_EVENT = 'status_full'
+PRINTER_STATUS_EVENT = 'printer_status'
+RELOAD_DASHBOARD_EVENT = 'reload_dashboard'
+
+# Scheduler-Jobs des Leaders für Status-Broadcast und Vollzustand
+STATUS_BROADCAST_JOB = 'status_broadcast'
+STATUS_RESYNC_JOB = 'status_resync'
+
+# Standard-Zeitfenster, in dem reload_dashboard-Meldungen gebündelt werden
+DEFAULT_RELOAD_COALESCE_SECONDS = 1.0
+
+# Seiten-Räume und ihre Ereignisse
+PAGE_ROOMS = {
+    'fleet': 'Status aller Drucker (Dashboard, Live-Ansicht, Digital Twin)',
+    'materials': 'Materialwarnungen (Bestand, Trocknung)',
+    'jobs': 'Job-Warnungen und Prioritäten',
+    'projects': 'Projekt-Deadlines und Prioritäten',
+    'maintenance': 'Wartungserinnerungen',
+}
+
+_ROOM_PATTERN = re.compile(r'^(printer|project):\d+$|^page:(%s)$' % '|'.join(PAGE_ROOMS))
+
+
+# --- Räume ---
+
+def printer_room(printer_id):
+    return f'printer:{printer_id}'
+
+
+def project_room(project_id):
+    return f'project:{project_id}'
+
+
+def page_room(name):
+    return f'page:{name}'
+
+
+def emit_to_rooms(event, payload, rooms):
+    """
+    Sendet ein Ereignis an alle Clients der angegebenen Räume.
+    Clients in mehreren dieser Räume erhalten es nur einmal.
+    """
+    rooms = [room for room in dict.fromkeys(rooms) if room]
+    if rooms:
+        socketio.emit(event, payload, to=rooms)
+
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Tritt den angefragten Räumen bei und gibt die beigetretenen Räume zurück."""
+    if not current_user.is_authenticated:
+        return []
+    joined = []
+    for room in (data or {}).get('rooms', []):
+        if isinstance(room, str) and _ROOM_PATTERN.match(room):
+            join_room(room)
+            joined.append(room)
+    return joined
+
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    """Verlässt die angegebenen Räume."""
+    for room in (data or {}).get('rooms', []):
+        if isinstance(room, str):
+            leave_room(room)
+
+
+def _normalize_status(entry):
+    """
+    Rundet laufend veränderliche Werte, damit nicht jede Sekunde
+    Bruchteile als Änderung erkannt werden.
+    """
+    data = dict(entry)
+    time_info = data.get('time_info') or {}
+    data['time_info'] = {key: int(value or 0) for key, value in time_info.items()}
+    data['progress'] = round(data.get('progress') or 0, 1)
+    return data
+
+
+class StatusDeltaEncoder:
+    """Berechnet Deltas zwischen aufeinanderfolgenden Status-Broadcasts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = {}
+        self.seq = 0
+        # Kennung dieses Encoders; Sequenznummern gelten nur innerhalb einer Epoche
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def encode(self, status_data):
+        """
+        Vergleicht den neuen Status mit dem zuletzt gesendeten.
+
+        Args:
+            status_data: dict {printer_id: status_dict}
+
+        Returns:
+            dict: {'epoch', 'seq', 'changes': {printer_id: {feld: wert}}, 'removed': [...]}
+                  oder None, wenn sich nichts geändert hat
+        """
+        current = {str(pid): _normalize_status(entry) for pid, entry in status_data.items()}
+        with self._lock:
+            changes = {}
+            for pid, entry in current.items():
+                previous = self._last.get(pid)
+                if previous is None:
+                    changes[pid] = entry
+                    continue
+                diff = {key: value for key, value in entry.items() if previous.get(key) != value}
+                if diff:
+                    changes[pid] = diff
+            removed = [pid for pid in self._last if pid not in current]
+
+            if not changes and not removed:
+                return None
+
+            self.seq += 1
+            self._last = current
+            return {'epoch': self.epoch, 'seq': self.seq, 'changes': changes, 'removed': removed}
+
+    def get_entry(self, printer_id):
+        """Gibt den zuletzt gesendeten Zustand eines Druckers zurück."""
+        with self._lock:
+            return copy.deepcopy(self._last.get(str(printer_id)))
+
+    def snapshot(self):
+        """Gibt den zuletzt gesendeten Zustand vollständig zurück."""
+        with self._lock:
+            return {'epoch': self.epoch, 'seq': self.seq, 'printers': copy.deepcopy(self._last)}
+
+
+def get_status_encoder(app=None):
+    """Gibt den Delta-Encoder der (aktuellen) App zurück."""
+    app = app or current_app._get_current_object()
+    encoder = app.extensions.get('status_delta_encoder')
+    if encoder is None:
+        encoder = StatusDeltaEncoder()
+        app.extensions['status_delta_encoder'] = encoder
+    return encoder
+
+
+def is_status_standby():
+    """True, wenn ein anderer Prozess die Scheduler-Lease hält und damit die Status-Sequenz vergibt."""
+    election = get_leader_election()
+    return election is not None and not election.is_leader
+
+
+def publish_status_update():
+    """
+    Liest den aktuellen Farm-Zustand und sendet die Änderungen seit dem
+    letzten Broadcast: das Delta an den Raum 'page:fleet', den vollständigen
+    Eintrag jedes geänderten Druckers an dessen Drucker-Raum.
+
+    Im Standby wird stattdessen der Broadcast des Leaders vorgezogen.
+
+    Returns:
+        dict: Das gesendete Delta oder None, wenn nichts gesendet wurde
+    """
+    if is_status_standby():
+        get_scheduler_events().trigger(STATUS_BROADCAST_JOB)
+        return None
+    encoder = get_status_encoder()
+    delta = encoder.encode(get_farm_state().get_all_statuses())
+    if delta:
+        socketio.emit(STATUS_DELTA_EVENT, delta, to=page_room('fleet'))
+        for printer_id in delta['changes']:
+            socketio.emit(PRINTER_STATUS_EVENT, encoder.get_entry(printer_id), to=printer_room(printer_id))
+    return delta
+
+
+def publish_full_status():
+    """Sendet den vollständigen Status an alle Clients im Raum 'page:fleet' (nur Leader)."""
+    publish_status_update()
+    socketio.emit(STATUS_FULL_EVENT, get_status_encoder().snapshot(), to=page_room('fleet'))
+
+
+@socketio.on('request_resync')
+def handle_request_resync():
+    """Sendet dem anfragenden Client den vollständigen Status."""
+    if not current_user.is_authenticated:
+        return
+    if is_status_standby():
+        # Sequenz gehört dem Leader: er sendet den Vollzustand an den Flotten-Raum
+        get_scheduler_events().trigger(STATUS_RESYNC_JOB)
+        return
+    publish_status_update()
+    emit(STATUS_FULL_EVENT, get_status_encoder().snapshot())
+
+
+class EmitCoalescer:
+    """
+    Bündelt gleichartige Socket.IO-Ereignisse innerhalb eines Zeitfensters.
+
+    Die erste Meldung startet das Fenster; alle weiteren Meldungen bis zum
+    Ablauf werden mit ihr zusammengeführt. Gesendet wird einmal mit
+    {'entities': {art: [ids]}, 'merged': anzahl}.
+    """
+
+    def __init__(self, event, rooms, window_seconds=DEFAULT_RELOAD_COALESCE_SECONDS):
+        self.event = event
+        self.rooms = rooms
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._pending = None
+        self._merged = 0
+        self._requested = 0
+        self._emitted = 0
+        self._suppressed = 0
+
+    def notify(self, **entities):
+        """
+        Meldet eine Änderung.
+
+        Args:
+            **entities: Geänderte IDs je Art, z.B. jobs=[1, 2], printers=[3]
+        """
+        with self._lock:
+            self._requested += 1
+            start_window = self._pending is None
+            if start_window:
+                self._pending = {}
+                self._merged = 0
+            else:
+                self._suppressed += 1
+            self._merged += 1
+            for kind, ids in entities.items():
+                ids = [entity_id for entity_id in (ids or []) if entity_id is not None]
+                if ids:
+                    self._pending.setdefault(kind, set()).update(ids)
+
+        if not start_window:
+            return
+        if self.window_seconds <= 0:
+            self.flush()
+        else:
+            socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self):
+        socketio.sleep(self.window_seconds)
+        self.flush()
+
+    def flush(self):
+        """Sendet die gebündelten Änderungen sofort."""
+        with self._lock:
+            if self._pending is None:
+                return
+            payload = {
+                'entities': {kind: sorted(ids) for kind, ids in self._pending.items()},
+                'merged': self._merged,
+            }
+            self._pending = None
+            self._emitted += 1
+        emit_to_rooms(self.event, payload, self.rooms)
+
+    def get_metrics(self):
+        """Zähler für angefragte, gesendete und unterdrückte Ereignisse."""
+        with self._lock:
+            return {
+                'event': self.event,
+                'window_seconds': self.window_seconds,
+                'requested': self._requested,
+                'emitted': self._emitted,
+                'suppressed': self._suppressed,
+                'pending': self._pending is not None,
+            }
+
+
+def get_reload_coalescer(app=None):
+    """Gibt den reload_dashboard-Coalescer der (aktuellen) App zurück."""
+    app = app or current_app._get_current_object()
+    coalescer = app.extensions.get('reload_coalescer')
+    if coalescer is None:
+        coalescer = EmitCoalescer(
+            RELOAD_DASHBOARD_EVENT,
+            [page_room('fleet')],
+            app.config.get('DASHBOARD_RELOAD_COALESCE_SECONDS', DEFAULT_RELOAD_COALESCE_SECONDS)
+        )
+        app.extensions['reload_coalescer'] = coalescer
+    return coalescer
+
+
+def notify_dashboard_changed(**entities):
+    """
+    Fordert ein (gebündeltes) Neuladen der Dashboards an.
+
+    Beispiel: notify_dashboard_changed(jobs=[job.id], printers=[job.printer_id])
+    """
+    get_reload_coalescer().notify(**entities)
@@ -23,6 +23,7 @@ def register_blueprints(app: Flask):
     from .maintenance_new import maintenance_new_bp
     from .filament_api import filament_api_bp
     from .projects import projects_bp  # NEU
+    from .admin import admin_bp
 
 
 
@@ -48,3 +49,4 @@ def register_blueprints(app: Flask):
     app.register_blueprint(maintenance_new_bp)
     app.register_blueprint(filament_api_bp)
     app.register_blueprint(projects_bp)  # NEU
+    app.register_blueprint(admin_bp, url_prefix='/admin')
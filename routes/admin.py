@@ -0,0 +1,15 @@
+# routes/admin.py
+from flask import Blueprint, render_template, redirect, url_for, flash
+from flask_login import login_required, current_user
+from models import UserRole
+
+admin_bp = Blueprint('admin_bp', __name__)
+
+@admin_bp.route('/scheduler')
+@login_required
+def scheduler_status():
+    """Übersicht über Läufe, Dauer und Fehler der Scheduler-Jobs (nur Admins)."""
+    if current_user.role != UserRole.ADMIN:
+        flash("Nur für Administratoren.", "danger")
+        return redirect(url_for('index'))
+    return render_template('admin/scheduler.html')
@@ -3,21 +3,28 @@ import os
 import secrets
 import subprocess
 from flask import Blueprint, jsonify, request, url_for, current_app
-from flask_login import login_required
+from flask_login import login_required, current_user
 from extensions import db, socketio
 from models import (
     Printer, Job, JobStatus, JobQuality, PrintSnapshot, PrinterStatus,
     PrinterStatusLog, ToDo, ToDoCategory, ToDoStatus, SlicerProfile,
     FilamentType, SystemSetting, GCodeFile, FilamentSpool, LayoutItem,
-    TimeWindow, JobDependency, DependencyType, DeadlineStatus
+    TimeWindow, JobDependency, DependencyType, DeadlineStatus, Project, UserRole
 )
 from printer_communication import get_printer_status, test_printer_connection
 import datetime
-from .services import assign_job_to_printer
+from .services import assign_job_to_printer, _log_printer_status
+from farm_state import get_farm_state
+from realtime import publish_status_update, get_reload_coalescer, get_status_encoder
+from http_cache import conditional_json, time_bucket
+from search_index import load_ranked, fts_available
 from sqlalchemy import func, or_
+from sqlalchemy.orm import joinedload
 from gcode_analyzer import analyze_gcode, create_gcode_preview
 from flask_login import login_required
 from validators import DependencyValidator
+from dependency_graph import dependency_subgraph
+from scheduler import get_scheduler_status as collect_scheduler_status, is_scheduler_enabled
 
 api_bp = Blueprint('api_bp', __name__, url_prefix='/api')
 
@@ -55,11 +62,10 @@ def set_printer_status(printer_id):
     try:
         new_status = PrinterStatus[new_status_str]
         printer.status = new_status
-        log_entry = PrinterStatusLog(printer_id=printer.id, status=new_status)
-        db.session.add(log_entry)
+        _log_printer_status(printer, new_status)
         db.session.commit()
         
-        socketio.emit('status_update', get_all_statuses().get_json())
+        publish_status_update()
         
         return jsonify({'status': 'success', 'message': f"Status für {printer.name} auf '{new_status.value}' gesetzt."})
     except (KeyError, ValueError):
@@ -70,52 +76,21 @@ def set_printer_status(printer_id):
 
 # --- Dashboard & Slicer ---
 
+def _dashboard_status_etag(versions):
+    """Zusätzliche ETag-Komponente: Live-Daten und Zeitfenster während laufender Drucke."""
+    state = get_farm_state()
+    printing = state.sync_versions(versions)
+    return {
+        'live': state.live_version,
+        'bucket': time_bucket(current_app.config.get('DASHBOARD_ETAG_BUCKET_SECONDS', 15)) if printing else None
+    }
+
 @api_bp.route('/dashboard/status')
 @login_required
+@conditional_json(Job, Printer, FilamentSpool, FilamentType, GCodeFile, extra=_dashboard_status_etag)
 def get_all_statuses():
     """Gibt den kombinierten Status aller Drucker für das Dashboard zurück."""
-    printers = Printer.query.all()
-    status_data = {}
-    for printer in printers:
-        primary_job = printer.get_active_or_next_job()
-        next_job_display = None
-        if primary_job and primary_job.status == JobStatus.PRINTING:
-            next_job_display = printer.jobs.filter(
-                Job.status.in_([JobStatus.QUEUED, JobStatus.ASSIGNED])
-            ).order_by(Job.priority.desc(), Job.created_at.asc()).first()
-
-        time_info = {'elapsed': 0, 'total': 0}
-        progress = 0
-        
-        if primary_job:
-            time_info = primary_job.get_elapsed_and_total_time_seconds()
-            progress = primary_job.get_manual_progress()
-
-        current_spool_data = None
-        current_spool = printer.assigned_spools.filter_by(is_in_use=True).first()
-        if current_spool:
-            current_spool_data = {
-                "short_id": current_spool.short_id,
-                "name": f"{current_spool.filament_type.name} ({current_spool.filament_type.material_type})",
-                "color_hex": current_spool.filament_type.color_hex
-            }
-        
-        next_job_data = None
-        if next_job_display:
-             next_job_data = {
-                 "name": next_job_display.name,
-                 "material": f"{next_job_display.required_filament_type.name} ({next_job_display.required_filament_type.material_type})" if next_job_display.required_filament_type else "Nicht spezifiziert"
-             }
-
-        status_data[printer.id] = {
-            'id': printer.id, 'name': printer.name, 'state': printer.status.value, 'state_key': printer.status.name,
-            'job_id': primary_job.id if primary_job else None, 'job_name': primary_job.name if primary_job else None,
-            'progress': progress, 'time_info': time_info,
-            'preview_image_url': primary_job.gcode_file.preview_image_url if (primary_job and primary_job.gcode_file) else None,
-            'current_spool': current_spool_data, 'next_job': next_job_data,
-            'gcode_file_id': primary_job.gcode_file_id if (primary_job and primary_job.gcode_file) else None
-        }
-    return jsonify(status_data)
+    return jsonify(get_farm_state().get_all_statuses())
 
 
 @api_bp.route('/slicer/profiles/filter', methods=['POST'])
@@ -269,16 +244,74 @@ def label_snapshot(snapshot_id):
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# --- Volltextsuche ---
+
+SEARCH_KINDS = ('jobs', 'spools', 'consumables')
+
+
+def _search_entry(kind, obj, score):
+    if kind == 'jobs':
+        title, subtitle = obj.name, obj.status.value if obj.status else ''
+        url = url_for('jobs_bp.job_details', job_id=obj.id)
+    elif kind == 'spools':
+        title = f"{obj.short_id} – {obj.filament_type.manufacturer} {obj.filament_type.name}"
+        subtitle = obj.storage_location or ''
+        url = url_for('materials_bp.list_filaments')
+    else:
+        title, subtitle = obj.name, obj.manufacturer or ''
+        url = url_for('consumables_bp.view_consumable', consumable_id=obj.id)
+    return {'id': obj.id, 'title': title, 'subtitle': subtitle, 'url': url,
+            'score': round(score, 4) if score is not None else None}
+
+
+@api_bp.route('/search', methods=['GET'])
+@login_required
+def unified_search():
+    """
+    Gemeinsame Suche über Aufträge, Spulen und Verbrauchsmaterialien.
+
+    Query-Parameter:
+        q: Suchbegriff (Präfixsuche, alle Wörter müssen vorkommen)
+        types: Kommagetrennte Auswahl aus jobs, spools, consumables
+        limit: Treffer pro Typ (max. 50)
+    """
+    term = request.args.get('q', '').strip()
+    if not term:
+        return jsonify({'status': 'error', 'message': 'Suchbegriff erforderlich'}), 400
+    kinds = [k for k in request.args.get('types', ','.join(SEARCH_KINDS)).split(',') if k in SEARCH_KINDS]
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+
+    options = {'spools': [joinedload(FilamentSpool.filament_type)]}
+    results = {
+        kind: [_search_entry(kind, obj, score) for obj, score in
+               load_ranked(kind, term, limit=limit, options=options.get(kind, ()))]
+        for kind in kinds
+    }
+    return jsonify({'query': term, 'engine': 'fts5' if fts_available() else 'like', 'results': results})
+
 # ... (Rest der Datei bleibt unverändert) ...
 
 # --- Scheduler Einstellungen ---
 
+@api_bp.route('/realtime/metrics', methods=['GET'])
+@login_required
+def get_realtime_metrics():
+    """Kennzahlen der gebündelten Socket.IO-Benachrichtigungen."""
+    return jsonify({
+        'reload_dashboard': get_reload_coalescer().get_metrics(),
+        'status_seq': get_status_encoder().seq
+    })
+
 @api_bp.route('/settings/scheduler/status', methods=['GET'])
 @login_required
 def get_scheduler_status():
-    """Ruft den aktuellen Status des Schedulers ab."""
-    setting = SystemSetting.query.filter_by(key='scheduler_enabled').first()
-    return jsonify({'enabled': setting.value == 'true' if setting else True})
+    """
+    Ruft den Status des Schedulers ab. Laufzeit-Kennzahlen, Leader und
+    Fehlertexte erhalten nur Admins, alle anderen nur 'enabled'.
+    """
+    if current_user.role != UserRole.ADMIN:
+        return jsonify({'enabled': is_scheduler_enabled()})
+    return jsonify(collect_scheduler_status())
 
 @api_bp.route('/settings/scheduler/status', methods=['POST'])
 @login_required
@@ -336,6 +369,7 @@ def job_preflight_check(job_id):
 
 @api_bp.route('/layout')
 @login_required
+@conditional_json(LayoutItem)
 def get_layout():
     """Gibt alle SICHTBAREN Layout-Objekte für die 3D-Szene zurück."""
     layout_items = LayoutItem.query.filter_by(is_visible=True).all()
@@ -506,12 +540,10 @@ def get_dependency_graph(job_id):
     if not job:
         return jsonify({'error': 'Job nicht gefunden'}), 404
     
-    # Sammle alle verbundenen Jobs
-    all_deps = job.get_all_dependencies()
+    # Alle verbundenen Jobs und Kanten in einer rekursiven Abfrage
+    all_deps, dependency_edges = dependency_subgraph(job.id)
     
     nodes = []
-    edges = []
-    
     for j in all_deps:
         nodes.append({
             'id': j.id,
@@ -520,14 +552,12 @@ def get_dependency_graph(job_id):
             'is_critical': j.is_on_critical_path,
             'priority_score': j.priority_score
         })
-        
-        for dep in j.dependencies:
-            if dep.depends_on in all_deps:
-                edges.append({
-                    'from': dep.depends_on_job_id,
-                    'to': j.id,
-                    'type': dep.dependency_type.value
-                })
+    
+    edges = [{
+        'from': depends_on_job_id,
+        'to': dependent_id,
+        'type': dependency_type.value
+    } for dependent_id, depends_on_job_id, dependency_type in dependency_edges]
     
     return jsonify({
         'nodes': nodes,
@@ -731,6 +761,7 @@ def check_printer_availability(printer_id):
 
 @api_bp.route('/jobs/calendar', methods=['GET'])
 @login_required
+@conditional_json(Job, Printer, Project, extra=lambda versions: time_bucket(300))
 def jobs_calendar():
     """
     Liefert Jobs für Kalender-Ansicht im FullCalendar-Format.
@@ -2,15 +2,20 @@
 import os
 import uuid
 import json
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
+from sqlalchemy import func, case
 from werkzeug.utils import secure_filename
 from extensions import db
 from models import Consumable, Printer, ConsumableCategory, HazardSymbol
 from flask_login import login_required
+from pagination import keyset_paginate, SortKey, InvalidCursor
+from search_index import search_filter
 import datetime
 
 consumables_bp = Blueprint('consumables_bp', __name__, url_prefix='/consumables')
 
+CONSUMABLES_PER_PAGE = 48
+
 @consumables_bp.route('/')
 @login_required
 def list_consumables():
@@ -55,24 +60,71 @@ def list_consumables():
     
     # Suchfilter
     if search_query:
-        query = query.filter(
-            db.or_(
-                Consumable.name.ilike(f'%{search_query}%'),
-                Consumable.manufacturer.ilike(f'%{search_query}%'),
-                Consumable.article_number.ilike(f'%{search_query}%')
-            )
-        )
+        query = query.filter(search_filter('consumables', search_query))
     
-    consumables = query.order_by(Consumable.category, Consumable.name).all()
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', CONSUMABLES_PER_PAGE, type=int)
+    wants_json = request.args.get('format') == 'json'
+    sort_keys = [SortKey(Consumable.category), SortKey(Consumable.name), SortKey(Consumable.id)]
+
+    try:
+        page = keyset_paginate(query, sort_keys, cursor=cursor, per_page=per_page)
+    except InvalidCursor as e:
+        if wants_json:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        flash('Ungültiger Seitenverweis, es wird die erste Seite angezeigt.', 'warning')
+        page = keyset_paginate(query, sort_keys, per_page=per_page)
+
+    if wants_json:
+        return jsonify(page.to_dict(_consumable_list_entry))
+
     categories = ConsumableCategory
     
     return render_template('consumables/list.html', 
-                         consumables=consumables, 
+                         consumables=page.items, 
+                         pagination=page,
+                         stats=_consumable_stats(query),
                          categories=categories,
                          current_category=category_filter,
                          current_status=status_filter,
                          search_query=search_query)
 
+
+def _consumable_stats(query):
+    """Kennzahlen der Statistik-Karten über alle gefilterten Einträge (nicht nur die aktuelle Seite)."""
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    critical, low, expired, total = query.with_entities(
+        count_if(db.and_(Consumable.min_stock.isnot(None), Consumable.stock_level < Consumable.min_stock)),
+        count_if(db.and_(Consumable.reorder_level.isnot(None), Consumable.stock_level <= Consumable.reorder_level)),
+        count_if(db.and_(
+            Consumable.has_expiry == True,
+            Consumable.expiry_date.isnot(None),
+            Consumable.expiry_date < datetime.date.today()
+        )),
+        func.count(Consumable.id)
+    ).order_by(None).one()
+    return {'critical': critical, 'low_stock': low, 'expired': expired, 'total': total}
+
+
+def _consumable_list_entry(consumable):
+    """JSON-Darstellung eines Verbrauchsmaterials für die Listen-Endpunkte."""
+    return {
+        'id': consumable.id,
+        'name': consumable.name,
+        'category': consumable.category.value if consumable.category else None,
+        'stock_level': consumable.stock_level,
+        'unit': consumable.unit,
+        'min_stock': consumable.min_stock,
+        'reorder_level': consumable.reorder_level,
+        'storage_location': consumable.storage_location,
+        'manufacturer': consumable.manufacturer,
+        'is_low_stock': consumable.is_low_stock,
+        'is_critical_stock': consumable.is_critical_stock,
+        'is_expired': consumable.is_expired,
+    }
+
 @consumables_bp.route('/add', methods=['GET', 'POST'])
 @login_required
 def add_consumable():
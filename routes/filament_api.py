@@ -2,6 +2,8 @@ from flask import Blueprint, jsonify, request, current_app
 from flask_login import login_required, current_user
 from extensions import db, socketio
 from models import FilamentType, FilamentSpool, Job, JobStatus, GCodeFile, Printer
+from stock_alerts import invalidate_low_stock_cache
+from analytics_cache import cached_analytics
 import qrcode
 import io
 import base64
@@ -265,6 +267,16 @@ def get_material_details(material_id):
 @login_required
 def get_consumption_forecast():
     """Gibt erweiterte Verbrauchsprognosen zurück"""
+    forecasts = cached_analytics('consumption_forecast', _compute_consumption_forecast,
+                                 tags=('job', 'g_code_file', 'filament_type', 'filament_spool'))
+    return jsonify({
+        'status': 'success',
+        'forecasts': forecasts
+    })
+
+
+def _compute_consumption_forecast():
+    """Verbrauchsprognose pro Material auf Basis der letzten 30 Tage."""
     filament_types = FilamentType.query.all()
     forecasts = []
     
@@ -339,10 +351,7 @@ def get_consumption_forecast():
             'recent_jobs_count': len(recent_jobs)
         })
     
-    return jsonify({
-        'status': 'success',
-        'forecasts': forecasts
-    })
+    return forecasts
 
 @filament_api_bp.route('/qr-code/<int:spool_id>')
 @login_required
@@ -415,6 +424,7 @@ def update_spool_weight():
         # Nur die letzten 10 Messungen behalten
         spool.weight_measurements = measurements[-10:]
         
+        invalidate_low_stock_cache()
         db.session.commit()
         
         return jsonify({
@@ -1,56 +1,58 @@
 # routes/gantt.py
 from flask import Blueprint, jsonify
 from flask_login import login_required
-from models import Printer, Job, JobStatus
-import datetime
+from models import Printer, Job, JobStatus, GCodeFile, FilamentType, TimeWindow, JobDependency
+from http_cache import conditional_json, time_bucket, get_entity_versions
+from analytics_cache import cached_analytics
+from horizon_scheduler import compute_farm_schedule
 
 gantt_bp = Blueprint('gantt_bp', __name__)
 
+# Geplante, noch nicht zugewiesene Jobs (PENDING) erscheinen grau
+STATUS_COLORS = {
+    JobStatus.PRINTING: '#dc3545',
+    JobStatus.ASSIGNED: '#ffc107',
+    JobStatus.QUEUED: '#0dcaf0',
+}
+
+# Tabellen, aus denen der Farmplan berechnet wird
+SCHEDULE_MODELS = (Job, Printer, GCodeFile, FilamentType, TimeWindow, JobDependency)
+SCHEDULE_BUCKET_SECONDS = 60
+
+
+def _farm_schedule():
+    """Farmplan, einmal je Datenstand und Minute berechnet und von allen Drucker-Ansichten geteilt."""
+    entities = sorted(model.__table__.name for model in SCHEDULE_MODELS)
+    versions = get_entity_versions(entities)
+    key = ('farm_schedule', tuple(sorted(versions.items())), time_bucket(SCHEDULE_BUCKET_SECONDS))
+    return cached_analytics(key, compute_farm_schedule, tags=entities, ttl=SCHEDULE_BUCKET_SECONDS)
+
+
 @gantt_bp.route('/printer/<int:printer_id>')
 @login_required
+@conditional_json(*SCHEDULE_MODELS, extra=lambda versions: time_bucket(SCHEDULE_BUCKET_SECONDS))
 def printer_gantt(printer_id):
     """
     Bereitet die Daten für das Gantt-Diagramm eines Druckers vor.
-    Beinhaltet den aktuellen Job, sowie alle zugewiesenen und in der Warteschlange befindlichen Jobs.
+    Beinhaltet den aktuellen Job, alle zugewiesenen und in der Warteschlange befindlichen Jobs
+    sowie wartende Jobs, die der Farmplan diesem Drucker zuordnet.
     """
-    printer = Printer.query.get_or_404(printer_id)
-    jobs = printer.jobs.filter(
-        Job.status.in_([JobStatus.PRINTING, JobStatus.ASSIGNED, JobStatus.QUEUED])
-    ).order_by(Job.priority.desc(), Job.created_at.asc()).all()
+    Printer.query.get_or_404(printer_id)
+    # Zeiten aus dem farmweiten Plan: berücksichtigt Zeitfenster, Abhängigkeiten
+    # und Aufträge, die noch keinem Drucker zugewiesen sind
+    schedule = _farm_schedule()
 
     series_data = []
-    
-    # Startzeitpunkt für die Planung ist jetzt
-    last_end_time = datetime.datetime.utcnow()
-
-    for job in jobs:
-        # Wenn der Job bereits läuft
-        if job.status == JobStatus.PRINTING and job.start_time:
-            start_time = job.start_time
-            if job.gcode_file and job.gcode_file.estimated_print_time_min:
-                duration_seconds = job.gcode_file.estimated_print_time_min * 60
-                end_time = start_time + datetime.timedelta(seconds=duration_seconds)
-            else: # Fallback, wenn keine Zeit vorhanden ist
-                end_time = start_time + datetime.timedelta(hours=1)
-        # Für geplante Jobs
-        else:
-            start_time = last_end_time
-            if job.gcode_file and job.gcode_file.estimated_print_time_min:
-                duration_seconds = job.gcode_file.estimated_print_time_min * 60
-                end_time = start_time + datetime.timedelta(seconds=duration_seconds)
-            else: # Fallback
-                end_time = start_time + datetime.timedelta(hours=1)
-        
+    for entry in schedule.for_printer(printer_id):
         series_data.append({
-            'x': job.name,
+            'x': entry.name,
             'y': [
-                start_time.timestamp() * 1000,
-                end_time.timestamp() * 1000
+                entry.start.timestamp() * 1000,
+                entry.end.timestamp() * 1000
             ],
-            'fillColor': '#dc3545' if job.status == JobStatus.PRINTING else ('#ffc107' if job.status == JobStatus.ASSIGNED else '#0dcaf0')
+            'fillColor': STATUS_COLORS.get(entry.status, '#adb5bd'),
+            'job_id': entry.job_id,
+            'late': bool(entry.deadline and entry.end > entry.deadline)
         })
 
-        # Die Endzeit dieses Jobs ist die Startzeit des nächsten
-        last_end_time = end_time
-
-    return jsonify([{'name': 'Belegung', 'data': series_data}])
\ No newline at end of file
+    return jsonify([{'name': 'Belegung', 'data': series_data}])
@@ -1,16 +1,23 @@
 # /routes/jobs.py
 import io
 import csv
-from flask import Response
+import json
+from flask import Response, stream_with_context
 import codecs
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from extensions import db
-from models import Job, Printer, GCodeFile, FilamentType, JobStatus, JobQuality, PrinterStatus, PrintSnapshot, FilamentSpool, JobDependency, DependencyType 
+from models import Job, Printer, GCodeFile, FilamentType, JobStatus, JobQuality, PrinterStatus, PrintSnapshot, FilamentSpool, JobDependency, DependencyType, CostCalculation
 from flask_login import login_required
 from .forms import update_model_from_form
 import os
-from sqlalchemy import or_
+from sqlalchemy import or_, select
+from sqlalchemy.orm import joinedload
+from pagination import keyset_paginate, SortKey, InvalidCursor, DEFAULT_PER_PAGE
+from search_index import search_filter
+from job_import import JobImporter, file_checksum, get_import_progress, DEFAULT_CHUNK_SIZE as DEFAULT_IMPORT_CHUNK_SIZE
+
+ARCHIVE_PER_PAGE = 50
 
 jobs_bp = Blueprint('jobs_bp', __name__, url_prefix='/jobs')
 
@@ -69,12 +76,14 @@ def dashboard():
 @jobs_bp.route('/')
 @login_required
 def list_jobs():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
     search_term = request.args.get('search', '')
     
     sort_by = request.args.get('sort_by', 'created_at')
     direction = request.args.get('direction', 'desc')
     status_filter = request.args.get('status')
+    wants_json = request.args.get('format') == 'json'
 
     query = Job.query.filter(Job.is_archived == False)
 
@@ -83,30 +92,75 @@ def list_jobs():
             valid_status = JobStatus[status_filter.upper()]
             query = query.filter(Job.status == valid_status)
         except KeyError:
-            flash(f"Ungültiger Filter-Status '{status_filter}' wurde ignoriert.", "warning")
+            if not wants_json:
+                flash(f"Ungültiger Filter-Status '{status_filter}' wurde ignoriert.", "warning")
             status_filter = None
 
     if search_term:
-        query = query.filter(Job.name.ilike(f'%{search_term}%'))
+        query = query.filter(search_filter('jobs', search_term))
 
     allowed_sort_columns = {
         'name': Job.name, 'status': Job.status, 'priority': Job.priority,
         'created_at': Job.created_at, 'start_time': Job.start_time, 'end_time': Job.end_time
     }
-    sort_column = allowed_sort_columns.get(sort_by, Job.created_at)
-    sort_expression = sort_column.asc() if direction == 'asc' else sort_column.desc()
+    if sort_by not in allowed_sort_columns:
+        sort_by = 'created_at'
+    descending = direction != 'asc'
+    sort_keys = [
+        SortKey(allowed_sort_columns[sort_by], descending=descending),
+        SortKey(Job.id, descending=descending)
+    ]
 
-    pagination = query.order_by(sort_expression).paginate(page=page, per_page=15, error_out=False)
-    jobs = pagination.items
-    
-    return render_template('jobs/list.html', jobs=jobs, pagination=pagination, current_sort=sort_by, current_direction=direction, current_status=status_filter, search_term=search_term)
+    try:
+        page = keyset_paginate(query, sort_keys, cursor=cursor, per_page=per_page)
+    except InvalidCursor as e:
+        if wants_json:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        flash('Ungültiger Seitenverweis, es wird die erste Seite angezeigt.', 'warning')
+        page = keyset_paginate(query, sort_keys, per_page=per_page)
+
+    if wants_json:
+        return jsonify(page.to_dict(_job_list_entry))
+
+    return render_template('jobs/list.html', jobs=page.items, pagination=page, current_sort=sort_by, current_direction=direction, current_status=status_filter, search_term=search_term)
 
 
 @jobs_bp.route('/archive')
 @login_required
 def archive_list():
-    archived_jobs = Job.query.filter(Job.is_archived == True).order_by(Job.end_time.desc()).all()
-    return render_template('jobs/archive_list.html', jobs=archived_jobs)
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', ARCHIVE_PER_PAGE, type=int)
+    wants_json = request.args.get('format') == 'json'
+
+    query = Job.query.options(joinedload(Job.assigned_printer)).filter(Job.is_archived == True)
+    sort_keys = [SortKey(Job.end_time, descending=True), SortKey(Job.id, descending=True)]
+
+    try:
+        page = keyset_paginate(query, sort_keys, cursor=cursor, per_page=per_page)
+    except InvalidCursor as e:
+        if wants_json:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        flash('Ungültiger Seitenverweis, es wird die erste Seite angezeigt.', 'warning')
+        page = keyset_paginate(query, sort_keys, per_page=per_page)
+
+    if wants_json:
+        return jsonify(page.to_dict(_job_list_entry))
+    return render_template('jobs/archive_list.html', jobs=page.items, pagination=page)
+
+
+def _job_list_entry(job):
+    """JSON-Darstellung eines Auftrags für die Listen-Endpunkte."""
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status.value if job.status else None,
+        'priority': job.priority,
+        'printer_id': job.printer_id,
+        'quality_assessment': job.quality_assessment.value if job.quality_assessment else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'start_time': job.start_time.isoformat() if job.start_time else None,
+        'end_time': job.end_time.isoformat() if job.end_time else None,
+    }
 
 # ##### FIX START: job_details und edit_job zusammengeführt #####
 @jobs_bp.route('/<int:job_id>', methods=['GET', 'POST'])
@@ -343,55 +397,58 @@ def assign_job():
 
     return redirect(url_for('jobs_bp.dashboard'))
 
-def handle_csv_import(reader):
-    required_headers = ['name', 'target_quantity_parts', 'material_short_text', 'gcode_filename']
-    
-    if not all(h in reader.fieldnames for h in required_headers):
-        missing = [h for h in required_headers if h not in reader.fieldnames]
-        raise ValueError(f"Fehlende Spalten in der CSV-Datei: {', '.join(missing)}")
-
-    material_cache = {f"{mat.manufacturer.lower()} {mat.name.lower()}": mat.id for mat in FilamentType.query.all()}
-    gcode_cache = {gcode.filename: gcode.id for gcode in GCodeFile.query.all()}
-    
-    for i, row in enumerate(reader):
-        if not any(row.values()): continue
-        try:
-            material_text = row.get('material_short_text', '').strip().lower()
-            material_id = material_cache.get(material_text)
-            gcode_filename = row.get('gcode_filename', '').strip()
-            gcode_id = gcode_cache.get(gcode_filename)
-            end_date = None
-            if row.get('estimated_end_date'):
-                end_date = datetime.strptime(row['estimated_end_date'], '%d.%m.%Y').date()
-
-            new_job = Job( name=row['name'], target_quantity_parts=int(row['target_quantity_parts']), material_short_text=row.get('material_short_text'), estimated_end_date=end_date, priority=int(row.get('priority', 1)), status=JobStatus.PENDING, is_archived=False, required_filament_type_id=material_id, gcode_file_id=gcode_id, material_number=row.get('material_number') )
-            db.session.add(new_job)
-        except (ValueError, TypeError) as e:
-            db.session.rollback()
-            raise ValueError(f"Fehler in CSV-Zeile {i+2}: {row}. Falscher Datentyp? Details: {e}")
-    db.session.commit()
-
 @jobs_bp.route('/import', methods=['POST'])
 @login_required
 def import_csv():
-    if 'file' not in request.files:
-        flash('Keine Datei für den Upload ausgewählt.', 'danger')
+    """
+    Importiert Aufträge aus einer CSV-Datei (Semikolon-getrennt).
+
+    Formularfelder:
+        dry_run: Nur prüfen, nichts speichern
+        resume: Einen abgebrochenen Import derselben Datei fortsetzen
+    Mit ?format=json wird der Importbericht als JSON zurückgegeben.
+    """
+    wants_json = request.args.get('format') == 'json'
+
+    def fail(message, status=400):
+        if wants_json:
+            return jsonify({'status': 'error', 'message': message}), status
+        flash(message, 'danger')
         return redirect(url_for('jobs_bp.list_jobs'))
+
+    if 'file' not in request.files:
+        return fail('Keine Datei für den Upload ausgewählt.')
     
     file = request.files['file']
     if file.filename == '' or not file.filename.lower().endswith('.csv'):
-        flash('Bitte wählen Sie eine gültige .csv-Datei aus.', 'danger')
-        return redirect(url_for('jobs_bp.list_jobs'))
-        
+        return fail('Bitte wählen Sie eine gültige .csv-Datei aus.')
+
+    dry_run = request.form.get('dry_run') in ('1', 'true', 'on')
+    resume = request.form.get('resume') in ('1', 'true', 'on')
+
     try:
-        stream = codecs.iterdecode(file.stream, 'utf-8-sig')
-        reader = csv.DictReader(stream, delimiter=';')
-        handle_csv_import(reader)
-        flash('Aufträge erfolgreich aus CSV importiert.', 'success')
+        checksum = file_checksum(file.stream)
+        start_row = get_import_progress(checksum) if resume else 0
+        reader = csv.DictReader(codecs.iterdecode(file.stream, 'utf-8-sig'), delimiter=';')
+        report = JobImporter(
+            chunk_size=current_app.config.get('JOB_IMPORT_CHUNK_SIZE', DEFAULT_IMPORT_CHUNK_SIZE),
+            dry_run=dry_run
+        ).run(reader, start_row=start_row, checksum=checksum)
     except Exception as e:
         db.session.rollback()
-        flash(f'Fehler beim Importieren der CSV-Datei: {e}', 'danger')
-        
+        return fail(f'Fehler beim Importieren der CSV-Datei: {e}', 500 if not isinstance(e, ValueError) else 400)
+
+    if wants_json:
+        return jsonify({'status': 'success', 'report': report.to_dict()})
+
+    verb = 'geprüft' if dry_run else 'importiert'
+    flash(f'{report.imported} Aufträge {verb}, {report.error_count} fehlerhafte Zeilen'
+          + (f', {report.skipped} bereits importierte Zeilen übersprungen.' if report.skipped else '.'),
+          'success' if not report.error_count else 'warning')
+    for error in report.errors[:10]:
+        flash(f'Zeile {error.row}: {error.message}', 'danger')
+    if report.error_count > 10:
+        flash(f'... und {report.error_count - 10} weitere Fehler.', 'danger')
     return redirect(url_for('jobs_bp.list_jobs'))
 
 def get_job_field_map():
@@ -408,14 +465,93 @@ def get_job_field_map():
 @jobs_bp.route('/archive/export')
 @login_required
 def export_archive():
-    archived_jobs = Job.query.filter(Job.is_archived == True).order_by(Job.end_time.desc()).all()
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=';')
-    writer.writerow([ 'ID', 'Name', 'Status', 'Qualitaet', 'Drucker', 'GCode-Datei', 'Filament-Typ', 'Erstellt am', 'Gestartet am', 'Beendet am', 'Druckdauer (Min)', 'Materialkosten', 'Maschinenkosten', 'Personalkosten', 'Gesamtkosten' ])
-    for job in archived_jobs:
-        writer.writerow([ job.id, job.name, job.status.value if job.status else '', job.quality_assessment.value if job.quality_assessment else '', job.assigned_printer.name if job.assigned_printer else 'N/A', job.gcode_file.filename if job.gcode_file else 'N/A', job.required_filament_type.name if job.required_filament_type else 'N/A', job.created_at.strftime('%Y-%m-%d %H:%M:%S') if job.created_at else '', job.start_time.strftime('%Y-%m-%d %H:%M:%S') if job.start_time else '', job.end_time.strftime('%Y-%m-%d %H:%M:%S') if job.end_time else '', round(job.actual_print_duration_s / 60, 2) if job.actual_print_duration_s else 0, job.material_cost, job.machine_cost, job.personnel_cost, job.total_cost ])
-    output.seek(0)
-    return Response( output, mimetype="text/csv", headers={"Content-Disposition": "attachment;filename=archivierte_auftraege.csv"} )
+    """
+    Exportiert das Archiv als CSV (Standard) oder JSONL (?format=jsonl).
+
+    Die Antwort wird gestreamt: Aufträge werden blockweise mit vorab
+    geladenen Beziehungen gelesen und sofort geschrieben, sodass der
+    Speicherbedarf unabhängig von der Archivgröße konstant bleibt.
+    """
+    if request.args.get('format') == 'jsonl':
+        generator, mimetype, filename = _archive_jsonl_lines(), 'application/x-ndjson', 'archivierte_auftraege.jsonl'
+    else:
+        generator, mimetype, filename = _archive_csv_lines(), 'text/csv', 'archivierte_auftraege.csv'
+    return Response(
+        stream_with_context(generator), mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment;filename={filename}", "X-Accel-Buffering": "no"}
+    )
+
+
+ARCHIVE_EXPORT_CHUNK_SIZE = 500
+ARCHIVE_EXPORT_HEADER = [ 'ID', 'Name', 'Status', 'Qualitaet', 'Drucker', 'GCode-Datei', 'Filament-Typ', 'Erstellt am', 'Gestartet am', 'Beendet am', 'Druckdauer (Min)', 'Materialkosten', 'Maschinenkosten', 'Personalkosten', 'Gesamtkosten' ]
+
+
+def _iter_archive_export_chunks():
+    """Liefert archivierte Aufträge blockweise samt ihrer letzten Kostenkalkulation."""
+    stmt = select(Job).options(
+        joinedload(Job.assigned_printer), joinedload(Job.gcode_file), joinedload(Job.required_filament_type)
+    ).filter(Job.is_archived == True).order_by(Job.end_time.desc(), Job.id.desc())
+    result = db.session.execute(stmt.execution_options(yield_per=ARCHIVE_EXPORT_CHUNK_SIZE))
+    for chunk in result.scalars().partitions():
+        # Eine Abfrage je Block: jeweils die neueste Kalkulation pro Auftrag
+        calculations = {}
+        rows = CostCalculation.query.filter(
+            CostCalculation.job_id.in_([job.id for job in chunk])
+        ).order_by(CostCalculation.created_at, CostCalculation.id).all()
+        for calculation in rows:
+            calculations[calculation.job_id] = calculation
+        yield [(job, calculations.get(job.id)) for job in chunk]
+
+
+def _archive_export_row(job, calculation):
+    def fmt(value):
+        return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+    total_cost = job.actual_cost
+    if total_cost is None and calculation:
+        total_cost = calculation.total_cost_without_margin
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status.value if job.status else '',
+        'quality': job.quality_assessment.value if job.quality_assessment else '',
+        'printer': job.assigned_printer.name if job.assigned_printer else 'N/A',
+        'gcode_file': job.gcode_file.filename if job.gcode_file else 'N/A',
+        'filament_type': job.required_filament_type.name if job.required_filament_type else 'N/A',
+        'created_at': fmt(job.created_at),
+        'start_time': fmt(job.start_time),
+        'end_time': fmt(job.end_time),
+        'print_duration_min': round(job.actual_print_duration_s / 60, 2) if job.actual_print_duration_s else 0,
+        'material_cost': calculation.material_cost if calculation else None,
+        'machine_cost': calculation.machine_cost if calculation else None,
+        'personnel_cost': calculation.personnel_cost if calculation else None,
+        'total_cost': total_cost,
+    }
+
+
+def _archive_csv_lines():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+
+    def drain():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    writer.writerow(ARCHIVE_EXPORT_HEADER)
+    yield drain()
+    for chunk in _iter_archive_export_chunks():
+        for job, calculation in chunk:
+            writer.writerow(['' if v is None else v for v in _archive_export_row(job, calculation).values()])
+        yield drain()
+
+
+def _archive_jsonl_lines():
+    for chunk in _iter_archive_export_chunks():
+        yield ''.join(
+            json.dumps(_archive_export_row(job, calculation), ensure_ascii=False) + '\n'
+            for job, calculation in chunk
+        )
 
 @jobs_bp.route('/calendar')
 @login_required
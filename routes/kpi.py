@@ -1,5 +1,5 @@
 # /routes/kpi.py
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required
 from sqlalchemy import func, case, desc
 from extensions import db
@@ -9,13 +9,41 @@ from models import (Printer, Job, JobStatus, JobQuality, FilamentType, GCodeFile
 from datetime import datetime, timedelta
 import json
 from collections import defaultdict
+from kpi_rollup import printer_totals, daily_totals
+from analytics_cache import cached_analytics, get_analytics_cache
+from utilization import compute_utilization
 
 kpi_bp = Blueprint('kpi_bp', __name__, url_prefix='/kpi')
 
 
+# Die Warteschlange ändert sich häufig, daher kürzere TTL als die übrigen Auswertungen
+QUEUE_STATUS_TTL_SECONDS = 30
+# Offene Statusintervalle wachsen mit der Zeit, daher ebenfalls kurze TTL
+UTILIZATION_TTL_SECONDS = 60
+UTILIZATION_CACHE_TAGS = ('printer', 'printer_status_interval')
+
+# Tabellen, deren Änderung das gecachte Dashboard veraltet
+DASHBOARD_CACHE_TAGS = ('printer', 'job', 'printer_daily_stats', 'printer_status_interval', 'g_code_file',
+                        'filament_type', 'filament_spool', 'maintenance_log', 'cost_calculation', 'project',
+                        'job_dependency')
+
+
 @kpi_bp.route('/dashboard')
 @login_required
 def dashboard():
+    context = cached_analytics('kpi_dashboard', compute_dashboard_context, tags=DASHBOARD_CACHE_TAGS)
+    return render_template('kpi/dashboard.html', **context)
+
+
+@kpi_bp.route('/api/cache-stats')
+@login_required
+def api_cache_stats():
+    """Treffer-/Fehlzugriffs-Statistik des Analytics-Caches"""
+    return jsonify(get_analytics_cache().stats())
+
+
+def compute_dashboard_context():
+    """Berechnet alle Kennzahlen des KPI-Dashboards (nur einfache Daten, cachebar)."""
     # --- 1. LIVE-FARM-STATUS ---
     printer_status_counts = db.session.query(
         Printer.status,
@@ -23,7 +51,7 @@ def dashboard():
     ).group_by(Printer.status).all()
     
     live_status = {
-        'total': Printer.query.count(),
+        'total': sum(count for status, count in printer_status_counts),
         'printing': 0,
         'idle': 0,
         'maintenance': 0,
@@ -40,59 +68,55 @@ def dashboard():
     ).count()
 
     # --- 2. PRODUKTIONS-ANALYSE (LETZTE 30 TAGE) ---
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    completed_jobs_query = Job.query.filter(
-        Job.status == JobStatus.COMPLETED,
-        Job.end_time >= thirty_days_ago
-    )
-    
-    total_completed_30d = completed_jobs_query.count()
-    successful_jobs_30d = completed_jobs_query.filter(Job.quality_assessment == JobQuality.SUCCESSFUL).count()
-    failed_jobs_30d = completed_jobs_query.filter(Job.quality_assessment == JobQuality.FAILED).count()
+    # Tages- und Druckersummen kommen aus den Rollups (printer_daily_stats),
+    # der Aufwand hängt damit nur von der Anzahl der Tage/Drucker ab.
+    now = datetime.utcnow()
+    thirty_days_ago = now - timedelta(days=30)
+    seven_days_ago = now - timedelta(days=7)
+    daily_stats = daily_totals(thirty_days_ago.date())
+    totals_by_printer = printer_totals(seven_days_ago.date())
+    
+    total_completed_30d = sum(d.jobs for d in daily_stats.values())
+    successful_jobs_30d = sum(d.successful for d in daily_stats.values())
+    failed_jobs_30d = sum(d.failed for d in daily_stats.values())
 
     farm_success_rate_30d = (successful_jobs_30d / (successful_jobs_30d + failed_jobs_30d) * 100) if (successful_jobs_30d + failed_jobs_30d) > 0 else 100
     
     job_throughput_30d = total_completed_30d / 30.0
 
-    material_trend = db.session.query(
-        func.date(Job.completed_at),
-        func.sum(GCodeFile.material_needed_g)
-    ).join(GCodeFile, Job.gcode_file_id == GCodeFile.id)\
-     .filter(Job.completed_at >= thirty_days_ago)\
-     .group_by(func.date(Job.completed_at))\
-     .order_by(func.date(Job.completed_at))\
-     .all()
+    material_trend = [(day, d.material_g) for day, d in daily_stats.items() if d.material_g]
     
     material_trend_chart = {
-        'labels': [datetime.strptime(d, '%Y-%m-%d').strftime('%d.%m') for d, v in material_trend if d],
-        'data': [round(v, 2) for d, v in material_trend if v is not None]
+        'labels': [day.strftime('%d.%m') for day, v in material_trend],
+        'data': [round(v, 2) for day, v in material_trend]
     }
 
     # --- 3. DRUCKER-PERFORMANCE ---
     printers = Printer.query.all()
     printer_performance = []
+
+    # Tatsächliche Belegung aus den Statusintervallen (eine Abfrage für alle Drucker)
+    status_report = compute_utilization(seven_days_ago, now, bucket_seconds=24 * 3600,
+                                        printer_ids=[p.id for p in printers], now=now)
+    known_seconds_7d = dict(zip(status_report.printer_ids, status_report.state_seconds().sum(axis=1)))
+    status_utilization_7d = dict(zip(status_report.printer_ids, status_report.utilization()))
     
     for printer in printers:
-        jobs = Job.query.filter_by(printer_id=printer.id, status=JobStatus.COMPLETED).all()
-        total_jobs = len(jobs)
-        successful_jobs = len([j for j in jobs if j.quality_assessment == JobQuality.SUCCESSFUL])
+        totals = totals_by_printer.get(printer.id)
+        total_jobs = totals.jobs if totals else 0
+        successful_jobs = totals.successful if totals else 0
         
         success_rate = (successful_jobs / total_jobs * 100) if total_jobs > 0 else 0
         
-        total_hours = sum([j.actual_print_duration_s or 0 for j in jobs]) / 3600
+        total_hours = (totals.print_seconds if totals else 0) / 3600
         
-        # 7-Tage Auslastung
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        jobs_7d = Job.query.filter(
-            Job.printer_id == printer.id,
-            Job.start_time >= seven_days_ago,
-            Job.status == JobStatus.COMPLETED
-        ).all()
-        
-        print_time_7d = sum([j.actual_print_duration_s or 0 for j in jobs_7d]) / 3600
-        total_time_7d = 7 * 24
-        utilization_7d = (print_time_7d / total_time_7d * 100) if total_time_7d > 0 else 0
+        # 7-Tage Auslastung: aus der Statushistorie, ohne Historie aus den Druckzeiten geschätzt
+        if known_seconds_7d.get(printer.id):
+            utilization_7d = status_utilization_7d[printer.id] * 100
+        else:
+            print_time_7d = (totals.recent_print_seconds if totals else 0) / 3600
+            total_time_7d = 7 * 24
+            utilization_7d = (print_time_7d / total_time_7d * 100) if total_time_7d > 0 else 0
         
         printer_performance.append({
             'id': printer.id,
@@ -109,74 +133,69 @@ def dashboard():
     printer_performance.sort(key=lambda x: x['success_rate'], reverse=True)
 
     # Uptime Chart (7 Tage)
-    uptime_data = []
-    for i in range(7):
-        day = datetime.utcnow() - timedelta(days=7-i)
-        day_str = day.strftime('%d.%m')
-        
-        day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        
-        day_print_time = db.session.query(func.sum(Job.actual_print_duration_s)).filter(
-            Job.start_time >= day_start,
-            Job.start_time < day_end,
-            Job.status == JobStatus.COMPLETED
-        ).scalar() or 0
-        
-        uptime_data.append(round(day_print_time / 3600, 2))
+    last_7_days = [(now - timedelta(days=7-i)).date() for i in range(7)]
+    print_seconds_by_day = {day: d.print_seconds for day, d in daily_stats.items()}
+    uptime_data = [round(print_seconds_by_day.get(day, 0) / 3600, 2) for day in last_7_days]
     
     uptime_chart_data = {
-        'labels': [(datetime.utcnow() - timedelta(days=7-i)).strftime('%d.%m') for i in range(7)],
+        'labels': [day.strftime('%d.%m') for day in last_7_days],
         'data': uptime_data
     }
 
-    # Filament Stock
-    filament_stock = FilamentSpool.query.filter(FilamentSpool.current_weight_g > 0).join(FilamentType).all()
-
     # --- 4. KOSTEN & WIRTSCHAFTLICHKEIT ---
-    avg_duration_success = db.session.query(func.avg(Job.actual_print_duration_s)).filter(
-        Job.quality_assessment == JobQuality.SUCCESSFUL
-    ).scalar() or 0
-    
-    avg_duration_failed = db.session.query(func.avg(Job.actual_print_duration_s)).filter(
-        Job.quality_assessment == JobQuality.FAILED
-    ).scalar() or 0
+    # Kennzahlen nach Bewertung in einer Abfrage (bedingte Aggregate)
+    is_success = Job.quality_assessment == JobQuality.SUCCESSFUL
+    is_failed = Job.quality_assessment == JobQuality.FAILED
+    quality_stats = db.session.query(
+        func.avg(case((is_success, Job.actual_print_duration_s))).label('avg_duration_success'),
+        func.avg(case((is_failed, Job.actual_print_duration_s))).label('avg_duration_failed'),
+        func.sum(case((is_success, GCodeFile.material_needed_g))).label('material_success'),
+        func.sum(case((is_failed, GCodeFile.material_needed_g))).label('material_failed'),
+        func.count(case((is_success | is_failed, Job.id))).label('reviewed'),
+        func.count(case((is_failed & Job.end_time.isnot(None), Job.id))).label('failures'),
+        func.min(case((is_failed, Job.end_time))).label('first_failure'),
+        func.max(case((is_failed, Job.end_time))).label('last_failure')
+    ).outerjoin(GCodeFile, Job.gcode_file_id == GCodeFile.id).one()
+    
+    avg_duration_success = quality_stats.avg_duration_success or 0
+    avg_duration_failed = quality_stats.avg_duration_failed or 0
 
-    cost_data = db.session.query(
-        func.sum(Job.actual_cost).label('total'),
-        func.avg(Job.actual_cost).label('avg')
-    ).filter(Job.actual_cost.isnot(None)).one()
+    total_cost_sum = sum(t.cost for t in totals_by_printer.values())
+    total_printed_jobs_all_time = sum(t.jobs for t in totals_by_printer.values())
     
     cost_chart_data = {
-        'total': round(cost_data.total or 0, 2),
-        'average': round(cost_data.avg or 0, 2)
+        'total': round(total_cost_sum, 2),
+        'average': round(total_cost_sum / total_printed_jobs_all_time, 2) if total_printed_jobs_all_time else 0
     }
 
-    failures_by_material = db.session.query(
+    # Alle Kennzahlen pro Materialtyp in einer gruppierten Abfrage
+    is_completed = Job.status == JobStatus.COMPLETED
+    stats_by_material = db.session.query(
         FilamentType.material_type,
-        func.count(Job.id)
-    ).join(Job.required_filament_type).filter(
-        Job.quality_assessment == JobQuality.FAILED
-    ).group_by(FilamentType.material_type).all()
+        func.sum(case((is_failed, 1), else_=0)).label('failed'),
+        func.sum(GCodeFile.material_needed_g).label('material_g'),
+        func.sum(case((is_completed, 1), else_=0)).label('completed'),
+        func.sum(case((is_completed & is_success, 1), else_=0)).label('successful')
+    ).join(Job.required_filament_type)\
+     .outerjoin(GCodeFile, Job.gcode_file_id == GCodeFile.id)\
+     .group_by(FilamentType.material_type).all()
     
+    failures_by_material = [m for m in stats_by_material if m.failed]
     failures_by_material_chart = {
-        'labels': [f[0] for f in failures_by_material],
-        'data': [f[1] for f in failures_by_material]
+        'labels': [m.material_type for m in failures_by_material],
+        'data': [m.failed for m in failures_by_material]
     }
 
     # All-Time Stats
-    total_print_hours_all_time = db.session.query(func.sum(Job.actual_print_duration_s)).scalar() or 0
-    total_print_hours_all_time = total_print_hours_all_time / 3600
-    
-    total_filament_all_time = db.session.query(func.sum(GCodeFile.material_needed_g)).join(Job.gcode_file).scalar() or 0
+    total_print_hours_all_time = sum(t.print_seconds for t in totals_by_printer.values()) / 3600
     
-    total_printed_jobs_all_time = Job.query.filter(Job.status == JobStatus.COMPLETED).count()
+    total_filament_all_time = sum(t.material_g for t in totals_by_printer.values())
 
     # Print Hours per Printer
-    print_hours_per_printer = db.session.query(
-        Printer.name,
-        func.sum(Job.actual_print_duration_s) / 3600
-    ).join(Job, Printer.id == Job.printer_id).group_by(Printer.name).all()
+    print_hours_per_printer = [
+        (printer.name, totals_by_printer[printer.id].print_seconds / 3600)
+        for printer in printers if printer.id in totals_by_printer
+    ]
     
     print_hours_per_printer_chart = {
         'labels': [p[0] for p in print_hours_per_printer],
@@ -184,27 +203,16 @@ def dashboard():
     }
 
     # Material Consumption
-    material_consumption = db.session.query(
-        FilamentType.material_type,
-        func.sum(GCodeFile.material_needed_g) / 1000
-    ).join(Job.required_filament_type).join(Job.gcode_file).group_by(FilamentType.material_type).all()
+    material_consumption = [m for m in stats_by_material if m.material_g is not None]
     
     material_consumption_chart = {
-        'labels': [m[0] for m in material_consumption],
-        'data': [round(m[1], 2) for m in material_consumption]
+        'labels': [m.material_type for m in material_consumption],
+        'data': [round(m.material_g / 1000, 2) for m in material_consumption]
     }
 
-    # Recent Activity
-    recent_jobs = Job.query.filter(Job.status == JobStatus.COMPLETED).order_by(Job.end_time.desc()).limit(10).all()
-    recent_maintenance = MaintenanceLog.query.order_by(MaintenanceLog.timestamp.desc()).limit(10).all()
-    
-    farm_activity = sorted(recent_jobs + recent_maintenance, 
-                           key=lambda x: x.end_time if hasattr(x, 'end_time') and x.end_time else (x.timestamp if hasattr(x, 'timestamp') else datetime.min), 
-                           reverse=True)
-
     # Material Efficiency
-    material_success = db.session.query(func.sum(GCodeFile.material_needed_g)).join(Job.gcode_file).filter(Job.quality_assessment == JobQuality.SUCCESSFUL).scalar() or 0
-    material_failed = db.session.query(func.sum(GCodeFile.material_needed_g)).join(Job.gcode_file).filter(Job.quality_assessment == JobQuality.FAILED).scalar() or 0
+    material_success = quality_stats.material_success or 0
+    material_failed = quality_stats.material_failed or 0
     material_efficiency_chart = {
         'labels': ['Erfolgreich', 'Fehlgeschlagen'],
         'data': [round(material_success, 2), round(material_failed, 2)]
@@ -226,17 +234,11 @@ def dashboard():
     }
 
     # Success Rate by Material
-    success_by_material = db.session.query(
-        FilamentType.material_type,
-        func.count(Job.id).label('total'),
-        func.sum(case((Job.quality_assessment == JobQuality.SUCCESSFUL, 1), else_=0)).label('success')
-    ).join(Job.required_filament_type)\
-     .filter(Job.status == JobStatus.COMPLETED)\
-     .group_by(FilamentType.material_type).all()
+    success_by_material = [m for m in stats_by_material if m.completed]
     
     success_rate_material_chart = {
-        'labels': [s.material_type for s in success_by_material],
-        'data': [round(s.success / s.total * 100, 1) if s.total > 0 else 100 for s in success_by_material]
+        'labels': [m.material_type for m in success_by_material],
+        'data': [round(m.successful / m.completed * 100, 1) for m in success_by_material]
     }
 
     # --- 5. WEITERE BESTEHENDE KPIs ---
@@ -280,26 +282,16 @@ def dashboard():
         'data': [round(s[1] or 0, 2) for s in stock_by_material]
     }
 
-    daily_jobs_30d = db.session.query(
-        func.date(Job.completed_at).label('day'),
-        func.sum(case((Job.quality_assessment == JobQuality.SUCCESSFUL, 1), else_=0)).label('successful'),
-        func.sum(case((Job.quality_assessment == JobQuality.FAILED, 1), else_=0)).label('failed')
-    ).filter(Job.completed_at >= thirty_days_ago, Job.status == JobStatus.COMPLETED)\
-     .group_by('day').order_by('day').all()
-    
     production_trend_chart = {
-        'labels': [datetime.strptime(d.day, '%Y-%m-%d').strftime('%d.%m') for d in daily_jobs_30d],
-        'successful': [d.successful for d in daily_jobs_30d],
-        'failed': [d.failed for d in daily_jobs_30d]
+        'labels': [day.strftime('%d.%m') for day in daily_stats],
+        'successful': [d.successful for d in daily_stats.values()],
+        'failed': [d.failed for d in daily_stats.values()]
     }
 
-    costs_per_printer = db.session.query(
-        Printer.name,
-        func.sum(Job.actual_cost)
-    ).join(Job, Printer.id == Job.printer_id)\
-     .filter(Job.actual_cost.isnot(None))\
-     .group_by(Printer.name)\
-     .order_by(desc(func.sum(Job.actual_cost))).all()
+    costs_per_printer = sorted(
+        [(printer.name, totals_by_printer[printer.id].cost) for printer in printers if printer.id in totals_by_printer],
+        key=lambda p: p[1], reverse=True
+    )
     costs_per_printer_chart = {
         'labels': [p[0] for p in costs_per_printer],
         'data': [round(p[1], 2) for p in costs_per_printer]
@@ -319,46 +311,29 @@ def dashboard():
     }
     
     # MTBF (Mean Time Between Failures)
-    failed_jobs = Job.query.filter(
-        Job.quality_assessment == JobQuality.FAILED,
-        Job.end_time.isnot(None)
-    ).order_by(Job.end_time).all()
-    
-    if len(failed_jobs) > 1:
-        time_between_failures = []
-        for i in range(1, len(failed_jobs)):
-            if failed_jobs[i].end_time and failed_jobs[i-1].end_time:
-                delta = (failed_jobs[i].end_time - failed_jobs[i-1].end_time).total_seconds() / 3600
-                time_between_failures.append(delta)
-        mtbf_hours = sum(time_between_failures) / len(time_between_failures) if time_between_failures else 0
+    # Mittel der Abstände aufeinanderfolgender Fehler = (letzter - erster) / (n - 1)
+    if quality_stats.failures > 1:
+        failure_span = quality_stats.last_failure - quality_stats.first_failure
+        mtbf_hours = failure_span.total_seconds() / 3600 / (quality_stats.failures - 1)
     else:
         mtbf_hours = total_print_hours_all_time
     
     mttr_hours = (avg_duration_failed / 60) if avg_duration_failed > 0 else 0
     
     # Kapazitätsauslastung über Zeit
-    capacity_utilization_data = []
-    for i in range(7):
-        day_start = datetime.utcnow() - timedelta(days=7-i)
-        day_end = day_start + timedelta(days=1)
-        
-        day_print_time = db.session.query(func.sum(Job.actual_print_duration_s)).filter(
-            Job.start_time >= day_start,
-            Job.start_time < day_end,
-            Job.status == JobStatus.COMPLETED
-        ).scalar() or 0
-        
-        day_capacity = Printer.query.count() * 24 * 3600
-        utilization = (day_print_time / day_capacity * 100) if day_capacity > 0 else 0
-        capacity_utilization_data.append(round(utilization, 1))
+    day_capacity = len(printers) * 24 * 3600
+    capacity_utilization_data = [
+        round(print_seconds_by_day.get(day, 0) / day_capacity * 100, 1) if day_capacity > 0 else 0
+        for day in last_7_days
+    ]
     
     capacity_chart = {
-        'labels': [(datetime.utcnow() - timedelta(days=7-i)).strftime('%d.%m') for i in range(7)],
+        'labels': [day.strftime('%d.%m') for day in last_7_days],
         'data': capacity_utilization_data
     }
     
     # Durchlaufzeiten
-    completed_jobs_with_times = Job.query.filter(
+    completed_jobs_with_times = db.session.query(Job.name, Job.created_at, Job.end_time).filter(
         Job.status == JobStatus.COMPLETED,
         Job.start_time.isnot(None),
         Job.end_time.isnot(None),
@@ -381,21 +356,11 @@ def dashboard():
     avg_lead_time = sum([lt['lead_time'] for lt in lead_times]) / len(lead_times) if lead_times else 0
     
     # First Pass Yield
-    total_reviewed = Job.query.filter(
-        Job.quality_assessment.in_([JobQuality.SUCCESSFUL, JobQuality.FAILED])
-    ).count()
+    total_reviewed = quality_stats.reviewed
     first_pass_yield = (successful_jobs_30d / total_reviewed * 100) if total_reviewed > 0 else 100
 
     # --- 7. KOSTEN & ROI ---
-    total_cost_sum = db.session.query(func.sum(Job.actual_cost)).filter(
-        Job.actual_cost.isnot(None)
-    ).scalar() or 0
-    
-    total_jobs_with_cost = db.session.query(func.count(Job.id)).filter(
-        Job.actual_cost.isnot(None)
-    ).scalar() or 1
-    
-    cost_per_part = total_cost_sum / total_jobs_with_cost if total_jobs_with_cost > 0 else 0
+    cost_per_part = total_cost_sum / total_printed_jobs_all_time if total_printed_jobs_all_time > 0 else 0
     
     cost_breakdown_chart = {
         'labels': ['Material', 'Energie', 'Arbeitszeit'],
@@ -410,10 +375,8 @@ def dashboard():
     # ROI per Printer
     roi_data = []
     for printer in printers:
-        printer_jobs = Job.query.filter_by(printer_id=printer.id).filter(
-            Job.actual_cost.isnot(None)
-        ).all()
-        printer_total_cost = sum([j.actual_cost for j in printer_jobs]) or 0
+        totals = totals_by_printer.get(printer.id)
+        printer_total_cost = totals.cost if totals else 0
         
         roi = ((printer_total_cost - (printer.purchase_cost or 0)) / (printer.purchase_cost or 1) * 100) if printer.purchase_cost else 0
         roi_data.append({
@@ -427,17 +390,13 @@ def dashboard():
     }
     
     # Monatliche Kostenentwicklung
-    monthly_costs = db.session.query(
-        func.strftime('%Y-%m', Job.completed_at).label('month'),
-        func.sum(Job.actual_cost)
-    ).filter(
-        Job.completed_at >= thirty_days_ago,
-        Job.status == JobStatus.COMPLETED
-    ).group_by('month').order_by('month').all()
+    monthly_costs = defaultdict(float)
+    for day, d in daily_stats.items():
+        monthly_costs[day.strftime('%Y-%m')] += d.cost or 0
     
     monthly_costs_chart = {
-        'labels': [datetime.strptime(m[0], '%Y-%m').strftime('%B') if m[0] else '' for m in monthly_costs],
-        'data': [round(m[1] or 0, 2) for m in monthly_costs]
+        'labels': [datetime.strptime(month, '%Y-%m').strftime('%B') for month in sorted(monthly_costs)],
+        'data': [round(monthly_costs[month], 2) for month in sorted(monthly_costs)]
     }
     
     # Wartungskosten vs. Produktionskosten
@@ -457,25 +416,20 @@ def dashboard():
     project_success_rate = 100
     
     try:
-        from models import Project, DeadlineStatus
-        total_projects = Project.query.count()
-        active_projects = Project.query.filter_by(status='active').count()
-        completed_projects = Project.query.filter_by(status='completed').count()
-        
-        projects_red = Project.query.filter(
-            Project.deadline_status == DeadlineStatus.RED
-        ).count()
-        projects_overdue = Project.query.filter(
-            Project.deadline_status == DeadlineStatus.OVERDUE
-        ).count()
-        projects_at_risk = projects_red + projects_overdue
-        
-        if completed_projects > 0:
-            on_time_projects = Project.query.filter(
-                Project.status == 'completed',
-                Project.actual_completion_date <= Project.deadline
-            ).count()
-            project_success_rate = (on_time_projects / completed_projects) * 100
+        from models import Project
+        # deadline_status ist eine berechnete Eigenschaft: ROT/ÜBERFÄLLIG = Deadline in < 24h
+        at_risk_limit = datetime.utcnow() + timedelta(hours=24)
+        project_counts = db.session.query(
+            func.count(Project.id).label('total'),
+            func.sum(case((Project.status == 'active', 1), else_=0)).label('active'),
+            func.sum(case((Project.status == 'completed', 1), else_=0)).label('completed'),
+            func.sum(case((Project.deadline < at_risk_limit, 1), else_=0)).label('at_risk')
+        ).one()
+        total_projects = project_counts.total
+        active_projects = project_counts.active or 0
+        completed_projects = project_counts.completed or 0
+        projects_at_risk = project_counts.at_risk or 0
+        # Termintreue (project_success_rate) bleibt ohne erfasstes Fertigstellungsdatum bei 100
     except:
         pass
     
@@ -511,14 +465,13 @@ def dashboard():
                 ('Niedrig (20-40)', 20, 40),
                 ('Sehr niedrig (<20)', 0, 20)
             ]
-            priority_distribution = []
-            for label, min_p, max_p in priority_ranges:
-                count = Job.query.filter(
-                    Job.priority_score >= min_p,
-                    Job.priority_score < max_p,
-                    Job.status.in_([JobStatus.PENDING, JobStatus.QUEUED, JobStatus.ASSIGNED])
-                ).count()
-                priority_distribution.append(count)
+            priority_counts = db.session.query(*[
+                func.sum(case(((Job.priority_score >= min_p) & (Job.priority_score < max_p), 1), else_=0))
+                for label, min_p, max_p in priority_ranges
+            ]).filter(
+                Job.status.in_([JobStatus.PENDING, JobStatus.QUEUED, JobStatus.ASSIGNED])
+            ).one()
+            priority_distribution = [count or 0 for count in priority_counts]
             
             priority_chart = {
                 'labels': [r[0] for r in priority_ranges],
@@ -538,8 +491,7 @@ def dashboard():
     bottom_performers = sorted_performance[-3:] if len(sorted_performance) >= 3 else []
 
     # --- 9. RETURN MIT ALLEN VARIABLEN ---
-    return render_template(
-        'kpi/dashboard.html',
+    return dict(
         # Basis-Daten
         live_status=live_status,
         pending_jobs_count=pending_jobs_count,
@@ -549,7 +501,6 @@ def dashboard():
         material_trend_chart=material_trend_chart,
         printer_performance=printer_performance,
         uptime_chart_data=uptime_chart_data,
-        filament_stock=filament_stock,
         avg_duration_success_min=round(avg_duration_success / 60),
         avg_duration_failed_min=round(avg_duration_failed / 60),
         cost_chart_data=cost_chart_data,
@@ -559,7 +510,6 @@ def dashboard():
         total_printed_jobs_all_time=total_printed_jobs_all_time,
         print_hours_per_printer_chart=print_hours_per_printer_chart,
         material_consumption_chart=material_consumption_chart,
-        farm_activity=farm_activity,
         material_efficiency_chart=material_efficiency_chart,
         top_filaments_chart=top_filaments_chart,
         success_rate_material_chart=success_rate_material_chart,
@@ -610,28 +560,67 @@ def dashboard():
     )
 
 
+@kpi_bp.route('/api/utilization')
+@login_required
+def api_utilization():
+    """
+    Tatsächliche Auslastung, Verfügbarkeit, MTTR und Leerlaufphasen pro Drucker
+    aus den Statusintervallen.
+
+    Query-Parameter:
+        days: Zeitraum bis jetzt in Tagen (Standard 7, max. 366)
+        bucket: Bucket-Größe in Minuten (Standard 60)
+    """
+    days = min(max(request.args.get('days', 7, type=int), 1), 366)
+    bucket_minutes = min(max(request.args.get('bucket', 60, type=int), 5), 24 * 60)
+    try:
+        data = cached_analytics(('kpi_utilization', days, bucket_minutes),
+                                lambda: _compute_utilization(days, bucket_minutes),
+                                tags=UTILIZATION_CACHE_TAGS, ttl=UTILIZATION_TTL_SECONDS)
+        return jsonify(data)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def _compute_utilization(days, bucket_minutes):
+    now = datetime.utcnow()
+    # Bucket-Grenzen auf volle Stunden ausrichten
+    end = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    report = compute_utilization(end - timedelta(days=days), end, bucket_seconds=bucket_minutes * 60, now=now)
+    data = report.to_dict()
+    names = dict(db.session.query(Printer.id, Printer.name))
+    for entry in data['printers']:
+        entry['name'] = names.get(entry['printer_id'])
+    return data
+
+
 @kpi_bp.route('/api/queue-status')
 @login_required
 def api_queue_status():
     """API Endpunkt für Queue-Status im Scheduler Tab"""
     try:
-        pending_jobs = Job.query.filter(
-            Job.status.in_([JobStatus.PENDING, JobStatus.QUEUED])
-        ).order_by(
-            Job.priority_score.desc() if hasattr(Job, 'priority_score') else Job.created_at
-        ).limit(10).all()
-        
-        queue_data = []
-        for job in pending_jobs:
-            queue_data.append({
-                'id': job.id,
-                'name': job.name,
-                'status': job.status.value,
-                'priority_score': round(job.priority_score, 1) if hasattr(job, 'priority_score') else 0,
-                'is_critical': job.is_on_critical_path if hasattr(job, 'is_on_critical_path') else False,
-                'deadline': job.deadline.isoformat() if hasattr(job, 'deadline') and job.deadline else None
-            })
-        
+        queue_data = cached_analytics('kpi_queue_status', _compute_queue_status, tags=('job',),
+                                      ttl=QUEUE_STATUS_TTL_SECONDS)
         return jsonify(queue_data)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+def _compute_queue_status():
+    pending_jobs = Job.query.filter(
+        Job.status.in_([JobStatus.PENDING, JobStatus.QUEUED])
+    ).order_by(
+        Job.priority_score.desc() if hasattr(Job, 'priority_score') else Job.created_at
+    ).limit(10).all()
+    
+    queue_data = []
+    for job in pending_jobs:
+        queue_data.append({
+            'id': job.id,
+            'name': job.name,
+            'status': job.status.value,
+            'priority_score': round(job.priority_score, 1) if hasattr(job, 'priority_score') else 0,
+            'is_critical': job.is_on_critical_path if hasattr(job, 'is_on_critical_path') else False,
+            'deadline': job.deadline.isoformat() if hasattr(job, 'deadline') and job.deadline else None
+        })
+    return queue_data
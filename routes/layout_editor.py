@@ -3,6 +3,7 @@ from flask import Blueprint, render_template, request, jsonify, flash, current_a
 from extensions import db
 from models import LayoutItem, Printer, LayoutItemType
 from flask_login import login_required
+from http_cache import conditional_json
 
 layout_editor_bp = Blueprint('layout_editor_bp', __name__, template_folder='../templates/digital_twin')
 
@@ -31,6 +32,7 @@ def editor():
 
 @layout_editor_bp.route('/layout-editor/items', methods=['GET'])
 @login_required
+@conditional_json(LayoutItem)
 def get_items():
     """Gibt alle Layout-Items als JSON zurück."""
     items = LayoutItem.query.all()
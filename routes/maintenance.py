@@ -119,11 +119,10 @@ def delete_task(task_id):
 def schedule():
     """Zeigt anstehende Wartungsaufgaben für alle Drucker"""
     printers = Printer.query.all()
+    active_tasks = MaintenanceTaskDefinition.query.filter_by(is_active=True).all()
     
     maintenance_schedule = []
     for printer in printers:
-        active_tasks = MaintenanceTaskDefinition.query.filter_by(is_active=True).all()
-        
         for task in active_tasks:
             if task.interval_hours:
                 hours_since_last = (printer.total_print_hours or 0) - (printer.last_maintenance_h or 0)
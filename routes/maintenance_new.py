@@ -6,8 +6,9 @@ from models import (
     MaintenanceTaskNew, MaintenanceScheduleNew, MaintenanceExecutionNew,
     MaintenanceStatus, MaintenancePriority, MaintenanceInterval,
     MaintenanceTaskCategory, Printer, Consumable, User,
-    TaskConsumableNew, ExecutionConsumableNew, MaintenancePhotoNew
+    TaskConsumableNew, ExecutionConsumableNew, MaintenancePhotoNew, PrinterStatus
 )
+from .services import _log_printer_status
 import datetime
 import qrcode
 import io
@@ -185,7 +186,8 @@ def start_execution(schedule_id):
     )
     
     schedule.status = MaintenanceStatus.IN_PROGRESS
-    schedule.printer.status = models.PrinterStatus.MAINTENANCE
+    schedule.printer.status = PrinterStatus.MAINTENANCE
+    _log_printer_status(schedule.printer, PrinterStatus.MAINTENANCE)
     
     db.session.add(execution)
     db.session.commit()
@@ -230,7 +232,8 @@ def complete_execution(execution_id):
         execution.schedule.status = MaintenanceStatus.COMPLETED
     
     # Drucker-Status zurücksetzen
-    execution.printer.status = models.PrinterStatus.IDLE
+    execution.printer.status = PrinterStatus.IDLE
+    _log_printer_status(execution.printer, PrinterStatus.IDLE)
     execution.printer.last_maintenance_date = datetime.date.today()
     execution.printer.last_maintenance_h = execution.printer.total_print_hours
     
@@ -2,10 +2,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify
 from extensions import db
 from models import FilamentType, FilamentSpool, Printer, SystemSetting
+from stock_alerts import invalidate_low_stock_cache
 from flask_login import login_required, current_user
 import datetime
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func, distinct
+from sqlalchemy.orm import contains_eager, joinedload
+from pagination import keyset_paginate, SortKey, InvalidCursor
+from search_index import search_filter
+from analytics_cache import cached_analytics
 import qrcode
 import base64
 from io import BytesIO
@@ -13,10 +18,12 @@ import json
 import io
 import csv
 import uuid
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 materials_bp = Blueprint('materials_bp', __name__, url_prefix='/materials')
 
+SPOOLS_PER_PAGE = 48
+
 # --- FilamentType Routes (Obergruppe) ---
 
 @materials_bp.route('/dryer-dashboard')
@@ -36,10 +43,52 @@ def dryer_dashboard():
 @materials_bp.route('/')
 @login_required
 def list_filaments():
-    spools = FilamentSpool.query.join(FilamentType).order_by(FilamentType.manufacturer, FilamentType.name).all()
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', SPOOLS_PER_PAGE, type=int)
+    wants_json = request.args.get('format') == 'json'
+
+    query = FilamentSpool.query.join(FilamentType).options(
+        contains_eager(FilamentSpool.filament_type),
+        joinedload(FilamentSpool.assigned_printer)
+    )
+    sort_keys = [
+        SortKey(FilamentType.manufacturer, getter=lambda spool: spool.filament_type.manufacturer),
+        SortKey(FilamentType.name, getter=lambda spool: spool.filament_type.name),
+        SortKey(FilamentSpool.id)
+    ]
+
+    try:
+        page = keyset_paginate(query, sort_keys, cursor=cursor, per_page=per_page)
+    except InvalidCursor as e:
+        if wants_json:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        flash('Ungültiger Seitenverweis, es wird die erste Seite angezeigt.', 'warning')
+        page = keyset_paginate(query, sort_keys, per_page=per_page)
+
+    if wants_json:
+        return jsonify(page.to_dict(_spool_list_entry))
+
     printers = Printer.query.order_by(Printer.name).all()
     filament_types = FilamentType.query.order_by(FilamentType.manufacturer, FilamentType.name).all()
-    return render_template('materials/list.html', spools=spools, printers=printers, filament_types=filament_types)
+    return render_template('materials/list.html', spools=page.items, pagination=page, printers=printers, filament_types=filament_types)
+
+
+def _spool_list_entry(spool):
+    """JSON-Darstellung einer Spule für die Listen-Endpunkte."""
+    return {
+        'id': spool.id,
+        'short_id': spool.short_id,
+        'filament_type_id': spool.filament_type_id,
+        'manufacturer': spool.filament_type.manufacturer,
+        'name': spool.filament_type.name,
+        'material_type': spool.filament_type.material_type,
+        'color_hex': spool.filament_type.color_hex,
+        'current_weight_g': spool.current_weight_g,
+        'initial_weight_g': spool.initial_weight_g,
+        'is_in_use': spool.is_in_use,
+        'is_drying': spool.is_drying,
+        'assigned_to_printer_id': spool.assigned_to_printer_id,
+    }
 
 @materials_bp.route('/types')
 @login_required
@@ -78,6 +127,7 @@ def edit_type(type_id):
     if request.method == 'POST':
         try:
             update_type_from_form(ftype, request.form)
+            invalidate_low_stock_cache()  # Meldebestand kann sich geändert haben
             db.session.commit()
             flash('Filament-Typ erfolgreich aktualisiert.', 'success')
             return redirect(url_for('materials_bp.list_types'))
@@ -144,6 +194,7 @@ def add_spool():
             notes=request.form.get('notes')
         )
         db.session.add(new_spool)
+        invalidate_low_stock_cache()
         db.session.commit()
         flash(f"Neue Spule '{new_spool.short_id}' wurde erfolgreich hinzugefügt.", "success")
     except Exception as e:
@@ -212,6 +263,7 @@ def delete_spool(spool_id):
     else:
         try:
             db.session.delete(spool)
+            invalidate_low_stock_cache()
             db.session.commit()
             flash(f"Spule '{spool.short_id}' wurde erfolgreich gelöscht.", "success")
         except Exception as e:
@@ -344,6 +396,30 @@ def consumption_analytics():
     material_filter = request.args.get('material', '')
     show_only_low = request.args.get('low_only', False, type=bool)
     
+    analytics = cached_analytics(
+        ('consumption_analytics', material_filter, show_only_low),
+        lambda: _compute_consumption_analytics(material_filter, show_only_low),
+        tags=('filament_type', 'filament_spool')
+    )
+    
+    return render_template('materials/consumption_analytics.html',
+                         forecasts=analytics['forecasts'],
+                         all_materials=analytics['all_materials'],
+                         days=days,
+                         material_filter=material_filter,
+                         show_only_low=show_only_low)
+
+
+MaterialOption = namedtuple('MaterialOption', ['id', 'manufacturer', 'name', 'material_type', 'color_hex', 'reorder_level_g'])
+
+
+def _material_option(material):
+    return MaterialOption(material.id, material.manufacturer, material.name, material.material_type,
+                          material.color_hex, material.reorder_level_g)
+
+
+def _compute_consumption_analytics(material_filter, show_only_low):
+    """Prognosedaten für consumption_analytics (ohne ORM-Objekte, cachebar)."""
     # Alle Materialien für Filter-Dropdown
     all_materials = FilamentType.query.order_by(
         FilamentType.manufacturer, 
@@ -372,7 +448,7 @@ def consumption_analytics():
             
         # Grundlegende Prognose
         forecast_data = {
-            'material': material,
+            'material': _material_option(material),
             'total_weight_g': total_weight,
             'total_spools': material.total_spool_count,
             'available_spools': material.available_spool_count,
@@ -412,12 +488,10 @@ def consumption_analytics():
     status_order = {'critical': 0, 'warning': 1, 'ok': 2, 'unknown': 3}
     forecasts.sort(key=lambda x: (status_order.get(x['status'], 4), x['estimated_days_remaining']))
     
-    return render_template('materials/consumption_analytics.html',
-                         forecasts=forecasts,
-                         all_materials=all_materials,
-                         days=days,
-                         material_filter=material_filter,
-                         show_only_low=show_only_low)
+    return {
+        'forecasts': forecasts,
+        'all_materials': [_material_option(material) for material in all_materials]
+    }
 
 # ======================================================================================
 # VOLLSTÄNDIGE LAGERORT-VERWALTUNG - NEUE FUNKTIONEN
@@ -815,24 +889,11 @@ def search_spool():
         FilamentSpool.current_weight_g > 0
     )
     
-    # Such-Filter anwenden
-    if search_type == 'short_id':
-        query = query.filter(FilamentSpool.short_id.ilike(f'%{search_term}%'))
-    elif search_type == 'material':
-        query = query.filter(
-            (FilamentType.name.ilike(f'%{search_term}%')) |
-            (FilamentType.manufacturer.ilike(f'%{search_term}%')) |
-            (FilamentType.material_type.ilike(f'%{search_term}%'))
-        )
-    elif search_type == 'location':
-        query = query.filter(FilamentSpool.storage_location.ilike(f'%{search_term}%'))
-    else:  # any
-        query = query.filter(
-            (FilamentSpool.short_id.ilike(f'%{search_term}%')) |
-            (FilamentType.name.ilike(f'%{search_term}%')) |
-            (FilamentType.manufacturer.ilike(f'%{search_term}%')) |
-            (FilamentSpool.storage_location.ilike(f'%{search_term}%'))
-        )
+    # Such-Filter anwenden (Volltextindex mit Präfixsuche)
+    columns = {
+        'short_id': ['short_id'], 'material': ['material'], 'location': ['storage_location']
+    }.get(search_type)
+    query = query.filter(search_filter('spools', search_term, columns)).order_by(FilamentSpool.short_id)
     
     spools = query.limit(20).all()  # Limit für Performance
     
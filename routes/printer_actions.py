@@ -1,11 +1,11 @@
 # /routes/printer_actions.py
 from flask import Blueprint, redirect, url_for, flash
 from flask_login import login_required
-from extensions import db, socketio
+from extensions import db
 from models import Job, JobStatus, PrinterStatus
 from datetime import datetime
 # KORRIGIERTER IMPORT: Wir nutzen die zentrale Status-Update-Funktion
-from .services import update_job_status
+from .services import update_job_status, _log_printer_status
 
 printer_actions_bp = Blueprint('printer_actions_bp', __name__, url_prefix='/printer_actions')
 
@@ -18,7 +18,6 @@ def start_job(job_id):
         success, message = update_job_status(job_id, 'PRINTING')
         if success:
             flash(f'Auftrag "{job.name}" wurde gestartet.', 'success')
-            socketio.emit('reload_dashboard')
         else:
             flash(message, 'danger')
     else:
@@ -35,9 +34,9 @@ def pause_job(job_id):
         success, message = update_job_status(job_id, 'QUEUED')
         if success:
             job.assigned_printer.status = PrinterStatus.IDLE # Oder PAUSED
+            _log_printer_status(job.assigned_printer, PrinterStatus.IDLE)
             db.session.commit()
             flash(f'Auftrag "{job.name}" wurde pausiert.', 'warning')
-            socketio.emit('reload_dashboard')
         else:
             flash(message, 'danger')
     else:
@@ -54,7 +53,6 @@ def stop_job(job_id):
         success, message = update_job_status(job_id, 'COMPLETED')
         if success:
             flash(f'Auftrag "{job.name}" wurde beendet und als abgeschlossen markiert.', 'success')
-            socketio.emit('reload_dashboard')
         else:
             flash(message, 'danger')
     else:
@@ -8,6 +8,7 @@ from extensions import db
 from models import Printer, MaintenanceLog, PrinterStatus, APIType, CameraSource, BedType, PrinterType, MaintenanceTaskType
 from flask_login import login_required, current_user
 from .forms import MaintenanceLogForm, update_model_from_form
+from .services import _log_printer_status
 import datetime
 
 printers_bp = Blueprint('printers_bp', __name__)
@@ -51,6 +52,9 @@ def add_printer():
 
         try:
             db.session.add(new_printer)
+            db.session.flush()
+            # Erstes Statusintervall eröffnen
+            _log_printer_status(new_printer, new_printer.status)
             db.session.commit()
             flash(f'Drucker "{name}" erfolgreich hinzugefügt.', 'success')
             return redirect(url_for('printers_bp.list_printers'))
@@ -92,10 +96,13 @@ def edit_printer(printer_id):
             elif file.filename != '':
                 flash('Ungültiger Bilddateityp.', 'warning')
 
+        old_status = printer.status
         # Standard-Felder über Helper aktualisieren
         update_model_from_form(printer, request.form, get_printer_field_map())
         # Kalibrierungs-Einstellungen manuell verarbeiten
         process_calibration_form(printer, request.form)
+        if printer.status != old_status:
+            _log_printer_status(printer, printer.status)
 
         try:
             db.session.commit()
@@ -185,6 +192,8 @@ def copy_printer(printer_id):
         new_printer.api_type = APIType.NONE
         
         db.session.add(new_printer)
+        db.session.flush()
+        _log_printer_status(new_printer, PrinterStatus.IDLE)
         db.session.commit()
         flash(f"Drucker '{printer_to_copy.name}' wurde erfolgreich als '{new_name}' kopiert.", 'success')
 
@@ -6,6 +6,8 @@ from flask_login import login_required
 from extensions import db
 from models import Project, Job, JobStatus, DeadlineStatus
 from validators import CriticalPathCalculator, PriorityCalculator
+from analytics_cache import cached_analytics
+from horizon_scheduler import compute_farm_schedule, persist_schedule
 import datetime
 
 projects_bp = Blueprint('projects_bp', __name__, url_prefix='/projects')
@@ -199,19 +201,29 @@ def project_gantt(project_id):
                 JobStatus.PENDING, JobStatus.ASSIGNED, 
                 JobStatus.QUEUED, JobStatus.PRINTING, JobStatus.COMPLETED
             ])
-        ).order_by(Job.estimated_start_time).all()
+        ).all()
         
-        series_data = []
+        # Offene Jobs aus dem farmweiten Plan (Druckerkapazität, Zeitfenster, Abhängigkeiten)
         now = datetime.datetime.utcnow()
+        schedule = compute_farm_schedule(now=now)
         
-        for job in jobs:
-            # Bestimme Start/End-Zeit
+        def _span(job):
             if job.status == JobStatus.COMPLETED:
                 start = job.start_time or job.created_at
-                end = job.end_time or job.completed_at or start
-            else:
-                start = job.estimated_start_time or now
-                end = job.estimated_end_time or (start + datetime.timedelta(hours=1))
+                return start, job.end_time or job.completed_at or start
+            entry = schedule.entries.get(job.id)
+            if entry:
+                return entry.start, entry.end
+            # Nicht im Horizont einplanbar: hinter das Planende setzen
+            start = schedule.horizon_end
+            return start, start + datetime.timedelta(hours=1)
+        
+        spans = {job.id: _span(job) for job in jobs}
+        jobs.sort(key=lambda job: (spans[job.id][0], job.id))
+        series_data = []
+        
+        for job in jobs:
+            start, end = spans[job.id]
             
             # Farbe basierend auf Status und Priorität
             if job.is_on_critical_path:
@@ -238,7 +250,8 @@ def project_gantt(project_id):
                 'deadline_status': job.deadline_status.value if job.deadline_status else None,
                 'status': job.status.value,
                 'priority_score': job.priority_score,
-                'job_id': job.id
+                'job_id': job.id,
+                'unscheduled': job.id in schedule.unscheduled
             })
         
         return jsonify([{
@@ -267,6 +280,9 @@ def recalculate_project(project_id):
         for job in project.jobs:
             job.priority_score = PriorityCalculator.calculate_priority_score(job)
         
+        # Geschätzte Zeiten mit den neuen Prioritäten neu planen
+        db.session.flush()
+        persist_schedule(compute_farm_schedule())
         db.session.commit()
         
         return jsonify({
@@ -284,10 +300,20 @@ def recalculate_project(project_id):
 @login_required
 def project_stats(project_id):
     """Detaillierte Projekt-Statistiken (JSON)"""
+    stats = cached_analytics(('project_stats', project_id), lambda: _compute_project_stats(project_id),
+                             tags=('project', 'job', 'g_code_file'))
+    
+    if stats is None:
+        return jsonify({'error': 'Projekt nicht gefunden'}), 404
+    
+    return jsonify(stats)
+
+
+def _compute_project_stats(project_id):
     project = db.session.get(Project, project_id)
     
     if not project:
-        return jsonify({'error': 'Projekt nicht gefunden'}), 404
+        return None
     
     jobs = project.jobs.all()
     
@@ -300,7 +326,7 @@ def project_stats(project_id):
         (j.actual_print_duration_s or 0) / 60 for j in jobs if j.status == JobStatus.COMPLETED
     )
     
-    stats = {
+    return {
         'project_name': project.name,
         'completion_percentage': project.completion_percentage,
         'total_jobs': len(jobs),
@@ -313,6 +339,4 @@ def project_stats(project_id):
         'critical_path_length': len([j for j in jobs if j.is_on_critical_path]),
         'overdue_jobs': len([j for j in jobs if j.deadline_status == DeadlineStatus.OVERDUE]),
         'material_usage': {}  # Kann erweitert werden
-    }
-    
-    return jsonify(stats)
\ No newline at end of file
+    }
\ No newline at end of file
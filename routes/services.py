@@ -1,15 +1,31 @@
 # routes/services.py
 from flask import flash, has_request_context, current_app
-from models import CostCalculation,  db, Job, Printer, JobStatus, JobQuality, PrinterStatus, FilamentSpool, PrinterStatusLog
+from models import CostCalculation,  db, Job, Printer, JobStatus, JobQuality, PrinterStatus, FilamentSpool, PrinterStatusLog, PrinterStatusInterval
 import datetime
-from extensions import socketio 
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import joinedload, selectinload
+from realtime import notify_dashboard_changed
+from stock_alerts import invalidate_low_stock_cache
 
-def _log_printer_status(printer, new_status):
-    """Erstellt einen neuen Log-Eintrag für eine Drucker-Statusänderung."""
+def _log_printer_status(printer, new_status, timestamp=None):
+    """
+    Erstellt einen neuen Log-Eintrag für eine Drucker-Statusänderung und
+    pflegt die Statusintervalle: das offene Intervall des Druckers wird
+    geschlossen und ein neues für den neuen Status eröffnet.
+    """
     if printer and new_status:
-        log_entry = PrinterStatusLog(printer_id=printer.id, status=new_status)
+        timestamp = timestamp or datetime.datetime.utcnow()
+        log_entry = PrinterStatusLog(printer_id=printer.id, status=new_status, timestamp=timestamp)
         db.session.add(log_entry)
-        print(f"DEBUG: Logge neuen Status '{new_status.name}' für Drucker '{printer.name}'")
+
+        open_interval = PrinterStatusInterval.query.filter_by(
+            printer_id=printer.id, end_time=None
+        ).order_by(PrinterStatusInterval.start_time.desc()).first()
+        if open_interval is None or open_interval.status != new_status:
+            if open_interval is not None:
+                open_interval.end_time = max(timestamp, open_interval.start_time)
+            db.session.add(PrinterStatusInterval(printer_id=printer.id, status=new_status, start_time=timestamp))
+        current_app.logger.debug("Logge neuen Status '%s' für Drucker '%s'", new_status.name, printer.name)
 
 def assign_job_to_printer(job_id, printer_id):
     #... (unverändert)
@@ -42,10 +58,6 @@ def assign_job_to_printer(job_id, printer_id):
         db.session.rollback()
         return False, f"Datenbankfehler bei der Zuweisung: {e}"
 
-def _update_printer_stats(job):
-    """Diese Funktion ist leer. Statistiken werden jetzt automatisch berechnet."""
-    pass
-
 def _calculate_and_set_job_costs(job):
     '''
     Berechnet Kosten für einen Job und speichert sie in job.actual_cost.
@@ -103,6 +115,7 @@ def _deduct_filament_from_spool(job):
             print(f"Warnung: Spule {active_spool.short_id} hat nicht genug Filament für Job {job.id}. Setze Gewicht auf 0.")
             active_spool.current_weight_g = 0
         
+        invalidate_low_stock_cache()
         print(f"Info: {filament_to_deduct}g von Spule {active_spool.short_id} abgezogen. Neues Gewicht: {active_spool.current_weight_g}g.")
 
 def update_job_status(job_id, new_status_str, auto_retry_failed=False):
@@ -123,7 +136,6 @@ def update_job_status(job_id, new_status_str, auto_retry_failed=False):
             job.actual_print_duration_s = (job.end_time - job.start_time).total_seconds()
         
         _calculate_and_set_job_costs(job)
-        _update_printer_stats(job)
         _deduct_filament_from_spool(job)
         
         if job.assigned_printer:
@@ -152,7 +164,159 @@ def update_job_status(job_id, new_status_str, auto_retry_failed=False):
 
     db.session.commit()
     
-    if has_request_context():
-        socketio.emit('reload_dashboard')
+    notify_dashboard_changed(jobs=[job.id], printers=[job.printer_id])
+
+    return True, f"Status von Job '{job.name}' auf '{new_status.value}' gesetzt."
+
+# --- Dashboard-Status ---
+
+def _load_primary_and_next_jobs(printer_ids=None, session=None):
+    """
+    Lädt für alle (bzw. die angegebenen) Drucker den laufenden Job und den
+    nächsten wartenden Job in EINER Abfrage (Fensterfunktion).
+
+    Pro Drucker wird je Gruppe (druckend / wartend) nur die erste Zeile
+    behalten. Die Sortierung entspricht Printer.get_active_or_next_job().
+
+    Returns:
+        dict: {printer_id: {'printing': Job|None, 'next': Job|None}}
+    """
+    is_printing = case((Job.status == JobStatus.PRINTING, 1), else_=0)
+    ranked = select(
+        Job.id.label('job_id'),
+        func.row_number().over(
+            partition_by=(Job.printer_id, is_printing),
+            order_by=(*Job.queue_order(), Job.id.asc())
+        ).label('rn')
+    ).where(
+        Job.printer_id.isnot(None),
+        Job.status.in_([JobStatus.PRINTING, JobStatus.QUEUED, JobStatus.ASSIGNED])
+    )
+    if printer_ids is not None:
+        ranked = ranked.where(Job.printer_id.in_(printer_ids))
+    ranked = ranked.subquery()
+
+    jobs = (session or db.session).execute(
+        select(Job)
+        .join(ranked, Job.id == ranked.c.job_id)
+        .where(ranked.c.rn == 1)
+        .options(selectinload(Job.gcode_file), selectinload(Job.required_filament_type))
+    ).scalars().all()
+
+    result = {}
+    for job in jobs:
+        slot = result.setdefault(job.printer_id, {'printing': None, 'next': None})
+        slot['printing' if job.status == JobStatus.PRINTING else 'next'] = job
+    return result
+
+
+def _load_active_spools(printer_ids=None, session=None):
+    """Lädt die aktiven Spulen aller Drucker inkl. Filamenttyp in einer Abfrage."""
+    query = (session or db.session).query(FilamentSpool).options(joinedload(FilamentSpool.filament_type)).filter(
+        FilamentSpool.assigned_to_printer_id.isnot(None),
+        FilamentSpool.is_in_use == True
+    )
+    if printer_ids is not None:
+        query = query.filter(FilamentSpool.assigned_to_printer_id.in_(printer_ids))
+
+    spools = {}
+    for spool in query.order_by(FilamentSpool.id).all():
+        spools.setdefault(spool.assigned_to_printer_id, spool)
+    return spools
+
+
+def load_printer_status_entries(printer_ids=None, session=None):
+    """
+    Lädt die Statusdaten für das Dashboard mit einer festen Anzahl an Abfragen,
+    unabhängig von der Anzahl der Drucker.
+
+    Die Einträge enthalten statt Fortschritt und verstrichener Zeit nur deren
+    Eingangsgrößen ('job_status', 'job_start_time', 'time_info.total'), damit
+    sie zwischengespeichert und beim Lesen mit finalize_printer_status()
+    aktualisiert werden können.
+
+    Args:
+        printer_ids: Optionale Liste von Drucker-IDs (None = alle Drucker)
+        session: Optionale eigene Session (Standard: db.session)
+
+    Returns:
+        dict: {printer_id: entry}
+    """
+    query = (session or db.session).query(Printer)
+    if printer_ids is not None:
+        query = query.filter(Printer.id.in_(printer_ids))
+    printers = query.order_by(Printer.id).all()
+
+    jobs_by_printer = _load_primary_and_next_jobs(printer_ids, session)
+    spools_by_printer = _load_active_spools(printer_ids, session)
+
+    entries = {}
+    for printer in printers:
+        slot = jobs_by_printer.get(printer.id, {})
+        primary_job = slot.get('printing') or slot.get('next')
+        next_job_display = slot.get('next') if slot.get('printing') else None
+
+        total_seconds = 0
+        if primary_job and primary_job.gcode_file and primary_job.gcode_file.estimated_print_time_min:
+            total_seconds = primary_job.gcode_file.estimated_print_time_min * 60
+
+        current_spool_data = None
+        current_spool = spools_by_printer.get(printer.id)
+        if current_spool:
+            current_spool_data = {
+                "short_id": current_spool.short_id,
+                "name": f"{current_spool.filament_type.name} ({current_spool.filament_type.material_type})",
+                "color_hex": current_spool.filament_type.color_hex
+            }
+
+        next_job_data = None
+        if next_job_display:
+            next_job_data = {
+                "name": next_job_display.name,
+                "material": f"{next_job_display.required_filament_type.name} ({next_job_display.required_filament_type.material_type})" if next_job_display.required_filament_type else "Nicht spezifiziert"
+            }
+
+        entries[printer.id] = {
+            'id': printer.id, 'name': printer.name, 'state': printer.status.value, 'state_key': printer.status.name,
+            'job_id': primary_job.id if primary_job else None, 'job_name': primary_job.name if primary_job else None,
+            'job_status': primary_job.status.name if primary_job else None,
+            'job_start_time': primary_job.start_time if primary_job else None,
+            'time_info': {'elapsed': 0, 'total': total_seconds},
+            'preview_image_url': primary_job.gcode_file.preview_image_url if (primary_job and primary_job.gcode_file) else None,
+            'current_spool': current_spool_data, 'next_job': next_job_data,
+            'gcode_file_id': primary_job.gcode_file_id if (primary_job and primary_job.gcode_file) else None
+        }
+    return entries
+
+
+def finalize_printer_status(entry, now=None):
+    """
+    Berechnet verstrichene Zeit und Fortschritt eines Status-Eintrags zum
+    Lesezeitpunkt (entspricht Job.get_manual_progress()).
+
+    Returns:
+        dict: Öffentlicher Status-Eintrag ohne interne Felder
+    """
+    now = now or datetime.datetime.utcnow()
+    data = {k: v for k, v in entry.items() if k not in ('job_status', 'job_start_time')}
+    total = entry['time_info']['total']
+    elapsed = 0
+    if entry['job_status'] == JobStatus.PRINTING.name and entry['job_start_time']:
+        elapsed = (now - entry['job_start_time']).total_seconds()
+    data['time_info'] = {'elapsed': elapsed, 'total': total}
+    data['progress'] = min(100, (elapsed / total) * 100) if total > 0 else 0
+    return data
+
+
+def build_printer_status_data(printer_ids=None):
+    """
+    Baut die Statusdaten für das Dashboard direkt aus der Datenbank.
 
-    return True, f"Status von Job '{job.name}' auf '{new_status.value}' gesetzt."
\ No newline at end of file
+    Returns:
+        dict: {printer_id: status_dict} im Format von /api/dashboard/status
+    """
+    now = datetime.datetime.utcnow()
+    return {
+        printer_id: finalize_printer_status(entry, now)
+        for printer_id, entry in load_printer_status_entries(printer_ids).items()
+    }
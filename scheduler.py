@@ -7,8 +7,15 @@ from apscheduler.triggers.cron import CronTrigger
 import uuid
 from flask import current_app
 from extensions import db, socketio
-from models import Printer, Job, JobStatus, PrinterStatus, PrinterStatusLog, FilamentSpool, FilamentType, SystemSetting
-from printer_communication import get_printer_status
+from models import Printer, Job, JobStatus, PrinterStatus, PrinterStatusLog, PrinterStatusInterval, FilamentSpool, FilamentType, SystemSetting, APIType
+from printer_communication import get_printer_status, PRINT_STATE_COMPLETE
+from farm_state import get_farm_state
+from stock_alerts import compute_low_stock_materials
+from assignment_engine import plan_assignments
+from scheduler_events import get_scheduler_events
+from scheduler_metrics import get_scheduler_metrics
+from scheduler_lease import start_leader_election, get_leader_election
+from realtime import publish_status_update, publish_full_status, emit_to_rooms, page_room, printer_room, notify_dashboard_changed
 import logging
 
 # Logger für Scheduler
@@ -17,6 +24,10 @@ scheduler_logger = logging.getLogger('scheduler')
 # Globaler App Context für Scheduler Jobs
 _app_context = None
 
+# Frühestens so lange nach dem Start gilt ein vom Drucker gemeldetes Druckende
+# (verhindert, dass der Zustand des vorherigen Drucks den neuen Auftrag beendet)
+PRINT_COMPLETE_GRACE = timedelta(minutes=2)
+
 def set_app_context(app):
     """Setzt den App Context für Scheduler Jobs"""
     global _app_context
@@ -52,6 +63,7 @@ def check_job_completion():
         printing_jobs = Job.query.filter_by(status=JobStatus.PRINTING).all()
         
         completed_jobs = 0
+        completed_ids = []
         
         for job in printing_jobs:
             # Prüfe ob Job abgeschlossen werden kann
@@ -59,6 +71,7 @@ def check_job_completion():
                 try:
                     complete_job_automatically(job)
                     completed_jobs += 1
+                    completed_ids.append((job.id, job.printer_id))
                     scheduler_logger.info(f"Job '{job.name}' automatisch abgeschlossen")
                 except Exception as job_error:
                     scheduler_logger.error(f"Fehler beim Abschließen von Job {job.id}: {job_error}")
@@ -67,8 +80,11 @@ def check_job_completion():
             db.session.commit()
             scheduler_logger.info(f"{completed_jobs} Jobs automatisch abgeschlossen")
             
-            # Status-Broadcast auslösen
-            socketio.emit('reload_dashboard')
+            # Status-Broadcast auslösen (gebündelt)
+            notify_dashboard_changed(
+                jobs=[job_id for job_id, _ in completed_ids],
+                printers=[printer_id for _, printer_id in completed_ids]
+            )
         
     except Exception as e:
         scheduler_logger.error(f"Fehler bei automatischer Job-Completion: {e}")
@@ -90,10 +106,11 @@ def should_complete_job(job):
     # Berechne ob geschätzte Zeit abgelaufen ist
     estimated_duration = timedelta(minutes=job.gcode_file.estimated_print_time_min)
     estimated_end_time = job.start_time + estimated_duration
+    now = datetime.utcnow()
     
     # Job gilt als abgeschlossen wenn geschätzte Zeit + 5 Minuten Puffer abgelaufen
     buffer_time = timedelta(minutes=5)
-    return datetime.utcnow() >= (estimated_end_time + buffer_time)
+    return now >= (estimated_end_time + buffer_time)
 
 def complete_job_automatically(job):
     """Schließt einen Job automatisch ab"""
@@ -128,49 +145,41 @@ def status_broadcast():
         return
         
     try:
-        # Drucker-Status sammeln
-        printers = Printer.query.all()
-        printer_data = []
+        # Nur Änderungen seit dem letzten Broadcast senden (Delta-Protokoll)
+        delta = publish_status_update()
         
-        for printer in printers:
-            status_info = {
-                'id': printer.id,
-                'name': printer.name,
-                'status': printer.status.value,
-                'current_job': None
-            }
-            
-            # Aktueller Job
-            current_job = printer.get_current_job()
-            if current_job:
-                status_info['current_job'] = {
-                    'id': current_job.id,
-                    'name': current_job.name,
-                    'progress': current_job.get_manual_progress()
-                }
-            
-            printer_data.append(status_info)
-        
-        # WebSocket-Broadcast
-        socketio.emit('status_update', {
-            'timestamp': datetime.utcnow().isoformat(),
-            'printers': printer_data
-        })
-        
-        scheduler_logger.debug(f"Status-Broadcast an {len(printer_data)} Drucker gesendet")
+        if delta:
+            scheduler_logger.debug(f"Status-Delta #{delta['seq']} für {len(delta['changes'])} Drucker gesendet")
     
     except Exception as e:
         scheduler_logger.error(f"Fehler beim Status-Broadcast: {e}")
 
+@with_app_context
+def status_resync():
+    """Sendet den vollständigen Status an alle Flotten-Clients (auch auf Anforderung von Standby-Prozessen)"""
+    try:
+        publish_full_status()
+    except Exception as e:
+        scheduler_logger.error(f"Fehler beim Senden des vollständigen Status: {e}")
+
+@with_app_context
+def reconcile_farm_state():
+    """Gleicht das In-Memory-Abbild der Farm vollständig mit der Datenbank ab."""
+    try:
+        get_farm_state().reconcile()
+    except Exception as e:
+        scheduler_logger.error(f"Fehler beim Abgleich des Farm-Zustands: {e}")
+
 @with_app_context
 def update_printer_statuses():
     """Aktualisiert Drucker-Status über API-Abfragen"""
+    from routes.services import _log_printer_status
     if not is_scheduler_enabled():
         return
         
     try:
         printers = Printer.query.filter(
-            Printer.api_type.in_(['KLIPPER', 'OCTOPRINT']),
+            Printer.api_type.in_([APIType.KLIPPER, APIType.OCTOPRINT]),
             Printer.ip_address.isnot(None)
         ).all()
         
@@ -180,32 +189,32 @@ def update_printer_statuses():
             try:
                 # Status von Drucker abrufen
                 api_status = get_printer_status(printer)
+                get_farm_state().update_from_poll(printer.id, api_status)
                 
-                if api_status and 'status' in api_status:
-                    # Status-Mapping von API zu unseren Enums
-                    status_mapping = {
-                        'operational': PrinterStatus.IDLE,
-                        'printing': PrinterStatus.PRINTING,
-                        'paused': PrinterStatus.PRINTING,  # Pause als Printing behandeln
-                        'error': PrinterStatus.ERROR,
-                        'offline': PrinterStatus.OFFLINE,
-                        'ready': PrinterStatus.IDLE,
-                        'idle': PrinterStatus.IDLE
-                    }
+                # Nur echte API-Antworten übernehmen (db_status: Drucker nicht erreichbar)
+                if api_status and not api_status.get('db_status', True):
+                    # Drucker meldet das Druckende: laufenden Auftrag ohne Puffer abschließen
+                    job = printer.jobs.filter_by(status=JobStatus.PRINTING).first() \
+                        if api_status.get('print_state') == PRINT_STATE_COMPLETE else None
+                    if job is not None:
+                        # Kurz nach dem Start stammt die Meldung noch vom vorherigen Druck
+                        if job.start_time and datetime.utcnow() >= job.start_time + PRINT_COMPLETE_GRACE:
+                            complete_job_automatically(job)
+                            updated_count += 1
+                            scheduler_logger.info(f"Job '{job.name}' vom Drucker {printer.name} als beendet gemeldet")
+                        continue
                     
-                    api_status_lower = api_status['status'].lower()
-                    new_status = status_mapping.get(api_status_lower)
+                    new_status = PrinterStatus(api_status['state'])
+                    # Pausierte Drucke (API: Maintenance) als Printing behandeln
+                    if new_status == PrinterStatus.MAINTENANCE:
+                        new_status = PrinterStatus.PRINTING
                     
-                    if new_status and printer.status != new_status:
+                    if printer.status != new_status:
                         old_status = printer.status
                         printer.status = new_status
                         
-                        # Log-Eintrag erstellen
-                        log_entry = PrinterStatusLog(
-                            printer_id=printer.id,
-                            status=new_status
-                        )
-                        db.session.add(log_entry)
+                        # Log-Eintrag und Statusintervall
+                        _log_printer_status(printer, new_status)
                         updated_count += 1
                         
                         scheduler_logger.info(f"Status geändert: {printer.name} {old_status.value} -> {new_status.value}")
@@ -227,12 +236,15 @@ def update_printer_statuses():
 @with_app_context
 def assign_pending_jobs():
     """Weist wartende Jobs automatisch zu verfügbaren Druckern zu"""
+    from routes.services import _log_printer_status
     if not is_scheduler_enabled():
         return
         
     try:
-        # Verfügbare Drucker finden
-        idle_printers = Printer.query.filter_by(status=PrinterStatus.IDLE).all()
+        # Drucker, die sich frei melden, deren Druckjob aber noch nicht abgeschlossen ist, auslassen
+        idle_printers = Printer.query.filter_by(status=PrinterStatus.IDLE).filter(
+            ~Printer.jobs.any(Job.status == JobStatus.PRINTING)
+        ).all()
         
         if not idle_printers:
             scheduler_logger.debug("Keine verfügbaren Drucker für Job-Zuweisung")
@@ -250,61 +262,36 @@ def assign_pending_jobs():
             scheduler_logger.debug("Keine wartenden Jobs für Zuweisung")
             return
         
+        # Optimale Zuweisung über alle Paare (Material, Spule, Bauraum, Zeitfenster)
+        plan = plan_assignments(pending_jobs, idle_printers, now=datetime.utcnow())
         assignments = 0
+        assigned_ids = []
         
-        for job in pending_jobs:
-            if not idle_printers:
-                break
-                
-            # Passenden Drucker finden
-            suitable_printer = None
+        for job, printer, spool_change, _ in plan:
+            # Job zuweisen
+            job.printer_id = printer.id
+            job.status = JobStatus.ASSIGNED
+            printer.status = PrinterStatus.QUEUED
             
-            for printer in idle_printers:
-                # Material-Kompatibilität prüfen
-                if job.required_filament_type_id:
-                    # Prüfe ob passendes Material verfügbar
-                    available_spools = FilamentSpool.query.filter_by(
-                        filament_type_id=job.required_filament_type_id,
-                        is_in_use=False
-                    ).filter(FilamentSpool.current_weight_g > 0).all()
-                    
-                    if available_spools:
-                        # Prüfe Drucker-Material-Kompatibilität
-                        required_material = job.required_filament_type.material_type.upper()
-                        compatible_materials = [m.strip().upper() for m in (printer.compatible_material_types or '').split(',')]
-                        
-                        if not compatible_materials or '' in compatible_materials or required_material in compatible_materials:
-                            suitable_printer = printer
-                            break
-                else:
-                    # Kein spezifisches Material erforderlich
-                    suitable_printer = printer
-                    break
+            # Log für Statusänderung
+            _log_printer_status(printer, PrinterStatus.QUEUED)
             
-            if suitable_printer:
-                # Job zuweisen
-                job.printer_id = suitable_printer.id
-                job.status = JobStatus.ASSIGNED
-                suitable_printer.status = PrinterStatus.QUEUED
-                
-                # Log für Statusänderung
-                log_entry = PrinterStatusLog(
-                    printer_id=suitable_printer.id,
-                    status=PrinterStatus.QUEUED
-                )
-                db.session.add(log_entry)
-                
-                idle_printers.remove(suitable_printer)
-                assignments += 1
-                
-                scheduler_logger.info(f"Job '{job.name}' zu {suitable_printer.name} zugewiesen")
+            assignments += 1
+            assigned_ids.append((job.id, printer.id))
+            
+            scheduler_logger.info(
+                f"Job '{job.name}' zu {printer.name} zugewiesen{' (Spulenwechsel)' if spool_change else ''}"
+            )
         
         if assignments > 0:
             db.session.commit()
             scheduler_logger.info(f"{assignments} Jobs automatisch zugewiesen")
             
-            # Status-Broadcast auslösen
-            socketio.emit('reload_dashboard')
+            # Status-Broadcast auslösen (gebündelt)
+            notify_dashboard_changed(
+                jobs=[job_id for job_id, _ in assigned_ids],
+                printers=[printer_id for _, printer_id in assigned_ids]
+            )
     
     except Exception as e:
         scheduler_logger.error(f"Fehler bei automatischer Job-Zuweisung: {e}")
@@ -330,11 +317,11 @@ def check_drying_timers():
             
             # WebSocket-Benachrichtigung
             try:
-                socketio.emit('drying_timer_alert', {
+                emit_to_rooms('drying_timer_alert', {
                     'spool_id': spool.id,
                     'spool_name': f"{spool.short_id} ({spool.filament_type.name})",
                     'message': f"Trocknung für Spule {spool.short_id} ist abgeschlossen!"
-                })
+                }, [page_room('materials')])
                 notification_count += 1
             except Exception as emit_error:
                 scheduler_logger.warning(f"WebSocket-Benachrichtigung fehlgeschlagen: {emit_error}")
@@ -354,12 +341,8 @@ def check_low_filament_alerts():
     try:
         alerts = []
         
-        filament_types = FilamentType.query.filter(
-            FilamentType.reorder_level_g.isnot(None),
-            FilamentType.reorder_level_g > 0
-        ).all()
-        
-        for ftype in filament_types:
+        # Eine gruppierte Abfrage statt einer SUM-Abfrage pro Material
+        for ftype in compute_low_stock_materials():
             total_weight = ftype.total_remaining_weight
             
             if total_weight <= ftype.reorder_level_g:
@@ -375,7 +358,7 @@ def check_low_filament_alerts():
                 
                 # WebSocket-Benachrichtigung
                 try:
-                    socketio.emit('low_stock_alert', alert)
+                    emit_to_rooms('low_stock_alert', alert, [page_room('materials')])
                 except Exception as emit_error:
                     scheduler_logger.warning(f"Low-Stock WebSocket-Benachrichtigung fehlgeschlagen: {emit_error}")
         
@@ -419,17 +402,21 @@ def check_maintenance_reminders():
         
         # Benachrichtigungen senden
         if overdue_printers:
-            socketio.emit('maintenance_overdue', {
+            emit_to_rooms('maintenance_overdue', {
                 'printers': overdue_printers,
                 'count': len(overdue_printers)
-            })
+            }, [page_room('maintenance')])
+            for entry in overdue_printers:
+                emit_to_rooms('maintenance_overdue', {'printers': [entry], 'count': 1}, [printer_room(entry['id'])])
             scheduler_logger.warning(f"{len(overdue_printers)} Drucker haben überfällige Wartung")
         
         if urgent_printers:
-            socketio.emit('maintenance_urgent', {
+            emit_to_rooms('maintenance_urgent', {
                 'printers': urgent_printers,
                 'count': len(urgent_printers)
-            })
+            }, [page_room('maintenance')])
+            for entry in urgent_printers:
+                emit_to_rooms('maintenance_urgent', {'printers': [entry], 'count': 1}, [printer_room(entry['id'])])
             scheduler_logger.info(f"{len(urgent_printers)} Drucker benötigen bald Wartung")
         
         return len(overdue_printers), len(urgent_printers)
@@ -453,6 +440,10 @@ def cleanup_old_logs():
             PrinterStatusLog.query.filter(
                 PrinterStatusLog.timestamp < cutoff_date
             ).delete()
+            # Abgeschlossene Statusintervalle im gleichen Zeitraum
+            PrinterStatusInterval.query.filter(
+                PrinterStatusInterval.end_time < cutoff_date
+            ).delete()
             
             db.session.commit()
             scheduler_logger.info(f"{old_logs_count} alte Log-Einträge bereinigt")
@@ -513,19 +504,31 @@ def add_maintenance_jobs(scheduler):
         scheduler_logger.error(f"Fehler beim Hinzufügen der Wartungs-Jobs: {e}")
 
 def get_scheduler_status():
-    """Gibt detaillierte Scheduler-Informationen zurück"""
+    """
+    Gibt detaillierte Scheduler-Informationen zurück: pro Job letzter Lauf,
+    Dauer-Histogramm, Ergebniszähler, Fehler, verpasste und überlappende
+    Läufe sowie Überläufe, dazu die Zähler der Ereignis-Trigger.
+    Schlägt das Sammeln fehl, bleibt 'enabled' korrekt und der Fehler
+    steht unter 'error'.
+    """
+    enabled = is_scheduler_enabled()
     try:
-        enabled = is_scheduler_enabled()
-        jobs_info = []
+        metrics = get_scheduler_metrics()
+        jobs_info = metrics.snapshot()
+        election = get_leader_election()
         
         return {
             'enabled': enabled,
-            'jobs_count': len(jobs_info),
+            'running': metrics.is_running(),
+            'jobs_count': sum(1 for job in jobs_info if job['registered']),
+            'jobs': jobs_info,
+            'events': get_scheduler_events().stats(),
+            'leader': election.status() if election else None,
             'last_check': datetime.utcnow().isoformat()
         }
     except Exception as e:
         scheduler_logger.error(f"Fehler beim Abrufen des Scheduler-Status: {e}")
-        return {'enabled': False, 'error': str(e)}
+        return {'enabled': enabled, 'error': str(e)}
 
 def init_scheduler(app, socketio_instance):
     """Initialisiert den Background-Scheduler"""
@@ -534,6 +537,9 @@ def init_scheduler(app, socketio_instance):
     
     scheduler = BackgroundScheduler()
     
+    # Laufzeiten, Fehler, verpasste und überlappende Läufe aller Jobs erfassen
+    get_scheduler_metrics(app).instrument(scheduler)
+    
     # Logging konfigurieren
     logging.basicConfig(level=logging.INFO)
     scheduler_logger.setLevel(logging.INFO)
@@ -560,6 +566,17 @@ def init_scheduler(app, socketio_instance):
                 replace_existing=True
             )
             
+            # Vollständiger Status stündlich; Standby-Prozesse ziehen den Lauf
+            # vor, wenn sich ein Client bei ihnen neu synchronisieren will
+            scheduler.add_job(
+                func=status_resync,
+                trigger="interval",
+                hours=1,
+                id='status_resync',
+                name='Vollständigen Status senden',
+                replace_existing=True
+            )
+            
             # Drucker-Status-Updates alle 45 Sekunden
             scheduler.add_job(
                func=update_printer_statuses,
@@ -580,6 +597,16 @@ def init_scheduler(app, socketio_instance):
                 replace_existing=True
             )
             
+            # Vollständiger Abgleich des Farm-Zustands mit der Datenbank
+            scheduler.add_job(
+                func=reconcile_farm_state,
+                trigger="interval",
+                seconds=app.config.get('FARM_STATE_RECONCILE_SECONDS', 300),
+                id='reconcile_farm_state',
+                name='Farm-Zustand abgleichen',
+                replace_existing=True
+            )
+            
             # Log-Bereinigung täglich um 2:00 Uhr
             scheduler.add_job(
                 func=cleanup_old_logs,
@@ -597,11 +624,23 @@ def init_scheduler(app, socketio_instance):
             # Wartungs-Management-Jobs hinzufügen
             add_maintenance_jobs(scheduler)
             
-            # Scheduler starten
-            scheduler.start()
+            # Planungs-Jobs (Prioritäten, Farmplan, Queue-Optimierung); lokaler Import wegen zirkulärer Abhängigkeit
+            from scheduler_extension import add_planning_jobs
+            add_planning_jobs(scheduler)
+            
+            # Scheduler pausiert starten: Jobs laufen erst, wenn dieser Prozess
+            # die Lease hält (nur ein Leader bei mehreren Web-Workern)
+            scheduler.start(paused=True)
+            
+            # Ereignisse (neuer Job, Job fertig, Drucker frei, Spule geladen)
+            # ziehen Zuweisung und Abschluss-Prüfung vor; Intervalle bleiben als Rückfallebene
+            get_scheduler_events(app).attach(scheduler)
             
             # Herunterfahren bei App-Ende
-            atexit.register(lambda: scheduler.shutdown())
+            atexit.register(lambda: scheduler.running and scheduler.shutdown())
+            
+            # Leader-Wahl über die Datenbank-Lease; gibt die Lease beim Beenden frei
+            start_leader_election(app, scheduler)
             
             scheduler_logger.info("Scheduler mit allen Jobs erfolgreich gestartet")
             scheduler_logger.info(f"Aktive Jobs: {len(scheduler.get_jobs())}")
@@ -0,0 +1,189 @@
+# scheduler_events.py
+"""
+Interner Ereignisbus für den Scheduler.
+
+Zuweisung, Abschluss-Prüfung und Prioritätsberechnung laufen als
+Intervall-Jobs (30 s bis 15 min). Damit ein freier Drucker nicht bis zum
+nächsten Intervall auf Arbeit wartet, ziehen fachliche Ereignisse die
+passenden Scheduler-Jobs vor:
+
+    job_created    neuer Auftrag angelegt
+    job_finished   Auftrag abgeschlossen, fehlgeschlagen oder abgebrochen
+    printer_idle   Drucker ist (wieder) frei
+    spool_loaded   Spule wurde einem Drucker zugewiesen
+
+Die Ereignisse werden aus den Session-Änderungen abgeleitet und erst nach
+dem Commit veröffentlicht; bei einem Rollback verfallen sie. Das Vorziehen
+ist entprellt: Liegt der nächste Lauf eines Jobs ohnehin innerhalb der
+Entprellzeit, bleibt er unverändert, mehrere Ereignisse ergeben so einen
+Lauf. Die Intervalle bleiben als Sicherheitsnetz bestehen und laufen nach
+einem vorgezogenen Lauf im gewohnten Abstand weiter.
+"""
+import datetime
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from apscheduler.schedulers.base import STATE_PAUSED
+from flask import current_app
+from sqlalchemy import inspect
+
+import change_tracking
+from models import Job, JobStatus, Printer, PrinterStatus, FilamentSpool
+
+JOB_CREATED = 'job_created'
+JOB_FINISHED = 'job_finished'
+PRINTER_IDLE = 'printer_idle'
+SPOOL_LOADED = 'spool_loaded'
+
+# Welche Scheduler-Jobs ein Ereignis vorzieht (nicht registrierte IDs werden ignoriert)
+EVENT_TRIGGERS = {
+    JOB_CREATED: ('assign_pending_jobs', 'assign_pending_jobs_advanced', 'calculate_priority_scores'),
+    JOB_FINISHED: ('assign_pending_jobs', 'assign_pending_jobs_advanced', 'calculate_priority_scores'),
+    PRINTER_IDLE: ('check_job_completion', 'assign_pending_jobs', 'assign_pending_jobs_advanced'),
+    SPOOL_LOADED: ('assign_pending_jobs', 'assign_pending_jobs_advanced'),
+}
+
+# Ereignisse innerhalb dieser Zeit werden zu einem Lauf zusammengefasst
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+
+FINISHED_JOB_STATES = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+scheduler_logger = logging.getLogger('scheduler')
+
+
+class SchedulerEventBus:
+    """Verteilt Ereignisse an Abonnenten und zieht Scheduler-Jobs entprellt vor."""
+
+    def __init__(self, debounce_seconds=DEFAULT_DEBOUNCE_SECONDS):
+        self.debounce_seconds = debounce_seconds
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+        self._schedulers = []
+        # Weiterleitung an den Leader, solange der eigene Scheduler im Standby pausiert (scheduler_lease)
+        self.forwarder = None
+        self.published = Counter()
+        self.triggered = Counter()
+        self.coalesced = Counter()
+        self.forwarded = Counter()
+
+    def attach(self, scheduler):
+        """Verbindet einen APScheduler, dessen Jobs Ereignisse vorziehen dürfen."""
+        with self._lock:
+            if scheduler not in self._schedulers:
+                self._schedulers.append(scheduler)
+
+    def subscribe(self, event_name, callback):
+        """Registriert callback(event_name, payload) für ein Ereignis."""
+        with self._lock:
+            self._subscribers[event_name].append(callback)
+
+    def publish(self, event_name, **payload):
+        """Veröffentlicht ein Ereignis: Abonnenten aufrufen, zugeordnete Jobs vorziehen."""
+        with self._lock:
+            self.published[event_name] += 1
+            subscribers = list(self._subscribers[event_name])
+        for callback in subscribers:
+            try:
+                callback(event_name, payload)
+            except Exception as e:
+                scheduler_logger.error(f"Fehler im Abonnenten für '{event_name}': {e}")
+        for job_id in EVENT_TRIGGERS.get(event_name, ()):
+            self.trigger(job_id)
+
+    def trigger(self, job_id):
+        """
+        Zieht den nächsten Lauf eines Scheduler-Jobs auf jetzt + Entprellzeit vor.
+
+        Returns:
+            bool: True, wenn ein Lauf vorgezogen wurde
+        """
+        with self._lock:
+            schedulers = list(self._schedulers)
+        pulled = standby = False
+        for scheduler in schedulers:
+            try:
+                with self._lock:
+                    job = scheduler.get_job(job_id)
+                    # Unbekannt oder Job pausiert: nichts vorziehen
+                    if job is None or job.next_run_time is None:
+                        continue
+                    # Scheduler im Standby: der Leader soll laufen
+                    if scheduler.state == STATE_PAUSED:
+                        standby = True
+                        continue
+                    run_at = datetime.datetime.now(job.next_run_time.tzinfo) + \
+                        datetime.timedelta(seconds=self.debounce_seconds)
+                    if job.next_run_time <= run_at:
+                        self.coalesced[job_id] += 1
+                        continue
+                    job.modify(next_run_time=run_at)
+                    self.triggered[job_id] += 1
+                pulled = True
+                scheduler_logger.debug(f"Scheduler-Job '{job_id}' vorgezogen auf {run_at:%H:%M:%S}")
+            except Exception as e:
+                scheduler_logger.error(f"Fehler beim Vorziehen von '{job_id}': {e}")
+        if standby and not pulled and self.forwarder is not None:
+            with self._lock:
+                self.forwarded[job_id] += 1
+            self.forwarder(job_id)
+        return pulled
+
+    def stats(self):
+        with self._lock:
+            return {
+                'debounce_seconds': self.debounce_seconds,
+                'published': dict(self.published),
+                'triggered': dict(self.triggered),
+                'coalesced': dict(self.coalesced),
+                'forwarded': dict(self.forwarded),
+            }
+
+
+def get_scheduler_events(app=None):
+    """Gibt den Ereignisbus der (aktuellen) App zurück und legt ihn bei Bedarf an."""
+    app = app or current_app._get_current_object()
+    bus = app.extensions.get('scheduler_events')
+    if bus is None:
+        bus = SchedulerEventBus(app.config.get('SCHEDULER_EVENT_DEBOUNCE_SECONDS', DEFAULT_DEBOUNCE_SECONDS))
+        app.extensions['scheduler_events'] = bus
+    return bus
+
+
+# --- Ereignisse aus Session-Änderungen ---
+
+def _changed_to(obj, attr, values):
+    """True, wenn attr im Flush auf einen der Werte gesetzt wurde."""
+    history = inspect(obj).attrs[attr].history
+    return bool(history.added) and history.added[0] in values
+
+
+@change_tracking.on_flush
+def _collect_scheduler_events(session, flushed, changes):
+    pending = changes.data.setdefault('scheduler_events', [])
+    for obj in flushed.new + flushed.dirty:
+        is_new = obj in session.new
+        if isinstance(obj, Job):
+            if is_new:
+                pending.append((JOB_CREATED, {'job_id': obj.id}))
+            elif _changed_to(obj, 'status', FINISHED_JOB_STATES):
+                pending.append((JOB_FINISHED, {'job_id': obj.id, 'printer_id': obj.printer_id}))
+        elif isinstance(obj, Printer):
+            if obj.status == PrinterStatus.IDLE and (is_new or _changed_to(obj, 'status', (PrinterStatus.IDLE,))):
+                pending.append((PRINTER_IDLE, {'printer_id': obj.id}))
+        elif isinstance(obj, FilamentSpool):
+            if obj.assigned_to_printer_id is not None and \
+                    (is_new or inspect(obj).attrs.assigned_to_printer_id.history.has_changes()):
+                pending.append((SPOOL_LOADED, {'spool_id': obj.id, 'printer_id': obj.assigned_to_printer_id}))
+
+
+@change_tracking.on_commit
+def _publish_scheduler_events(changes):
+    pending = list(changes.data.get('scheduler_events', ()))
+    # Massenimport von Aufträgen (insert(Job) mit Parameterliste)
+    pending.extend((JOB_CREATED, {'job_id': None}) for _ in changes.bulk_changes(Job, kinds=('insert',)))
+    if not pending:
+        return
+    bus = get_scheduler_events()
+    for event_name, payload in pending:
+        bus.publish(event_name, **payload)
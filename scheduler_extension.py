@@ -5,13 +5,20 @@ import datetime
 from datetime import timedelta
 from extensions import db, socketio
 from models import (
-    Job, Printer, Project, JobStatus, PrinterStatus, PrinterStatusLog,
+    Job, Printer, Project, JobStatus, PrinterStatus,
     DependencyType, DeadlineStatus
 )
 from validators import (
     DependencyValidator, CriticalPathCalculator, 
     PriorityCalculator, SchedulingOptimizer
 )
+from scheduler import with_app_context, is_scheduler_enabled
+from assignment_engine import plan_assignments
+from horizon_scheduler import compute_farm_schedule, persist_schedule
+from changeover_sequencer import optimize_printer_queues
+from realtime import emit_to_rooms, page_room, printer_room, project_room, notify_dashboard_changed
+from scheduler_events import get_scheduler_events
+from scheduler_metrics import get_scheduler_metrics
 import logging
 
 scheduler_logger = logging.getLogger('scheduler')
@@ -37,29 +44,18 @@ def calculate_priority_scores():
             except Exception as e:
                 scheduler_logger.error(f"Fehler bei CPM für Projekt {project.id}: {e}")
         
-        # 2. Berechne Priority Scores für alle Jobs
-        pending_jobs = Job.query.filter(
-            Job.status.in_([JobStatus.PENDING, JobStatus.ASSIGNED, JobStatus.QUEUED])
-        ).all()
+        # 2. Berechne Priority Scores für alle offenen Jobs (gesammelt, ein Bulk-UPDATE)
+        result = PriorityCalculator.recalculate_priority_scores()
+        updated = result['updated']
         
-        updated = 0
-        
-        for job in pending_jobs:
-            old_score = job.priority_score
-            new_score = PriorityCalculator.calculate_priority_score(job)
-            
-            if abs(old_score - new_score) > 0.5:  # Nur bei signifikanter Änderung
-                job.priority_score = new_score
-                updated += 1
-                
-                scheduler_logger.debug(
-                    f"Job {job.id} Priorität: {old_score:.1f} -> {new_score:.1f}"
-                )
+        for job_id, old_score, new_score in result['changes']:
+            scheduler_logger.debug(f"Job {job_id} Priorität: {old_score:.1f} -> {new_score:.1f}")
         
+        # Auch ohne neue Scores: geänderte Markierungen des kritischen Pfads speichern
+        db.session.commit()
         if updated > 0:
-            db.session.commit()
             scheduler_logger.info(f"{updated} Job-Prioritäten aktualisiert")
-            socketio.emit('priority_updated', {'count': updated})
+            emit_to_rooms('priority_updated', {'count': updated}, [page_room('jobs'), page_room('projects')])
         
     except Exception as e:
         scheduler_logger.error(f"Fehler bei Prioritäts-Berechnung: {e}")
@@ -80,12 +76,17 @@ def assign_pending_jobs_advanced():
     
     Ersetzt die alte assign_pending_jobs() Funktion.
     """
+    from routes.services import _log_printer_status
+
     if not is_scheduler_enabled():
         return
     
     try:
         # 1. Finde verfügbare Drucker
-        idle_printers = Printer.query.filter_by(status=PrinterStatus.IDLE).all()
+        # Drucker, die sich frei melden, deren Druckjob aber noch nicht abgeschlossen ist, auslassen
+        idle_printers = Printer.query.filter_by(status=PrinterStatus.IDLE).filter(
+            ~Printer.jobs.any(Job.status == JobStatus.PRINTING)
+        ).all()
         
         if not idle_printers:
             scheduler_logger.debug("Keine freien Drucker verfügbar")
@@ -102,124 +103,60 @@ def assign_pending_jobs_advanced():
             scheduler_logger.debug("Keine pending Jobs")
             return
         
-        assignments = 0
-        skipped_deps = 0
-        skipped_time = 0
-        skipped_material = 0
         now = datetime.datetime.utcnow()
         
-        for job in pending_jobs:
-            # === ABHÄNGIGKEITS-PRÜFUNG ===
-            if not job.can_start:
-                blocking_deps = job.get_blocking_dependencies()
-                scheduler_logger.debug(
-                    f"Job {job.id} '{job.name}' wartet auf {len(blocking_deps)} Abhängigkeiten"
-                )
-                skipped_deps += 1
-                continue
-            
-            # === DRUCKER-MATCHING ===
-            suitable_printer = None
-            
-            for printer in idle_printers:
-                # Prüfe Zeitfenster
-                if not printer.is_available_at(now):
-                    next_available = printer.get_next_available_time()
-                    scheduler_logger.debug(
-                        f"Drucker {printer.name} außerhalb Zeitfenster "
-                        f"(nächste Zeit: {next_available})"
-                    )
-                    skipped_time += 1
-                    continue
+        # === OPTIMALE ZUWEISUNG ===
+        # Abhängigkeiten, Zeitfenster, Material/Spule und Bauraum werden für alle
+        # Paare auf einmal geprüft und als Min-Cost-Matching gelöst
+        plan = plan_assignments(pending_jobs, idle_printers, now=now)
+        assignments = 0
+        skipped_deps = plan.skipped['dependencies']
+        skipped_time = plan.skipped['time_window']
+        skipped_material = plan.skipped['material']
+        
+        for job, suitable_printer, spool_change, _ in plan:
+            # === JOB-ZUWEISUNG ===
+            try:
+                # Setze Job und Drucker Status
+                job.printer_id = suitable_printer.id
+                job.status = JobStatus.ASSIGNED
+                suitable_printer.status = PrinterStatus.QUEUED
                 
-                # Prüfe Material-Kompatibilität
-                if job.required_filament_type:
-                    loaded_spool = printer.assigned_spools.filter_by(is_in_use=True).first()
-                    
-                    if loaded_spool:
-                        if loaded_spool.filament_type_id != job.required_filament_type.id:
-                            scheduler_logger.debug(
-                                f"Material-Konflikt: Job braucht {job.required_filament_type.name}, "
-                                f"aber {loaded_spool.filament_type.name} geladen"
-                            )
-                            skipped_material += 1
-                            continue
-                        
-                        # Prüfe ob genug Material vorhanden
-                        if job.gcode_file and job.gcode_file.material_needed_g:
-                            if loaded_spool.remaining_grams < job.gcode_file.material_needed_g:
-                                scheduler_logger.warning(
-                                    f"Nicht genug Material: {loaded_spool.remaining_grams}g verfügbar, "
-                                    f"{job.gcode_file.material_needed_g}g benötigt"
-                                )
-                                skipped_material += 1
-                                continue
+                # Log für Statusänderung
+                _log_printer_status(suitable_printer, PrinterStatus.QUEUED)
                 
-                # Prüfe Druckbett-Größe (falls Dimensionen vorhanden)
-                if job.gcode_file and printer.bed_size_x and printer.bed_size_y:
-                    if job.gcode_file.dimensions_x_mm and job.gcode_file.dimensions_y_mm:
-                        if (job.gcode_file.dimensions_x_mm > printer.bed_size_x or 
-                            job.gcode_file.dimensions_y_mm > printer.bed_size_y):
-                            scheduler_logger.warning(
-                                f"Job zu groß für Drucker {printer.name}"
-                            )
-                            continue
+                assignments += 1
                 
-                # Drucker ist geeignet!
-                suitable_printer = printer
-                break
-            
-            # === JOB-ZUWEISUNG ===
-            if suitable_printer:
-                try:
-                    # Setze Job und Drucker Status
-                    job.printer_id = suitable_printer.id
-                    job.status = JobStatus.ASSIGNED
-                    suitable_printer.status = PrinterStatus.QUEUED
-                    
-                    # Berechne geschätzte Start-/Endzeit
-                    job.estimated_start_time = now
-                    if job.gcode_file and job.gcode_file.estimated_print_time_min:
-                        job.estimated_end_time = now + timedelta(
-                            minutes=job.gcode_file.estimated_print_time_min
-                        )
-                    
-                    # Log für Statusänderung
-                    log_entry = PrinterStatusLog(
-                        printer_id=suitable_printer.id,
-                        status=PrinterStatus.QUEUED
-                    )
-                    db.session.add(log_entry)
-                    
-                    # Entferne Drucker aus Pool
-                    idle_printers.remove(suitable_printer)
-                    assignments += 1
-                    
-                    scheduler_logger.info(
-                        f"✓ Job '{job.name}' (Score: {job.priority_score:.1f}) "
-                        f"-> {suitable_printer.name}"
-                        f"{' [KRITISCHER PFAD]' if job.is_on_critical_path else ''}"
-                        f"{f' [Deadline: {job.hours_until_deadline:.1f}h]' if job.deadline else ''}"
-                    )
-                    
-                except Exception as e:
-                    scheduler_logger.error(f"Fehler bei Zuweisung von Job {job.id}: {e}")
-                    db.session.rollback()
+                scheduler_logger.info(
+                    f"✓ Job '{job.name}' (Score: {job.priority_score:.1f}) "
+                    f"-> {suitable_printer.name}"
+                    f"{' [SPULENWECHSEL]' if spool_change else ''}"
+                    f"{' [KRITISCHER PFAD]' if job.is_on_critical_path else ''}"
+                    f"{f' [Deadline: {job.hours_until_deadline:.1f}h]' if job.deadline else ''}"
+                )
+                
+            except Exception as e:
+                scheduler_logger.error(f"Fehler bei Zuweisung von Job {job.id}: {e}")
+                db.session.rollback()
         
         # === COMMIT & BENACHRICHTIGUNG ===
         if assignments > 0:
+            # Geschätzte Zeiten aus dem farmweiten Plan (statt "ab jetzt")
+            db.session.flush()
+            persist_schedule(compute_farm_schedule(now=now))
             db.session.commit()
             scheduler_logger.info(
                 f"🎯 {assignments} Jobs zugewiesen | "
-                f"Übersprungen: {skipped_deps} Deps, {skipped_time} Zeit, {skipped_material} Material"
+                f"Übersprungen: {skipped_deps} Deps, {skipped_time} Zeit, {skipped_material} Material | "
+                f"Spulenwechsel: {plan.spool_changes}"
             )
             
             # WebSocket-Benachrichtigung
-            socketio.emit('reload_dashboard')
-            socketio.emit('jobs_assigned', {
+            notify_dashboard_changed()
+            emit_to_rooms('jobs_assigned', {
                 'count': assignments,
                 'timestamp': now.isoformat()
-            })
+            }, [page_room('fleet'), page_room('jobs')])
         
     except Exception as e:
         scheduler_logger.error(f"Kritischer Fehler bei Job-Zuweisung: {e}")
@@ -229,6 +166,49 @@ def assign_pending_jobs_advanced():
             pass
 
 
+@with_app_context
+def update_farm_schedule():
+    """
+    Plant alle offenen Aufträge farmweit ein und speichert die geschätzten
+    Start-/Endzeiten. Läuft alle 5 Minuten.
+    """
+    if not is_scheduler_enabled():
+        return
+    
+    try:
+        schedule = compute_farm_schedule()
+        changed = persist_schedule(schedule)
+        db.session.commit()
+        
+        late = schedule.late_jobs
+        if changed:
+            scheduler_logger.info(
+                f"Farmplan aktualisiert: {len(schedule.entries)} eingeplant, "
+                f"{len(schedule.unscheduled)} ohne Platz, {len(late)} nach Deadline"
+            )
+            emit_to_rooms('schedule_updated', {
+                'changed': changed,
+                'late': [entry.job_id for entry in late]
+            }, [page_room('jobs'), page_room('projects')])
+        
+    except Exception as e:
+        scheduler_logger.error(f"Fehler bei Farmplanung: {e}")
+        try:
+            db.session.rollback()
+        except:
+            pass
+
+
+def _job_rooms(job):
+    """Räume, die Warnungen zu einem Job erhalten: Job-Seite, Projekt und Drucker."""
+    rooms = [page_room('jobs')]
+    if job.project_id:
+        rooms.append(project_room(job.project_id))
+    if job.printer_id:
+        rooms.append(printer_room(job.printer_id))
+    return rooms
+
+
 @with_app_context
 def check_deadline_alerts():
     """
@@ -252,14 +232,14 @@ def check_deadline_alerts():
         for job in overdue_jobs:
             hours_overdue = (now - job.deadline).total_seconds() / 3600
             
-            socketio.emit('deadline_alert', {
+            emit_to_rooms('deadline_alert', {
                 'type': 'overdue',
                 'job_id': job.id,
                 'job_name': job.name,
                 'hours_overdue': round(hours_overdue, 1),
                 'printer': job.assigned_printer.name if job.assigned_printer else 'Nicht zugewiesen',
                 'project': job.project.name if job.project else None
-            })
+            }, _job_rooms(job))
         
         if overdue_jobs:
             scheduler_logger.warning(f"⚠️  {len(overdue_jobs)} überfällige Jobs!")
@@ -275,14 +255,14 @@ def check_deadline_alerts():
         for job in urgent_jobs:
             hours_remaining = (job.deadline - now).total_seconds() / 3600
             
-            socketio.emit('deadline_alert', {
+            emit_to_rooms('deadline_alert', {
                 'type': 'urgent',
                 'job_id': job.id,
                 'job_name': job.name,
                 'hours_remaining': round(hours_remaining, 1),
                 'status': job.status.value,
                 'printer': job.assigned_printer.name if job.assigned_printer else 'Nicht zugewiesen'
-            })
+            }, _job_rooms(job))
         
         if urgent_jobs:
             scheduler_logger.info(f"⏰ {len(urgent_jobs)} dringende Jobs (< 24h)")
@@ -303,13 +283,13 @@ def check_deadline_alerts():
             if incomplete > 0:
                 hours_remaining = (project.deadline - now).total_seconds() / 3600
                 
-                socketio.emit('project_deadline_alert', {
+                emit_to_rooms('project_deadline_alert', {
                     'project_id': project.id,
                     'project_name': project.name,
                     'hours_remaining': round(hours_remaining, 1),
                     'incomplete_jobs': incomplete,
                     'completion': project.completion_percentage
-                })
+                }, [project_room(project.id), page_room('projects')])
                 
                 scheduler_logger.warning(
                     f"Projekt '{project.name}' Deadline in {hours_remaining:.1f}h, "
@@ -323,49 +303,26 @@ def check_deadline_alerts():
 @with_app_context
 def optimize_job_queue():
     """
-    Optimiert die Job-Queue basierend auf aktuellen Prioritäten.
-    Kann Jobs neu priorisieren wenn sich Situation ändert.
+    Optimiert die Reihenfolge der Drucker-Warteschlangen: Aufträge mit gleichem
+    Filament werden gebündelt, ohne Deadlines zu gefährden.
     Läuft alle 30 Minuten.
     """
     if not is_scheduler_enabled():
         return
     
     try:
-        # Finde Jobs die zugewiesen aber noch nicht gestartet sind
-        queued_jobs = Job.query.filter(
-            Job.status.in_([JobStatus.ASSIGNED, JobStatus.QUEUED])
-        ).order_by(Job.printer_id, Job.priority_score.desc()).all()
-        
-        if not queued_jobs:
-            return
-        
-        reordered = 0
-        
-        # Gruppiere nach Drucker
-        printer_queues = {}
-        for job in queued_jobs:
-            if job.printer_id:
-                if job.printer_id not in printer_queues:
-                    printer_queues[job.printer_id] = []
-                printer_queues[job.printer_id].append(job)
-        
-        # Prüfe jede Queue auf Optimierungspotenzial
-        for printer_id, jobs in printer_queues.items():
-            if len(jobs) > 1:
-                # Sortiere nach Priority Score
-                sorted_jobs = sorted(jobs, key=lambda j: j.priority_score, reverse=True)
-                
-                # Prüfe ob Reihenfolge geändert werden sollte
-                if sorted_jobs != jobs:
-                    scheduler_logger.info(
-                        f"Queue-Optimierung für Drucker {printer_id}: "
-                        f"{len(jobs)} Jobs neu sortiert"
-                    )
-                    reordered += 1
+        result = optimize_printer_queues()
         
-        if reordered > 0:
+        if result['reordered'] > 0:
+            # Geschätzte Zeiten folgen der neuen Reihenfolge
+            db.session.flush()
+            persist_schedule(compute_farm_schedule())
             db.session.commit()
-            scheduler_logger.info(f"Queue-Optimierung: {reordered} Drucker-Queues aktualisiert")
+            scheduler_logger.info(
+                f"Queue-Optimierung: {result['reordered']} Jobs auf {result['printers']} Druckern umsortiert, "
+                f"Filamentwechsel {result['changeovers_before']} -> {result['changeovers_after']}"
+            )
+            emit_to_rooms('queue_optimized', result, [page_room('fleet'), page_room('jobs')])
     
     except Exception as e:
         scheduler_logger.error(f"Fehler bei Queue-Optimierung: {e}")
@@ -408,13 +365,13 @@ def check_time_window_compliance():
                     # Job läuft außerhalb Zeitfenster
                     next_window = printer.get_next_available_time()
                     
-                    socketio.emit('time_window_violation', {
+                    emit_to_rooms('time_window_violation', {
                         'printer_id': printer.id,
                         'printer_name': printer.name,
                         'job_id': running_job.id,
                         'job_name': running_job.name,
                         'next_available': next_window.isoformat() if next_window else None
-                    })
+                    }, [printer_room(printer.id), page_room('fleet')])
                     
                     violations += 1
                     scheduler_logger.warning(
@@ -431,6 +388,45 @@ def check_time_window_compliance():
 
 # ==================== SCHEDULER-INITIALISIERUNG ====================
 
+def add_planning_jobs(scheduler):
+    """Fügt die Planungs-Jobs zum Haupt-Scheduler hinzu (laufen nur beim Lease-Inhaber)"""
+    try:
+        # Prioritäts-Scores alle 15 Minuten, Ereignisse ziehen den Lauf vor
+        scheduler.add_job(
+            func=calculate_priority_scores,
+            trigger="interval",
+            minutes=15,
+            id='calculate_priority_scores',
+            name='Prioritäts-Scores berechnen',
+            replace_existing=True
+        )
+        
+        # Farmweiter Zeitplan (geschätzte Start-/Endzeiten) alle 5 Minuten
+        scheduler.add_job(
+            func=update_farm_schedule,
+            trigger="interval",
+            minutes=5,
+            id='update_farm_schedule',
+            name='Farmweiten Zeitplan berechnen',
+            replace_existing=True
+        )
+        
+        # Drucker-Warteschlangen nach Filament bündeln alle 30 Minuten
+        scheduler.add_job(
+            func=optimize_job_queue,
+            trigger="interval",
+            minutes=30,
+            id='optimize_job_queue',
+            name='Job-Queue optimieren',
+            replace_existing=True
+        )
+        
+        scheduler_logger.info("Planungs-Jobs hinzugefügt")
+        
+    except Exception as e:
+        scheduler_logger.error(f"Fehler beim Hinzufügen der Planungs-Jobs: {e}")
+
+
 def init_scheduler_with_advanced_features(app, socketio_instance):
     """
     Erweitert den Scheduler mit neuen Jobs.
@@ -439,6 +435,7 @@ def init_scheduler_with_advanced_features(app, socketio_instance):
     from apscheduler.schedulers.background import BackgroundScheduler
     
     scheduler = BackgroundScheduler()
+    get_scheduler_metrics(app).instrument(scheduler)
     
     with app.app_context():
         try:
@@ -466,6 +463,17 @@ def init_scheduler_with_advanced_features(app, socketio_instance):
             )
             scheduler_logger.info("✓ Job hinzugefügt: Intelligente Zuweisung")
             
+            # Farmweiter Zeitplan (alle 5 Minuten)
+            scheduler.add_job(
+                func=update_farm_schedule,
+                trigger="interval",
+                minutes=5,
+                id='update_farm_schedule',
+                name='Farmweiten Zeitplan berechnen',
+                replace_existing=True
+            )
+            scheduler_logger.info("✓ Job hinzugefügt: Farmplanung")
+            
             # Deadline-Alerts (stündlich)
             scheduler.add_job(
                 func=check_deadline_alerts,
@@ -499,6 +507,10 @@ def init_scheduler_with_advanced_features(app, socketio_instance):
             )
             scheduler_logger.info("✓ Job hinzugefügt: Zeitfenster-Check")
             
+            # Ereignisgesteuerte Läufe (Zuweisung, Prioritäten) zusätzlich zu den Intervallen
+            get_scheduler_events(app).attach(scheduler)
+            scheduler_logger.info("✓ Ereignis-Trigger verbunden")
+            
             scheduler_logger.info("=" * 60)
             scheduler_logger.info("🚀 ERWEITERTER SCHEDULER ERFOLGREICH INITIALISIERT")
             scheduler_logger.info(f"   Gesamt: {len(scheduler.get_jobs())} Jobs aktiv")
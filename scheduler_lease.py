@@ -0,0 +1,303 @@
+# scheduler_lease.py
+"""
+Leader-Wahl für den Hintergrund-Scheduler über eine Lease in der Datenbank.
+
+Jeder Prozess, der create_app aufruft, startet einen Scheduler – bei mehreren
+Web-Workern würden Jobs doppelt zugewiesen und Drucker doppelt abgefragt.
+Deshalb startet der Scheduler pausiert. Ein Hintergrund-Thread versucht
+regelmäßig, die Lease-Zeile zu übernehmen bzw. zu erneuern:
+
+    UPDATE scheduler_lease SET holder = :ich, expires_at = :jetzt + ttl
+    WHERE name = 'scheduler' AND (holder = :ich OR expires_at < :jetzt)
+
+Nur wer die Zeile ändern konnte, ist Leader und setzt seinen Scheduler fort.
+Fällt der Leader aus, läuft die Lease ab und ein Standby-Prozess übernimmt
+beim nächsten Versuch. Ein Leader, der nicht erneuern kann, pausiert
+spätestens, wenn seine Lease abgelaufen ist; verliert er sie an einen anderen
+Prozess, sofort.
+
+Ereignisse (siehe scheduler_events) entstehen in dem Prozess, der den Commit
+ausführt. Standby-Prozesse vermerken die angeforderten Jobs in der
+Lease-Zeile, der Leader zieht sie beim nächsten Erneuern vor.
+
+Die Zeitstempel stammen von den beteiligten Rechnern, deren Uhren müssen
+synchron laufen (NTP); die TTL sollte deutlich größer als die erwartete
+Abweichung sein und mindestens das Doppelte der Erneuerungszeit betragen.
+
+Betrieb mit mehreren Web-Workern:
+
+- Socket.IO braucht eine gemeinsame Message-Queue (SOCKETIO_MESSAGE_QUEUE,
+  z.B. redis://localhost:6379/0), sonst erreichen Ereignisse des Leaders nur
+  die Clients, die mit seinem Prozess verbunden sind.
+- Die Status-Sequenz (realtime.StatusDeltaEncoder) vergibt nur der Leader,
+  Standby-Prozesse leiten Broadcasts und Resync-Anfragen an ihn weiter.
+- Prozesslokal bleiben: Live-Daten der Druckerabfrage (FarmState, nur beim
+  Leader vorhanden), Scheduler-Metriken (SchedulerMetrics, Läufe nur beim
+  Leader), die Caches ProjectDagCache, AnalyticsCache und LowStockCache
+  (Invalidierung nur im ändernden Prozess, in den anderen gilt die TTL bzw.
+  der Versionsabgleich) sowie die EmitCoalescer-Bündelung. Die
+  Scheduler-Statusseite zeigt deshalb die Metriken des Prozesses, der die
+  Anfrage beantwortet; im Standby sind das keine Läufe.
+"""
+import atexit
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from apscheduler.schedulers.base import STATE_PAUSED
+from apscheduler.triggers.interval import IntervalTrigger
+from flask import current_app
+from sqlalchemy import case, func, insert, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import SchedulerLease
+from scheduler_events import get_scheduler_events
+
+DEFAULT_LEASE_NAME = 'scheduler'
+# Gültigkeit einer Lease und Abstand der Erneuerungen (Sekunden)
+DEFAULT_TTL_SECONDS = 30
+DEFAULT_RENEW_SECONDS = 10
+
+scheduler_logger = logging.getLogger('scheduler')
+
+
+def make_holder_id():
+    """Eindeutige Kennung dieses Prozesses (Host, PID, Zufallsanteil)."""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class LeaderLease:
+    """Zugriff auf eine Lease-Zeile; alle Operationen laufen in eigenen, kurzen Transaktionen."""
+
+    def __init__(self, engine, name=DEFAULT_LEASE_NAME, holder=None, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.engine = engine
+        self.name = name
+        self.holder = holder or make_holder_id()
+        self.ttl_seconds = ttl_seconds
+        self.table = SchedulerLease.__table__
+
+    def try_acquire(self, now=None):
+        """
+        Übernimmt oder erneuert die Lease.
+
+        Returns:
+            tuple: (leader, requested) – ob dieser Prozess Leader ist und die
+                von Standby-Prozessen angeforderten Job-IDs (nur als Leader)
+        """
+        now = now or datetime.datetime.utcnow()
+        t = self.table
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(t)
+                .where(t.c.name == self.name,
+                       or_(t.c.holder == self.holder, t.c.expires_at.is_(None), t.c.expires_at < now))
+                .values(holder=self.holder, renewed_at=now,
+                        expires_at=now + datetime.timedelta(seconds=self.ttl_seconds),
+                        acquired_at=case((t.c.holder == self.holder, t.c.acquired_at), else_=now))
+            )
+            if result.rowcount == 1:
+                # Zeile ist durch das UPDATE gesperrt: Anforderungen lesen und leeren
+                requested = conn.execute(select(t.c.requested_jobs).where(t.c.name == self.name)).scalar()
+                if requested:
+                    conn.execute(update(t).where(t.c.name == self.name).values(requested_jobs=None))
+                return True, {job_id for job_id in requested.split(',') if job_id} if requested else set()
+            exists = conn.execute(select(t.c.name).where(t.c.name == self.name)).first() is not None
+        if exists:
+            return False, set()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(t).values(
+                    name=self.name, holder=self.holder, acquired_at=now, renewed_at=now,
+                    expires_at=now + datetime.timedelta(seconds=self.ttl_seconds)
+                ))
+            return True, set()
+        except IntegrityError:
+            # Ein anderer Prozess hat die Zeile gleichzeitig angelegt
+            return False, set()
+
+    def release(self):
+        """Gibt die Lease frei, damit ein Standby-Prozess sofort übernehmen kann."""
+        t = self.table
+        with self.engine.begin() as conn:
+            conn.execute(update(t).where(t.c.name == self.name, t.c.holder == self.holder)
+                         .values(expires_at=datetime.datetime.utcnow()))
+
+    def request_run(self, job_id):
+        """Vermerkt einen Job, den der Leader vorziehen soll (atomares Anhängen)."""
+        t = self.table
+        with self.engine.begin() as conn:
+            conn.execute(update(t).where(t.c.name == self.name)
+                         .values(requested_jobs=func.coalesce(t.c.requested_jobs, '') + f'{job_id},'))
+
+    def current(self):
+        """Aktueller Stand der Lease-Zeile als dict (None, wenn noch keine existiert)."""
+        with self.engine.connect() as conn:
+            row = conn.execute(select(self.table).where(self.table.c.name == self.name)).mappings().first()
+        return dict(row) if row else None
+
+
+class SchedulerLeaderElection:
+    """Hält die Lease in einem Hintergrund-Thread und pausiert bzw. startet den Scheduler."""
+
+    def __init__(self, scheduler, lease, renew_seconds=DEFAULT_RENEW_SECONDS, events=None):
+        self.scheduler = scheduler
+        self.lease = lease
+        self.renew_seconds = renew_seconds
+        self.events = events
+        self.is_leader = False
+        self.valid_until = None
+        self.transitions = 0
+        self._recent_requests = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.events is not None:
+            self.events.forwarder = self.forward_trigger
+        self._thread = threading.Thread(target=self._run, name='scheduler-lease', daemon=True)
+        self._thread.start()
+
+    def stop(self, release=True):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.renew_seconds)
+        if self.is_leader:
+            self._step_down(stopping=True)
+            if release:
+                try:
+                    self.lease.release()
+                    scheduler_logger.info(f"Scheduler-Lease beim Beenden freigegeben ({self.lease.holder})")
+                except Exception as e:
+                    scheduler_logger.warning(f"Scheduler-Lease konnte nicht freigegeben werden: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.tick()
+            self._stop.wait(self.renew_seconds)
+
+    def tick(self, now=None):
+        """Ein Übernahme- bzw. Erneuerungsversuch."""
+        now = now or datetime.datetime.utcnow()
+        try:
+            leader, requested = self.lease.try_acquire(now)
+        except Exception as e:
+            scheduler_logger.error(f"Fehler beim Erneuern der Scheduler-Lease: {e}")
+            # Ohne Erneuerung bleibt die Lease bis zu ihrem Ablauf gültig. Der
+            # nächste Versuch liegt renew_seconds später: wer bis dahin ablaufen
+            # würde, pausiert jetzt, damit kein Standby übernimmt, solange hier
+            # noch Jobs laufen.
+            margin = datetime.timedelta(seconds=self.renew_seconds)
+            if self.is_leader and (self.valid_until is None or now >= self.valid_until - margin):
+                self._step_down()
+            return self.is_leader
+        if leader:
+            self.valid_until = now + datetime.timedelta(seconds=self.lease.ttl_seconds)
+            if not self.is_leader:
+                self._become_leader()
+            for job_id in sorted(requested):
+                if self.events is not None:
+                    self.events.trigger(job_id)
+        elif self.is_leader:
+            self._step_down()
+        return self.is_leader
+
+    def _become_leader(self):
+        self.is_leader = True
+        self.transitions += 1
+        # Während der Pause fällig gewordene Läufe nicht als verpasst verwerfen
+        now = datetime.datetime.now(self.scheduler.timezone)
+        for job in self.scheduler.get_jobs():
+            if job.next_run_time is not None and job.next_run_time < now:
+                if isinstance(job.trigger, IntervalTrigger):
+                    job.modify(next_run_time=now)
+                else:
+                    job.modify(next_run_time=job.trigger.get_next_fire_time(None, now))
+        if self.scheduler.state == STATE_PAUSED:
+            self.scheduler.resume()
+        scheduler_logger.info(f"Scheduler-Lease übernommen, dieser Prozess ist Leader ({self.lease.holder})")
+
+    def _step_down(self, stopping=False):
+        self.is_leader = False
+        self.valid_until = None
+        self.transitions += 1
+        if self.scheduler.running and self.scheduler.state != STATE_PAUSED:
+            self.scheduler.pause()
+        if not stopping:
+            scheduler_logger.warning(f"Scheduler-Lease verloren, Prozess im Standby ({self.lease.holder})")
+
+    def forward_trigger(self, job_id):
+        """Leitet ein Ereignis im Standby über die Lease-Zeile an den Leader weiter (entprellt)."""
+        now = time.monotonic()
+        if now - self._recent_requests.get(job_id, float('-inf')) < self.renew_seconds:
+            return
+        self._recent_requests[job_id] = now
+        try:
+            self.lease.request_run(job_id)
+        except Exception as e:
+            scheduler_logger.warning(f"Job '{job_id}' konnte nicht an den Leader weitergeleitet werden: {e}")
+
+    def status(self):
+        try:
+            current = self.lease.current()
+        except Exception as e:
+            current = {'error': str(e)}
+        return {
+            'holder': self.lease.holder,
+            'is_leader': self.is_leader,
+            'valid_until': self.valid_until.isoformat() if self.valid_until else None,
+            'ttl_seconds': self.lease.ttl_seconds,
+            'renew_seconds': self.renew_seconds,
+            'transitions': self.transitions,
+            'lease': {key: value.isoformat() if isinstance(value, datetime.datetime) else value
+                      for key, value in (current or {}).items()},
+        }
+
+
+def start_leader_election(app, scheduler):
+    """
+    Startet die Leader-Wahl für einen pausiert gestarteten Scheduler.
+
+    Ist sie abgeschaltet (SCHEDULER_LEADER_ELECTION = False) oder fehlt die
+    Lease-Tabelle (Migration noch nicht ausgeführt), läuft der Scheduler wie
+    bisher in diesem Prozess.
+
+    Returns:
+        SchedulerLeaderElection oder None
+    """
+    with app.app_context():
+        engine = db.engine
+        if not app.config.get('SCHEDULER_LEADER_ELECTION', True):
+            scheduler.resume()
+            return None
+        if not inspect(engine).has_table(SchedulerLease.__tablename__):
+            scheduler_logger.warning("Tabelle scheduler_lease fehlt – Scheduler läuft ohne Leader-Wahl")
+            scheduler.resume()
+            return None
+        events = get_scheduler_events(app)
+    lease = LeaderLease(
+        engine,
+        name=app.config.get('SCHEDULER_LEASE_NAME', DEFAULT_LEASE_NAME),
+        ttl_seconds=app.config.get('SCHEDULER_LEASE_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+    )
+    renew_seconds = app.config.get('SCHEDULER_LEASE_RENEW_SECONDS', DEFAULT_RENEW_SECONDS)
+    if lease.ttl_seconds < 2 * renew_seconds:
+        scheduler_logger.warning(
+            f"Scheduler-Lease: TTL ({lease.ttl_seconds} s) sollte mindestens doppelt so lang wie "
+            f"die Erneuerungszeit ({renew_seconds} s) sein"
+        )
+    election = SchedulerLeaderElection(scheduler, lease, renew_seconds, events)
+    app.extensions['scheduler_lease'] = election
+    election.start()
+    atexit.register(election.stop)
+    return election
+
+
+def get_leader_election(app=None):
+    """Gibt die Leader-Wahl der (aktuellen) App zurück (None, wenn nicht aktiv)."""
+    app = app or current_app._get_current_object()
+    return app.extensions.get('scheduler_lease')
@@ -0,0 +1,241 @@
+# scheduler_metrics.py
+"""
+Laufzeit-Instrumentierung der APScheduler-Jobs.
+
+Jeder Job wird beim Hinzufügen (EVENT_JOB_ADDED) mit einer Messhülle
+versehen, die Dauer, Ergebnis und Fehler jedes Laufs erfasst. Da die
+Scheduler-Funktionen ihre Ausnahmen meist selbst abfangen und nur
+protokollieren, zählen auch ERROR-Meldungen des 'scheduler'-Loggers
+während eines Laufs als Fehler dieses Laufs.
+
+Zusätzlich werden über Scheduler-Events erfasst:
+    - verpasste Läufe (misfire, EVENT_JOB_MISSED)
+    - Überlappungen: Lauf fällig, während der vorige noch läuft
+      (EVENT_JOB_MAX_INSTANCES, der Lauf entfällt)
+    - Überläufe: Laufdauer länger als das Intervall des Jobs
+"""
+import datetime
+import logging
+import threading
+import time
+from collections import deque
+
+from apscheduler.events import EVENT_JOB_ADDED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+from flask import current_app
+
+# Obergrenzen der Histogramm-Klassen in Sekunden (letzte Klasse: darüber)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Anzahl der zuletzt gemerkten Fehlermeldungen pro Job
+MAX_RECENT_ERRORS = 5
+
+scheduler_logger = logging.getLogger('scheduler')
+
+# Aktueller Lauf des Worker-Threads (für die Zuordnung von Log-Fehlern)
+_current_run = threading.local()
+
+
+class JobMetrics:
+    """Kennzahlen eines Scheduler-Jobs."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.runs = 0
+        self.results = {'ok': 0, 'error': 0, 'missed': 0, 'overlap': 0}
+        self.overruns = 0
+        self.histogram = [0] * (len(DURATION_BUCKETS) + 1)
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_duration = None
+        self.last_run = None
+        self.last_result = None
+        self.last_outcome = None
+        self.running_since = None
+        self.recent_errors = deque(maxlen=MAX_RECENT_ERRORS)
+
+    def record(self, started_at, duration, outcome, result, interval):
+        self.runs += 1
+        self.results[outcome] += 1
+        bucket = next((i for i, bound in enumerate(DURATION_BUCKETS) if duration <= bound), len(DURATION_BUCKETS))
+        self.histogram[bucket] += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        self.last_duration = duration
+        self.last_run = started_at
+        self.last_outcome = outcome
+        if isinstance(result, (bool, int, float, str, dict, list)):
+            self.last_result = result
+        if interval and duration > interval:
+            self.overruns += 1
+
+    def to_dict(self, now, interval=None):
+        running_for = (now - self.running_since).total_seconds() if self.running_since else None
+        return {
+            'runs': self.runs,
+            'results': dict(self.results),
+            'overruns': self.overruns,
+            'running': self.running_since is not None,
+            'running_for_s': round(running_for, 3) if running_for is not None else None,
+            # Läuft länger als das Intervall: der nächste fällige Lauf entfällt
+            'overrunning': bool(interval and running_for and running_for > interval),
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_duration_s': round(self.last_duration, 4) if self.last_duration is not None else None,
+            'avg_duration_s': round(self.total_duration / self.runs, 4) if self.runs else None,
+            'max_duration_s': round(self.max_duration, 4),
+            'last_outcome': self.last_outcome,
+            'last_result': self.last_result,
+            'histogram': {'buckets_s': list(DURATION_BUCKETS), 'counts': list(self.histogram)},
+            'recent_errors': list(self.recent_errors),
+        }
+
+
+class SchedulerMetrics:
+    """Thread-sicherer Kennzahlenspeicher für alle Jobs der angebundenen Scheduler."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._schedulers = []
+
+    def _metrics(self, job_id):
+        metrics = self._jobs.get(job_id)
+        if metrics is None:
+            metrics = self._jobs[job_id] = JobMetrics(job_id)
+        return metrics
+
+    # --- Anbindung ---
+
+    def instrument(self, scheduler):
+        """Instrumentiert alle vorhandenen und künftig hinzugefügten Jobs eines Schedulers."""
+        with self._lock:
+            if scheduler in self._schedulers:
+                return
+            self._schedulers.append(scheduler)
+        _install_log_handler()
+        scheduler.add_listener(lambda event: self._on_job_added(scheduler, event), EVENT_JOB_ADDED)
+        scheduler.add_listener(self._on_job_skipped, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+        for job in scheduler.get_jobs():
+            self._wrap(job)
+
+    def _on_job_added(self, scheduler, event):
+        job = scheduler.get_job(event.job_id, event.jobstore)
+        if job is not None:
+            self._wrap(job)
+
+    def _wrap(self, job):
+        if getattr(job.func, '_scheduler_metrics', None) is self:
+            return
+        job.modify(func=self.timed(job.id, job.func, _interval_seconds(job.trigger)))
+
+    def _on_job_skipped(self, event):
+        outcome = 'missed' if event.code == EVENT_JOB_MISSED else 'overlap'
+        with self._lock:
+            self._metrics(event.job_id).results[outcome] += 1
+        scheduler_logger.warning(
+            f"Scheduler-Job '{event.job_id}' ausgelassen ({'verpasst' if outcome == 'missed' else 'läuft noch'})"
+        )
+
+    def timed(self, job_id, func, interval=None):
+        """Messhülle für eine Job-Funktion."""
+        def run(*args, **kwargs):
+            started_at = datetime.datetime.utcnow()
+            start = time.perf_counter()
+            current = {'errors': []}
+            _current_run.run = current
+            with self._lock:
+                self._metrics(job_id).running_since = started_at
+            result, outcome = None, 'ok'
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                current['errors'].append(f'{type(e).__name__}: {e}')
+                raise
+            finally:
+                _current_run.run = None
+                duration = time.perf_counter() - start
+                if current['errors']:
+                    outcome = 'error'
+                with self._lock:
+                    metrics = self._metrics(job_id)
+                    metrics.running_since = None
+                    metrics.record(started_at, duration, outcome, result, interval)
+                    for message in current['errors']:
+                        metrics.recent_errors.append({'at': started_at.isoformat(), 'message': message[:500]})
+                if interval and duration > interval:
+                    scheduler_logger.warning(
+                        f"Scheduler-Job '{job_id}' dauerte {duration:.1f}s (Intervall {interval:.0f}s)"
+                    )
+            return result
+        run._scheduler_metrics = self
+        run.__name__ = getattr(func, '__name__', job_id)
+        return run
+
+    # --- Auswertung ---
+
+    def snapshot(self):
+        """
+        Kennzahlen aller bekannten Jobs, ergänzt um die Daten aus den Schedulern.
+
+        Returns:
+            list: Ein dict pro Job, sortiert nach Job-ID
+        """
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            schedulers = list(self._schedulers)
+        registered = {}
+        for scheduler in schedulers:
+            for job in scheduler.get_jobs():
+                registered[job.id] = job
+        with self._lock:
+            job_ids = sorted(set(registered) | set(self._jobs))
+            jobs = []
+            for job_id in job_ids:
+                job = registered.get(job_id)
+                interval = _interval_seconds(job.trigger) if job else None
+                entry = {
+                    'id': job_id,
+                    'name': job.name if job else None,
+                    'trigger': str(job.trigger) if job else None,
+                    'interval_s': interval,
+                    'next_run_time': job.next_run_time.isoformat() if job and job.next_run_time else None,
+                    'registered': job is not None,
+                }
+                entry.update((self._jobs.get(job_id) or JobMetrics(job_id)).to_dict(now, interval))
+                jobs.append(entry)
+        return jobs
+
+    def is_running(self):
+        with self._lock:
+            return any(getattr(scheduler, 'running', False) for scheduler in self._schedulers)
+
+
+def _interval_seconds(trigger):
+    interval = getattr(trigger, 'interval', None)
+    return interval.total_seconds() if isinstance(interval, datetime.timedelta) else None
+
+
+class _RunErrorHandler(logging.Handler):
+    """Ordnet ERROR-Meldungen des Scheduler-Loggers dem laufenden Job des Threads zu."""
+
+    def emit(self, record):
+        run = getattr(_current_run, 'run', None)
+        if run is not None:
+            run['errors'].append(record.getMessage())
+
+
+_log_handler = None
+
+
+def _install_log_handler():
+    global _log_handler
+    if _log_handler is None:
+        _log_handler = _RunErrorHandler(level=logging.ERROR)
+        scheduler_logger.addHandler(_log_handler)
+
+
+def get_scheduler_metrics(app=None):
+    """Gibt die Scheduler-Kennzahlen der (aktuellen) App zurück und legt sie bei Bedarf an."""
+    app = app or current_app._get_current_object()
+    metrics = app.extensions.get('scheduler_metrics')
+    if metrics is None:
+        metrics = app.extensions['scheduler_metrics'] = SchedulerMetrics()
+    return metrics
@@ -0,0 +1,317 @@
+# search_index.py
+"""
+Volltextsuche über Aufträge, Spulen und Verbrauchsmaterialien.
+
+Unter SQLite werden FTS5-Tabellen verwendet, die per Trigger mit den
+Quelltabellen synchron gehalten werden – dadurch sind auch Bulk-Inserts
+und Massen-Updates abgedeckt. Die Suche arbeitet mit Präfix-Matching
+("gala" findet "Galaxy") und sortiert nach bm25-Relevanz.
+
+Auf anderen Datenbanken (oder ohne FTS5) wird auf eine ilike-Suche über
+dieselben Spalten zurückgegriffen.
+"""
+import re
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, text, or_, column, Integer
+from sqlalchemy.exc import DatabaseError
+
+from extensions import db
+from models import Job, FilamentSpool, FilamentType, Consumable
+
+SearchIndex = namedtuple('SearchIndex', ['name', 'source', 'columns', 'create_sql', 'populate_sql', 'triggers'])
+
+_SPOOL_MATERIAL = "ft.manufacturer || ' ' || ft.name || ' ' || coalesce(ft.material_type, '')"
+
+SEARCH_INDEXES = {
+    'jobs': SearchIndex(
+        name='job_fts',
+        source='job',
+        columns=['name', 'material_number', 'source_stl_filename'],
+        create_sql="CREATE VIRTUAL TABLE IF NOT EXISTS job_fts USING fts5("
+                   "name, material_number, source_stl_filename, tokenize='unicode61 remove_diacritics 2')",
+        populate_sql="INSERT INTO job_fts(rowid, name, material_number, source_stl_filename) "
+                     "SELECT id, name, material_number, source_stl_filename FROM job",
+        triggers=[
+            """CREATE TRIGGER IF NOT EXISTS job_fts_ai AFTER INSERT ON job BEGIN
+                INSERT INTO job_fts(rowid, name, material_number, source_stl_filename)
+                VALUES (new.id, new.name, new.material_number, new.source_stl_filename);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS job_fts_ad AFTER DELETE ON job BEGIN
+                DELETE FROM job_fts WHERE rowid = old.id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS job_fts_au AFTER UPDATE OF name, material_number, source_stl_filename ON job BEGIN
+                UPDATE job_fts SET name = new.name, material_number = new.material_number,
+                    source_stl_filename = new.source_stl_filename
+                WHERE rowid = new.id;
+            END""",
+        ]
+    ),
+    'spools': SearchIndex(
+        name='spool_fts',
+        source='filament_spool',
+        columns=['short_id', 'material', 'storage_location'],
+        create_sql="CREATE VIRTUAL TABLE IF NOT EXISTS spool_fts USING fts5("
+                   "short_id, material, storage_location, tokenize='unicode61 remove_diacritics 2')",
+        populate_sql="INSERT INTO spool_fts(rowid, short_id, material, storage_location) "
+                     f"SELECT s.id, s.short_id, {_SPOOL_MATERIAL}, s.storage_location "
+                     "FROM filament_spool s JOIN filament_type ft ON ft.id = s.filament_type_id",
+        triggers=[
+            f"""CREATE TRIGGER IF NOT EXISTS spool_fts_ai AFTER INSERT ON filament_spool BEGIN
+                INSERT INTO spool_fts(rowid, short_id, material, storage_location)
+                SELECT new.id, new.short_id, {_SPOOL_MATERIAL}, new.storage_location
+                FROM filament_type ft WHERE ft.id = new.filament_type_id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS spool_fts_ad AFTER DELETE ON filament_spool BEGIN
+                DELETE FROM spool_fts WHERE rowid = old.id;
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS spool_fts_au AFTER UPDATE OF short_id, storage_location, filament_type_id ON filament_spool BEGIN
+                DELETE FROM spool_fts WHERE rowid = old.id;
+                INSERT INTO spool_fts(rowid, short_id, material, storage_location)
+                SELECT new.id, new.short_id, {_SPOOL_MATERIAL}, new.storage_location
+                FROM filament_type ft WHERE ft.id = new.filament_type_id;
+            END""",
+            # Umbenennungen des Filament-Typs in alle zugehörigen Spulen übernehmen
+            """CREATE TRIGGER IF NOT EXISTS spool_fts_type_au AFTER UPDATE OF manufacturer, name, material_type ON filament_type BEGIN
+                UPDATE spool_fts SET material = new.manufacturer || ' ' || new.name || ' ' || coalesce(new.material_type, '')
+                WHERE rowid IN (SELECT id FROM filament_spool WHERE filament_type_id = new.id);
+            END""",
+        ]
+    ),
+    'consumables': SearchIndex(
+        name='consumable_fts',
+        source='consumable',
+        columns=['name', 'manufacturer', 'article_number', 'storage_location'],
+        create_sql="CREATE VIRTUAL TABLE IF NOT EXISTS consumable_fts USING fts5("
+                   "name, manufacturer, article_number, storage_location, tokenize='unicode61 remove_diacritics 2')",
+        populate_sql="INSERT INTO consumable_fts(rowid, name, manufacturer, article_number, storage_location) "
+                     "SELECT id, name, manufacturer, article_number, storage_location FROM consumable",
+        triggers=[
+            """CREATE TRIGGER IF NOT EXISTS consumable_fts_ai AFTER INSERT ON consumable BEGIN
+                INSERT INTO consumable_fts(rowid, name, manufacturer, article_number, storage_location)
+                VALUES (new.id, new.name, new.manufacturer, new.article_number, new.storage_location);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS consumable_fts_ad AFTER DELETE ON consumable BEGIN
+                DELETE FROM consumable_fts WHERE rowid = old.id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS consumable_fts_au AFTER UPDATE OF name, manufacturer, article_number, storage_location ON consumable BEGIN
+                UPDATE consumable_fts SET name = new.name, manufacturer = new.manufacturer,
+                    article_number = new.article_number, storage_location = new.storage_location
+                WHERE rowid = new.id;
+            END""",
+        ]
+    ),
+}
+
+# ilike-Fallback: dieselben Felder wie im FTS-Index
+FALLBACK_COLUMNS = {
+    'jobs': {
+        'name': [Job.name], 'material_number': [Job.material_number],
+        'source_stl_filename': [Job.source_stl_filename],
+    },
+    'spools': {
+        'short_id': [FilamentSpool.short_id],
+        'material': [FilamentType.manufacturer, FilamentType.name, FilamentType.material_type],
+        'storage_location': [FilamentSpool.storage_location],
+    },
+    'consumables': {
+        'name': [Consumable.name], 'manufacturer': [Consumable.manufacturer],
+        'article_number': [Consumable.article_number], 'storage_location': [Consumable.storage_location],
+    },
+}
+
+MODELS = {'jobs': Job, 'spools': FilamentSpool, 'consumables': Consumable}
+
+
+# --- Einrichtung ---
+
+def _table_exists(connection, name):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': name}
+    ).first() is not None
+
+
+def _trigger_names(index):
+    return [re.search(r'CREATE TRIGGER IF NOT EXISTS (\w+)', trigger).group(1) for trigger in index.triggers]
+
+
+def _index_usable(connection, index):
+    """Prüft einen vorhandenen Index mit dem FTS5-eigenen integrity-check."""
+    try:
+        connection.execute(text(f"INSERT INTO {index.name}({index.name}) VALUES ('integrity-check')"))
+    except DatabaseError:
+        return False
+    return True
+
+
+def ensure_search_index(connection, check=False):
+    """
+    Legt fehlende FTS-Tabellen und Trigger an und befüllt neu angelegte
+    Indizes aus den Quelltabellen. Vorhandene Indizes bleiben unberührt,
+    damit der App-Start ohne Schreibzugriff auskommt.
+
+    Args:
+        connection: Verbindung innerhalb einer Transaktion
+        check: Vorhandene Indizes zusätzlich per integrity-check prüfen und
+            beschädigte neu anlegen (teuer, nur für 'flask search-reindex')
+
+    Returns:
+        bool: True, wenn die FTS-Suche verfügbar ist
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    try:
+        existing = set(connection.execute(text("SELECT name FROM sqlite_master")).scalars())
+        for index in SEARCH_INDEXES.values():
+            if index.source not in existing:
+                return False
+            # Fehlen Trigger, wurde die Quelltabelle neu angelegt (oder der Index ist veraltet)
+            complete = index.name in existing and existing.issuperset(_trigger_names(index))
+            if complete and not (check and not _index_usable(connection, index)):
+                continue
+            connection.execute(text(f"DROP TABLE IF EXISTS {index.name}"))
+            connection.execute(text(index.create_sql))
+            for trigger in index.triggers:
+                connection.execute(text(trigger))
+            connection.execute(text(index.populate_sql))
+    except DatabaseError:
+        # SQLite ohne FTS5-Unterstützung oder nicht mehr löschbarer Index: ilike-Fallback
+        return False
+    return True
+
+
+def rebuild_search_index(connection):
+    """Befüllt alle FTS-Indizes neu aus den Quelltabellen."""
+    for index in SEARCH_INDEXES.values():
+        connection.execute(text(f"DELETE FROM {index.name}"))
+        connection.execute(text(index.populate_sql))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    available = ensure_search_index(connection)
+    if has_app_context():
+        current_app.extensions['fts_search'] = available
+
+
+def init_search_index(app):
+    """Richtet die Volltextsuche beim App-Start ein (für bestehende Datenbanken)."""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            app.extensions['fts_search'] = ensure_search_index(connection)
+
+
+@click.command('search-reindex')
+@with_appcontext
+def search_reindex_command():
+    """Prüft die Volltext-Suchindizes und baut sie neu auf."""
+    with db.engine.begin() as connection:
+        available = ensure_search_index(connection, check=True)
+        current_app.extensions['fts_search'] = available
+        if not available:
+            click.echo("Volltextsuche nicht verfügbar (kein SQLite/FTS5) – ilike-Fallback aktiv.")
+            return
+        rebuild_search_index(connection)
+    click.echo("Suchindizes neu aufgebaut.")
+
+
+def fts_available():
+    """
+    Gibt zurück, ob die FTS-Suche verfügbar ist. Das Ergebnis wird pro App
+    gemerkt (auch ein negatives) und bei create_all bzw. search-reindex
+    aktualisiert.
+    """
+    available = current_app.extensions.get('fts_search')
+    if available is None:
+        available = db.engine.dialect.name == 'sqlite' and all(
+            _table_exists(db.session.connection(), index.name) for index in SEARCH_INDEXES.values()
+        )
+        current_app.extensions['fts_search'] = available
+    return available
+
+
+# --- Abfragen ---
+
+def build_match_query(term, columns=None):
+    """
+    Wandelt eine Benutzereingabe in einen FTS5-MATCH-Ausdruck um: alle Wörter
+    müssen (als Präfix) vorkommen. Sonderzeichen werden entfernt, damit die
+    FTS-Syntax nicht verletzt werden kann.
+
+    Returns:
+        str oder None, wenn die Eingabe keine Wörter enthält
+    """
+    tokens = re.findall(r'\w+', term or '', re.UNICODE)
+    if not tokens:
+        return None
+    query = ' '.join(f'"{token}"*' for token in tokens)
+    if columns:
+        query = '{' + ' '.join(columns) + '} : (' + query + ')'
+    return query
+
+
+def _fallback_filter(kind, term, columns=None):
+    fields = FALLBACK_COLUMNS[kind]
+    selected = [col for name in (columns or fields) for col in fields[name]]
+    conditions = []
+    for token in term.split():
+        conditions.append(or_(*[col.ilike(f'%{token}%') for col in selected]))
+    return db.and_(*conditions)
+
+
+def search_filter(kind, term, columns=None):
+    """
+    Filterbedingung für Listenansichten (z.B. Job.query.filter(...)).
+
+    Unter FTS5 eine Einschränkung auf die passenden IDs, sonst ilike.
+    Bei 'spools' muss die Abfrage im Fallback mit FilamentType gejoint sein.
+    """
+    if fts_available():
+        match = build_match_query(term, columns)
+        if match is None:
+            return db.false()
+        index = SEARCH_INDEXES[kind]
+        ids = text(f"SELECT rowid FROM {index.name} WHERE {index.name} MATCH :match").bindparams(match=match)
+        return MODELS[kind].id.in_(ids.columns(column('rowid', Integer)))
+    return _fallback_filter(kind, term, columns)
+
+
+def ranked_ids(kind, term, limit=20, columns=None):
+    """
+    IDs der besten Treffer, absteigend nach Relevanz.
+
+    Returns:
+        list[tuple[int, float]]: (id, score); im Fallback ist score None
+    """
+    if fts_available():
+        match = build_match_query(term, columns)
+        if match is None:
+            return []
+        index = SEARCH_INDEXES[kind]
+        # bm25 liefert negative Werte: kleiner = relevanter
+        rows = db.session.execute(text(
+            f"SELECT rowid, bm25({index.name}) AS score FROM {index.name} "
+            f"WHERE {index.name} MATCH :match ORDER BY score LIMIT :limit"
+        ), {'match': match, 'limit': limit}).all()
+        return [(row_id, -score) for row_id, score in rows]
+
+    model = MODELS[kind]
+    query = db.session.query(model.id)
+    if kind == 'spools':
+        query = query.join(FilamentType)
+    order = {'jobs': Job.name, 'spools': FilamentSpool.short_id, 'consumables': Consumable.name}[kind]
+    rows = query.filter(_fallback_filter(kind, term, columns)).order_by(order).limit(limit).all()
+    return [(row_id, None) for (row_id,) in rows]
+
+
+def load_ranked(kind, term, limit=20, columns=None, options=()):
+    """Lädt die Treffer als Modellobjekte in Relevanzreihenfolge."""
+    ranking = ranked_ids(kind, term, limit, columns)
+    if not ranking:
+        return []
+    model = MODELS[kind]
+    objects = {obj.id: obj for obj in model.query.options(*options).filter(model.id.in_([i for i, _ in ranking]))}
+    return [(objects[i], score) for i, score in ranking if i in objects]
@@ -0,0 +1,140 @@
+// static/realtime.js - Raum-Abonnements und delta-kodierte Status-Updates über Socket.IO
+
+/**
+ * Tritt Socket.IO-Räumen bei (z.B. 'printer:3', 'project:7', 'page:materials').
+ * Räume gehen bei einem Reconnect verloren und werden daher erneut abonniert.
+ */
+function subscribeRooms(socket, rooms) {
+    const join = () => socket.emit('subscribe', { rooms: rooms });
+    socket.on('connect', join);
+    if (socket.connected) join();
+}
+
+/**
+ * Abonniert den Drucker-Status über 'status_delta' / 'status_full'.
+ *
+ * Der Client hält den vollständigen Zustand lokal und wendet nur die
+ * gesendeten Änderungen an. Bei einer Lücke in der Sequenznummer oder
+ * einer neuen Epoche (Leaderwechsel) wird der vollständige Zustand neu
+ * angefordert.
+ *
+ * @param {Socket} socket - Socket.IO-Verbindung
+ * @param {Function} onChange - wird mit {printerId: status} aller geänderten
+ *                              Drucker und der Liste entfernter IDs aufgerufen
+ */
+function subscribeStatusStream(socket, onChange) {
+    const state = {};
+    let seq = null;
+    let epoch = null;
+
+    function requestResync() {
+        seq = null;
+        socket.emit('request_resync');
+    }
+
+    // Erst dem Flotten-Raum beitreten, dann den Vollzustand anfordern
+    subscribeRooms(socket, ['page:fleet']);
+    socket.on('connect', requestResync);
+
+    socket.on('status_full', data => {
+        for (const printerId in state) delete state[printerId];
+        Object.assign(state, data.printers);
+        seq = data.seq;
+        epoch = data.epoch;
+        onChange(state, []);
+    });
+
+    socket.on('status_delta', delta => {
+        if (seq === null) return;            // Warten auf status_full
+        if (delta.epoch !== epoch) {         // Anderer Leader: Sequenz beginnt neu
+            requestResync();
+            return;
+        }
+        if (delta.seq <= seq) return;        // Bereits im Vollzustand enthalten
+        if (delta.seq !== seq + 1) {         // Lücke erkannt
+            requestResync();
+            return;
+        }
+
+        const changed = {};
+        for (const printerId in delta.changes) {
+            state[printerId] = Object.assign(state[printerId] || {}, delta.changes[printerId]);
+            changed[printerId] = state[printerId];
+        }
+        for (const printerId of delta.removed) {
+            delete state[printerId];
+        }
+        seq = delta.seq;
+        onChange(changed, delta.removed);
+    });
+
+    return { state, requestResync };
+}
+
+/**
+ * Tritt Räumen bei und registriert die Handler der dort gesendeten Ereignisse.
+ *
+ * @param {Socket} socket - Socket.IO-Verbindung
+ * @param {string[]} rooms - z.B. ['page:jobs', 'project:7']
+ * @param {Object} handlers - {ereignis: function(payload)}
+ */
+function subscribeRoomEvents(socket, rooms, handlers) {
+    subscribeRooms(socket, rooms);
+    for (const [event, handler] of Object.entries(handlers)) {
+        socket.on(event, handler);
+    }
+}
+
+/**
+ * Zeigt eine Echtzeit-Meldung als Toast oben rechts an (Text, kein HTML).
+ *
+ * @param {string} message - Meldungstext
+ * @param {string} type - Bootstrap-Farbe (info, success, warning, danger)
+ */
+function showRealtimeToast(message, type = 'info') {
+    const toast = document.createElement('div');
+    toast.className = `toast align-items-center text-white bg-${type} border-0`;
+    toast.setAttribute('role', 'alert');
+    toast.style.cssText = 'position: fixed; top: 20px; right: 20px; z-index: 9999;';
+    toast.innerHTML = `
+        <div class="d-flex">
+            <div class="toast-body"></div>
+            <button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast"></button>
+        </div>`;
+    toast.querySelector('.toast-body').textContent = message;
+    document.body.appendChild(toast);
+    new bootstrap.Toast(toast).show();
+    setTimeout(() => toast.remove(), 8000);
+}
+
+/**
+ * Meldungstexte der Warn-Ereignisse, gemeinsam für alle Seiten.
+ */
+const REALTIME_ALERTS = {
+    deadline_alert: a => a.type === 'overdue'
+        ? [`Auftrag "${a.job_name}" ist seit ${a.hours_overdue} h überfällig (${a.printer}).`, 'danger']
+        : [`Auftrag "${a.job_name}" muss in ${a.hours_remaining} h fertig sein (${a.printer}).`, 'warning'],
+    project_deadline_alert: a =>
+        [`Projekt "${a.project_name}": Deadline in ${a.hours_remaining} h, ${a.incomplete_jobs} Aufträge offen.`, 'warning'],
+    maintenance_overdue: a =>
+        [`Wartung überfällig: ${a.printers.map(p => p.name).join(', ')}`, 'danger'],
+    maintenance_urgent: a =>
+        [`Wartung bald fällig: ${a.printers.map(p => p.name).join(', ')}`, 'warning'],
+    time_window_violation: a =>
+        [`Drucker "${a.printer_name}" druckt "${a.job_name}" außerhalb seines Zeitfensters.`, 'warning'],
+    low_stock_alert: a => [`Niedriger Bestand: ${a.material} (${Math.round(a.current_weight)} g von ${a.reorder_level} g)`, 'warning'],
+    drying_timer_alert: a => [a.message, 'info'],
+};
+
+/**
+ * Handler, die die angegebenen Warn-Ereignisse als Toast anzeigen.
+ *
+ * @param {string[]} events - Schlüssel aus REALTIME_ALERTS
+ */
+function alertToastHandlers(events) {
+    const handlers = {};
+    for (const event of events) {
+        handlers[event] = payload => showRealtimeToast(...REALTIME_ALERTS[event](payload));
+    }
+    return handlers;
+}
@@ -0,0 +1,108 @@
+# stock_alerts.py
+"""
+Zwischengespeicherte Liste der Materialien mit niedrigem Bestand.
+
+Die Liste wird mit einer einzigen gruppierten Abfrage berechnet und pro App
+im Speicher gehalten. Änderungen an Spulengewichten invalidieren den Cache;
+zusätzlich läuft er nach einer TTL ab, damit auch Änderungen anderer
+Prozesse oder nicht erfasster Pfade nach kurzer Zeit sichtbar werden.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import func
+
+import change_tracking
+from extensions import db
+from models import FilamentType, FilamentSpool
+
+# Sicherheitsnetz: Cache spätestens nach dieser Zeit neu berechnen
+DEFAULT_LOW_STOCK_TTL_SECONDS = 300
+
+LowStockMaterial = namedtuple(
+    'LowStockMaterial',
+    ['id', 'manufacturer', 'name', 'material_type', 'color_hex', 'reorder_level_g', 'total_remaining_weight']
+)
+
+
+def compute_low_stock_materials():
+    """
+    Ermittelt alle Materialien, deren Gesamtbestand den Meldebestand
+    erreicht oder unterschritten hat – in einer gruppierten Abfrage.
+
+    Returns:
+        list[LowStockMaterial]
+    """
+    total_weight = func.coalesce(func.sum(FilamentSpool.current_weight_g), 0)
+    rows = db.session.query(
+        FilamentType.id, FilamentType.manufacturer, FilamentType.name, FilamentType.material_type,
+        FilamentType.color_hex, FilamentType.reorder_level_g, total_weight
+    ).outerjoin(
+        FilamentSpool, FilamentSpool.filament_type_id == FilamentType.id
+    ).filter(
+        FilamentType.reorder_level_g.isnot(None),
+        FilamentType.reorder_level_g > 0
+    ).group_by(
+        FilamentType.id
+    ).having(
+        total_weight <= FilamentType.reorder_level_g
+    ).order_by(FilamentType.name).all()
+
+    return [LowStockMaterial(*row) for row in rows]
+
+
+class LowStockCache:
+    """Thread-sicherer TTL-Cache für compute_low_stock_materials()."""
+
+    def __init__(self, ttl_seconds=DEFAULT_LOW_STOCK_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._materials = None
+        self._computed_at = 0.0
+
+    def get(self):
+        with self._lock:
+            expired = time.monotonic() - self._computed_at > self.ttl_seconds
+            if self._materials is None or expired:
+                self._materials = compute_low_stock_materials()
+                self._computed_at = time.monotonic()
+            return self._materials
+
+    def invalidate(self):
+        with self._lock:
+            self._materials = None
+
+
+def get_low_stock_cache(app=None):
+    """Gibt den Low-Stock-Cache der (aktuellen) App zurück."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('low_stock_cache')
+    if cache is None:
+        cache = LowStockCache(app.config.get('LOW_STOCK_CACHE_TTL_SECONDS', DEFAULT_LOW_STOCK_TTL_SECONDS))
+        app.extensions['low_stock_cache'] = cache
+    return cache
+
+
+def get_low_stock_materials():
+    """Materialien mit niedrigem Bestand (aus dem Cache)."""
+    return get_low_stock_cache().get()
+
+
+def invalidate_low_stock_cache():
+    """
+    Verwirft den Cache nach einer Bestandsänderung.
+
+    Wird sofort und – falls eine Transaktion offen ist – nochmals nach dem
+    Commit ausgeführt, damit ein zwischenzeitliches Neuberechnen mit dem
+    alten Stand nicht bis zum Ablauf der TTL hängen bleibt.
+    """
+    get_low_stock_cache().invalidate()
+    change_tracking.pending_changes().data['low_stock'] = True
+
+
+@change_tracking.on_commit
+def _invalidate_after_commit(changes):
+    if changes.data.get('low_stock'):
+        get_low_stock_cache().invalidate()
@@ -0,0 +1,119 @@
+# test_analytics_cache.py
+"""
+Tests für den Stale-while-revalidate-Cache der Auswertungen.
+"""
+import threading
+import time
+
+import pytest
+
+from extensions import db
+from models import Printer, Project, Job, JobStatus
+from analytics_cache import AnalyticsCache, get_analytics_cache, invalidate_analytics
+
+
+@pytest.fixture
+def app(app):
+    db.session.add(Printer(name='P1'))
+    db.session.commit()
+    return app
+
+
+def _wait_for(predicate, timeout=5.0):
+    """Wartet, bis die Hintergrund-Berechnung ihr Ergebnis eingetragen hat."""
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_stale_value_is_served_while_refreshing_in_background(app):
+    cache = AnalyticsCache(app, ttl_seconds=60, background=True)
+    release = threading.Event()
+    finished = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(5)
+            finished.set()
+        return len(calls)
+
+    assert cache.get('key', compute) == 1
+    assert cache.get('key', compute) == 1
+    cache.invalidate()
+
+    # Veralteter Wert sofort, nur eine Hintergrund-Berechnung trotz mehrerer Zugriffe
+    assert cache.get('key', compute) == 1
+    assert cache.get('key', compute) == 1
+    assert cache.stats()['refreshing'] == 1
+    release.set()
+    assert finished.wait(5)
+    _wait_for(lambda: cache.stats()['refreshes'])
+
+    assert cache.get('key', compute) == 2
+    stats = cache.stats()
+    assert (stats['misses'], stats['hits'], stats['stale_hits'], stats['refreshes']) == (1, 2, 2, 1)
+    assert len(calls) == 2
+
+
+def test_failed_refresh_keeps_last_value(app):
+    cache = AnalyticsCache(app, ttl_seconds=0, background=False)
+    assert cache.get('key', lambda: 'alt') == 'alt'
+    with pytest.raises(RuntimeError):
+        cache.get('key', lambda: (_ for _ in ()).throw(RuntimeError('kaputt')))
+
+    background = AnalyticsCache(app, ttl_seconds=0, background=True)
+    background.get('key', lambda: 'alt')
+    done = threading.Event()
+
+    def failing():
+        done.set()
+        raise RuntimeError('kaputt')
+
+    assert background.get('key', failing) == 'alt'
+    assert done.wait(5)
+    _wait_for(lambda: background.stats()['errors'])
+    assert background.stats()['errors'] == 1
+    assert background.get('key', lambda: 'neu') == 'alt'
+
+
+def test_commit_invalidates_entries_by_table(app):
+    cache = get_analytics_cache()
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+
+    cache.get('printers', compute, tags=('printer',))
+    cache.get('projects', compute, tags=('project',))
+    db.session.add(Printer(name='P2'))
+    db.session.commit()
+
+    # Im Testmodus wird synchron neu berechnet
+    assert cache.get('printers', compute, tags=('printer',)) == 3
+    assert cache.get('projects', compute, tags=('project',)) == 2
+
+    invalidate_analytics('project')
+    assert cache.get('projects', compute, tags=('project',)) == 4
+
+
+def test_analytics_endpoints_are_cached(logged_in_client):
+    project = Project(name='Gehäuse')
+    db.session.add(project)
+    db.session.commit()
+
+    for _ in range(2):
+        assert logged_in_client.get('/kpi/dashboard').status_code == 200
+        assert logged_in_client.get('/kpi/api/queue-status').status_code == 200
+        assert logged_in_client.get('/api/filament/forecast').get_json()['status'] == 'success'
+        assert logged_in_client.get('/materials/consumption-analytics').status_code == 200
+        assert logged_in_client.get(f'/projects/{project.id}/stats').get_json()['project_name'] == 'Gehäuse'
+    assert logged_in_client.get('/projects/999/stats').status_code == 404
+
+    stats = logged_in_client.get('/kpi/api/cache-stats').get_json()
+    assert stats['misses'] == 6
+    assert stats['hits'] == 5
+
+    # Neuer Auftrag im Projekt macht die Projektstatistik veraltet
+    db.session.add(Job(name='Deckel', project_id=project.id, status=JobStatus.PENDING))
+    db.session.commit()
+    assert logged_in_client.get(f'/projects/{project.id}/stats').get_json()['total_jobs'] == 1
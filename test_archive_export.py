@@ -0,0 +1,64 @@
+# test_archive_export.py
+"""
+Tests für den gestreamten Export des Auftragsarchivs.
+"""
+import datetime
+import json
+
+import pytest
+
+from extensions import db
+from models import Job, JobStatus, Printer, PrinterStatus, GCodeFile, CostCalculation, FilamentType
+import routes.jobs as jobs_module
+
+
+@pytest.fixture
+def app(app):
+    printer = Printer(name='Export Drucker', status=PrinterStatus.IDLE)
+    gcode = GCodeFile(filename='teil.gcode')
+    ftype = FilamentType(manufacturer='A', name='PLA', material_type='PLA')
+    db.session.add_all([printer, gcode, ftype])
+    db.session.flush()
+    end = datetime.datetime(2026, 3, 1, 12, 0)
+    for i in range(25):
+        db.session.add(Job(
+            name=f'Archiv {i}', status=JobStatus.COMPLETED, is_archived=True,
+            printer_id=printer.id, gcode_file_id=gcode.id, required_filament_type_id=ftype.id,
+            end_time=end - datetime.timedelta(hours=i), actual_print_duration_s=600
+        ))
+    db.session.flush()
+    first = Job.query.filter_by(name='Archiv 0').first()
+    db.session.add(CostCalculation(
+        name='Kalkulation', job_id=first.id, gcode_file_id=gcode.id, filament_type_id=ftype.id,
+        printer_id=printer.id, material_cost=1.5, machine_cost=2.0, personnel_cost=3.0,
+        total_cost_without_margin=6.5
+    ))
+    db.session.commit()
+    return app
+
+
+def test_csv_export_streams_in_chunks(logged_in_client, count_queries, monkeypatch):
+    monkeypatch.setattr(jobs_module, 'ARCHIVE_EXPORT_CHUNK_SIZE', 10)
+    with count_queries() as statements:
+        response = logged_in_client.get('/jobs/archive/export')
+        chunks = list(response.response)
+
+    assert response.is_streamed
+    assert chunks[0].startswith(b'ID;Name;Status')
+    lines = b''.join(chunks).decode().strip().splitlines()
+    assert len(lines) == 26
+    assert lines[1].split(';')[1] == 'Archiv 0'
+    assert lines[1].split(';')[4:7] == ['Export Drucker', 'teil.gcode', 'PLA']
+    assert lines[1].split(';')[-4:] == ['1.5', '2.0', '3.0', '6.5']
+    # Keine Lazy-Loads pro Zeile: Abfragen wachsen nur mit der Zahl der Blöcke
+    job_statements = [s for s in statements if 'FROM job' in s or 'FROM cost_calculation' in s]
+    assert len(job_statements) <= 5
+
+
+def test_jsonl_export(logged_in_client):
+    response = logged_in_client.get('/jobs/archive/export?format=jsonl')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == 25
+    assert rows[0]['name'] == 'Archiv 0' and rows[0]['total_cost'] == 6.5
+    assert rows[1]['material_cost'] is None
@@ -0,0 +1,167 @@
+# test_assignment_engine.py
+"""
+Tests für die optimale Zuweisung von Aufträgen zu Druckern.
+"""
+import datetime
+import itertools
+
+import numpy as np
+import pytest
+
+from conftest import create_job, create_printer, filament_type
+from extensions import db
+from models import (Printer, PrinterStatus, Job, JobStatus, FilamentType, FilamentSpool,
+                    JobDependency, DependencyType, TimeWindow)
+from assignment_engine import solve_assignment, plan_assignments
+from scheduler import assign_pending_jobs, set_app_context
+from scheduler_extension import assign_pending_jobs_advanced
+
+NOW = datetime.datetime(2026, 10, 19, 10, 0)  # Montag
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([
+        FilamentType(manufacturer='Test', name='PLA Schwarz', material_type='PLA'),
+        FilamentType(manufacturer='Test', name='PETG Blau', material_type='PETG'),
+    ])
+    db.session.commit()
+    return app
+
+
+def _stock(material, grams=1000):
+    db.session.add(FilamentSpool(filament_type_id=filament_type(material).id, current_weight_g=grams))
+    db.session.flush()
+
+
+def _pairs(plan):
+    return {(a.job.name, a.printer.name) for a in plan}
+
+
+def test_solver_matches_brute_force():
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        rows, cols = int(rng.integers(1, 6)), int(rng.integers(1, 6))
+        cost = rng.uniform(0, 10, size=(rows, cols))
+        pairs = solve_assignment(cost)
+        assert len(pairs) == min(rows, cols)
+        if rows <= cols:
+            best = min(sum(cost[i, p[i]] for i in range(rows)) for p in itertools.permutations(range(cols), rows))
+        else:
+            best = min(sum(cost[p[j], j] for j in range(cols)) for p in itertools.permutations(range(rows), cols))
+        assert sum(cost[i, j] for i, j in pairs) == pytest.approx(best)
+
+
+def test_maximizes_started_jobs_where_greedy_fails(app):
+    # A passt auf beide Drucker, B nur auf P1 (PETG): gierig bekäme A den P1
+    p1 = create_printer('P1', materials='PLA,PETG', spool='PETG')
+    p2 = create_printer('P2', materials='PLA', spool='PLA')
+    jobs = [create_job('A', 'PLA', 50), create_job('B', 'PETG', 50)]
+    plan = plan_assignments(jobs, [p1, p2], now=NOW)
+    assert _pairs(plan) == {('A', 'P2'), ('B', 'P1')}
+    assert plan.spool_changes == 0
+
+
+def test_prefers_loaded_spool_and_checks_grams_and_volume(app):
+    _stock('PLA', grams=200)
+    printers = [
+        create_printer('Klein', spool='PLA', build_volume_l=100, build_volume_w=100, build_volume_h=100),
+        create_printer('Fast leer', spool='PLA', spool_g=30, build_volume_l=250, build_volume_w=210, build_volume_h=220),
+        create_printer('Falsche Spule', spool='PETG', build_volume_l=250, build_volume_w=210, build_volume_h=220),
+    ]
+    big = create_job('Groß', 'PLA', grams=150, dims=(200, 120, 50))
+    plan = plan_assignments([big], printers, now=NOW)
+    # Klein: Bauraum zu klein; Fast leer: Spule reicht nicht -> Wechsel auf Lager-Spule
+    assert plan.assignments[0].printer.name in ('Fast leer', 'Falsche Spule')
+    assert plan.spool_changes == 1
+
+    rotated = create_job('Gedreht', 'PLA', grams=20, dims=(90, 200, 50))
+    plan = plan_assignments([rotated], printers, now=NOW)
+    assert _pairs(plan) == {('Gedreht', 'Fast leer')}
+    assert plan.spool_changes == 0
+
+    too_heavy = create_job('Schwer', 'PLA', grams=5000)
+    plan = plan_assignments([too_heavy], printers, now=NOW)
+    assert len(plan) == 0 and plan.skipped['material'] == 1
+
+
+def test_free_spools_limit_loads_per_type(app):
+    _stock('PLA', grams=100)
+    printers = [create_printer('Leer'), create_printer('PETG geladen', spool='PETG'), create_printer('Auch leer')]
+    jobs = [create_job('Erster', 'PLA', 50), create_job('Zweiter', 'PLA', 50), create_job('Dritter', 'PLA', 50)]
+
+    # Nur eine freie PLA-Spule: nur der wichtigste Auftrag bekommt sie
+    plan = plan_assignments(jobs, printers, now=NOW)
+    assert [a.job.name for a in plan] == ['Erster'] and plan.spool_changes == 1
+    assert plan.skipped['material'] == 2
+
+    # Best fit: die kleine Spule für den kleinen Auftrag, die große für den großen
+    _stock('PLA', grams=500)
+    heavy = create_job('Schwer', 'PLA', 400)
+    plan = plan_assignments([jobs[0], heavy], printers, now=NOW)
+    assert {a.job.name for a in plan} == {'Erster', 'Schwer'}
+
+
+def test_priority_order_and_skip_reasons(app):
+    closed = create_printer('Zu', spool='PLA')
+    db.session.add(TimeWindow(printer_id=closed.id, day_of_week=NOW.weekday(),
+                              start_time=datetime.time(18, 0), end_time=datetime.time(22, 0)))
+    open_printer = create_printer('Offen', spool='PLA')
+    first = create_job('Wichtig', 'PLA', 10)
+    second = create_job('Unwichtig', 'PLA', 10)
+    waiting = create_job('Wartet', 'PLA', 10)
+    db.session.add(JobDependency(job_id=waiting.id, depends_on_job_id=second.id,
+                                 dependency_type=DependencyType.FINISH_TO_START))
+    db.session.flush()
+
+    plan = plan_assignments([waiting, first, second], [closed, open_printer], now=NOW)
+    assert _pairs(plan) == {('Wichtig', 'Offen')}
+    assert plan.skipped['dependencies'] == 1
+
+    plan = plan_assignments([first], [closed], now=NOW)
+    assert plan.skipped['time_window'] == 1
+
+
+def test_query_count_is_bounded(app, count_queries):
+    def scenario(printer_count, job_count):
+        printers = [create_printer(f'P{printer_count}-{i}', spool='PLA' if i % 2 else 'PETG')
+                    for i in range(printer_count)]
+        jobs = [create_job(f'J{job_count}-{i}', 'PLA' if i % 3 else 'PETG', 20) for i in range(job_count)]
+        _stock('PLA')
+        db.session.commit()
+        # Wie im Scheduler: Kandidaten frisch geladen
+        printers = Printer.query.filter(Printer.id.in_([p.id for p in printers])).all()
+        jobs = Job.query.filter(Job.id.in_([j.id for j in jobs])).order_by(Job.id).all()
+        with count_queries() as statements:
+            plan = plan_assignments(jobs, printers, now=NOW)
+        return plan, len(statements)
+
+    small_plan, small = scenario(2, 3)
+    large_plan, large = scenario(30, 60)
+    assert small == large
+    assert len(large_plan) == 30
+
+
+def test_schedulers_use_engine(app):
+    set_app_context(app)
+    create_printer('P1', materials='PLA,PETG', spool='PETG')
+    create_printer('P2', materials='PLA', spool='PLA')
+    create_job('A', 'PLA', 50, priority=5)
+    create_job('B', 'PETG', 50, priority=1)
+    db.session.commit()
+
+    assign_pending_jobs()
+    db.session.expire_all()
+    assert {(j.name, j.assigned_printer.name) for j in Job.query.filter_by(status=JobStatus.ASSIGNED)} == {
+        ('A', 'P2'), ('B', 'P1')
+    }
+    assert {p.status for p in Printer.query} == {PrinterStatus.QUEUED}
+
+    p3 = create_printer('P3', spool='PLA')
+    create_job('C', 'PLA', 10, priority_score=50.0)
+    db.session.commit()
+    assign_pending_jobs_advanced()
+    db.session.expire_all()
+    job = Job.query.filter_by(name='C').one()
+    assert job.status == JobStatus.ASSIGNED and job.printer_id == p3.id
+    assert job.estimated_start_time is not None
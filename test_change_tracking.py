@@ -0,0 +1,59 @@
+# test_change_tracking.py
+"""
+Tests für die gemeinsame Erfassung der Transaktionsänderungen.
+"""
+import pytest
+from sqlalchemy import update
+
+import change_tracking
+from extensions import db
+from models import Job, JobStatus, Printer
+
+
+@pytest.fixture
+def published(app):
+    commits, rollbacks = [], []
+    commit_cb = change_tracking.on_commit(lambda changes: commits.append(changes))
+    rollback_cb = change_tracking.on_rollback(lambda changes: rollbacks.append(changes))
+    yield commits, rollbacks
+    change_tracking._commit_callbacks.remove(commit_cb)
+    change_tracking._rollback_callbacks.remove(rollback_cb)
+
+
+def test_changes_are_published_once_per_commit(published):
+    commits, rollbacks = published
+    printer = Printer(name='P1')
+    db.session.add(printer)
+    db.session.flush()
+    printer.name = 'P1'  # unverändert: keine Tabelle
+    db.session.execute(update(Job).values(priority=2))
+    assert commits == []
+    db.session.commit()
+
+    assert len(commits) == 1
+    assert commits[0].tables == {'printer', 'job'}
+    assert commits[0].bulk_changes(Job) == [change_tracking.BulkChange(Job, 'update', frozenset({'priority'}))]
+
+    db.session.add(Job(name='Verworfen', status=JobStatus.PENDING))
+    db.session.flush()
+    db.session.rollback()
+    assert len(commits) == 1 and rollbacks[0].tables == {'job'}
+
+
+def test_savepoints_defer_to_outer_transaction(published):
+    commits, rollbacks = published
+    db.session.add(Printer(name='Außen'))
+    db.session.flush()
+
+    # Zurückgerollter Savepoint verwirft die äußeren Änderungen nicht
+    with db.session.begin_nested() as savepoint:
+        db.session.add(Job(name='Innen', status=JobStatus.PENDING))
+        db.session.flush()
+        savepoint.rollback()
+    # Committeter Savepoint veröffentlicht noch nichts
+    with db.session.begin_nested():
+        db.session.add(Job(name='Innen 2', status=JobStatus.PENDING))
+    assert commits == [] and rollbacks == []
+
+    db.session.commit()
+    assert len(commits) == 1 and commits[0].tables == {'printer', 'job'}
@@ -0,0 +1,89 @@
+# test_changeover_sequencer.py
+"""
+Tests für die Rüstoptimierung der Drucker-Warteschlangen.
+"""
+import datetime
+
+from extensions import db
+from models import Printer, PrinterStatus, Job, JobStatus, FilamentType, FilamentSpool, GCodeFile, JobDependency
+from changeover_sequencer import QueueItem, CHANGEOVER, sequence_queue, count_changeovers, optimize_printer_queues
+from scheduler import set_app_context
+from scheduler_extension import optimize_job_queue
+
+NOW = datetime.datetime(2026, 10, 19, 10, 0)
+H = datetime.timedelta(hours=1)
+
+
+def _item(job_id, family, hours=1, deadline=None, after=()):
+    return QueueItem(job_id, family, hours * H, NOW + deadline * H if deadline else None, 0.0, tuple(after))
+
+
+def _ids(items):
+    return [item.job_id for item in items]
+
+
+def test_groups_by_filament_starting_with_loaded_spool():
+    items = [_item(1, 'A'), _item(2, 'B'), _item(3, 'A'), _item(4, None), _item(5, 'B'), _item(6, 'A')]
+    assert count_changeovers(items, 'B') == 5
+    ordered = sequence_queue(items, NOW, family='B')
+    assert _ids(ordered) == [2, 4, 5, 1, 3, 6]
+    assert count_changeovers(ordered, 'B') == 1
+
+
+def test_deadlines_and_dependencies_limit_grouping():
+    # Auftrag 3 (Filament B) muss bis 2h + Wechsel fertig sein
+    items = [_item(1, 'A'), _item(2, 'A'), _item(3, 'B', deadline=2.5), _item(4, 'A')]
+    ordered = sequence_queue(items, NOW, family='A')
+    assert _ids(ordered) == [1, 3, 2, 4]
+    end = NOW + H + CHANGEOVER + H
+    assert end <= items[2].deadline
+
+    # Nicht haltbare Deadline: nicht später als in reiner EDD-Reihenfolge
+    items = [_item(1, 'A'), _item(2, 'B', deadline=0.5), _item(3, 'A')]
+    assert _ids(sequence_queue(items, NOW, family='A'))[0] == 2
+
+    # Vorgänger vor Nachfolger, auch wenn das einen Wechsel mehr kostet
+    items = [_item(1, 'A', after=[2]), _item(2, 'B'), _item(3, 'A')]
+    ordered = _ids(sequence_queue(items, NOW, family='A'))
+    assert ordered.index(2) < ordered.index(1)
+    assert ordered == [3, 2, 1]
+
+
+def test_optimize_persists_queue_positions(app):
+    set_app_context(app)
+    pla = FilamentType(manufacturer='Test', name='PLA Schwarz', material_type='PLA', color_hex='#000000')
+    petg = FilamentType(manufacturer='Test', name='PETG Blau', material_type='PETG', color_hex='#0000FF')
+    printer = Printer(name='P1', status=PrinterStatus.QUEUED)
+    db.session.add_all([pla, petg, printer])
+    db.session.flush()
+    db.session.add(FilamentSpool(filament_type_id=petg.id, current_weight_g=800, is_in_use=True,
+                                 assigned_to_printer_id=printer.id))
+    gcode = GCodeFile(filename='teil.gcode', estimated_print_time_min=60)
+    db.session.add(gcode)
+    db.session.flush()
+    names = [('PLA 1', pla, 5), ('PETG 1', petg, 4), ('PLA 2', pla, 3), ('PETG 2', petg, 2)]
+    jobs = {}
+    for name, filament, priority in names:
+        jobs[name] = Job(name=name, status=JobStatus.ASSIGNED, printer_id=printer.id, priority=priority,
+                         gcode_file_id=gcode.id, required_filament_type_id=filament.id)
+        db.session.add(jobs[name])
+    db.session.flush()
+    db.session.add(JobDependency(job_id=jobs['PLA 1'].id, depends_on_job_id=jobs['PLA 2'].id))
+    db.session.commit()
+    assert printer.get_active_or_next_job().name == 'PLA 1'
+
+    result = optimize_printer_queues(now=NOW)
+    assert result == {'printers': 1, 'reordered': 4, 'changeovers_before': 4, 'changeovers_after': 1}
+    db.session.commit()
+    order = [job.name for job in Job.query.order_by(Job.queue_position)]
+    assert order == ['PETG 1', 'PETG 2', 'PLA 2', 'PLA 1']
+    assert printer.get_active_or_next_job().name == 'PETG 1'
+    assert optimize_printer_queues(now=NOW)['reordered'] == 0
+
+    # Scheduler-Job plant die geschätzten Zeiten nach der neuen Reihenfolge
+    jobs['PLA 2'].queue_position = None
+    db.session.commit()
+    optimize_job_queue()
+    db.session.expire_all()
+    starts = {job.name: job.estimated_start_time for job in Job.query}
+    assert starts['PETG 1'] < starts['PETG 2'] < starts['PLA 2'] < starts['PLA 1']
@@ -0,0 +1,128 @@
+# test_dashboard_status.py
+"""
+Tests für /api/dashboard/status.
+Stellt sicher, dass die Anzahl der SQL-Abfragen nicht mit der Anzahl
+der Drucker wächst (keine N+1-Abfragen).
+"""
+import datetime
+
+import pytest
+
+import farm_state
+from extensions import db
+from models import (
+    Printer, PrinterStatus, Job, JobStatus,
+    FilamentType, FilamentSpool, GCodeFile
+)
+from routes.services import build_printer_status_data, update_job_status
+from farm_state import get_farm_state
+
+
+def _create_printers(start, count):
+    """Legt Drucker mit laufendem Job, wartendem Job und aktiver Spule an."""
+    ftype = FilamentType.query.first()
+    if not ftype:
+        ftype = FilamentType(manufacturer='Test', name='PLA Basic', material_type='PLA', color_hex='#FF0000')
+        db.session.add(ftype)
+        db.session.flush()
+
+    for i in range(start, start + count):
+        printer = Printer(name=f'Drucker {i}', status=PrinterStatus.PRINTING)
+        gcode = GCodeFile(filename=f'teil_{i}.gcode', estimated_print_time_min=120)
+        db.session.add_all([printer, gcode])
+        db.session.flush()
+
+        db.session.add_all([
+            Job(name=f'Läuft {i}', status=JobStatus.PRINTING, printer_id=printer.id,
+                gcode_file_id=gcode.id, start_time=datetime.datetime.utcnow() - datetime.timedelta(minutes=30)),
+            Job(name=f'Wartet {i}', status=JobStatus.QUEUED, printer_id=printer.id, priority=5,
+                required_filament_type_id=ftype.id),
+            Job(name=f'Wartet später {i}', status=JobStatus.QUEUED, printer_id=printer.id, priority=1),
+            FilamentSpool(filament_type_id=ftype.id, short_id=f'S{i:03d}', current_weight_g=800,
+                          is_in_use=True, assigned_to_printer_id=printer.id),
+        ])
+    db.session.commit()
+
+
+def _count_queries(count_queries):
+    db.session.expire_all()
+    with count_queries() as statements:
+        build_printer_status_data()
+    return len(statements)
+
+
+def test_status_data_content(app):
+    _create_printers(0, 2)
+    data = build_printer_status_data()
+
+    assert len(data) == 2
+    entry = next(iter(data.values()))
+    assert entry['state_key'] == 'PRINTING'
+    assert entry['job_name'].startswith('Läuft')
+    assert entry['next_job']['name'].startswith('Wartet ')
+    assert entry['next_job']['material'] == 'PLA Basic (PLA)'
+    assert entry['current_spool']['color_hex'] == '#FF0000'
+    assert entry['time_info']['total'] == 7200
+    assert 20 < entry['progress'] < 30
+
+
+def test_query_count_constant_with_printer_count(app, count_queries):
+    _create_printers(0, 3)
+    small = _count_queries(count_queries)
+
+    _create_printers(3, 30)
+    large = _count_queries(count_queries)
+
+    assert small == large
+    assert large <= 6
+
+
+def test_dashboard_status_endpoint(logged_in_client):
+    _create_printers(0, 3)
+
+    response = logged_in_client.get('/api/dashboard/status')
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert len(payload) == 3
+    assert all(entry['current_spool'] for entry in payload.values())
+
+
+def test_farm_state_serves_reads_from_memory(app, count_queries):
+    _create_printers(0, 3)
+    state = get_farm_state()
+    state.get_all_statuses()
+
+    with count_queries() as statements:
+        state.get_all_statuses()
+    assert statements == []
+
+
+def test_farm_state_refreshes_after_commit(app):
+    _create_printers(0, 2)
+    state = get_farm_state()
+    printer = Printer.query.first()
+    assert state.get_status(printer.id)['job_name'].startswith('Läuft')
+
+    update_job_status(printer.jobs.filter_by(status=JobStatus.PRINTING).first().id, 'COMPLETED')
+
+    entry = state.get_status(printer.id)
+    assert entry['job_name'].startswith('Wartet ')
+    assert entry['state_key'] == 'IDLE'
+
+
+def test_farm_state_keeps_dirty_printers_when_load_fails(app, monkeypatch):
+    _create_printers(0, 1)
+    state = get_farm_state()
+    printer = Printer.query.first()
+    state.get_status(printer.id)
+    printer.name = 'Umbenannt'
+    db.session.commit()
+
+    def failing_load(printer_ids):
+        raise RuntimeError('Datenbank nicht erreichbar')
+    monkeypatch.setattr(farm_state, '_load_entries', failing_load)
+    with pytest.raises(RuntimeError):
+        state.get_status(printer.id)
+    monkeypatch.undo()
+
+    assert state.get_status(printer.id)['name'] == 'Umbenannt'
@@ -0,0 +1,90 @@
+# test_dependency_graph.py
+"""
+Tests für die rekursiven Abhängigkeitsabfragen.
+"""
+import pytest
+
+import dependency_graph
+from extensions import db
+from models import Job, JobStatus, JobDependency, DependencyType
+from dependency_graph import dependency_edges, reachable_ids, would_create_cycle, dependency_subgraph
+from validators import DependencyValidator
+
+
+@pytest.fixture(params=['cte', 'python'])
+def mode(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(dependency_graph, '_supports_recursive_cte', lambda session: False)
+    return request.param
+
+
+def _jobs(count):
+    jobs = [Job(name=f'Teil {i}', status=JobStatus.PENDING) for i in range(count)]
+    db.session.add_all(jobs)
+    db.session.flush()
+    return jobs
+
+
+def _depends(job, on, dependency_type=DependencyType.FINISH_TO_START):
+    db.session.add(JobDependency(job_id=job.id, depends_on_job_id=on.id, dependency_type=dependency_type))
+    db.session.flush()
+
+
+def test_closure_and_cycle_checks(app, mode):
+    # Raute: 3 hängt von 1 und 2 ab, beide von 0; 4 hängt von 3 ab
+    jobs = _jobs(6)
+    _depends(jobs[1], jobs[0])
+    _depends(jobs[2], jobs[0], DependencyType.START_TO_START)
+    _depends(jobs[3], jobs[1])
+    _depends(jobs[3], jobs[2])
+    _depends(jobs[4], jobs[3])
+    ids = [job.id for job in jobs]
+
+    assert reachable_ids(ids[4]) == {ids[0], ids[1], ids[2], ids[3]}
+    assert reachable_ids(ids[0], upstream=False) == {ids[1], ids[2], ids[3], ids[4]}
+    assert reachable_ids(ids[5]) == set()
+    assert len(dependency_edges([ids[4]])) == 5
+
+    assert would_create_cycle(ids[0], ids[4])
+    assert would_create_cycle(ids[2], ids[2])
+    assert not would_create_cycle(ids[4], ids[0])
+    assert not would_create_cycle(ids[5], ids[4])
+    assert DependencyValidator.has_cycle(ids[1], ids[3], db.session)
+    assert DependencyValidator.validate_dependency(ids[5], ids[4], db.session)[0]
+
+    # Bereits zyklische Daten (an der Validierung vorbei) terminieren
+    _depends(jobs[0], jobs[4])
+    assert reachable_ids(ids[4]) == set(ids[:4])
+
+    graph_jobs, edges = dependency_subgraph(ids[3])
+    assert [job.id for job in graph_jobs] == [ids[3], ids[0], ids[1], ids[2], ids[4]]
+    assert (ids[2], ids[0], DependencyType.START_TO_START) in edges
+
+
+def test_deep_chain_uses_single_query(app, count_queries):
+    jobs = _jobs(300)
+    db.session.add_all([JobDependency(job_id=b.id, depends_on_job_id=a.id) for a, b in zip(jobs, jobs[1:])])
+    db.session.commit()
+    first, last = jobs[0].id, jobs[-1].id
+
+    with count_queries() as statements:
+        cycle = DependencyValidator.has_cycle(first, last, db.session)
+    assert cycle and len(statements) == 1
+    with count_queries() as statements:
+        ancestors = reachable_ids(last)
+    assert len(ancestors) == 299 and len(statements) == 1
+
+
+def test_dependency_graph_endpoint(logged_in_client):
+    jobs = _jobs(3)
+    _depends(jobs[1], jobs[0])
+    _depends(jobs[2], jobs[1], DependencyType.START_TO_START)
+    db.session.commit()
+    assert [job.name for job in jobs[2].get_all_dependencies()] == ['Teil 2', 'Teil 0', 'Teil 1']
+
+    data = logged_in_client.get(f'/api/job/{jobs[2].id}/dependency_graph').get_json()
+    assert [node['label'] for node in data['nodes']] == ['Teil 2', 'Teil 0', 'Teil 1']
+    assert {(edge['from'], edge['to'], edge['type']) for edge in data['edges']} == {
+        (jobs[0].id, jobs[1].id, DependencyType.FINISH_TO_START.value),
+        (jobs[1].id, jobs[2].id, DependencyType.START_TO_START.value),
+    }
@@ -0,0 +1,144 @@
+# test_horizon_scheduler.py
+"""
+Tests für die farmweite Zeitplanung.
+"""
+import datetime
+
+import pytest
+
+from conftest import create_job, create_printer
+from extensions import db
+from models import PrinterStatus, JobStatus, FilamentType, TimeWindow, JobDependency, DependencyType
+from horizon_scheduler import compute_farm_schedule, persist_schedule, next_window_start
+from scheduler import set_app_context
+from scheduler_extension import update_farm_schedule
+
+NOW = datetime.datetime(2026, 10, 19, 10, 0)  # Montag
+H = datetime.timedelta(hours=1)
+
+
+@pytest.fixture
+def app(app):
+    db.session.add(FilamentType(manufacturer='Test', name='PETG Blau', material_type='PETG'))
+    db.session.commit()
+    return app
+
+
+def _depends(job, on, dependency_type=DependencyType.FINISH_TO_START):
+    db.session.add(JobDependency(job_id=job.id, depends_on_job_id=on.id, dependency_type=dependency_type))
+    db.session.flush()
+
+
+def _span(schedule, job):
+    entry = schedule.entries[job.id]
+    return entry.printer_id, entry.start - NOW, entry.end - NOW
+
+
+def test_list_scheduling_with_running_jobs_and_priorities(app):
+    p1, p2 = create_printer('P1'), create_printer('P2')
+    create_job('Läuft', minutes=120, status=JobStatus.PRINTING, printer=p1, start_time=NOW - H)
+    queued = create_job('Eingereiht', minutes=30, status=JobStatus.ASSIGNED, printer=p1)
+    low = create_job('Unwichtig', minutes=60, priority_score=10)
+    high = create_job('Wichtig', minutes=90, priority_score=80)
+    late = create_job('Spät', minutes=60, priority_score=5, deadline=NOW + H)
+
+    schedule = compute_farm_schedule(now=NOW)
+    assert _span(schedule, queued) == (p1.id, H, 1.5 * H)
+    # Höchste Priorität zuerst auf den frühesten freien Drucker
+    assert _span(schedule, high) == (p2.id, 0 * H, 1.5 * H)
+    assert _span(schedule, low) == (p1.id, 1.5 * H, 2.5 * H)
+    assert _span(schedule, late) == (p2.id, 1.5 * H, 2.5 * H)
+    assert [e.job_id for e in schedule.late_jobs] == [late.id]
+    assert [e.name for e in schedule.for_printer(p1.id)] == ['Läuft', 'Eingereiht', 'Unwichtig']
+
+
+def test_dependencies_time_windows_and_compatibility(app):
+    p1 = create_printer('P1')
+    p2 = create_printer('Nur PLA', materials='PLA')
+    create_printer('Offline', status=PrinterStatus.OFFLINE)
+    # P1 nur ab 14 Uhr
+    db.session.add(TimeWindow(printer_id=p1.id, day_of_week=NOW.weekday(),
+                              start_time=datetime.time(14, 0), end_time=datetime.time(18, 0)))
+    base = create_job('Basis', minutes=60, priority_score=50)
+    after = create_job('Danach', minutes=60, priority_score=90)
+    parallel = create_job('Parallel', minutes=30, priority_score=95)
+    petg = create_job('PETG', minutes=60, material='PETG')
+    _depends(after, base)
+    _depends(parallel, base, DependencyType.START_TO_START)
+    failed = create_job('Fehlgeschlagen', minutes=60, status=JobStatus.FAILED)
+    blocked = create_job('Blockiert', minutes=60)
+    _depends(blocked, failed)
+
+    schedule = compute_farm_schedule(now=NOW)
+    assert _span(schedule, base) == (p2.id, 0 * H, H)
+    assert _span(schedule, parallel) == (p2.id, H, 1.5 * H)
+    assert _span(schedule, after) == (p2.id, 1.5 * H, 2.5 * H)
+    # PETG nur auf P1, Start erst im Zeitfenster
+    assert _span(schedule, petg) == (p1.id, 4 * H, 5 * H)
+    assert blocked.id in schedule.unscheduled
+    assert failed.id not in schedule.entries
+
+    # Ohne Fenster heute: nächster Wochentag mit Fenster
+    windows = TimeWindow.query.all()
+    assert next_window_start(windows, NOW.replace(hour=19)) == NOW.replace(hour=14) + 7 * 24 * H
+    assert next_window_start([], NOW) == NOW
+
+
+def test_horizon_and_persist(app):
+    p1 = create_printer('P1')
+    first = create_job('Erster', minutes=60 * 20)
+    second = create_job('Zweiter', minutes=60 * 20)
+    stale = create_job('Zu spät', minutes=60)
+    stale.estimated_start_time = NOW
+    _depends(stale, second)
+    db.session.commit()
+
+    schedule = compute_farm_schedule(now=NOW, horizon_hours=12)
+    assert _span(schedule, first) == (p1.id, 0 * H, 20 * H)
+    assert schedule.unscheduled == [second.id, stale.id]
+
+    assert persist_schedule(schedule) == 2
+    db.session.commit()
+    db.session.expire_all()
+    assert first.estimated_start_time == NOW and first.estimated_end_time == NOW + 20 * H
+    assert stale.estimated_start_time is None
+    # Unverändert: kein weiteres Update
+    assert persist_schedule(compute_farm_schedule(now=NOW, horizon_hours=12)) == 0
+
+
+def test_scheduler_job_and_gantt_endpoint(app, logged_in_client):
+    set_app_context(app)
+    p1 = create_printer('P1')
+    create_job('Läuft', minutes=60, status=JobStatus.PRINTING, printer=p1, start_time=datetime.datetime.utcnow())
+    waiting = create_job('Wartet', minutes=30)
+    db.session.commit()
+
+    update_farm_schedule()
+    db.session.expire_all()
+    assert waiting.estimated_start_time is not None
+    assert waiting.estimated_end_time - waiting.estimated_start_time == datetime.timedelta(minutes=30)
+
+    data = logged_in_client.get(f'/gantt/printer/{p1.id}').get_json()[0]['data']
+    assert [item['x'] for item in data] == ['Läuft', 'Wartet']
+    assert data[1]['fillColor'] == '#adb5bd'
+    assert data[0]['y'][1] <= data[1]['y'][0]
+
+
+def test_gantt_views_share_one_plan(logged_in_client, monkeypatch):
+    import routes.gantt
+    p1, p2 = create_printer('P1'), create_printer('P2')
+    create_job('Wartet', minutes=30)
+    db.session.commit()
+
+    calls = []
+    monkeypatch.setattr(routes.gantt, 'compute_farm_schedule',
+                        lambda: calls.append(1) or compute_farm_schedule())
+    for printer in (p1, p2, p1):
+        assert logged_in_client.get(f'/gantt/printer/{printer.id}').status_code == 200
+    assert len(calls) == 1
+
+    # Geänderte Aufträge ergeben einen neuen Plan
+    create_job('Neu', minutes=10)
+    db.session.commit()
+    logged_in_client.get(f'/gantt/printer/{p1.id}')
+    assert len(calls) == 2
@@ -0,0 +1,90 @@
+# test_http_cache.py
+"""
+Tests für ETags und Conditional GET der Polling-Endpunkte.
+"""
+import pytest
+
+from extensions import db
+from models import LayoutItem, LayoutItemType, Printer, PrinterStatus
+from http_cache import get_entity_versions
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([
+        Printer(name='ETag Drucker', status=PrinterStatus.IDLE),
+        LayoutItem(name='Tisch 1', item_type=LayoutItemType.TABLE, model_path='table.glb'),
+    ])
+    db.session.commit()
+    return app
+
+
+def test_versions_increase_on_changes(app):
+    before = get_entity_versions(['layout_item'])['layout_item']
+
+    item = LayoutItem.query.first()
+    item.position_x = 5.0
+    db.session.commit()
+    after_flush = get_entity_versions(['layout_item'])['layout_item']
+
+    LayoutItem.query.update({'color': '#00FF00'})
+    db.session.commit()
+    after_bulk = get_entity_versions(['layout_item'])['layout_item']
+
+    assert before < after_flush < after_bulk
+
+
+def test_versions_are_bumped_once_per_commit(app, count_queries):
+    before = get_entity_versions(['layout_item', 'printer'])
+
+    # Mehrere Flushes in einer Transaktion: kein Schreibzugriff auf entity_version
+    with count_queries() as statements:
+        for x in range(3):
+            LayoutItem.query.first().position_x = float(x + 1)
+            db.session.flush()
+        Printer.query.update({'name': 'Umbenannt'})
+    assert not any('entity_version' in statement for statement in statements)
+    db.session.commit()
+    after = get_entity_versions(['layout_item', 'printer'])
+    assert after == {'layout_item': before['layout_item'] + 1, 'printer': before['printer'] + 1}
+
+    # Rollback verwirft die gesammelten Tabellen
+    LayoutItem.query.first().position_x = 9.0
+    db.session.flush()
+    db.session.rollback()
+    assert get_entity_versions(['layout_item']) == {'layout_item': after['layout_item']}
+
+
+@pytest.mark.parametrize('url', ['/api/layout', '/layout-editor/items', '/api/dashboard/status'])
+def test_unchanged_resource_returns_304(logged_in_client, url):
+    first = logged_in_client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    second = logged_in_client.get(url, headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+
+
+def test_changed_resource_returns_new_etag(app, logged_in_client):
+    etag = logged_in_client.get('/api/layout').headers['ETag']
+
+    db.session.add(LayoutItem(name='Regal 1', item_type=LayoutItemType.SHELF, model_path='shelf.glb'))
+    db.session.commit()
+
+    response = logged_in_client.get('/api/layout', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.get_json()) == 2
+
+
+def test_dashboard_status_changes_with_printer(app, logged_in_client):
+    etag = logged_in_client.get('/api/dashboard/status').headers['ETag']
+
+    printer = Printer.query.first()
+    printer.status = PrinterStatus.MAINTENANCE
+    db.session.commit()
+
+    response = logged_in_client.get('/api/dashboard/status', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert next(iter(response.get_json().values()))['state_key'] == 'MAINTENANCE'
@@ -0,0 +1,114 @@
+# test_job_import.py
+"""
+Tests für den blockweisen CSV-Import von Aufträgen.
+"""
+import csv
+import io
+
+import pytest
+
+from extensions import db
+from models import Job, JobStatus, FilamentType, GCodeFile
+from job_import import JobImporter, get_import_progress
+
+HEADER = 'name;target_quantity_parts;material_short_text;gcode_filename;priority;estimated_end_date;material_number\n'
+
+
+def _csv(rows):
+    return HEADER + ''.join(rows)
+
+
+def _reader(text):
+    return csv.DictReader(io.StringIO(text), delimiter=';')
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([
+        FilamentType(manufacturer='Prusament', name='PLA Galaxy', material_type='PLA'),
+        GCodeFile(filename='halter.gcode'),
+    ])
+    db.session.commit()
+    return app
+
+
+def test_valid_rows_are_imported_and_errors_reported(app):
+    text = _csv([
+        'Halter A;10;Prusament PLA Galaxy;halter.gcode;2;31.12.2026;M-100\n',
+        ';5;;;1;;\n',
+        'Halter B;viele;;;1;;\n',
+        '\n',
+        'Halter C;;;unbekannt.gcode;;2026-11-01;\n',
+    ])
+    report = JobImporter(chunk_size=2).run(_reader(text))
+
+    assert report.completed and report.imported == 2
+    assert [(e.row, 'name' in e.message or 'target_quantity_parts' in e.message) for e in report.errors] == [(3, True), (4, True)]
+    job = Job.query.filter_by(name='Halter A').one()
+    assert job.target_quantity_parts == 10 and job.material_number == 'M-100'
+    assert job.required_filament_type.name == 'PLA Galaxy' and job.gcode_file.filename == 'halter.gcode'
+    assert job.status == JobStatus.PENDING and job.deadline.year == 2026
+    assert Job.query.filter_by(name='Halter C').one().gcode_file_id is None
+
+
+def test_dry_run_writes_nothing(app):
+    report = JobImporter(dry_run=True).run(_reader(_csv(['Halter A;1;;;1;;\n', 'Halter B;1;;;x;;\n'])))
+
+    assert report.imported == 1 and report.error_count == 1
+    assert Job.query.count() == 0
+
+
+def test_chunks_use_bulk_inserts(app, count_queries):
+    text = _csv([f'Teil {i};1;;halter.gcode;1;;\n' for i in range(250)])
+    with count_queries() as statements:
+        JobImporter(chunk_size=100).run(_reader(text))
+
+    # Ein Statement pro Block für alle 100 Zeilen
+    inserts = [s for s in statements if s.startswith('INSERT INTO job ')]
+    assert len(inserts) == 3
+    assert Job.query.count() == 250
+
+
+def test_resume_skips_committed_rows(app):
+    text = _csv([f'Teil {i};1;;;1;;\n' for i in range(10)])
+    checksum = 'a' * 40
+
+    class Interrupted(Exception):
+        pass
+
+    importer = JobImporter(chunk_size=4)
+    original_flush = importer._flush
+    calls = []
+
+    def flaky_flush(*args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise Interrupted()
+        return original_flush(*args)
+
+    importer._flush = flaky_flush
+    with pytest.raises(Interrupted):
+        importer.run(_reader(text), checksum=checksum)
+    assert Job.query.count() == 4
+    assert get_import_progress(checksum) == 5
+
+    report = JobImporter(chunk_size=4).run(_reader(text), start_row=get_import_progress(checksum), checksum=checksum)
+    assert report.skipped == 4 and report.imported == 6
+    assert sorted(j.name for j in Job.query) == sorted(f'Teil {i}' for i in range(10))
+    assert get_import_progress(checksum) == 0
+
+
+def test_upload_route_returns_report(logged_in_client):
+    data = _csv(['Halter A;1;;;1;;\n', 'Halter B;1;;;1;99.99.2026;\n']).encode('utf-8-sig')
+
+    response = logged_in_client.post('/jobs/import?format=json',
+                                     data={'file': (io.BytesIO(data), 'auftraege.csv')},
+                                     content_type='multipart/form-data')
+    report = response.get_json()['report']
+    assert report['imported'] == 1
+    assert report['errors'][0]['row'] == 3
+
+    missing = logged_in_client.post('/jobs/import?format=json',
+                                    data={'file': (io.BytesIO(b'foo;bar\n1;2\n'), 'x.csv')},
+                                    content_type='multipart/form-data')
+    assert missing.status_code == 400
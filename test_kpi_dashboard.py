@@ -0,0 +1,122 @@
+# test_kpi_dashboard.py
+"""
+Tests für die mengenbasierten Abfragen des KPI-Dashboards.
+"""
+import datetime
+import random
+
+from flask import template_rendered
+from sqlalchemy import insert
+
+from extensions import db
+from models import Printer, Job, JobStatus, JobQuality, GCodeFile, FilamentType, Project
+from kpi_rollup import rebuild_printer_daily_stats
+from stock_alerts import get_low_stock_cache
+
+# Obergrenze unabhängig von der Anzahl der Drucker und Aufträge
+MAX_DASHBOARD_QUERIES = 30
+
+
+def _populate(printer_count, job_count):
+    """Legt Drucker und Aufträge per Core-Bulk-Insert an und baut die Rollups auf."""
+    rng = random.Random(42)
+    now = datetime.datetime.utcnow()
+    db.session.execute(insert(Printer), [
+        {'name': f'Drucker {i:03d}', 'purchase_cost': 1000.0, 'status': 'Idle'} for i in range(printer_count)
+    ])
+    db.session.execute(insert(FilamentType), [
+        {'manufacturer': 'Test', 'name': name, 'material_type': name} for name in ('PLA', 'PETG', 'ASA')
+    ])
+    db.session.execute(insert(GCodeFile), [
+        {'filename': f'teil_{i}.gcode', 'material_needed_g': 10.0 + i} for i in range(20)
+    ])
+    db.session.add(Project(name='Projekt', deadline=now + datetime.timedelta(hours=5)))
+    printer_ids = [p.id for p in Printer.query]
+    type_ids = [t.id for t in FilamentType.query]
+    gcode_ids = [g.id for g in GCodeFile.query]
+
+    statuses = [JobStatus.COMPLETED] * 6 + [JobStatus.PENDING, JobStatus.QUEUED, JobStatus.FAILED]
+    qualities = [JobQuality.SUCCESSFUL] * 3 + [JobQuality.FAILED, JobQuality.NOT_REVIEWED]
+    rows = []
+    for i in range(job_count):
+        status = rng.choice(statuses)
+        end_time = now - datetime.timedelta(minutes=rng.randint(1, 60 * 24 * 60))
+        completed = status == JobStatus.COMPLETED
+        rows.append({
+            'name': f'Auftrag {i}',
+            'status': status,
+            'is_archived': False,
+            'printer_id': rng.choice(printer_ids),
+            'gcode_file_id': rng.choice(gcode_ids),
+            'required_filament_type_id': rng.choice(type_ids),
+            'quality_assessment': rng.choice(qualities) if completed else JobQuality.NOT_REVIEWED,
+            'priority_score': rng.uniform(0, 100),
+            'created_at': end_time - datetime.timedelta(hours=5),
+            'start_time': end_time - datetime.timedelta(hours=2) if completed else None,
+            'end_time': end_time if completed else None,
+            'completed_at': end_time if completed else None,
+            'actual_print_duration_s': 7200 if completed else None,
+            'actual_cost': 3.5 if completed else None,
+        })
+    for start in range(0, len(rows), 10000):
+        db.session.execute(insert(Job), rows[start:start + 10000])
+    db.session.commit()
+    with db.engine.begin() as connection:
+        rebuild_printer_daily_stats(connection)
+
+
+def _count_dashboard_queries(logged_in_client, count_queries):
+    # Gleiche Ausgangslage für beide Messungen (Bestandswarnungen neu berechnen)
+    get_low_stock_cache().invalidate()
+    with count_queries() as statements:
+        response = logged_in_client.get('/kpi/dashboard')
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_query_count_does_not_grow_with_fleet_size(logged_in_client, count_queries):
+    _populate(printer_count=3, job_count=50)
+    small = _count_dashboard_queries(logged_in_client, count_queries)
+
+    db.session.execute(db.text('DELETE FROM printer_daily_stats'))
+    db.session.execute(db.text('DELETE FROM job'))
+    db.session.execute(db.text('DELETE FROM printer'))
+    db.session.execute(db.text('DELETE FROM filament_type'))
+    db.session.execute(db.text('DELETE FROM g_code_file'))
+    db.session.execute(db.text('DELETE FROM project'))
+    db.session.commit()
+
+    _populate(printer_count=200, job_count=100_000)
+    large = _count_dashboard_queries(logged_in_client, count_queries)
+
+    assert large == small
+    assert large <= MAX_DASHBOARD_QUERIES
+
+
+def test_dashboard_figures_match_raw_jobs(app, logged_in_client):
+    _populate(printer_count=4, job_count=400)
+    contexts = []
+    recorder = lambda sender, template, context, **extra: contexts.append(context)
+    template_rendered.connect(recorder, app)
+    try:
+        assert logged_in_client.get('/kpi/dashboard').status_code == 200
+    finally:
+        template_rendered.disconnect(recorder, app)
+    context = contexts[0]
+
+    completed = Job.query.filter_by(status=JobStatus.COMPLETED).all()
+    assert context['total_printed_jobs_all_time'] == len(completed)
+    assert context['live_status']['total'] == 4
+
+    failures = sorted(j.end_time for j in completed if j.quality_assessment == JobQuality.FAILED)
+    gaps = [(b - a).total_seconds() / 3600 for a, b in zip(failures, failures[1:])]
+    assert context['mtbf_hours'] == round(sum(gaps) / len(gaps), 1)
+
+    failed_by_type = {}
+    for job in completed:
+        if job.quality_assessment == JobQuality.FAILED:
+            material = job.required_filament_type.material_type
+            failed_by_type[material] = failed_by_type.get(material, 0) + 1
+    chart = context['failures_by_material_chart']
+    assert dict(zip(chart['labels'], chart['data'])) == failed_by_type
+    assert context['projects_at_risk'] == 1
@@ -0,0 +1,138 @@
+# test_kpi_rollup.py
+"""
+Tests für die täglichen KPI-Rollups pro Drucker.
+"""
+import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from conftest import printer_by_name
+from extensions import db
+from models import Printer, Job, JobStatus, JobQuality, GCodeFile, PrinterDailyStats
+from kpi_rollup import rebuild_printer_daily_stats, COUNTERS
+
+DAY = datetime.datetime(2026, 10, 1, 14, 0)
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([
+        Printer(name='P1', purchase_cost=1000),
+        Printer(name='P2'),
+        GCodeFile(filename='teil.gcode', material_needed_g=25.0),
+    ])
+    db.session.commit()
+    return app
+
+
+def _stats():
+    return {
+        (row.printer.name, row.day): tuple(getattr(row, c) for c in COUNTERS)
+        for row in PrinterDailyStats.query.all() if row.jobs_count
+    }
+
+
+def _completed_job(**kwargs):
+    values = dict(name='Teil', status=JobStatus.COMPLETED, printer_id=printer_by_name('P1').id,
+                  gcode_file_id=GCodeFile.query.one().id, completed_at=DAY,
+                  actual_print_duration_s=3600, actual_cost=4.5)
+    values.update(kwargs)
+    return Job(**values)
+
+
+def test_completion_and_review_update_rollups(app):
+    job = Job(name='Teil', status=JobStatus.PRINTING, printer_id=printer_by_name('P1').id,
+              gcode_file_id=GCodeFile.query.one().id)
+    db.session.add(job)
+    db.session.commit()
+    assert _stats() == {}
+
+    job.status = JobStatus.COMPLETED
+    job.completed_at = DAY
+    job.actual_print_duration_s = 7200
+    job.actual_cost = 3.0
+    db.session.commit()
+    assert _stats() == {('P1', DAY.date()): (7200, 1, 0, 0, 25.0, 3.0)}
+
+    # Bewertung nach dem Expire durch den Commit (alter Wert nicht geladen)
+    db.session.expire_all()
+    job = db.session.get(Job, job.id)
+    job.quality_assessment = JobQuality.FAILED
+    db.session.commit()
+    job.quality_assessment = JobQuality.SUCCESSFUL
+    db.session.commit()
+    assert _stats() == {('P1', DAY.date()): (7200, 1, 1, 0, 25.0, 3.0)}
+
+    job.printer_id = printer_by_name('P2').id
+    db.session.commit()
+    assert _stats() == {('P2', DAY.date()): (7200, 1, 1, 0, 25.0, 3.0)}
+
+    db.session.delete(job)
+    db.session.commit()
+    assert _stats() == {}
+
+
+def test_multiple_flushes_in_one_transaction_are_counted_once(app):
+    job = _completed_job()
+    db.session.add(job)
+    db.session.flush()
+    job.quality_assessment = JobQuality.FAILED
+    db.session.flush()
+    db.session.add(_completed_job(completed_at=DAY + datetime.timedelta(days=1)))
+    db.session.commit()
+    assert _stats() == {
+        ('P1', DAY.date()): (3600, 1, 0, 1, 25.0, 4.5),
+        ('P1', (DAY + datetime.timedelta(days=1)).date()): (3600, 1, 0, 0, 25.0, 4.5),
+    }
+
+    job.actual_cost = 10.0
+    db.session.flush()
+    db.session.rollback()
+    assert _stats()[('P1', DAY.date())][-1] == 4.5
+
+
+def test_backfill_matches_incremental_rollups(app):
+    for i in range(6):
+        db.session.add(_completed_job(
+            printer_id=printer_by_name('P1' if i % 2 else 'P2').id,
+            completed_at=DAY + datetime.timedelta(days=i % 3),
+            quality_assessment=[JobQuality.SUCCESSFUL, JobQuality.FAILED, JobQuality.NOT_REVIEWED][i % 3],
+            actual_print_duration_s=600 * (i + 1),
+        ))
+    db.session.add(Job(name='Offen', status=JobStatus.PENDING))
+    db.session.commit()
+    incremental = _stats()
+
+    # Bulk-Inserts laufen an den Session-Events vorbei und brauchen den Backfill
+    db.session.execute(insert(Job), [{
+        'name': 'Import', 'status': JobStatus.COMPLETED, 'printer_id': printer_by_name('P2').id,
+        'completed_at': DAY, 'actual_print_duration_s': 60, 'is_archived': False,
+    }])
+    db.session.commit()
+    assert _stats() == incremental
+
+    with db.engine.begin() as connection:
+        rebuild_printer_daily_stats(connection)
+    db.session.expire_all()
+    rebuilt = _stats()
+    assert rebuilt.pop(('P2', DAY.date())) == tuple(
+        a + b for a, b in zip(incremental.pop(('P2', DAY.date())), (60, 1, 0, 0, 0.0, 0.0))
+    )
+    assert rebuilt == incremental
+
+
+def test_dashboard_is_served_from_rollups(logged_in_client):
+    yesterday = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    db.session.add_all([
+        _completed_job(completed_at=yesterday, quality_assessment=JobQuality.SUCCESSFUL),
+        _completed_job(completed_at=yesterday, quality_assessment=JobQuality.FAILED, actual_print_duration_s=1800),
+    ])
+    db.session.commit()
+
+    response = logged_in_client.get('/kpi/dashboard')
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert 'P1' in html
+    # 1,5 Stunden gestern in der Uptime-Grafik
+    assert '1.5' in html
@@ -0,0 +1,95 @@
+# test_pagination.py
+"""
+Tests für die Keyset-Paginierung der Listen.
+"""
+import datetime
+
+import pytest
+
+from extensions import db
+from models import Job, JobStatus, Consumable, ConsumableCategory
+from pagination import keyset_paginate, SortKey, InvalidCursor
+
+
+@pytest.fixture
+def app(app):
+    base = datetime.datetime(2026, 1, 1, 8, 0)
+    for i in range(23):
+        db.session.add(Job(
+            name=f'Auftrag {i:02d}',
+            status=JobStatus.PENDING if i % 2 else JobStatus.COMPLETED,
+            priority=i % 3,
+            # Gleiche Zeitstempel und NULL-Werte prüfen die Eindeutigkeit der Sortierung
+            created_at=base + datetime.timedelta(hours=i // 4),
+            end_time=None if i % 5 == 0 else base + datetime.timedelta(days=i % 4),
+            is_archived=i >= 12
+        ))
+    for i in range(7):
+        db.session.add(Consumable(
+            name=f'Material {i}', category=ConsumableCategory.OTHER,
+            stock_level=i, reorder_level=3
+        ))
+    db.session.commit()
+    return app
+
+
+def _walk(query, sort_keys, per_page):
+    pages = [keyset_paginate(query, sort_keys, per_page=per_page)]
+    while pages[-1].has_next:
+        pages.append(keyset_paginate(query, sort_keys, cursor=pages[-1].next_cursor, per_page=per_page))
+    return pages
+
+
+@pytest.mark.parametrize('column, descending', [
+    (Job.end_time, True), (Job.end_time, False), (Job.created_at, True), (Job.status, False), (Job.priority, True)
+])
+def test_walk_forward_and_back_matches_offset_order(app, column, descending):
+    sort_keys = [SortKey(column, descending=descending), SortKey(Job.id, descending=descending)]
+    ordered = [job.id for job in Job.query.order_by(*[key.order_clause() for key in sort_keys]).all()]
+
+    pages = _walk(Job.query, sort_keys, per_page=4)
+    assert [job.id for page in pages for job in page.items] == ordered
+    assert not pages[0].has_prev
+
+    # Zurückblättern liefert exakt die vorherigen Seiten
+    back = keyset_paginate(Job.query, sort_keys, cursor=pages[-1].prev_cursor, per_page=4)
+    assert [job.id for job in back.items] == [job.id for job in pages[-2].items]
+    first = keyset_paginate(Job.query, sort_keys, cursor=pages[1].prev_cursor, per_page=4)
+    assert [job.id for job in first.items] == [job.id for job in pages[0].items]
+    assert not first.has_prev and first.has_next
+
+
+def test_invalid_cursor_is_rejected(app):
+    with pytest.raises(InvalidCursor):
+        keyset_paginate(Job.query, [SortKey(Job.id)], cursor='kaputt')
+
+
+def test_job_list_json_pages_through_active_jobs(logged_in_client):
+    seen = []
+    url = '/jobs/?format=json&per_page=5&sort_by=priority&direction=asc'
+    response = logged_in_client.get(url).get_json()
+    seen.extend(item['id'] for item in response['items'])
+    while response['next_cursor']:
+        response = logged_in_client.get(f"{url}&cursor={response['next_cursor']}").get_json()
+        seen.extend(item['id'] for item in response['items'])
+
+    assert sorted(seen) == sorted(job.id for job in Job.query.filter_by(is_archived=False))
+    assert len(seen) == len(set(seen))
+    assert logged_in_client.get('/jobs/?format=json&cursor=kaputt').status_code == 400
+
+
+def test_html_pages_render_with_cursor_links(logged_in_client):
+    archive = logged_in_client.get('/jobs/archive?per_page=4')
+    assert archive.status_code == 200
+    assert b'cursor=' in archive.data
+
+    consumables = logged_in_client.get('/consumables/?per_page=3')
+    assert consumables.status_code == 200
+    # Statistik-Karten zählen über alle Einträge, nicht nur die aktuelle Seite
+    assert b'<h3>7</h3>' in consumables.data
+    assert b'<h3>4</h3>' in consumables.data
+
+    spools = logged_in_client.get('/materials/?format=json')
+    assert spools.status_code == 200
+    assert spools.get_json()['items'] == []
+    assert logged_in_client.get('/materials/').status_code == 200
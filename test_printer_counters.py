@@ -0,0 +1,104 @@
+# test_printer_counters.py
+"""
+Tests für die gespeicherten Lebenszeit-Zähler der Drucker.
+"""
+import pytest
+from sqlalchemy import insert
+
+from conftest import printer_by_name
+from extensions import db
+from models import Printer, Job, JobStatus, JobQuality, GCodeFile
+from kpi_rollup import check_printer_counters, rebuild_printer_counters, printer_counters_command
+from scheduler import check_maintenance_reminders, set_app_context
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([
+        Printer(name='P1', historical_print_hours=10, historical_filament_used_g=500, historical_jobs_count=3),
+        Printer(name='P2'),
+        GCodeFile(filename='teil.gcode', material_needed_g=25.0),
+    ])
+    db.session.commit()
+    return app
+
+
+def _totals(name):
+    printer = printer_by_name(name)
+    return printer.total_print_hours, printer.total_filament_used_g, printer.total_jobs_count
+
+
+def test_counters_follow_job_lifecycle(app):
+    job = Job(name='Teil', status=JobStatus.PRINTING, printer_id=printer_by_name('P1').id,
+              gcode_file_id=GCodeFile.query.one().id, actual_print_duration_s=5400)
+    db.session.add(job)
+    db.session.commit()
+    assert _totals('P1') == (10.0, 500.0, 3)
+
+    job.status = JobStatus.COMPLETED
+    db.session.commit()
+    assert _totals('P1') == (11.5, 525.0, 4)
+
+    # Nachbewertung ändert die Summen nicht, Neuzuordnung verschiebt sie
+    job.quality_assessment = JobQuality.FAILED
+    job.printer_id = printer_by_name('P2').id
+    db.session.commit()
+    assert _totals('P1') == (10.0, 500.0, 3)
+    assert _totals('P2') == (1.5, 25.0, 1)
+
+    # Innerhalb der Transaktion sofort sichtbar
+    printer = printer_by_name('P2')
+    assert printer.total_jobs_count == 1
+    job.actual_print_duration_s = 7200
+    db.session.flush()
+    assert printer.total_print_hours == 2.0
+    db.session.rollback()
+    assert _totals('P2') == (1.5, 25.0, 1)
+
+    job.status = JobStatus.FAILED
+    db.session.commit()
+    assert _totals('P2') == (0.0, 0.0, 0)
+    assert check_printer_counters(db.session.connection()) == []
+
+
+def test_check_and_rebuild_after_bulk_insert(app):
+    db.session.add(Job(name='Teil', status=JobStatus.COMPLETED, printer_id=printer_by_name('P1').id,
+                       actual_print_duration_s=3600))
+    db.session.commit()
+    # An den Session-Events vorbei
+    db.session.execute(insert(Job), [{
+        'name': 'Import', 'status': JobStatus.COMPLETED, 'printer_id': printer_by_name('P2').id,
+        'gcode_file_id': GCodeFile.query.one().id, 'actual_print_duration_s': 1800, 'is_archived': False,
+    }])
+    db.session.commit()
+
+    mismatches = check_printer_counters(db.session.connection())
+    assert {(name, counter) for _, name, counter, _, _ in mismatches} == {
+        ('P2', 'lifetime_print_seconds'), ('P2', 'lifetime_filament_g'), ('P2', 'lifetime_jobs_count')
+    }
+
+    result = app.test_cli_runner().invoke(printer_counters_command, ['--rebuild'])
+    assert 'lifetime_jobs_count = 0, erwartet 1' in result.output
+    assert 'Drucker-Zähler neu aufgebaut: 2 Drucker.' in result.output
+    db.session.expire_all()
+    assert _totals('P1') == (11.0, 500.0, 4)
+    assert _totals('P2') == (0.5, 25.0, 1)
+    assert check_printer_counters(db.session.connection()) == []
+    assert rebuild_printer_counters(db.session.connection()) == 2
+
+
+def test_maintenance_checks_without_aggregate_queries(app, count_queries):
+    for i in range(20):
+        printer = Printer(name=f'Wartung {i}', maintenance_interval_h=10, last_maintenance_h=0)
+        db.session.add(printer)
+        db.session.flush()
+        db.session.add(Job(name='Teil', status=JobStatus.COMPLETED, printer_id=printer.id,
+                           actual_print_duration_s=3600 * (i + 1)))
+    db.session.commit()
+    set_app_context(app)
+
+    with count_queries() as statements:
+        overdue, urgent = check_maintenance_reminders()
+        assert Printer.overdue_maintenance_count() == overdue
+    assert (overdue, urgent) == (11, 1)
+    assert not any('FROM job' in statement for statement in statements)
@@ -0,0 +1,90 @@
+# test_priority_scores.py
+"""
+Tests für die gesammelte Neuberechnung der Prioritäts-Scores.
+"""
+import datetime
+import random
+
+import pytest
+from sqlalchemy import insert
+
+from extensions import db, socketio
+from models import Project, Job, JobStatus, JobDependency
+from scheduler import set_app_context, init_scheduler
+from scheduler_extension import calculate_priority_scores
+from validators import PriorityCalculator
+
+
+def test_bulk_scores_match_single_job_calculation(app, count_queries):
+    rng = random.Random(11)
+    now = datetime.datetime.utcnow()
+    # Stundenwerte mitten in den Stufen, damit Sekundenbruchteile nichts kippen
+    offsets = [None, -5, 3, 9, 18, 30, 60, 100, 150, 300, 1000]
+    projects = [Project(name=f'Projekt {i}', deadline=now + datetime.timedelta(hours=h) if h else None)
+                for i, h in enumerate([None, 10, 30, 60, 100, 500])]
+    db.session.add_all(projects)
+    db.session.flush()
+    jobs = []
+    for i in range(200):
+        offset = rng.choice(offsets)
+        jobs.append(Job(
+            name=f'Teil {i}', status=rng.choice([JobStatus.PENDING, JobStatus.ASSIGNED, JobStatus.QUEUED]),
+            priority=rng.randint(1, 10), is_on_critical_path=rng.random() < 0.3,
+            deadline=now + datetime.timedelta(hours=offset + rng.random()) if offset is not None else None,
+            project_id=rng.choice(projects).id if rng.random() < 0.7 else None
+        ))
+    db.session.add_all(jobs)
+    db.session.flush()
+    for job in jobs[1:]:
+        for blocker in rng.sample(jobs, rng.randint(0, 2)):
+            if blocker is not job:
+                db.session.add(JobDependency(job_id=job.id, depends_on_job_id=blocker.id))
+    db.session.commit()
+
+    expected = {job.id: PriorityCalculator.calculate_priority_score(job) for job in jobs}
+    with count_queries() as statements:
+        result = PriorityCalculator.recalculate_priority_scores(threshold=0)
+    db.session.commit()
+    assert result['checked'] == 200
+    assert sum(1 for s in statements if s.startswith('UPDATE job ')) == 1
+    assert sum(1 for s in statements if s.startswith('SELECT')) == 2
+    for job in Job.query:
+        assert job.priority_score == pytest.approx(expected[job.id], abs=0.011)
+
+    # Unverändert: nichts schreiben
+    with count_queries() as statements:
+        result = PriorityCalculator.recalculate_priority_scores()
+    assert result['updated'] == 0 and not any(s.startswith('UPDATE job ') for s in statements)
+
+
+def test_scheduler_job_updates_scores_in_bulk(app, count_queries):
+    set_app_context(app)
+    now = datetime.datetime.utcnow()
+    db.session.execute(insert(Job), [{
+        'name': f'Import {i}', 'status': JobStatus.PENDING, 'priority': 1 + i % 10, 'priority_score': 0.0,
+        'is_archived': False, 'is_on_critical_path': False,
+        'deadline': now + datetime.timedelta(hours=i % 200) if i % 3 else None,
+    } for i in range(1000)])
+    db.session.add(Job(name='Fertig', status=JobStatus.COMPLETED, priority=10, priority_score=1.0))
+    db.session.commit()
+
+    with count_queries() as statements:
+        calculate_priority_scores()
+    # Ein executemany für alle 1000 Jobs
+    assert sum(1 for s in statements if s.startswith('UPDATE job ')) == 1
+    db.session.expire_all()
+    assert Job.query.filter(Job.priority_score == 0).count() == 0
+    assert Job.query.filter_by(name='Fertig').one().priority_score == 1.0
+    assert Job.query.filter_by(name='Import 10').one().priority_score == pytest.approx(46 + 2.5)
+
+
+def test_init_scheduler_registers_priority_job(app):
+    app.config['SCHEDULER_LEADER_ELECTION'] = False
+    scheduler = init_scheduler(app, socketio)
+    try:
+        job = scheduler.get_job('calculate_priority_scores')
+        assert job is not None and job.trigger.interval == datetime.timedelta(minutes=15)
+        assert scheduler.get_job('update_farm_schedule') is not None
+        assert scheduler.get_job('optimize_job_queue') is not None
+    finally:
+        scheduler.shutdown(wait=False)
@@ -0,0 +1,135 @@
+# test_project_dag.py
+"""
+Tests für den inkrementellen kritischen Pfad mit zwischengespeichertem Projekt-DAG.
+"""
+import random
+
+from extensions import db
+from models import Project, Job, JobStatus, GCodeFile, JobDependency, DependencyType
+from project_dag import ProjectDag, get_project_dag_cache
+from validators import CriticalPathCalculator, DependencyValidator
+
+
+def _project(name='Projekt'):
+    project = Project(name=name)
+    db.session.add(project)
+    db.session.flush()
+    return project
+
+
+def _job(project, name, minutes):
+    gcode = GCodeFile(filename=f'{name}.gcode', estimated_print_time_min=minutes)
+    db.session.add(gcode)
+    db.session.flush()
+    job = Job(name=name, status=JobStatus.PENDING, project_id=project.id, gcode_file_id=gcode.id)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def _depends(job, on, dependency_type=DependencyType.FINISH_TO_START):
+    dependency = JobDependency(job_id=job.id, depends_on_job_id=on.id, dependency_type=dependency_type)
+    db.session.add(dependency)
+    db.session.flush()
+    return dependency
+
+
+def _names(jobs):
+    return [job.name for job in jobs]
+
+
+def test_critical_path_and_invalidation(app, count_queries):
+    project = _project()
+    a, b, c, d = _job(project, 'A', 60), _job(project, 'B', 120), _job(project, 'C', 30), _job(project, 'D', 10)
+    _depends(b, a)
+    _depends(c, a)
+    _depends(d, b)
+    _depends(d, c)
+    db.session.commit()
+
+    assert _names(CriticalPathCalculator.calculate(project)) == ['A', 'B', 'D']
+    db.session.commit()
+    assert [j.name for j in Job.query.filter_by(is_on_critical_path=True).order_by(Job.id)] == ['A', 'B', 'D']
+
+    # Ohne Änderung: nichts nachladen, nichts schreiben
+    project_id = project.id
+    with count_queries() as statements:
+        critical = get_project_dag_cache().update_critical_path(project_id)
+    assert statements == [] and len(critical) == 3
+
+    # Längere Druckzeit verschiebt den kritischen Pfad
+    c.gcode_file.estimated_print_time_min = 200
+    db.session.commit()
+    assert _names(CriticalPathCalculator.calculate(project)) == ['A', 'C', 'D']
+    db.session.commit()
+    assert db.session.get(Job, b.id).is_on_critical_path is False
+
+    # Start-to-Start: E darf mit C beginnen, Abschluss von C entfernt den Knoten
+    e = _job(project, 'E', 400)
+    _depends(e, c, DependencyType.START_TO_START)
+    db.session.commit()
+    assert _names(CriticalPathCalculator.calculate(project)) == ['A', 'C', 'E']
+    c.status = JobStatus.COMPLETED
+    db.session.commit()
+    assert _names(CriticalPathCalculator.calculate(project)) == ['E']
+    assert get_project_dag_cache().stats()['loads'] == 1
+
+
+def test_incremental_matches_full_recompute(app):
+    rng = random.Random(7)
+    project = _project()
+    other = _project('Anderes Projekt')
+    jobs = [_job(project, f'J{i}', rng.randint(5, 300)) for i in range(60)]
+    for i, job in enumerate(jobs[1:], start=1):
+        for pred in rng.sample(jobs[:i], min(i, rng.randint(0, 3))):
+            _depends(job, pred, rng.choice(list(DependencyType)))
+    db.session.commit()
+    cache = get_project_dag_cache()
+    cache.update_critical_path(project.id)
+    db.session.commit()
+
+    for step in range(60):
+        action = rng.random()
+        active = [job for job in jobs if job.status == JobStatus.PENDING]
+        if action < 0.3:
+            # Neue Kante in beliebiger Richtung, Zyklen lehnt die Validierung ab
+            job, pred = rng.sample(active, 2)
+            if not DependencyValidator.has_cycle(job.id, pred.id, db.session) and \
+                    not JobDependency.query.filter_by(job_id=job.id, depends_on_job_id=pred.id).first():
+                _depends(job, pred)
+        elif action < 0.5:
+            dependency = rng.choice(JobDependency.query.all())
+            db.session.delete(dependency)
+        elif action < 0.7:
+            rng.choice(active).gcode_file.estimated_print_time_min = rng.randint(5, 300)
+        elif action < 0.8:
+            rng.choice(active).status = JobStatus.COMPLETED
+        elif action < 0.9:
+            rng.choice(active).project_id = other.id
+        else:
+            jobs.append(_job(project, f'Neu{step}', rng.randint(5, 300)))
+            _depends(jobs[-1], rng.choice(active))
+        db.session.commit()
+
+        cache.update_critical_path(project.id)
+        incremental = cache._dags[project.id]
+        full = ProjectDag.load(project.id)
+        assert set(incremental.critical_ids()) == set(full.critical_ids())
+        assert incremental.es == full.es and incremental.ls == full.ls
+        order = incremental.order
+        for node, preds in incremental.preds.items():
+            assert all(order[pred] < order[node] for pred in preds)
+        db.session.commit()
+    assert cache.stats()['loads'] == 1 and cache.stats()['refreshes'] > 0
+
+
+def test_rollback_forgets_written_flags(app):
+    project = _project()
+    a = _job(project, 'A', 60)
+    db.session.commit()
+    assert _names(CriticalPathCalculator.calculate(project)) == ['A']
+    db.session.rollback()
+    assert db.session.get(Job, a.id).is_on_critical_path is False
+    CriticalPathCalculator.calculate(project)
+    db.session.commit()
+    assert db.session.get(Job, a.id).is_on_critical_path is True
@@ -0,0 +1,195 @@
+# test_realtime.py
+"""
+Tests für das delta-kodierte Socket.IO-Statusprotokoll und die Raum-Abonnements.
+"""
+import re
+import time
+from types import SimpleNamespace
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from extensions import db, socketio
+from models import Printer, PrinterStatus, Project
+from realtime import StatusDeltaEncoder, EmitCoalescer, get_status_encoder, publish_status_update, publish_full_status
+from scheduler_events import get_scheduler_events
+
+
+def _status(name, state='Idle', progress=0.0, elapsed=0.0):
+    return {'id': 1, 'name': name, 'state': state, 'progress': progress,
+            'time_info': {'elapsed': elapsed, 'total': 3600}}
+
+
+def test_first_encode_contains_full_state():
+    encoder = StatusDeltaEncoder()
+    delta = encoder.encode({1: _status('A'), 2: _status('B')})
+
+    assert delta['seq'] == 1
+    assert set(delta['changes']) == {'1', '2'}
+    assert delta['removed'] == []
+
+
+def test_unchanged_state_produces_no_delta():
+    encoder = StatusDeltaEncoder()
+    encoder.encode({1: _status('A')})
+    # Bruchteile einer Sekunde gelten nicht als Änderung
+    assert encoder.encode({1: _status('A', elapsed=0.4)}) is None
+    assert encoder.seq == 1
+
+
+def test_delta_contains_only_changed_fields():
+    encoder = StatusDeltaEncoder()
+    encoder.encode({1: _status('A'), 2: _status('B')})
+    delta = encoder.encode({1: _status('A', state='Printing', progress=12.34), 2: _status('B')})
+
+    assert delta['seq'] == 2
+    assert delta['changes'] == {'1': {'state': 'Printing', 'progress': 12.3}}
+
+
+def test_removed_printers_are_reported():
+    encoder = StatusDeltaEncoder()
+    encoder.encode({1: _status('A'), 2: _status('B')})
+    delta = encoder.encode({1: _status('A')})
+
+    assert delta['changes'] == {}
+    assert delta['removed'] == ['2']
+    assert list(encoder.snapshot()['printers']) == ['1']
+
+
+@pytest.fixture
+def app(app):
+    db.session.add(Printer(name='Socket Drucker', status=PrinterStatus.IDLE))
+    db.session.commit()
+    return app
+
+
+def _socket_client(app, logged_in_client):
+    return socketio.test_client(app, flask_test_client=logged_in_client)
+
+
+def test_resync_sends_full_state(app, logged_in_client):
+    client = _socket_client(app, logged_in_client)
+    client.emit('request_resync')
+    received = [msg for msg in client.get_received() if msg['name'] == 'status_full']
+
+    assert len(received) == 1
+    full = received[0]['args'][0]
+    assert full['seq'] == get_status_encoder(app).seq
+    assert [entry['name'] for entry in full['printers'].values()] == ['Socket Drucker']
+    client.disconnect()
+
+
+def test_subscribe_rejects_unknown_rooms(app, logged_in_client):
+    client = _socket_client(app, logged_in_client)
+    joined = client.emit('subscribe', {'rooms': ['printer:1', 'page:fleet', 'page:unbekannt', 'admin']}, callback=True)
+    assert joined == ['printer:1', 'page:fleet']
+    client.disconnect()
+
+
+def test_printer_room_receives_only_its_printer(app, logged_in_client):
+    printer = Printer.query.first()
+    other = Printer(name='Anderer Drucker')
+    db.session.add(other)
+    db.session.commit()
+
+    printer_client = _socket_client(app, logged_in_client)
+    printer_client.emit('subscribe', {'rooms': [f'printer:{printer.id}']}, callback=True)
+    fleet_client = _socket_client(app, logged_in_client)
+    fleet_client.emit('subscribe', {'rooms': ['page:fleet']}, callback=True)
+
+    publish_status_update()
+    other.status = PrinterStatus.ERROR
+    db.session.commit()
+    publish_status_update()
+
+    printer_events = printer_client.get_received()
+    assert [msg['name'] for msg in printer_events] == ['printer_status']
+    assert printer_events[0]['args'][0]['name'] == 'Socket Drucker'
+
+    fleet_events = [msg['name'] for msg in fleet_client.get_received()]
+    assert fleet_events == ['status_delta', 'status_delta']
+    printer_client.disconnect()
+    fleet_client.disconnect()
+
+
+def test_standby_forwards_status_to_leader(app, logged_in_client):
+    scheduler = BackgroundScheduler()
+    for job_id in ('status_broadcast', 'status_resync'):
+        scheduler.add_job(func=lambda: None, trigger='interval', hours=1, id=job_id)
+    scheduler.start(paused=True)
+    bus = get_scheduler_events(app)
+    bus.attach(scheduler)
+    forwarded = []
+    bus.forwarder = forwarded.append
+    election = app.extensions['scheduler_lease'] = SimpleNamespace(is_leader=False)
+    client = _socket_client(app, logged_in_client)
+    client.emit('subscribe', {'rooms': ['page:fleet']}, callback=True)
+    try:
+        # Standby: keine eigene Sequenz, Broadcast und Resync gehen an den Leader
+        assert publish_status_update() is None
+        client.emit('request_resync')
+        assert get_status_encoder(app).seq == 0
+        assert client.get_received() == []
+        assert forwarded == ['status_broadcast', 'status_resync']
+
+        election.is_leader = True
+        publish_full_status()
+        received = client.get_received()
+        assert [msg['name'] for msg in received] == ['status_delta', 'status_full']
+        delta, full = received[0]['args'][0], received[1]['args'][0]
+        assert delta['epoch'] == full['epoch'] == get_status_encoder(app).epoch
+        assert full['seq'] == delta['seq'] == 1
+    finally:
+        client.disconnect()
+        scheduler.shutdown(wait=False)
+
+
+def test_coalescer_merges_notifications(app, logged_in_client):
+    client = _socket_client(app, logged_in_client)
+    client.emit('subscribe', {'rooms': ['page:fleet']}, callback=True)
+
+    coalescer = EmitCoalescer('reload_dashboard', ['page:fleet'], window_seconds=60)
+    for job_id in range(5):
+        coalescer.notify(jobs=[job_id], printers=[1])
+    coalescer.flush()
+
+    received = [msg for msg in client.get_received() if msg['name'] == 'reload_dashboard']
+    assert len(received) == 1
+    assert received[0]['args'][0] == {'entities': {'jobs': [0, 1, 2, 3, 4], 'printers': [1]}, 'merged': 5}
+
+    metrics = coalescer.get_metrics()
+    assert (metrics['requested'], metrics['emitted'], metrics['suppressed']) == (5, 1, 4)
+    assert metrics['pending'] is False
+    client.disconnect()
+
+
+def test_coalescer_window_flushes_in_background(app):
+    coalescer = EmitCoalescer('reload_dashboard', ['page:fleet'], window_seconds=0.05)
+    coalescer.notify(jobs=[1])
+    coalescer.notify(jobs=[2])
+    assert coalescer.get_metrics()['pending'] is True
+
+    time.sleep(0.3)
+    assert coalescer.get_metrics()['emitted'] == 1
+
+
+def test_pages_subscribe_to_their_rooms(app, logged_in_client):
+    printer = Printer.query.first()
+    project = Project(name='Socket Projekt')
+    db.session.add(project)
+    db.session.commit()
+
+    pages = {
+        f'/printers/details/{printer.id}': f'printer:{printer.id}',
+        '/materials/': 'page:materials',
+        '/jobs/': 'page:jobs',
+        '/projects/': 'page:projects',
+        f'/projects/{project.id}': f'project:{project.id}',
+        '/maintenance-v2/': 'page:maintenance',
+    }
+    client = _socket_client(app, logged_in_client)
+    for url, room in pages.items():
+        html = logged_in_client.get(url).get_data(as_text=True)
+        assert re.search(r"subscribeRoomEvents\(socket, \['%s'\]" % re.escape(room), html), url
+        assert client.emit('subscribe', {'rooms': [room]}, callback=True) == [room]
+    client.disconnect()
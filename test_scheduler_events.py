@@ -0,0 +1,166 @@
+# test_scheduler_events.py
+"""
+Tests für die ereignisgesteuerten Scheduler-Läufe.
+"""
+import datetime
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import insert
+
+from extensions import db
+from models import Job, JobStatus, Printer, PrinterStatus, APIType, FilamentType, FilamentSpool, GCodeFile
+from scheduler import should_complete_job, assign_pending_jobs, update_printer_statuses, set_app_context
+from scheduler_events import get_scheduler_events, JOB_CREATED, JOB_FINISHED, PRINTER_IDLE, SPOOL_LOADED
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = BackgroundScheduler()
+    scheduler.start()
+    yield scheduler
+    scheduler.shutdown(wait=False)
+
+
+def _record(bus):
+    events = []
+    for name in (JOB_CREATED, JOB_FINISHED, PRINTER_IDLE, SPOOL_LOADED):
+        bus.subscribe(name, lambda event_name, payload: events.append((event_name, payload)))
+    return events
+
+
+def test_events_are_published_after_commit(app):
+    events = _record(get_scheduler_events())
+    printer = Printer(name='P1', status=PrinterStatus.PRINTING)
+    job = Job(name='Teil', status=JobStatus.PENDING)
+    db.session.add_all([printer, job])
+    db.session.flush()
+    assert events == []
+    db.session.commit()
+    assert events == [(JOB_CREATED, {'job_id': job.id})]
+
+    # Rollback verwirft gesammelte Ereignisse
+    db.session.add(Job(name='Verworfen', status=JobStatus.PENDING))
+    db.session.flush()
+    db.session.rollback()
+    assert len(events) == 1
+
+    job.status = JobStatus.PRINTING
+    job.printer_id = printer.id
+    db.session.commit()
+    assert len(events) == 1
+
+    job.status = JobStatus.COMPLETED
+    printer.status = PrinterStatus.IDLE
+    db.session.commit()
+    assert sorted(events[1:]) == [
+        (JOB_FINISHED, {'job_id': job.id, 'printer_id': printer.id}),
+        (PRINTER_IDLE, {'printer_id': printer.id}),
+    ]
+
+    db.session.add(FilamentType(manufacturer='Test', name='PLA Schwarz', material_type='PLA'))
+    db.session.flush()
+    spool = FilamentSpool(filament_type_id=FilamentType.query.one().id, current_weight_g=1000)
+    db.session.add(spool)
+    db.session.commit()
+    assert len(events) == 3
+    spool.assigned_to_printer_id = printer.id
+    db.session.commit()
+    assert events[3] == (SPOOL_LOADED, {'spool_id': spool.id, 'printer_id': printer.id})
+
+    db.session.execute(insert(Job), [{'name': f'Import {i}', 'status': JobStatus.PENDING} for i in range(3)])
+    db.session.commit()
+    assert events[4] == (JOB_CREATED, {'job_id': None})
+
+
+def test_events_pull_interval_jobs_forward_debounced(app, scheduler):
+    bus = get_scheduler_events()
+    bus.attach(scheduler)
+    for job_id in ('assign_pending_jobs', 'check_job_completion'):
+        scheduler.add_job(func=lambda: None, trigger='interval', seconds=60, id=job_id)
+    before = datetime.datetime.now(datetime.timezone.utc)
+
+    db.session.add(Printer(name='P1', status=PrinterStatus.IDLE))
+    db.session.commit()
+    first = {job.id: job.next_run_time for job in scheduler.get_jobs()}
+    for run_at in first.values():
+        assert run_at <= before + datetime.timedelta(seconds=bus.debounce_seconds + 1)
+
+    # Weitere Ereignisse innerhalb der Entprellzeit ergeben keinen zusätzlichen Lauf
+    db.session.add(Job(name='Teil', status=JobStatus.PENDING))
+    db.session.commit()
+    assert {job.id: job.next_run_time for job in scheduler.get_jobs()} == first
+    stats = bus.stats()
+    assert stats['triggered'] == {'assign_pending_jobs': 1, 'check_job_completion': 1}
+    assert stats['coalesced'] == {'assign_pending_jobs': 1}
+    assert stats['published'] == {PRINTER_IDLE: 1, JOB_CREATED: 1}
+
+    # Nicht registrierte Jobs (z.B. erweiterter Scheduler) werden ignoriert
+    assert bus.trigger('calculate_priority_scores') is False
+
+
+def test_printer_reported_completion_via_status_poll(app, monkeypatch):
+    import printer_communication
+    set_app_context(app)
+    now = datetime.datetime.utcnow()
+    gcode = GCodeFile(filename='teil.gcode', estimated_print_time_min=120)
+    db.session.add(gcode)
+    db.session.flush()
+    reports = {}
+
+    def printer(name, print_state, minutes_ago=None, api_type=APIType.KLIPPER):
+        printer = Printer(name=name, status=PrinterStatus.PRINTING if minutes_ago else PrinterStatus.IDLE,
+                          api_type=api_type, ip_address='10.0.0.1')
+        db.session.add(printer)
+        db.session.flush()
+        reports[printer.id] = print_state
+        if minutes_ago:
+            db.session.add(Job(name=name, status=JobStatus.PRINTING, printer_id=printer.id, gcode_file_id=gcode.id,
+                               start_time=now - datetime.timedelta(minutes=minutes_ago)))
+        return printer
+
+    state_map = {'complete': 'Idle', 'cancelled': 'Idle', 'standby': 'Idle', 'printing': 'Printing'}
+    monkeypatch.setattr(printer_communication, '_get_klipper_status', lambda p: {
+        'state': state_map[reports[p.id]], 'print_state': reports[p.id], 'progress': 100,
+        'time_info': {'elapsed': 0, 'total': 0}, 'job_name': None
+    })
+    finished = printer('Fertig', 'complete', minutes_ago=30)
+    cancelled = printer('Abgebrochen', 'cancelled', minutes_ago=30)
+    previous = printer('Gerade gestartet', 'complete', minutes_ago=1)
+    started = printer('Extern gestartet', 'printing')
+    manual = printer('Manuell frei', None, minutes_ago=30, api_type=APIType.NONE)
+    db.session.commit()
+
+    update_printer_statuses()
+    db.session.expire_all()
+    job_status = {job.name: job.status for job in Job.query}
+    assert job_status == {'Fertig': JobStatus.COMPLETED, 'Abgebrochen': JobStatus.PRINTING,
+                          'Gerade gestartet': JobStatus.PRINTING, 'Manuell frei': JobStatus.PRINTING}
+    assert finished.status == PrinterStatus.IDLE and cancelled.status == PrinterStatus.PRINTING
+    assert previous.status == PrinterStatus.PRINTING and started.status == PrinterStatus.PRINTING
+
+    # Manuell auf frei gesetzt: kein Druckende, die Zeitschätzung bleibt maßgeblich
+    manual.status = PrinterStatus.IDLE
+    db.session.commit()
+    assert not should_complete_job(Job.query.filter_by(name='Manuell frei').one())
+
+
+def test_assignment_skips_idle_printer_with_running_job(app):
+    set_app_context(app)
+    busy = Printer(name='Noch belegt', status=PrinterStatus.IDLE)
+    db.session.add(busy)
+    db.session.flush()
+    db.session.add_all([
+        Job(name='Läuft', status=JobStatus.PRINTING, printer_id=busy.id),
+        Job(name='Wartet', status=JobStatus.PENDING),
+    ])
+    db.session.commit()
+
+    assign_pending_jobs()
+    assert Job.query.filter_by(name='Wartet').one().status == JobStatus.PENDING
+
+    db.session.add(Printer(name='Frei', status=PrinterStatus.IDLE))
+    db.session.commit()
+    assign_pending_jobs()
+    waiting = Job.query.filter_by(name='Wartet').one()
+    assert waiting.status == JobStatus.ASSIGNED and waiting.assigned_printer.name == 'Frei'
@@ -0,0 +1,125 @@
+# test_scheduler_lease.py
+"""
+Tests für die Leader-Wahl des Schedulers über die Datenbank-Lease.
+"""
+import datetime
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING
+from sqlalchemy import create_engine
+
+from app import create_app
+from config_test import TestConfig
+from extensions import db
+from models import SchedulerLease
+from scheduler_events import SchedulerEventBus
+from scheduler_lease import LeaderLease, SchedulerLeaderElection, start_leader_election
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/lease.db')
+    SchedulerLease.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def schedulers():
+    created = []
+
+    def make():
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(func=lambda: None, trigger='interval', seconds=60, id='assign_pending_jobs')
+        scheduler.start(paused=True)
+        created.append(scheduler)
+        return scheduler
+    yield make
+    for scheduler in created:
+        scheduler.shutdown(wait=False)
+
+
+def test_lease_is_held_by_one_holder_until_expiry(engine):
+    now = datetime.datetime(2026, 10, 19, 12, 0)
+    first = LeaderLease(engine, holder='web-1', ttl_seconds=30)
+    second = LeaderLease(engine, holder='web-2', ttl_seconds=30)
+
+    assert first.try_acquire(now) == (True, set())
+    assert second.try_acquire(now) == (False, set())
+    assert first.try_acquire(now + datetime.timedelta(seconds=20))[0]
+    # Erneuert: auch 40 s nach der Übernahme noch gültig
+    assert not second.try_acquire(now + datetime.timedelta(seconds=40))[0]
+    assert first.current()['acquired_at'] == now
+
+    # Leader erneuert nicht mehr: Standby übernimmt nach Ablauf
+    later = now + datetime.timedelta(seconds=51)
+    assert second.try_acquire(later)[0]
+    assert not first.try_acquire(later)[0]
+    assert second.current()['holder'] == 'web-2' and second.current()['acquired_at'] == later
+
+    # Anforderungen aus dem Standby erhält der Leader genau einmal
+    first.request_run('assign_pending_jobs')
+    first.request_run('check_job_completion')
+    first.request_run('assign_pending_jobs')
+    assert second.try_acquire(later) == (True, {'assign_pending_jobs', 'check_job_completion'})
+    assert second.try_acquire(later) == (True, set())
+
+    second.release()
+    assert first.try_acquire(datetime.datetime.utcnow())[0]
+
+
+def test_election_pauses_standby_and_fails_over(engine, schedulers):
+    now = datetime.datetime.utcnow()
+    leader_scheduler, standby_scheduler = schedulers(), schedulers()
+    leader_bus, standby_bus = SchedulerEventBus(), SchedulerEventBus()
+    leader_bus.attach(leader_scheduler)
+    standby_bus.attach(standby_scheduler)
+    leader = SchedulerLeaderElection(leader_scheduler, LeaderLease(engine, holder='web-1'), events=leader_bus)
+    standby = SchedulerLeaderElection(standby_scheduler, LeaderLease(engine, holder='web-2'), events=standby_bus)
+    standby_bus.forwarder = standby.forward_trigger
+
+    assert leader.tick(now) and leader_scheduler.state == STATE_RUNNING
+    assert not standby.tick(now) and standby_scheduler.state == STATE_PAUSED
+
+    # Ereignis im Standby-Prozess: an den Leader weitergeleitet, dort vorgezogen
+    assert standby_bus.trigger('assign_pending_jobs') is False
+    assert standby_bus.stats()['forwarded'] == {'assign_pending_jobs': 1}
+    leader.tick(now + datetime.timedelta(seconds=1))
+    assert leader_bus.stats()['triggered'] == {'assign_pending_jobs': 1}
+
+    # Leader fällt aus: Standby übernimmt nach Ablauf und holt fällige Läufe nach
+    standby_scheduler.get_job('assign_pending_jobs').modify(
+        next_run_time=datetime.datetime.now(standby_scheduler.timezone) - datetime.timedelta(minutes=5)
+    )
+    takeover = now + datetime.timedelta(seconds=leader.lease.ttl_seconds + 2)
+    assert standby.tick(takeover) and standby_scheduler.state == STATE_RUNNING
+    assert standby_scheduler.get_job('assign_pending_jobs').next_run_time >= \
+        datetime.datetime.now(standby_scheduler.timezone) - datetime.timedelta(seconds=5)
+    assert not leader.tick(takeover) and leader_scheduler.state == STATE_PAUSED
+
+
+def test_leader_keeps_running_until_lease_expires_on_db_errors(engine, schedulers):
+    now = datetime.datetime.utcnow()
+    election = SchedulerLeaderElection(schedulers(), LeaderLease(engine, holder='web-1', ttl_seconds=30))
+    assert election.tick(now)
+
+    def unavailable(now=None):
+        raise RuntimeError('database is locked')
+    election.lease.try_acquire = unavailable
+    assert election.tick(now + datetime.timedelta(seconds=10))
+    # Der nächste Versuch (in renew_seconds) läge nach dem Ablauf: jetzt pausieren
+    assert not election.tick(now + datetime.timedelta(seconds=20))
+    assert election.scheduler.state == STATE_PAUSED
+
+
+def test_without_lease_table_scheduler_runs_as_before(schedulers):
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        SchedulerLease.__table__.drop(db.engine)
+        scheduler = schedulers()
+        assert start_leader_election(app, scheduler) is None
+        assert scheduler.state == STATE_RUNNING
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,104 @@
+# test_scheduler_metrics.py
+"""
+Tests für die Instrumentierung der Scheduler-Jobs und die Status-API.
+"""
+import logging
+import time
+
+import pytest
+from apscheduler.events import JobSubmissionEvent, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from apscheduler.schedulers.background import BackgroundScheduler
+
+import scheduler as scheduler_module
+from extensions import db
+from models import User, UserRole
+from scheduler_metrics import get_scheduler_metrics, DURATION_BUCKETS
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = BackgroundScheduler()
+    scheduler.start(paused=True)
+    yield scheduler
+    scheduler.shutdown(wait=False)
+
+
+def _login(app, role):
+    user = User(username=f'test-{role.value.lower()}', role=role)
+    user.set_password('x')
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+        sess['_fresh'] = True
+    return client
+
+
+def _job(metrics, job_id):
+    return next(job for job in metrics.snapshot() if job['id'] == job_id)
+
+
+def test_runs_errors_and_skips_are_recorded(app, scheduler):
+    metrics = get_scheduler_metrics()
+    metrics.instrument(scheduler)
+    scheduler.add_job(func=lambda: 3, trigger='interval', seconds=60, id='zaehlen', name='Zählen')
+    job = scheduler.get_job('zaehlen')
+    assert job.func._scheduler_metrics is metrics
+
+    assert job.func() == 3
+    entry = _job(metrics, 'zaehlen')
+    assert entry['registered'] and entry['interval_s'] == 60 and entry['next_run_time']
+    assert entry['runs'] == 1 and entry['results']['ok'] == 1 and entry['last_result'] == 3
+    assert sum(entry['histogram']['counts']) == 1 and len(entry['histogram']['counts']) == len(DURATION_BUCKETS) + 1
+
+    # Abgefangene, nur protokollierte Fehler zählen ebenfalls
+    def swallowed():
+        logging.getLogger('scheduler').error('Drucker nicht erreichbar')
+    metrics.timed('abfrage', swallowed)()
+    with pytest.raises(ValueError):
+        metrics.timed('abfrage', lambda: int('x'))()
+    entry = _job(metrics, 'abfrage')
+    assert entry['results'] == {'ok': 0, 'error': 2, 'missed': 0, 'overlap': 0}
+    assert entry['recent_errors'][0]['message'] == 'Drucker nicht erreichbar'
+    assert entry['recent_errors'][1]['message'].startswith('ValueError')
+    assert not entry['registered']
+
+    # Laufzeit über dem Intervall
+    metrics.timed('langsam', lambda: time.sleep(0.02), interval=0.01)()
+    assert _job(metrics, 'langsam')['overruns'] == 1
+
+    # Überlappende und verpasste Läufe aus den Scheduler-Events
+    scheduler._dispatch_event(JobSubmissionEvent(EVENT_JOB_MAX_INSTANCES, 'zaehlen', 'default', []))
+    scheduler._dispatch_event(JobSubmissionEvent(EVENT_JOB_MISSED, 'zaehlen', 'default', []))
+    assert _job(metrics, 'zaehlen')['results'] == {'ok': 1, 'error': 0, 'missed': 1, 'overlap': 1}
+
+
+def test_status_api(logged_in_client, scheduler):
+    get_scheduler_metrics().instrument(scheduler)
+    scheduler.add_job(func=lambda: None, trigger='interval', seconds=30, id='check_job_completion')
+
+    data = logged_in_client.get('/api/settings/scheduler/status').get_json()
+    assert data['enabled'] is True and data['running'] is True and data['jobs_count'] == 1
+    assert data['jobs'][0]['id'] == 'check_job_completion' and data['jobs'][0]['runs'] == 0
+    assert 'published' in data['events']
+
+
+def test_status_api_for_non_admins(app):
+    # Nicht-Admins sehen nur den Schalter fürs Dashboard
+    client = _login(app, UserRole.OPERATOR)
+    assert client.get('/api/settings/scheduler/status').get_json() == {'enabled': True}
+    assert client.get('/admin/scheduler').status_code == 302
+
+
+def test_status_keeps_enabled_when_collecting_fails(app, monkeypatch):
+    def failing_stats():
+        raise RuntimeError('Ereignisse nicht verfügbar')
+    monkeypatch.setattr(scheduler_module, 'get_scheduler_events', failing_stats)
+    assert scheduler_module.get_scheduler_status() == {'enabled': True, 'error': 'Ereignisse nicht verfügbar'}
+
+
+def test_admin_view(logged_in_client):
+    response = logged_in_client.get('/admin/scheduler')
+    assert response.status_code == 200
+    assert b'Scheduler-Status' in response.data
@@ -0,0 +1,118 @@
+# test_search_index.py
+"""
+Tests für die FTS5-Volltextsuche und den ilike-Fallback.
+"""
+import pytest
+from flask import current_app
+from sqlalchemy import insert
+
+from extensions import db
+from models import Job, FilamentType, FilamentSpool, Consumable, ConsumableCategory
+from search_index import (
+    build_match_query, search_filter, ranked_ids, fts_available, ensure_search_index, search_reindex_command
+)
+
+
+@pytest.fixture
+def app(app):
+    galaxy = FilamentType(manufacturer='Prusament', name='PLA Galaxy Black', material_type='PLA')
+    petg = FilamentType(manufacturer='Extrudr', name='PETG Weiß', material_type='PETG')
+    db.session.add_all([galaxy, petg])
+    db.session.flush()
+    db.session.add_all([
+        Job(name='Gehäuse Oberteil', material_number='M-4711'),
+        Job(name='Gehäuse Unterteil'),
+        Job(name='Halterung Kamera', source_stl_filename='gehaeuse_adapter.stl'),
+        FilamentSpool(filament_type_id=galaxy.id, short_id='G1', current_weight_g=800, storage_location='Regal A'),
+        FilamentSpool(filament_type_id=petg.id, short_id='W2', current_weight_g=500, storage_location='Regal B'),
+        Consumable(name='Isopropanol 99%', manufacturer='Chemie AG', category=ConsumableCategory.OTHER),
+        Consumable(name='Düse 0.4mm', manufacturer='E3D', article_number='NOZ-04', category=ConsumableCategory.OTHER),
+    ])
+    db.session.commit()
+    return app
+
+
+def _job_names(term):
+    return sorted(job.name for job in Job.query.filter(search_filter('jobs', term)))
+
+
+def test_match_query_is_sanitized():
+    assert build_match_query('gehä* OR "x') == '"gehä"* "OR"* "x"*'
+    assert build_match_query('  ') is None
+    assert build_match_query('pla', ['material']) == '{material} : ("pla"*)'
+
+
+def test_prefix_search_and_trigger_sync(app):
+    assert fts_available()
+    assert _job_names('Gehäu') == ['Gehäuse Oberteil', 'Gehäuse Unterteil']
+    assert _job_names('gehause ober') == ['Gehäuse Oberteil']
+    assert _job_names('M-4711') == ['Gehäuse Oberteil']
+
+    job = Job.query.filter_by(name='Gehäuse Unterteil').one()
+    job.name = 'Deckel'
+    db.session.commit()
+    db.session.execute(insert(Job), [{'name': 'Gehäuse Seitenteil', 'is_archived': False}])
+    db.session.delete(Job.query.filter_by(name='Gehäuse Oberteil').one())
+    db.session.commit()
+    assert _job_names('gehäuse') == ['Gehäuse Seitenteil']
+    assert _job_names('deck') == ['Deckel']
+
+
+def test_spool_index_follows_filament_type_changes(app):
+    ftype = FilamentType.query.filter_by(manufacturer='Extrudr').one()
+    ftype.name = 'PETG Marmor'
+    db.session.commit()
+
+    ids = [row_id for row_id, _ in ranked_ids('spools', 'marmor')]
+    assert ids == [FilamentSpool.query.filter_by(short_id='W2').one().id]
+
+
+def test_existing_data_is_indexed_on_startup(app):
+    db.session.execute(db.text('DROP TABLE job_fts'))
+    db.session.commit()
+    with db.engine.begin() as connection:
+        assert ensure_search_index(connection)
+    assert _job_names('halterung') == ['Halterung Kamera']
+
+
+def test_fallback_without_fts(app, monkeypatch, count_queries):
+    monkeypatch.setitem(current_app.extensions, 'fts_search', False)
+    monkeypatch.setattr(db.engine.dialect, 'name', 'postgresql')
+    # Auch das negative Ergebnis ist gemerkt
+    with count_queries() as statements:
+        assert not fts_available()
+    assert statements == []
+    assert _job_names('oberteil') == ['Gehäuse Oberteil']
+    assert [row_id for row_id, score in ranked_ids('consumables', 'noz')] == \
+        [Consumable.query.filter_by(article_number='NOZ-04').one().id]
+
+
+def test_unified_search_api_ranks_results(logged_in_client):
+    response = logged_in_client.get('/api/search?q=regal&types=spools,consumables')
+    data = response.get_json()
+    assert data['engine'] == 'fts5'
+    assert set(data['results']) == {'spools', 'consumables'}
+    assert {r['title'].split(' ')[0] for r in data['results']['spools']} == {'G1', 'W2'}
+
+    data = logged_in_client.get('/api/search?q=gehäuse').get_json()
+    titles = [r['title'] for r in data['results']['jobs']]
+    # Treffer im Namen ranken vor Treffern nur im Dateinamen
+    assert set(titles[:2]) == {'Gehäuse Oberteil', 'Gehäuse Unterteil'}
+    assert logged_in_client.get('/api/search').status_code == 400
+
+    spools = logged_in_client.post('/materials/storage-management/search-spool',
+                                   json={'search_term': 'gala', 'search_type': 'material'}).get_json()
+    assert [r['short_id'] for r in spools['results']] == ['G1']
+    assert b'Isopropanol' in logged_in_client.get('/consumables/?search=isoprop').data
+
+
+def test_index_with_emptied_shadow_tables_is_repaired(app):
+    for shadow in ('config', 'data', 'idx', 'content', 'docsize'):
+        db.session.execute(db.text(f'DELETE FROM job_fts_{shadow}'))
+    db.session.commit()
+    # Der App-Start prüft vorhandene Indizes nicht, erst search-reindex
+    with db.engine.begin() as connection:
+        assert ensure_search_index(connection)
+    result = app.test_cli_runner().invoke(search_reindex_command)
+    assert 'neu aufgebaut' in result.output
+    assert _job_names('halterung') == ['Halterung Kamera']
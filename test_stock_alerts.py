@@ -0,0 +1,68 @@
+# test_stock_alerts.py
+"""
+Tests für die zwischengespeicherte Low-Stock-Liste.
+"""
+import pytest
+
+from extensions import db
+from models import FilamentType, FilamentSpool
+from stock_alerts import (
+    compute_low_stock_materials, get_low_stock_materials, get_low_stock_cache,
+    invalidate_low_stock_cache
+)
+
+
+@pytest.fixture
+def app(app):
+    pla = FilamentType(manufacturer='A', name='PLA Rot', material_type='PLA', reorder_level_g=1000)
+    petg = FilamentType(manufacturer='B', name='PETG Blau', material_type='PETG', reorder_level_g=500)
+    empty = FilamentType(manufacturer='C', name='ABS Leer', material_type='ABS', reorder_level_g=200)
+    untracked = FilamentType(manufacturer='D', name='TPU', material_type='TPU')
+    db.session.add_all([pla, petg, empty, untracked])
+    db.session.flush()
+    db.session.add_all([
+        FilamentSpool(filament_type_id=pla.id, short_id='P001', current_weight_g=400),
+        FilamentSpool(filament_type_id=pla.id, short_id='P002', current_weight_g=300),
+        FilamentSpool(filament_type_id=petg.id, short_id='G001', current_weight_g=900),
+        FilamentSpool(filament_type_id=untracked.id, short_id='T001', current_weight_g=10),
+    ])
+    db.session.commit()
+    return app
+
+
+def test_compute_matches_per_material_sums(app):
+    materials = compute_low_stock_materials()
+
+    assert [m.name for m in materials] == ['ABS Leer', 'PLA Rot']
+    assert {m.name: m.total_remaining_weight for m in materials} == {'ABS Leer': 0, 'PLA Rot': 700}
+    expected = [
+        ftype.name for ftype in FilamentType.query.order_by(FilamentType.name).all()
+        if ftype.reorder_level_g and ftype.total_remaining_weight <= ftype.reorder_level_g
+    ]
+    assert [m.name for m in materials] == expected
+
+
+def test_cache_serves_without_queries_and_invalidates_after_commit(app, count_queries):
+    get_low_stock_materials()
+
+    with count_queries() as statements:
+        get_low_stock_materials()
+    assert statements == []
+
+    spool = FilamentSpool.query.filter_by(short_id='G001').first()
+    spool.current_weight_g = 100
+    invalidate_low_stock_cache()
+    db.session.commit()
+
+    assert 'PETG Blau' in [m.name for m in get_low_stock_materials()]
+
+
+def test_cache_expires_after_ttl(app):
+    cache = get_low_stock_cache()
+    cache.get()
+    FilamentSpool.query.filter_by(short_id='G001').update({'current_weight_g': 50})
+    db.session.commit()
+
+    assert 'PETG Blau' not in [m.name for m in cache.get()]
+    cache.ttl_seconds = 0
+    assert 'PETG Blau' in [m.name for m in cache.get()]
@@ -25,6 +25,7 @@ from models import (
     User, Printer, Job, FilamentType, FilamentSpool,
     UserRole, PrinterStatus, JobStatus
 )
+from search_index import SEARCH_INDEXES
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Optional imports - gracefully handle missing modules
@@ -104,10 +105,19 @@ def clean_db(app):
             table_names = inspector.get_table_names()
             
             for table in table_names:
+                # FTS5-Tabellen nie direkt leeren (beschädigt die Schattentabellen)
+                if '_fts' in table:
+                    continue
                 try:
                     db.session.execute(db.text(f'DELETE FROM {table}'))
                 except Exception as e:
                     print(f"Warning cleaning table {table}: {e}")
+
+            # Suchindizes über die virtuelle Tabelle leeren ('delete-all' gibt es
+            # nur für contentless/external-content-Tabellen)
+            for index in SEARCH_INDEXES.values():
+                if index.name in table_names:
+                    db.session.execute(db.text(f'DELETE FROM {index.name}'))
             
             db.session.execute(db.text('PRAGMA foreign_keys = ON'))
             db.session.commit()
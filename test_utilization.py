@@ -0,0 +1,136 @@
+# test_utilization.py
+"""
+Tests für die Statusintervalle und die Auslastungsauswertung.
+"""
+import datetime
+
+import numpy as np
+import pytest
+
+from conftest import printer_by_name
+from extensions import db
+from models import Printer, PrinterStatus, PrinterStatusInterval, PrinterStatusLog
+from routes.services import _log_printer_status
+from utilization import compute_utilization, STATE_INDEX
+
+T0 = datetime.datetime(2026, 10, 1, 8, 0)
+
+
+def _at(hours):
+    return T0 + datetime.timedelta(hours=hours)
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([Printer(name='P1'), Printer(name='P2')])
+    db.session.commit()
+    return app
+
+
+def _log(name, status, hours):
+    _log_printer_status(printer_by_name(name), status, timestamp=_at(hours))
+    db.session.commit()
+
+
+def test_status_log_maintains_intervals(app):
+    _log('P1', PrinterStatus.IDLE, 0)
+    _log('P1', PrinterStatus.PRINTING, 1)
+    _log('P1', PrinterStatus.PRINTING, 2)
+    _log('P1', PrinterStatus.ERROR, 3.5)
+
+    assert PrinterStatusLog.query.count() == 4
+    intervals = [(i.status, i.start_time, i.end_time)
+                 for i in PrinterStatusInterval.query.order_by(PrinterStatusInterval.start_time)]
+    # Gleicher Status verlängert das offene Intervall
+    assert intervals == [
+        (PrinterStatus.IDLE, _at(0), _at(1)),
+        (PrinterStatus.PRINTING, _at(1), _at(3.5)),
+        (PrinterStatus.ERROR, _at(3.5), None),
+    ]
+
+
+def test_hourly_occupancy_and_metrics(app):
+    for status, hours in ((PrinterStatus.IDLE, 0), (PrinterStatus.PRINTING, 1.5), (PrinterStatus.ERROR, 3.25),
+                          (PrinterStatus.IDLE, 3.75), (PrinterStatus.PRINTING, 5), (PrinterStatus.ERROR, 5.5),
+                          (PrinterStatus.IDLE, 6.5)):
+        _log('P1', status, hours)
+    _log('P2', PrinterStatus.OFFLINE, 2)
+
+    report = compute_utilization(_at(0), _at(8), now=_at(7))
+    p1, p2 = report.printer_ids.index(printer_by_name('P1').id), report.printer_ids.index(printer_by_name('P2').id)
+    printing = report.occupancy[p1, :, STATE_INDEX[PrinterStatus.PRINTING]] / 3600
+    assert np.allclose(printing, [0, 0.5, 1, 0.25, 0, 0.5, 0, 0])
+    assert np.allclose(report.occupancy[p1].sum(axis=1) / 3600, [1, 1, 1, 1, 1, 1, 1, 0])
+
+    hours = report.state_seconds()[p1] / 3600
+    assert hours[STATE_INDEX[PrinterStatus.PRINTING]] == pytest.approx(2.25)
+    assert hours[STATE_INDEX[PrinterStatus.ERROR]] == pytest.approx(1.5)
+    assert report.utilization()[p1] == pytest.approx(2.25 / 7)
+    assert report.uptime()[p1] == pytest.approx(1 - 1.5 / 7)
+    assert report.mttr_hours()[p1] == pytest.approx(0.75)
+    count, mean, longest = report.idle_gaps()
+    assert (count[p1], mean[p1], longest[p1]) == (3, pytest.approx((1.5 + 1.25 + 0.5) / 3), pytest.approx(1.5))
+
+    # P2: vor dem ersten Log unbekannt, danach offline bis jetzt
+    assert report.unknown_seconds()[p2] / 3600 == pytest.approx(3)
+    assert report.uptime()[p2] == 0
+    assert np.isnan(report.mttr_hours()[p2])
+
+
+def test_range_clips_intervals_and_matches_naive_sum(app):
+    rng = np.random.default_rng(7)
+    hours = np.cumsum(rng.uniform(0.05, 3, size=120))
+    states = list(STATE_INDEX)
+    for i, h in enumerate(hours):
+        _log('P1' if i % 3 else 'P2', states[rng.integers(len(states))], float(h))
+
+    start, end = _at(20), _at(140)
+    report = compute_utilization(start, end, bucket_seconds=1800, now=_at(hours[-1] + 1))
+    expected = {}
+    for interval in PrinterStatusInterval.query:
+        stop = interval.end_time or _at(hours[-1] + 1)
+        overlap = (min(stop, end) - max(interval.start_time, start)).total_seconds()
+        if overlap > 0:
+            key = (interval.printer_id, interval.status)
+            expected[key] = expected.get(key, 0) + overlap
+    totals = report.state_seconds()
+    for (printer_id, status), seconds in expected.items():
+        assert totals[report.printer_ids.index(printer_id), STATE_INDEX[status]] == pytest.approx(seconds, abs=1e-3)
+    assert totals.sum() == pytest.approx(sum(expected.values()), abs=1e-3)
+
+
+def test_utilization_endpoint(logged_in_client):
+    now = datetime.datetime.utcnow()
+    _log_printer_status(printer_by_name('P1'), PrinterStatus.PRINTING, timestamp=now - datetime.timedelta(hours=3))
+    db.session.commit()
+
+    data = logged_in_client.get('/kpi/api/utilization?days=1').get_json()
+    assert len(data['fleet']['labels']) == 24
+    by_name = {p['name']: p for p in data['printers']}
+    assert by_name['P1']['hours_by_state']['printing'] == pytest.approx(3, abs=0.01)
+    assert by_name['P1']['utilization'] == 100.0
+    assert by_name['P2']['unknown_hours'] == 24
+
+    assert logged_in_client.get('/kpi/dashboard').status_code == 200
+
+
+def _open_intervals(printer):
+    return [i.status for i in PrinterStatusInterval.query.filter_by(printer_id=printer.id, end_time=None)]
+
+
+def test_manual_status_changes_open_intervals(logged_in_client):
+    from models import Job, JobStatus
+    printer = printer_by_name('P1')
+    job = Job(name='Teil', status=JobStatus.ASSIGNED, printer_id=printer.id)
+    db.session.add(job)
+    db.session.commit()
+
+    logged_in_client.post(f'/printer_actions/job/start/{job.id}')
+    assert _open_intervals(printer) == [PrinterStatus.PRINTING]
+    logged_in_client.post(f'/printer_actions/job/pause/{job.id}')
+    assert _open_intervals(printer) == [PrinterStatus.IDLE]
+    assert PrinterStatusInterval.query.filter_by(printer_id=printer.id).count() == 2
+
+    logged_in_client.post(f'/printers/copy/{printer.id}')
+    copy = Printer.query.filter(Printer.name.notin_(['P1', 'P2'])).one()
+    assert _open_intervals(copy) == [PrinterStatus.IDLE]
@@ -0,0 +1,229 @@
+# utilization.py
+"""
+Auslastungsauswertung auf Basis der Statusintervalle (PrinterStatusInterval).
+
+Alle Intervalle eines Zeitraums werden mit einer Abfrage geladen und in
+NumPy-Arrays überführt. Die Belegung pro Drucker, Stunde (bzw. beliebiger
+Bucket-Größe) und Status wird dann in einem Durchlauf ohne Python-Schleifen
+über Intervalle oder Buckets berechnet:
+
+Für jede Gruppe (Drucker, Status) ist die bis zum Zeitpunkt x abgedeckte Zeit
+G(x) = Σ max(x - s_i, 0) - Σ max(x - e_i, 0). An den Bucket-Grenzen lässt sich
+das über kumulierte Anzahlen und Summen der Start-/Endpunkte (np.bincount +
+cumsum) auswerten; die Belegung eines Buckets ist die Differenz von G an
+seinen Grenzen. Der Aufwand ist O(Intervalle + Drucker · Status · Buckets).
+"""
+import datetime
+
+import numpy as np
+
+from extensions import db
+from models import Printer, PrinterStatus, PrinterStatusInterval
+
+# Feste Reihenfolge der Status-Achse
+STATES = tuple(PrinterStatus)
+STATE_INDEX = {status: i for i, status in enumerate(STATES)}
+
+# Status, in denen der Drucker nicht verfügbar ist
+DOWN_STATES = (PrinterStatus.ERROR, PrinterStatus.OFFLINE)
+
+DEFAULT_BUCKET_SECONDS = 3600
+
+
+def _ramp_sums(positions, groups, group_count, bucket_count):
+    """
+    Σ max(x - p, 0) über alle Punkte p einer Gruppe, für alle x = 0..bucket_count.
+
+    Args:
+        positions: Punkte in Bucket-Einheiten (bereits auf [0, bucket_count] begrenzt)
+        groups: Gruppenindex je Punkt
+    """
+    width = bucket_count + 1
+    # Erstes ganzzahliges x mit x >= p
+    slots = groups * width + np.ceil(positions).astype(np.int64)
+    counts = np.bincount(slots, minlength=group_count * width).reshape(group_count, width).cumsum(axis=1)
+    # Ohne Punkte liefert bincount trotz Gewichten Ganzzahlen
+    sums = np.bincount(slots, weights=positions, minlength=group_count * width).astype(float)\
+        .reshape(group_count, width).cumsum(axis=1)
+    return np.arange(width) * counts - sums
+
+
+class UtilizationReport:
+    """
+    Ergebnis einer Auslastungsauswertung.
+
+    Attributes:
+        occupancy: Sekunden pro (Drucker, Bucket, Status), Form (P, B, S)
+        printer_ids: Drucker-IDs in der Reihenfolge der ersten Achse
+        states: Status in der Reihenfolge der letzten Achse
+        bucket_starts: Startzeitpunkte der Buckets
+    """
+
+    def __init__(self, start, end, bucket_seconds, printer_ids, occupancy, intervals):
+        self.start = start
+        self.end = end
+        self.bucket_seconds = bucket_seconds
+        self.printer_ids = printer_ids
+        self.states = STATES
+        self.occupancy = occupancy
+        self.bucket_starts = [start + datetime.timedelta(seconds=bucket_seconds * i)
+                              for i in range(occupancy.shape[1])]
+        # (Druckerindex, Statusindex, Dauer in s, berührt Bereichsgrenze) je Intervall
+        self._intervals = intervals
+
+    @property
+    def range_seconds(self):
+        return (self.end - self.start).total_seconds()
+
+    def state_seconds(self):
+        """Gesamtzeit pro Drucker und Status, Form (P, S)."""
+        return self.occupancy.sum(axis=1)
+
+    def unknown_seconds(self):
+        """Zeit ohne bekannten Status (vor dem ersten Intervall) pro Drucker."""
+        return np.clip(self.range_seconds - self.state_seconds().sum(axis=1), 0, None)
+
+    def share(self, *states):
+        """Anteil der bekannten Zeit in den angegebenen Status pro Drucker (0..1)."""
+        totals = self.state_seconds()
+        known = totals.sum(axis=1)
+        selected = totals[:, [STATE_INDEX[s] for s in states]].sum(axis=1)
+        return np.divide(selected, known, out=np.zeros_like(selected), where=known > 0)
+
+    def utilization(self):
+        """Druckanteil der bekannten Zeit pro Drucker."""
+        return self.share(PrinterStatus.PRINTING)
+
+    def uptime(self):
+        """Verfügbarkeit (nicht Fehler/Offline) der bekannten Zeit pro Drucker."""
+        known = self.state_seconds().sum(axis=1)
+        return np.where(known > 0, 1.0 - self.share(*DOWN_STATES), 0.0)
+
+    def _episodes(self, state, complete_only=False):
+        printer_index, state_index, durations, truncated = self._intervals
+        mask = (state_index == STATE_INDEX[state]) & (durations > 0)
+        if complete_only:
+            mask &= ~truncated
+        count = np.bincount(printer_index[mask], minlength=len(self.printer_ids))
+        total = np.bincount(printer_index[mask], weights=durations[mask], minlength=len(self.printer_ids))
+        longest = np.zeros(len(self.printer_ids))
+        np.maximum.at(longest, printer_index[mask], durations[mask])
+        return count, total, longest
+
+    def mttr_hours(self):
+        """Mittlere Dauer abgeschlossener Fehler-Episoden pro Drucker (NaN ohne Fehler)."""
+        count, total, _ = self._episodes(PrinterStatus.ERROR, complete_only=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 0, total / np.maximum(count, 1) / 3600, np.nan)
+
+    def idle_gaps(self):
+        """Anzahl, mittlere und längste Leerlaufphase (Stunden) pro Drucker."""
+        count, total, longest = self._episodes(PrinterStatus.IDLE)
+        mean = np.where(count > 0, total / np.maximum(count, 1) / 3600, 0.0)
+        return count, mean, longest / 3600
+
+    def fleet_hourly(self, state=PrinterStatus.PRINTING):
+        """Anzahl gleichzeitig im Status befindlicher Drucker je Bucket (Mittelwert)."""
+        return self.occupancy[:, :, STATE_INDEX[state]].sum(axis=0) / self.bucket_seconds
+
+    def to_dict(self):
+        """Einfache Daten für JSON-Ausgabe und Cache."""
+        totals = self.state_seconds()
+        utilization = self.utilization()
+        uptime = self.uptime()
+        mttr = self.mttr_hours()
+        idle_count, idle_mean, idle_longest = self.idle_gaps()
+        unknown = self.unknown_seconds()
+        printers = []
+        for i, printer_id in enumerate(self.printer_ids):
+            printers.append({
+                'printer_id': printer_id,
+                'hours_by_state': {state.name.lower(): round(totals[i, j] / 3600, 2)
+                                   for j, state in enumerate(self.states)},
+                'unknown_hours': round(unknown[i] / 3600, 2),
+                'utilization': round(utilization[i] * 100, 1),
+                'uptime': round(uptime[i] * 100, 1),
+                'mttr_hours': None if np.isnan(mttr[i]) else round(mttr[i], 2),
+                'idle_gaps': int(idle_count[i]),
+                'avg_idle_gap_hours': round(idle_mean[i], 2),
+                'max_idle_gap_hours': round(idle_longest[i], 2),
+            })
+        return {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'bucket_seconds': self.bucket_seconds,
+            'printers': printers,
+            'fleet': {
+                'labels': [b.isoformat() for b in self.bucket_starts],
+                'printing': [round(v, 2) for v in self.fleet_hourly(PrinterStatus.PRINTING).tolist()],
+                'idle': [round(v, 2) for v in self.fleet_hourly(PrinterStatus.IDLE).tolist()],
+                'down': [round(a + b, 2) for a, b in zip(self.fleet_hourly(PrinterStatus.ERROR).tolist(),
+                                                         self.fleet_hourly(PrinterStatus.OFFLINE).tolist())],
+            },
+        }
+
+
+def compute_utilization(start, end, bucket_seconds=DEFAULT_BUCKET_SECONDS, printer_ids=None, now=None):
+    """
+    Berechnet die Statusbelegung pro Drucker und Bucket im Zeitraum [start, end).
+
+    Args:
+        start, end: Zeitraum (UTC, naive datetimes)
+        bucket_seconds: Größe der Buckets (Standard: 1 Stunde)
+        printer_ids: Nur diese Drucker (None = alle)
+        now: Bezugszeit für offene Intervalle (Standard: jetzt)
+
+    Returns:
+        UtilizationReport
+    """
+    if end <= start:
+        raise ValueError("Ende des Zeitraums muss nach dem Start liegen.")
+    now = now or datetime.datetime.utcnow()
+    # Ende auf volle Buckets aufrunden
+    bucket_count = int(np.ceil((end - start).total_seconds() / bucket_seconds))
+    end = start + datetime.timedelta(seconds=bucket_count * bucket_seconds)
+
+    if printer_ids is None:
+        printer_ids = [row.id for row in db.session.query(Printer.id).order_by(Printer.id)]
+    printer_ids = list(printer_ids)
+
+    query = db.session.query(
+        PrinterStatusInterval.printer_id,
+        PrinterStatusInterval.status,
+        PrinterStatusInterval.start_time,
+        PrinterStatusInterval.end_time
+    ).filter(
+        PrinterStatusInterval.start_time < end,
+        db.or_(PrinterStatusInterval.end_time.is_(None), PrinterStatusInterval.end_time > start)
+    )
+    if printer_ids:
+        query = query.filter(PrinterStatusInterval.printer_id.in_(printer_ids))
+    rows = query.all() if printer_ids else []
+
+    printer_position = {printer_id: i for i, printer_id in enumerate(printer_ids)}
+    rows = [row for row in rows if row.printer_id in printer_position and row.status in STATE_INDEX]
+    count = len(rows)
+
+    printer_index = np.fromiter((printer_position[r.printer_id] for r in rows), dtype=np.int64, count=count)
+    state_index = np.fromiter((STATE_INDEX[r.status] for r in rows), dtype=np.int64, count=count)
+    starts = np.fromiter(((r.start_time - start).total_seconds() for r in rows), dtype=float, count=count)
+    ends = np.fromiter((((r.end_time or now) - start).total_seconds() for r in rows), dtype=float, count=count)
+
+    range_seconds = bucket_count * bucket_seconds
+    clipped_starts = np.clip(starts, 0, range_seconds)
+    clipped_ends = np.clip(np.maximum(ends, starts), 0, range_seconds)
+    truncated = (starts < 0) | (ends > range_seconds) | np.fromiter(
+        (r.end_time is None for r in rows), dtype=bool, count=count)
+
+    group_count = max(len(printer_ids), 1) * len(STATES)
+    groups = printer_index * len(STATES) + state_index
+    coverage = (_ramp_sums(clipped_starts / bucket_seconds, groups, group_count, bucket_count)
+                - _ramp_sums(clipped_ends / bucket_seconds, groups, group_count, bucket_count))
+    occupancy = np.diff(coverage, axis=1) * bucket_seconds
+    # Rundungsfehler der kumulierten Summen abschneiden
+    occupancy = np.clip(occupancy, 0, bucket_seconds)
+    occupancy = occupancy.reshape(max(len(printer_ids), 1), len(STATES), bucket_count)\
+        .transpose(0, 2, 1)[:len(printer_ids)]
+
+    intervals = (printer_index, state_index, clipped_ends - clipped_starts, truncated)
+    return UtilizationReport(start, end, bucket_seconds, printer_ids, occupancy, intervals)
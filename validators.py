@@ -3,8 +3,15 @@
 
 import datetime
 from collections import defaultdict, deque
-from models import Job, JobDependency, JobStatus, DependencyType, DeadlineStatus
+import numpy as np
+from sqlalchemy import func
+from models import Job, JobDependency, JobStatus, DependencyType, DeadlineStatus, Project
 from extensions import db
+from bulk_updates import bulk_update_jobs
+from project_dag import get_project_dag_cache
+from dependency_graph import would_create_cycle
+
+OPEN_JOB_STATES = (JobStatus.PENDING, JobStatus.ASSIGNED, JobStatus.QUEUED)
 
 
 class DependencyValidator:
@@ -14,7 +21,8 @@ class DependencyValidator:
     def has_cycle(job_id, depends_on_id, db_session):
         """
         Prüft ob eine neue Abhängigkeit einen Zyklus erzeugen würde.
-        Verwendet Tiefensuche (DFS) für Zyklenerkennung.
+        Lädt alle transitiven Vorgänger von depends_on_id in einer Abfrage
+        (rekursive CTE, siehe dependency_graph).
         
         Args:
             job_id: ID des abhängigen Jobs
@@ -24,32 +32,7 @@ class DependencyValidator:
         Returns:
             bool: True wenn Zyklus existiert
         """
-        # Verhindere Selbst-Abhängigkeiten
-        if job_id == depends_on_id:
-            return True
-        
-        visited = set()
-        stack = [depends_on_id]
-        
-        while stack:
-            current = stack.pop()
-            
-            if current == job_id:
-                return True  # Zyklus gefunden!
-            
-            if current in visited:
-                continue
-            
-            visited.add(current)
-            
-            # Finde alle Jobs von denen current abhängt
-            deps = db_session.query(JobDependency.depends_on_job_id)\
-                .filter_by(job_id=current).all()
-            
-            for (dep_id,) in deps:
-                stack.append(dep_id)
-        
-        return False
+        return would_create_cycle(job_id, depends_on_id, db_session)
     
     @staticmethod
     def validate_dependency(job_id, depends_on_id, db_session):
@@ -167,87 +150,23 @@ class CriticalPathCalculator:
         Berechnet kritischen Pfad eines Projekts.
         Markiert alle Jobs auf dem kritischen Pfad.
         
+        Der Abhängigkeitsgraph wird pro Projekt zwischengespeichert und nach
+        Änderungen nur im betroffenen Bereich neu gerechnet (siehe project_dag).
+        
         Args:
             project: Project-Objekt
             
         Returns:
-            list: Jobs auf dem kritischen Pfad
+            list: Jobs auf dem kritischen Pfad (topologisch sortiert, leer bei Zyklus)
         """
-        # Lade alle nicht-abgeschlossenen Jobs
-        jobs = list(project.jobs.filter(
-            Job.status.in_([JobStatus.PENDING, JobStatus.ASSIGNED, JobStatus.QUEUED, JobStatus.PRINTING])
-        ))
-        
-        if not jobs:
+        critical_ids = get_project_dag_cache().update_critical_path(project.id)
+        if not critical_ids:
             return []
         
-        # Sortiere topologisch
-        sorted_jobs = DependencyValidator.topological_sort(jobs)
-        if not sorted_jobs:
-            return []  # Zyklus erkannt
-        
-        # Erstelle Job-Maps für schnellen Zugriff
-        job_map = {job.id: job for job in sorted_jobs}
-        
-        # Forward Pass: Earliest Start/Finish Times
-        earliest_start = {}
-        earliest_finish = {}
-        
-        for job in sorted_jobs:
-            # Geschätzte Dauer in Minuten
-            duration = 0
-            if job.gcode_file and job.gcode_file.estimated_print_time_min:
-                duration = job.gcode_file.estimated_print_time_min
-            
-            # Earliest Start ist max(Earliest Finish der Vorgänger)
-            es = 0
-            for dep in job.dependencies:
-                if dep.dependency_type == DependencyType.FINISH_TO_START:
-                    if dep.depends_on_job_id in earliest_finish:
-                        es = max(es, earliest_finish[dep.depends_on_job_id])
-            
-            earliest_start[job.id] = es
-            earliest_finish[job.id] = es + duration
-        
-        # Backward Pass: Latest Start/Finish Times
-        latest_start = {}
-        latest_finish = {}
-        
-        # Projekt-Ende ist max(Earliest Finish)
-        project_end = max(earliest_finish.values()) if earliest_finish else 0
-        
-        for job in reversed(sorted_jobs):
-            duration = 0
-            if job.gcode_file and job.gcode_file.estimated_print_time_min:
-                duration = job.gcode_file.estimated_print_time_min
-            
-            # Latest Finish ist min(Latest Start der Nachfolger)
-            lf = project_end
-            for dependent in job.dependents:
-                if dependent.job_id in latest_start:
-                    lf = min(lf, latest_start[dependent.job_id])
-            
-            latest_finish[job.id] = lf
-            latest_start[job.id] = lf - duration
-        
-        # Identifiziere kritischen Pfad (Slack = 0)
-        critical_jobs = []
-        
-        for job in sorted_jobs:
-            slack = latest_start[job.id] - earliest_start[job.id]
-            
-            if abs(slack) < 0.1:  # Float-Vergleich mit Toleranz
-                job.is_on_critical_path = True
-                critical_jobs.append(job)
-            else:
-                job.is_on_critical_path = False
-            
-            # Setze geschätzte Start-/Endzeiten
-            now = datetime.datetime.utcnow()
-            job.estimated_start_time = now + datetime.timedelta(minutes=earliest_start[job.id])
-            job.estimated_end_time = now + datetime.timedelta(minutes=earliest_finish[job.id])
-        
-        return critical_jobs
+        # Geschätzte Start-/Endzeiten setzt die Farmplanung (horizon_scheduler),
+        # die im Gegensatz zum CPM die Druckerkapazität berücksichtigt
+        job_map = {job.id: job for job in Job.query.filter(Job.id.in_(critical_ids))}
+        return [job_map[job_id] for job_id in critical_ids if job_id in job_map]
     
     @staticmethod
     def calculate_slack_time(job, project):
@@ -366,6 +285,95 @@ class PriorityCalculator:
             job.priority_score = PriorityCalculator.calculate_priority_score(job)
         
         db.session.commit()
+    
+    @staticmethod
+    def score_arrays(hours_remaining, priority, critical, project_hours, blocking_count):
+        """
+        Vektorisierte Fassung von calculate_priority_score (gleiche Punkte).
+        
+        Args:
+            hours_remaining: Stunden bis zur Deadline (NaN = keine Deadline)
+            priority: Manuelle Priorität
+            critical: Auf kritischem Pfad (bool)
+            project_hours: Stunden bis zur Projekt-Deadline (NaN = keine)
+            blocking_count: Anzahl abhängiger Jobs
+            
+        Returns:
+            np.ndarray: Scores, auf 2 Stellen gerundet
+        """
+        hours = np.asarray(hours_remaining, dtype=float)
+        project = np.asarray(project_hours, dtype=float)
+        
+        # 1. Deadline-Dringlichkeit: Stufen, danach lineare Abnahme bis 30 Tage
+        linear = np.maximum(0, 10 - (hours - 168) / 168 * 10)
+        deadline_points = np.select(
+            [hours < 0, hours < 6, hours < 12, hours < 24, hours < 48, hours < 72, hours < 120, hours < 168],
+            [50, 48, 46, 42, 35, 28, 20, 12],
+            default=linear
+        )
+        score = np.where(np.isnan(hours), 0.0, deadline_points)
+        
+        # 2. Manuelle Priorität, 3. Kritischer Pfad
+        score += np.asarray(priority, dtype=float) / 10 * 25
+        score += np.where(np.asarray(critical, dtype=bool), 25, 0)
+        
+        # 4. Projekt-Wichtigkeit
+        project_points = np.select(
+            [project < 24, project < 48, project < 72, project < 120], [10, 8, 6, 4], default=2
+        )
+        score += np.where(np.isnan(project), 0, project_points)
+        
+        # 5. Abhängigkeits-Dringlichkeit
+        score += np.minimum(10, np.asarray(blocking_count, dtype=float) * 2)
+        return np.round(score, 2)
+    
+    @staticmethod
+    def recalculate_priority_scores(statuses=OPEN_JOB_STATES, threshold=0.5, now=None):
+        """
+        Berechnet die Scores aller offenen Jobs gesammelt neu: Spalten in zwei
+        Abfragen laden, als Arrays rechnen und geänderte Scores in einem
+        Bulk-UPDATE (executemany über den Primärschlüssel) zurückschreiben.
+        
+        Args:
+            statuses: Zu berechnende Job-Status
+            threshold: Nur Änderungen größer als dieser Wert schreiben
+            now: Bezugszeitpunkt (Standard: jetzt, UTC)
+            
+        Returns:
+            dict: checked, updated, changes (Liste von (job_id, alt, neu))
+        """
+        now = now or datetime.datetime.utcnow()
+        rows = db.session.query(
+            Job.id, Job.deadline, Job.priority, Job.is_on_critical_path, Job.priority_score, Project.deadline
+        ).outerjoin(Project, Job.project_id == Project.id).filter(Job.status.in_(statuses)).all()
+        if not rows:
+            return {'checked': 0, 'updated': 0, 'changes': []}
+        
+        # Anzahl abhängiger Jobs (job.dependents) je Job in einer Abfrage
+        blocking = dict(db.session.query(JobDependency.depends_on_job_id, func.count(JobDependency.id))
+                        .group_by(JobDependency.depends_on_job_id).all())
+        
+        ids, deadline, priority, critical, old, project_deadline = zip(*rows)
+        ids = np.array(ids)
+        
+        def hours_until(values):
+            seconds = np.array([(value - now).total_seconds() if value else np.nan for value in values])
+            return seconds / 3600
+        
+        scores = PriorityCalculator.score_arrays(
+            hours_until(deadline),
+            [value or 0 for value in priority],
+            [bool(value) for value in critical],
+            hours_until(project_deadline),
+            [blocking.get(job_id, 0) for job_id in ids.tolist()]
+        )
+        old = np.array(old, dtype=float)
+        changed = np.abs(scores - old) > threshold
+        changes = list(zip(ids[changed].tolist(), old[changed].tolist(), scores[changed].tolist()))
+        
+        bulk_update_jobs([{'id': job_id, 'priority_score': score} for job_id, _, score in changes],
+                         ['priority_score'])
+        return {'checked': len(rows), 'updated': len(changes), 'changes': changes}
 
 
 class SchedulingOptimizer: